@@ -0,0 +1,30 @@
+"""
+Benchmark reproducible de la API.
+
+Siembra un catálogo sintético del tamaño indicado (`bench/catalogo.py`) y recorre todos los
+endpoints de los routers (`bench/escenarios.py`) llamando a la aplicación ASGI dentro del mismo
+proceso, con un número fijo de peticiones simultáneas. Para cada escenario informa, en JSON, el
+rendimiento (peticiones por segundo), las latencias p50/p95/p99, los comandos enviados a MongoDB
+y la memoria residente máxima del proceso.
+
+Funciona con el backend en memoria (por defecto) o con un servidor de MongoDB local, en una base
+de datos propia (`biblioteca_bench`) que se vacía antes de sembrar. Con `--comparar` se compara
+con una ejecución anterior guardada con `--salida`; el código de salida es 1 si algún escenario
+empeora más que `--tolerancia`.
+
+Uso:
+
+    python -m bench --tamano 10000 --salida base.json
+    python -m bench --tamano 10000 --comparar base.json
+    python -m bench --backend mongodb --uri mongodb://localhost:27017 --tamano 100000 --escenarios "libros_*"
+
+`bench/serializacion.py` mide por separado, sin base de datos, el coste por elemento de la
+serialización de los listados:
+
+    python -m bench.serializacion --elementos 10000
+
+`bench/equivalencia.py` comprueba con el mismo catálogo que el backend en memoria devuelve lo
+mismo que MongoDB:
+
+    python -m bench.equivalencia --uri mongodb://localhost:27017
+"""
@@ -0,0 +1,141 @@
+"""
+Ejecuta el benchmark de la API. Ver `bench/__init__.py`.
+"""
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import platform
+import sys
+import time
+
+BASE_POR_DEFECTO = 'biblioteca_bench'
+URI_POR_DEFECTO = 'mongodb://localhost:27017'
+
+def main(argumentos: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Mide el rendimiento de los endpoints de la API con un catálogo sintético.')
+    parser.add_argument('--backend', choices=['memoria', 'mongodb'], default='memoria', help='almacenamiento (por defecto memoria)')
+    parser.add_argument('--uri', help=f'URI de MongoDB (por defecto la variable URI, o {URI_POR_DEFECTO})')
+    parser.add_argument('--base', default=BASE_POR_DEFECTO, help=f'base de datos del benchmark; se vacía al sembrar (por defecto {BASE_POR_DEFECTO})')
+    parser.add_argument('--tamano', type=int, default=10000, help='elementos de biblioteca del catálogo (por defecto 10000)')
+    parser.add_argument('--semilla', type=int, default=1, help='semilla del catálogo y de las peticiones (por defecto 1)')
+    parser.add_argument('--reutilizar', action='store_true', help='usa el catálogo existente en --base si no está vacío')
+    parser.add_argument('--concurrencia', type=int, default=16, help='peticiones simultáneas (por defecto 16)')
+    parser.add_argument('--peticiones', type=int, default=500, help='peticiones medidas por escenario (por defecto 500)')
+    parser.add_argument('--calentamiento', type=int, default=20, help='peticiones sin medir antes de cada escenario (por defecto 20)')
+    parser.add_argument('--escenarios', help='patrones de nombre separados por comas, p. ej. "libros_*,elementos_estadisticas"')
+    parser.add_argument('--salida', help='archivo JSON de resultados (por defecto, la salida estándar)')
+    parser.add_argument('--comparar', help='archivo JSON de una ejecución de referencia')
+    parser.add_argument('--tolerancia', type=float, default=0.15, help='variación de rps o p95 tolerada al comparar (por defecto 0.15)')
+    opciones = parser.parse_args(argumentos)
+
+    if opciones.backend == 'mongodb' and opciones.base == 'biblioteca':
+        parser.error('el benchmark vacía su base de datos; usa una distinta de "biblioteca" con --base')
+    # La configuración se lee al importar `database`, así que se fija antes de importar la aplicación
+    os.environ['BACKEND'] = opciones.backend
+    os.environ['BASE_DE_DATOS'] = opciones.base
+    if opciones.uri:
+        os.environ['URI'] = opciones.uri
+    elif opciones.backend == 'mongodb':
+        os.environ.setdefault('URI', URI_POR_DEFECTO)
+
+    referencia = None
+    if opciones.comparar:
+        with open(opciones.comparar, encoding='utf-8') as archivo:
+            referencia = json.load(archivo)
+
+    resultado = asyncio.run(ejecutar(opciones))
+
+    codigo = 0
+    if referencia is not None:
+        from bench.medicion import comparar, imprimir_comparacion
+        if referencia.get('parametros', {}).get('tamano') != opciones.tamano or referencia.get('entorno', {}).get('backend') != opciones.backend:
+            print('Aviso: la referencia usa otro tamaño de catálogo o backend', file=sys.stderr)
+        filas = comparar(resultado, referencia, opciones.tolerancia)
+        imprimir_comparacion(filas)
+        resultado['comparacion'] = {'referencia': opciones.comparar, 'tolerancia': opciones.tolerancia, 'escenarios': filas}
+        codigo = 1 if any(fila['empeora'] for fila in filas) else 0
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if opciones.salida:
+        with open(opciones.salida, 'w', encoding='utf-8') as archivo:
+            archivo.write(texto + '\n')
+    else:
+        print(texto)
+    return codigo
+
+async def ejecutar(opciones) -> dict:
+    from pymongo import monitoring
+    from bench.medicion import ContadorComandos, medir, rss_pico_mb
+
+    contador = None
+    if opciones.backend == 'mongodb':
+        # Registrado antes de crear el cliente, cuenta todos sus comandos
+        contador = ContadorComandos()
+        monitoring.register(contador)
+
+    import database
+    from main import app
+    from models.indices import crear_indices
+    from crud.autocompletado import indice_autocompletado
+    from services.cache import CACHE_BACKEND
+    from bench.catalogo import contar, muestras, sembrar
+    from bench.escenarios import escenarios
+
+    seleccion = escenarios()
+    if opciones.escenarios:
+        patrones = [patron.strip() for patron in opciones.escenarios.split(',') if patron.strip()]
+        seleccion = [e for e in seleccion if any(fnmatch.fnmatchcase(e.nombre, patron) for patron in patrones)]
+
+    resultado = {
+        'fecha': datetime.now(timezone.utc).isoformat(),
+        'entorno': {
+            'backend': opciones.backend,
+            'almacenamiento': database.ALMACENAMIENTO,
+            'cache': CACHE_BACKEND,
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+        },
+        'parametros': {
+            'tamano': opciones.tamano,
+            'semilla': opciones.semilla,
+            'concurrencia': opciones.concurrencia,
+            'peticiones': opciones.peticiones,
+            'calentamiento': opciones.calentamiento,
+        },
+        'siembra': None,
+        'escenarios': {},
+    }
+    async with app.router.lifespan_context(app):
+        engine = database.obtener_engine()
+        if opciones.reutilizar and await contar(engine):
+            print(f'Catálogo existente: {await contar(engine)} elementos', file=sys.stderr)
+        else:
+            if opciones.backend == 'mongodb':
+                await engine.client.drop_database(database.BASE_DE_DATOS)
+                await crear_indices(engine)
+                await indice_autocompletado.construir(engine)
+            resultado['siembra'] = await sembrar(opciones.tamano, opciones.semilla)
+        datos = await muestras(engine)
+        datos['semilla'] = opciones.semilla
+        datos['ejecucion'] = format(time.time_ns(), 'x')
+        resultado['rss_tras_siembra_mb'] = rss_pico_mb()
+
+        for escenario in seleccion:
+            peticiones = max(1, round(opciones.peticiones * escenario.factor))
+            calentamiento = round(opciones.calentamiento * escenario.factor)
+            medido = await medir(app, escenario, datos, peticiones, opciones.concurrencia, calentamiento, contador)
+            resultado['escenarios'][escenario.nombre] = medido
+            latencia = medido['latencia_ms']
+            print(
+                f'{escenario.nombre:<32} {medido["rps"] or 0:>9.1f} rps  p50 {latencia["p50"]:>8.2f}  '
+                f'p95 {latencia["p95"]:>8.2f}  p99 {latencia["p99"]:>8.2f} ms  errores {medido["errores"]}',
+                file=sys.stderr,
+            )
+    resultado['rss_pico_mb'] = rss_pico_mb()
+    return resultado
+
+if __name__ == '__main__':
+    sys.exit(main())
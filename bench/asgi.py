@@ -0,0 +1,90 @@
+"""
+Cliente HTTP mínimo que llama a la aplicación ASGI dentro del mismo proceso.
+
+Las peticiones no pasan por sockets ni por un servidor, de modo que la medición incluye solo el
+trabajo de la API (middleware, validación, servicios, base de datos y serialización).
+"""
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+import asyncio
+import json
+
+@dataclass
+class Respuesta:
+    estado: int
+    cuerpo: bytes
+    cabeceras: dict[str, str] = field(default_factory=dict)
+
+    def json(self):
+        return json.loads(self.cuerpo)
+
+async def peticion(app, metodo: str, ruta: str, params: dict | None = None, cuerpo=None, cabeceras: dict | None = None) -> Respuesta:
+    """
+    Envía una petición a la aplicación ASGI y espera la respuesta completa.
+
+    Parámetros:
+    - app: Aplicación ASGI (por ejemplo, `main.app`).
+    - metodo (str): Método HTTP.
+    - ruta (str): Ruta de la petición, sin query string.
+    - params (dict | None): Parámetros de la query string.
+    - cuerpo: Objeto a enviar como JSON, o None si la petición no lleva cuerpo.
+    - cabeceras (dict | None): Cabeceras adicionales.
+
+    Retorna:
+    - Respuesta: Código de estado, cuerpo completo (los cuerpos en streaming se concatenan) y
+      cabeceras (con los nombres en minúsculas). Si la aplicación lanza una excepción, el estado
+      es 500.
+    """
+    datos = b'' if cuerpo is None else json.dumps(cuerpo).encode()
+    lista_cabeceras = [(b'host', b'bench')]
+    if cuerpo is not None:
+        lista_cabeceras += [(b'content-type', b'application/json'), (b'content-length', str(len(datos)).encode())]
+    for nombre, valor in (cabeceras or {}).items():
+        lista_cabeceras.append((nombre.lower().encode(), valor.encode()))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0', 'spec_version': '2.3'},
+        'http_version': '1.1',
+        'method': metodo,
+        'scheme': 'http',
+        'path': ruta,
+        'raw_path': ruta.encode(),
+        'root_path': '',
+        'query_string': urlencode(params or {}).encode(),
+        'headers': lista_cabeceras,
+        'client': ('127.0.0.1', 0),
+        'server': ('bench', 80),
+    }
+    enviado = False
+    terminada = asyncio.Event()
+    estado = 500
+    cabeceras_respuesta = {}
+    partes = []
+
+    async def recibir():
+        nonlocal enviado
+        if not enviado:
+            enviado = True
+            return {'type': 'http.request', 'body': datos, 'more_body': False}
+        # El cliente no se desconecta hasta haber leído toda la respuesta
+        await terminada.wait()
+        return {'type': 'http.disconnect'}
+
+    async def enviar(mensaje):
+        nonlocal estado
+        if mensaje['type'] == 'http.response.start':
+            estado = mensaje['status']
+            cabeceras_respuesta.update((nombre.decode().lower(), valor.decode()) for nombre, valor in mensaje.get('headers', []))
+        elif mensaje['type'] == 'http.response.body':
+            partes.append(mensaje.get('body', b''))
+            if not mensaje.get('more_body', False):
+                terminada.set()
+
+    try:
+        await app(scope, recibir, enviar)
+    except Exception:
+        # Un error sin capturar en la aplicación llega al cliente como un 500 (así lo sirve
+        # uvicorn) y cuenta como error del escenario en lugar de interrumpir la medición
+        estado = 500
+    terminada.set()
+    return Respuesta(estado, b''.join(partes), cabeceras_respuesta)
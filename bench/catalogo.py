@@ -0,0 +1,160 @@
+"""
+Catálogo sintético para los benchmarks.
+
+Los elementos se generan de forma determinista a partir de una semilla (60 % libros, 25 % DVDs y
+15 % revistas) y se escriben con los servicios de creación masiva, igual que haría
+`POST /<tipo>/bulk`, para que los índices y el índice de búsqueda por título queden como en una
+base de datos real.
+"""
+from models.dvd import DVD
+from models.elemento import ElementoBiblioteca
+from models.libro import Libro
+from models.revista import Revista
+from schemas.dvd import DVDCreate
+from schemas.libro import LibroCreate
+from schemas.revista import RevistaCreate
+from services import libro as libro_service, dvd as dvd_service, revista as revista_service
+import asyncio
+import random
+import sys
+import time
+
+TAMANO_LOTE = 1000
+CONCURRENCIA = 4
+TAMANO_MUESTRA = 1000
+
+PROPORCIONES = (('libro', 0.60), ('dvd', 0.25), ('revista', 0.15))
+
+SUSTANTIVOS = (
+    'Jardín', 'Río', 'Ciudad', 'Noche', 'Sombra', 'Camino', 'Mar', 'Bosque', 'Silencio', 'Tiempo',
+    'Viento', 'Puerta', 'Espejo', 'Isla', 'Montaña', 'Reino', 'Memoria', 'Fuego', 'Luz', 'Invierno',
+    'Verano', 'Casa', 'Puente', 'Torre', 'Laberinto', 'Desierto', 'Estrella', 'Lluvia', 'Secreto', 'Viaje',
+)
+ADJETIVOS = (
+    'perdido', 'oscuro', 'eterno', 'rojo', 'olvidado', 'infinito', 'secreto', 'antiguo', 'lejano', 'dorado',
+    'salvaje', 'frío', 'último', 'primero', 'invisible', 'sagrado', 'roto', 'blanco', 'profundo', 'nuevo',
+)
+COMPLEMENTOS = ('de los vientos', 'del norte', 'de cristal', 'sin nombre', 'de papel', 'de medianoche', 'del sur', 'de plata')
+NOMBRES = ('Ana', 'Carlos', 'Lucía', 'Jorge', 'María', 'Pedro', 'Elena', 'Andrés', 'Sofía', 'Gabriel', 'Isabel', 'Julio')
+APELLIDOS = ('García', 'Márquez', 'Borges', 'Cortázar', 'Allende', 'Neruda', 'Mistral', 'Rulfo', 'Paz', 'Fuentes', 'Onetti', 'Vargas')
+GENEROS_LIBRO = ('Novela', 'Drama', 'Terror', 'Poesía', 'Ensayo', 'Ciencia ficción', 'Fantasía', 'Historia', 'Policial', 'Biografía')
+GENEROS_DVD = ('Acción', 'Comedia', 'Drama', 'Terror', 'Ciencia ficción', 'Documental', 'Animación', 'Suspenso')
+CATEGORIAS = ('Ciencia', 'Tecnología', 'Historia', 'Arte', 'Deportes', 'Viajes', 'Economía', 'Salud', 'Cocina', 'Música')
+EDITORIALES = ('Sudamericana', 'Alfaguara', 'Anagrama', 'Planeta', 'Seix Barral', 'Tusquets', 'Losada', 'Emecé')
+
+def titulo(aleatorio: random.Random) -> str:
+    texto = f'{aleatorio.choice(("El", "La", "Los", "Las"))} {aleatorio.choice(SUSTANTIVOS)} {aleatorio.choice(ADJETIVOS)}'
+    if aleatorio.random() < 0.4:
+        texto += f' {aleatorio.choice(COMPLEMENTOS)}'
+    return texto
+
+def autor(aleatorio: random.Random) -> str:
+    return f'{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)}'
+
+def generar(tipo: str, numero: int, aleatorio: random.Random):
+    """
+    Genera los datos de creación de un elemento sintético.
+
+    Parámetros:
+    - tipo (str): 'libro', 'dvd' o 'revista'.
+    - numero (int): Número del elemento dentro de su tipo; determina el ISBN de los libros.
+    - aleatorio (random.Random): Generador del que se toman los valores.
+
+    Retorna:
+    - LibroCreate | DVDCreate | RevistaCreate: Datos del elemento.
+    """
+    comunes = {'titulo': titulo(aleatorio), 'autor': autor(aleatorio), 'ano_publicacion': aleatorio.randint(1850, 2025)}
+    if tipo == 'libro':
+        return LibroCreate(
+            **comunes, isbn=f'978{numero:010d}', numero_paginas=aleatorio.randint(60, 1200),
+            genero=aleatorio.choice(GENEROS_LIBRO), editorial=aleatorio.choice(EDITORIALES),
+        )
+    if tipo == 'dvd':
+        return DVDCreate(**comunes, duracion=aleatorio.randint(70, 210), genero=aleatorio.choice(GENEROS_DVD))
+    return RevistaCreate(**comunes, numero_edicion=aleatorio.randint(1, 500), categoria=aleatorio.choice(CATEGORIAS))
+
+CREADORES = {
+    'libro': libro_service.crear_libros_service,
+    'dvd': dvd_service.crear_dvds_service,
+    'revista': revista_service.crear_revistas_service,
+}
+
+def cantidades(tamano: int) -> dict[str, int]:
+    """
+    Reparte el tamaño del catálogo entre los tipos según `PROPORCIONES`.
+    """
+    resultado = {tipo: int(tamano * proporcion) for tipo, proporcion in PROPORCIONES}
+    resultado['libro'] += tamano - sum(resultado.values())
+    return resultado
+
+async def sembrar(tamano: int, semilla: int, tamano_lote: int = TAMANO_LOTE, concurrencia: int = CONCURRENCIA) -> dict:
+    """
+    Crea un catálogo sintético de `tamano` elementos.
+
+    Parámetros:
+    - tamano (int): Número total de elementos de biblioteca.
+    - semilla (int): Semilla del generador; la misma semilla produce el mismo catálogo.
+    - tamano_lote (int): Elementos por creación masiva.
+    - concurrencia (int): Lotes en vuelo.
+
+    Retorna:
+    - dict: Elementos creados por tipo, errores y segundos empleados.
+
+    Errores:
+    - RuntimeError: Si algún elemento no se pudo crear (por ejemplo, porque la base de datos no estaba vacía).
+    """
+    inicio = time.monotonic()
+    semaforo = asyncio.Semaphore(concurrencia)
+    creados = {tipo: 0 for tipo, _ in PROPORCIONES}
+    errores = []
+
+    async def escribir(tipo: str, lote: list):
+        try:
+            for resultado in await CREADORES[tipo](lote):
+                if resultado.get('error'):
+                    errores.append(resultado['error'])
+                else:
+                    creados[tipo] += 1
+        finally:
+            semaforo.release()
+
+    for tipo, cantidad in cantidades(tamano).items():
+        aleatorio = random.Random(f'{semilla}:{tipo}')
+        tareas = []
+        for desde in range(0, cantidad, tamano_lote):
+            # Se espera un hueco antes de generar el lote, para no acumular lotes pendientes en memoria
+            await semaforo.acquire()
+            lote = [generar(tipo, numero, aleatorio) for numero in range(desde, min(desde + tamano_lote, cantidad))]
+            tareas.append(asyncio.create_task(escribir(tipo, lote)))
+        await asyncio.gather(*tareas)
+        print(f'Catálogo: {creados[tipo]} {tipo}s ({time.monotonic() - inicio:.1f} s)', file=sys.stderr)
+    if errores:
+        raise RuntimeError(f'{len(errores)} elementos no se pudieron crear; el primero: {errores[0]}')
+    return {'elementos': creados, 'segundos': round(time.monotonic() - inicio, 3)}
+
+async def muestras(engine, tamano: int = TAMANO_MUESTRA) -> dict:
+    """
+    Toma del catálogo los valores con los que se construyen las peticiones: IDs de cada tipo e ISBNs.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - tamano (int): Número máximo de valores de cada clase.
+
+    Retorna:
+    - dict: Listas `libro`, `dvd` y `revista` con IDs (str), e `isbn` con ISBNs.
+    """
+    resultado = {}
+    for tipo, modelo in (('libro', Libro), ('dvd', DVD), ('revista', Revista)):
+        documentos = await engine.get_collection(modelo).find({}, {'_id': 1}).limit(tamano).to_list(length=None)
+        resultado[tipo] = [str(documento['_id']) for documento in documentos]
+    documentos = await engine.get_collection(Libro).find({}, {'isbn': 1}).limit(tamano).to_list(length=None)
+    resultado['isbn'] = [documento['isbn'] for documento in documentos]
+    if not all(resultado.values()):
+        raise RuntimeError('El catálogo no tiene elementos de todos los tipos; aumenta --tamano')
+    return resultado
+
+async def contar(engine) -> int:
+    """
+    Número de elementos de biblioteca del catálogo.
+    """
+    return await engine.get_collection(ElementoBiblioteca).estimated_document_count()
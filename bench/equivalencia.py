@@ -0,0 +1,227 @@
+"""
+Comprueba que el backend en memoria (`database_memoria.py`) responde igual que MongoDB.
+
+Siembra el catálogo sintético del benchmark con `BACKEND=memoria`, copia sus colecciones tal cual
+(con los mismos `_id`) a una base de datos de MongoDB con los índices declarados, y ejecuta las
+mismas funciones de la capa crud contra los dos motores: listados paginados en todos los órdenes
+y tipos, recorridos NDJSON, búsquedas por título, ISBN, ID, género y categoría, estadísticas y
+una serie de modificaciones y eliminaciones, tras las que se comparan las colecciones completas.
+Es el contrato del backend en memoria: una consulta nueva de la capa crud debe añadirse aquí.
+
+El código de salida es 1 si alguna llamada devuelve un resultado distinto (o falla en un solo
+backend). La base de datos de MongoDB se vacía al empezar.
+
+Uso:
+
+    python -m bench.equivalencia --uri mongodb://localhost:27017 --tamano 2000
+    ALMACENAMIENTO=embebido python -m bench.equivalencia --uri mongodb://localhost:27017
+"""
+from typing import Awaitable, Callable
+import argparse
+import asyncio
+import os
+import sys
+
+BASE_POR_DEFECTO = 'biblioteca_equivalencia'
+URI_POR_DEFECTO = 'mongodb://localhost:27017'
+LIMITE_PAGINA = 97
+TERMINOS = ('l', 'la', 'jardin', 'noche o', 'RÍO', 'de los vientos', 'xyz')
+
+Consulta = Callable[[object], Awaitable]
+
+def _normalizar(valor):
+    # Los promedios pueden diferir en el último decimal según el orden en que se suman
+    if isinstance(valor, float):
+        return round(valor, 9)
+    if isinstance(valor, dict):
+        return {clave: _normalizar(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    if hasattr(valor, 'model_dump'):
+        return _normalizar(valor.model_dump())
+    return valor
+
+def _sin_orden(documentos: list) -> list:
+    # Para las consultas que no fijan un orden (MongoDB devuelve el orden natural)
+    return sorted(documentos, key=lambda documento: str(documento.get('id', documento.get('_id'))))
+
+async def _paginas(listar, engine) -> list:
+    paginas, cursor = [], None
+    while True:
+        documentos, cursor = await listar(engine, cursor)
+        paginas.append((documentos, cursor))
+        if cursor is None:
+            return paginas
+
+async def _lista(iterador) -> list:
+    return [documento async for documento in iterador]
+
+async def _sin_fecha(calculo: Awaitable) -> dict:
+    estadisticas = await calculo
+    del estadisticas['generado']
+    return estadisticas
+
+def consultas(muestras: dict) -> list[tuple[str, Consulta]]:
+    """
+    Llamadas de lectura de la capa crud que se comparan.
+
+    Parámetros:
+    - muestras (dict): IDs de cada tipo e ISBNs del catálogo (`bench.catalogo.muestras`).
+
+    Retorna:
+    - list[tuple[str, Consulta]]: Nombre y función que recibe el motor y devuelve el resultado.
+    """
+    from crud import libro, dvd, revista, elemento, estadisticas
+    from bench.catalogo import GENEROS_DVD, CATEGORIAS
+
+    resultado = []
+    listados = (('libros', libro.listar_libros_con_campos), ('dvds', dvd.listar_dvds_con_campos),
+                ('revistas', revista.listar_revistas_con_campos), ('elementos', elemento.listar_elementos_con_campos))
+    for nombre, listar in listados:
+        for orden in ('id', 'titulo', 'ano_publicacion'):
+            for campos in (None, ('id', 'titulo')):
+                resultado.append((
+                    f'{nombre}_listado_{orden}{"_campos" if campos else ""}',
+                    lambda engine, listar=listar, orden=orden, campos=campos: _paginas(
+                        lambda engine, cursor: listar(engine, campos, LIMITE_PAGINA, cursor, orden), engine),
+                ))
+    recorridos = (('libros', libro.iterar_libros_con_campos), ('dvds', dvd.iterar_dvds_con_campos),
+                  ('revistas', revista.iterar_revistas_con_campos), ('elementos', elemento.iterar_elementos_con_campos))
+    for nombre, iterar in recorridos:
+        resultado.append((f'{nombre}_ndjson', lambda engine, iterar=iterar: _lista(iterar(engine, None))))
+    for termino in TERMINOS:
+        for nombre, modulo in (('libros', libro), ('dvds', dvd), ('revistas', revista)):
+            resultado.append((f'{nombre}_titulo_{termino}', lambda engine, modulo=modulo, termino=termino: modulo.buscar_por_titulo(termino, engine)))
+        resultado.append((f'elementos_titulo_{termino}', lambda engine, termino=termino: elemento.buscar_elemento_por_titulo(termino, engine)))
+        for orden in ('relevancia', 'titulo', 'ano_publicacion'):
+            resultado.append((
+                f'elementos_buscar_{termino}_{orden}',
+                lambda engine, termino=termino, orden=orden: _paginas(
+                    lambda engine, cursor: elemento.buscar_elementos_con_detalle(termino, engine, LIMITE_PAGINA, cursor, orden), engine),
+            ))
+    for isbn in muestras['isbn'][:20]:
+        resultado.append((f'libro_isbn_{isbn}', lambda engine, isbn=isbn: libro.buscar_por_isbn(isbn, engine)))
+    for nombre, modulo in (('libro', libro), ('dvd', dvd), ('revista', revista)):
+        for identificador in muestras[nombre][:20]:
+            resultado.append((f'{nombre}_id_{identificador}', lambda engine, modulo=modulo, i=identificador: modulo.buscar_por_id(i, engine)))
+    for genero in GENEROS_DVD[:3] + ('dra',):
+        resultado.append((f'dvds_genero_{genero}', lambda engine, genero=genero: dvd.buscar_por_genero(genero, engine)))
+    for categoria in CATEGORIAS[:3] + ('ci',):
+        resultado.append((f'revistas_categoria_{categoria}', lambda engine, c=categoria: revista.buscar_por_categoria(c, engine)))
+    resultado.append(('estadisticas', lambda engine: _sin_fecha(estadisticas.calcular_estadisticas(engine))))
+    for nombre, modulo in (('libros', libro), ('dvds', dvd), ('revistas', revista), ('elementos', elemento)):
+        resultado.append((f'{nombre}_cambios', modulo.contar_cambios))
+    return resultado
+
+def escrituras(muestras: dict) -> list[tuple[str, Consulta]]:
+    """
+    Modificaciones y eliminaciones de la capa crud que se aplican a los dos backends.
+    """
+    from crud import libro, dvd, revista
+    from schemas.libro import LibroCreate, LibroUpdate
+    from schemas.dvd import DVDUpdate
+    from schemas.revista import RevistaUpdate
+
+    libro_id, otro_libro_id = muestras['libro'][:2]
+    nuevo = LibroCreate(titulo='El túnel', autor='Ernesto Sabato', ano_publicacion=1948, isbn='equivalencia-1',
+                        numero_paginas=158, genero='Novela', editorial='Sur')
+    return [
+        ('libro_actualizar', lambda engine: libro.actualizar_libro_por_id(libro_id, nuevo, engine)),
+        ('libro_actualizar_parcial', lambda engine: libro.actualizar_parcial_libro_por_id(otro_libro_id, LibroUpdate(numero_paginas=1), engine)),
+        ('dvd_actualizar_parcial', lambda engine: dvd.actualizar_parcial_por_id(muestras['dvd'][0], DVDUpdate(titulo='Otro título'), engine)),
+        ('revista_actualizar_parcial', lambda engine: revista.actualizar_parcial_por_id(muestras['revista'][0], RevistaUpdate(categoria='Arte'), engine)),
+        ('libro_eliminar', lambda engine: libro.eliminar_libro_por_id(muestras['libro'][2], engine)),
+        ('dvd_eliminar', lambda engine: dvd.eliminar_por_id(muestras['dvd'][1], engine)),
+        ('revista_eliminar', lambda engine: revista.eliminar_revista_por_id(muestras['revista'][1], engine)),
+        ('libro_eliminar_inexistente', lambda engine: libro.eliminar_libro_por_id(muestras['libro'][2], engine)),
+    ]
+
+async def _resultado(consulta: Consulta, engine, ordenado: bool):
+    try:
+        valor = _normalizar(await consulta(engine))
+    except Exception as error:
+        # Los mensajes de error de los dos backends no coinciden; basta con el tipo
+        return f'error {type(error).__name__}'
+    if not ordenado and isinstance(valor, list):
+        return _sin_orden(valor)
+    return valor
+
+async def _colecciones(engine, nombres: list[str]) -> dict:
+    return {
+        nombre: await engine.database[nombre].find({}, sort=[('_id', 1)]).to_list(length=None)
+        for nombre in nombres
+    }
+
+async def comparar(memoria, mongodb, muestras: dict, salida=sys.stderr) -> int:
+    """
+    Ejecuta las consultas y escrituras contra los dos motores e informa de las diferencias.
+
+    Parámetros:
+    - memoria (AIOEngine): Motor del backend en memoria.
+    - mongodb (AIOEngine): Motor de MongoDB con los mismos datos.
+    - muestras (dict): IDs e ISBNs del catálogo.
+
+    Retorna:
+    - int: Número de llamadas con resultados distintos.
+    """
+    diferencias = 0
+
+    def informar(nombre: str, a, b):
+        nonlocal diferencias
+        if a == b:
+            return
+        diferencias += 1
+        print(f'DIFERENTE {nombre}\n  memoria: {str(a)[:300]}\n  mongodb: {str(b)[:300]}', file=salida)
+
+    lecturas = consultas(muestras)
+    for nombre, consulta in lecturas:
+        ordenado = not nombre.startswith(('dvds_genero_', 'revistas_categoria_'))
+        informar(nombre, await _resultado(consulta, memoria, ordenado), await _resultado(consulta, mongodb, ordenado))
+    for nombre, escritura in escrituras(muestras):
+        informar(nombre, await _resultado(escritura, memoria, True), await _resultado(escritura, mongodb, True))
+    nombres = sorted(await memoria.database.list_collection_names())
+    antes, despues = await _colecciones(memoria, nombres), await _colecciones(mongodb, nombres)
+    for nombre in nombres:
+        informar(f'coleccion_{nombre}', antes[nombre], despues[nombre])
+    print(f'{len(lecturas)} consultas, {len(escrituras(muestras))} escrituras y {len(nombres)} colecciones comparadas; '
+          f'{diferencias} diferencias', file=salida)
+    return diferencias
+
+async def ejecutar(opciones) -> int:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from odmantic import AIOEngine
+    import database
+    from models.indices import crear_indices
+    from bench.catalogo import muestras, sembrar
+
+    async with database.conexion() as memoria:
+        await crear_indices(memoria)
+        await sembrar(opciones.tamano, opciones.semilla)
+        cliente = AsyncIOMotorClient(opciones.uri)
+        try:
+            await cliente.drop_database(opciones.base)
+            mongodb = AIOEngine(client=cliente, database=opciones.base)
+            await crear_indices(mongodb)
+            for nombre in await memoria.database.list_collection_names():
+                documentos = await memoria.database[nombre].find({}).to_list(length=None)
+                if documentos:
+                    await mongodb.database[nombre].insert_many(documentos)
+            return await comparar(memoria, mongodb, await muestras(memoria))
+        finally:
+            cliente.close()
+
+def main(argumentos: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Compara las respuestas de la capa crud con el backend en memoria y con MongoDB.')
+    parser.add_argument('--uri', default=os.getenv('URI', URI_POR_DEFECTO), help=f'URI de MongoDB (por defecto la variable URI, o {URI_POR_DEFECTO})')
+    parser.add_argument('--base', default=BASE_POR_DEFECTO, help=f'base de datos de MongoDB; se vacía al empezar (por defecto {BASE_POR_DEFECTO})')
+    parser.add_argument('--tamano', type=int, default=2000, help='elementos de biblioteca del catálogo (por defecto 2000)')
+    parser.add_argument('--semilla', type=int, default=1, help='semilla del catálogo (por defecto 1)')
+    opciones = parser.parse_args(argumentos)
+    if opciones.base == 'biblioteca':
+        parser.error('la comprobación vacía su base de datos; usa una distinta de "biblioteca" con --base')
+    # El catálogo se siembra en memoria; la configuración se lee al importar `database`
+    os.environ['BACKEND'] = 'memoria'
+    return 1 if asyncio.run(ejecutar(opciones)) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Escenarios del benchmark: uno o más por cada endpoint de los routers.
+
+Cada escenario construye la petición número `i` a partir de las muestras del catálogo, con un
+generador aleatorio propio que depende de la semilla y del nombre del escenario, de modo que dos
+ejecuciones con la misma semilla envían las mismas peticiones. Los escenarios de escritura se
+ejecutan después de los de lectura; los de eliminación crean antes (sin medirlos) los elementos
+que van a borrar, y así ninguna petición borra datos que otra necesite.
+"""
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from bench.asgi import peticion
+from bench.catalogo import (
+    ADJETIVOS, CATEGORIAS, CREADORES, GENEROS_DVD, SUSTANTIVOS, generar, titulo,
+)
+from services.compresion import COMPRESION
+from services.metricas import METRICAS
+import random
+
+NDJSON = {'accept': 'application/x-ndjson'}
+GZIP = {'accept-encoding': 'gzip'}
+TAMANO_BULK = 100
+
+@dataclass
+class Escenario:
+    """
+    Endpoint medido y forma de sus peticiones.
+
+    Atributos:
+    - nombre (str): Identificador del escenario en el informe.
+    - metodo (str): Método HTTP.
+    - ruta (str): Plantilla de la ruta, como la declara el router.
+    - construir (Callable): Recibe el número de petición, un `random.Random` y los datos de la
+      ejecución, y devuelve los argumentos de `bench.asgi.peticion` (`ruta`, `params`, `cuerpo`, `cabeceras`).
+    - esperados (tuple[int, ...]): Códigos de estado que no cuentan como error.
+    - factor (float): Fracción de `--peticiones` que se envía (para endpoints costosos, como las exportaciones).
+    - escritura (bool): Si modifica el catálogo; se ejecuta después de las lecturas.
+    - preparar (Callable | None): Corrutina que recibe la aplicación, los datos de la ejecución y el
+      número total de peticiones, y completa los datos antes de medir.
+    """
+    nombre: str
+    metodo: str
+    ruta: str
+    construir: Callable[[int, random.Random, dict], dict]
+    esperados: tuple[int, ...] = (200,)
+    factor: float = 1.0
+    escritura: bool = False
+    preparar: Callable[[object, dict, int], Awaitable[None]] | None = None
+
+def _palabra(aleatorio: random.Random) -> str:
+    return aleatorio.choice(SUSTANTIVOS + ADJETIVOS)
+
+def _leer(ruta: str, params: dict | None = None, cabeceras: dict | None = None) -> dict:
+    params = {clave: valor for clave, valor in (params or {}).items() if valor is not None}
+    return {'ruta': ruta, 'params': params, 'cabeceras': cabeceras}
+
+def _isbn(datos: dict, clave: str) -> str:
+    # ISBN propio de la ejecución, para no chocar con el catálogo ni con ejecuciones anteriores
+    return f'bench-{datos["ejecucion"]}-{clave}'
+
+def _cuerpo(tipo: str, clave: str, aleatorio: random.Random, datos: dict) -> dict:
+    datos_elemento = generar(tipo, 0, aleatorio).model_dump()
+    if tipo == 'libro':
+        datos_elemento['isbn'] = _isbn(datos, clave)
+    return datos_elemento
+
+def _listado(prefijo: str) -> list[Escenario]:
+    ruta = f'/{prefijo}/'
+
+    async def pagina_siguiente(app, datos: dict, total: int):
+        respuesta = await peticion(app, 'GET', ruta, {'limit': 50})
+        datos[f'cursor_{prefijo}'] = respuesta.json()['next_cursor']
+
+    async def etag_pagina(app, datos: dict, total: int):
+        respuesta = await peticion(app, 'GET', ruta, {'limit': 50})
+        datos[f'etag_{prefijo}'] = respuesta.cabeceras['etag']
+
+    escenarios = [
+        Escenario(f'{prefijo}_listado', 'GET', ruta, lambda i, a, d: _leer(ruta, {'limit': 50})),
+        Escenario(
+            f'{prefijo}_listado_cursor', 'GET', ruta,
+            lambda i, a, d: _leer(ruta, {'limit': 50, 'cursor': d[f'cursor_{prefijo}']}),
+            preparar=pagina_siguiente,
+        ),
+        Escenario(f'{prefijo}_listado_titulo', 'GET', ruta, lambda i, a, d: _leer(ruta, {'limit': 50, 'sort': 'titulo'})),
+        Escenario(f'{prefijo}_listado_campos', 'GET', ruta, lambda i, a, d: _leer(ruta, {'limit': 50, 'fields': 'id,titulo,autor'})),
+        Escenario(f'{prefijo}_ndjson', 'GET', ruta, lambda i, a, d: _leer(ruta, cabeceras=NDJSON), factor=0.01),
+        Escenario(
+            f'{prefijo}_listado_condicional', 'GET', ruta,
+            lambda i, a, d: _leer(ruta, {'limit': 50}, {'if-none-match': d[f'etag_{prefijo}']}),
+            esperados=(304,), preparar=etag_pagina,
+        ),
+    ]
+    if COMPRESION:
+        escenarios += [
+            Escenario(f'{prefijo}_listado_gzip', 'GET', ruta, lambda i, a, d: _leer(ruta, {'limit': 50}, GZIP)),
+            Escenario(f'{prefijo}_ndjson_gzip', 'GET', ruta, lambda i, a, d: _leer(ruta, cabeceras={**NDJSON, **GZIP}), factor=0.01),
+        ]
+    return escenarios
+
+def _escrituras(prefijo: str, tipo: str) -> list[Escenario]:
+    async def crear_para_borrar(app, datos: dict, total: int):
+        aleatorio = random.Random(f'{datos["semilla"]}:{prefijo}_eliminar')
+        ids = []
+        for desde in range(0, total, 1000):
+            lote = [generar(tipo, 0, aleatorio) for _ in range(desde, min(desde + 1000, total))]
+            if tipo == 'libro':
+                for numero, elemento in enumerate(lote, desde):
+                    elemento.isbn = _isbn(datos, f'eliminar-{numero}')
+            ids += [resultado['id'] for resultado in await CREADORES[tipo](lote)]
+        datos[f'eliminar_{prefijo}'] = ids
+
+    def modificar(i: int, aleatorio: random.Random, datos: dict) -> dict:
+        return {'ruta': f'/{prefijo}/actualizar/{aleatorio.choice(datos[tipo])}', 'cuerpo': _cuerpo(tipo, f'reemplazar-{i}', aleatorio, datos)}
+
+    ruta_eliminar = '/revistaseliminar/id/{id}' if prefijo == 'revistas' else f'/{prefijo}/eliminar/id/{{id}}'
+    return [
+        Escenario(
+            f'{prefijo}_crear', 'POST', f'/{prefijo}/',
+            lambda i, a, d: {'ruta': f'/{prefijo}/', 'cuerpo': _cuerpo(tipo, f'crear-{i}', a, d)}, escritura=True,
+        ),
+        Escenario(
+            f'{prefijo}_bulk', 'POST', f'/{prefijo}/bulk',
+            lambda i, a, d: {'ruta': f'/{prefijo}/bulk', 'cuerpo': [_cuerpo(tipo, f'bulk-{i}-{j}', a, d) for j in range(TAMANO_BULK)]},
+            factor=0.1, escritura=True,
+        ),
+        Escenario(f'{prefijo}_reemplazar', 'PUT', f'/{prefijo}/actualizar/{{id}}', modificar, escritura=True),
+        Escenario(
+            f'{prefijo}_modificar', 'PATCH', f'/{prefijo}/actualizar/{{id}}',
+            lambda i, a, d: {'ruta': f'/{prefijo}/actualizar/{a.choice(d[tipo])}', 'cuerpo': {'titulo': titulo(a)}},
+            escritura=True,
+        ),
+        Escenario(
+            f'{prefijo}_eliminar', 'DELETE', ruta_eliminar,
+            lambda i, a, d: {'ruta': ruta_eliminar.replace('{id}', d[f'eliminar_{prefijo}'][i])},
+            escritura=True, preparar=crear_para_borrar,
+        ),
+    ]
+
+def escenarios() -> list[Escenario]:
+    """
+    Todos los escenarios, primero los de lectura y después los de escritura.
+    """
+    lectura = [
+        Escenario('raiz', 'GET', '/', lambda i, a, d: _leer('/')),
+        *_listado('libros'),
+        Escenario(
+            'libros_titulo', 'GET', '/libros/buscar/titulo/{titulo}',
+            lambda i, a, d: _leer(f'/libros/buscar/titulo/{_palabra(a)}'), esperados=(200, 404),
+        ),
+        Escenario(
+            'libros_isbn', 'GET', '/libros/buscar/isbn/{isbn}',
+            lambda i, a, d: _leer(f'/libros/buscar/isbn/{a.choice(d["isbn"])}'),
+        ),
+        *_listado('dvds'),
+        Escenario(
+            'dvds_titulo', 'GET', '/dvds/buscar/titulo/{titulo}',
+            lambda i, a, d: _leer(f'/dvds/buscar/titulo/{_palabra(a)}'), esperados=(200, 404),
+        ),
+        Escenario(
+            'dvds_genero', 'GET', '/dvds/buscar/genero/{genero}',
+            lambda i, a, d: _leer(f'/dvds/buscar/genero/{a.choice(GENEROS_DVD)}'), esperados=(200, 404),
+        ),
+        *_listado('revistas'),
+        Escenario(
+            'revistas_id', 'GET', '/revistas/buscar/id/{id}',
+            lambda i, a, d: _leer(f'/revistas/buscar/id/{a.choice(d["revista"])}'),
+        ),
+        Escenario(
+            'revistas_titulo', 'GET', '/revistas/buscar/titulo/{titulo}',
+            lambda i, a, d: _leer(f'/revistas/buscar/titulo/{_palabra(a)}'), esperados=(200, 404),
+        ),
+        Escenario(
+            'revistas_categoria', 'GET', '/revistasbuscar/categoria/{categoria}',
+            lambda i, a, d: _leer(f'/revistasbuscar/categoria/{a.choice(CATEGORIAS)}'), esperados=(200, 404),
+        ),
+        *_listado('elementos'),
+        Escenario(
+            'elementos_listado_ano', 'GET', '/elementos/',
+            lambda i, a, d: _leer('/elementos/', {'limit': 50, 'sort': 'ano_publicacion'}),
+        ),
+        Escenario(
+            'elementos_buscar', 'GET', '/elementos/buscar/{titulo}',
+            lambda i, a, d: _leer(f'/elementos/buscar/{_palabra(a)}'), esperados=(200, 404),
+        ),
+        Escenario(
+            'elementos_buscar_detalle', 'GET', '/elementos/buscar',
+            lambda i, a, d: _leer('/elementos/buscar', {'titulo': _palabra(a), 'limit': 50}), esperados=(200, 404),
+        ),
+        Escenario(
+            'elementos_autocompletar', 'GET', '/elementos/autocompletar',
+            lambda i, a, d: _leer('/elementos/autocompletar', {'q': _palabra(a)[:a.randint(1, 4)]}),
+        ),
+        Escenario('elementos_estadisticas', 'GET', '/elementos/estadisticas', lambda i, a, d: _leer('/elementos/estadisticas')),
+        Escenario('cache_estadisticas', 'GET', '/cache/estadisticas', lambda i, a, d: _leer('/cache/estadisticas')),
+    ]
+    if METRICAS:
+        lectura.append(Escenario('metricas', 'GET', '/metrics', lambda i, a, d: _leer('/metrics')))
+    escritura = _escrituras('libros', 'libro') + _escrituras('dvds', 'dvd') + _escrituras('revistas', 'revista')
+    return lectura + escritura
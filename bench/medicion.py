@@ -0,0 +1,209 @@
+"""
+Ejecución y medición de los escenarios, y comparación con una ejecución de referencia.
+"""
+from pymongo import monitoring
+from bench.asgi import peticion
+from bench.escenarios import Escenario
+import asyncio
+import math
+import random
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+class ContadorComandos(monitoring.CommandListener):
+    """
+    Listener de pymongo que cuenta los comandos enviados a MongoDB, por nombre.
+
+    Se registra de forma global antes de crear el cliente; los eventos llegan desde los hilos de
+    Motor, por lo que el conteo se protege con un candado.
+    """
+
+    def __init__(self):
+        self.comandos: dict[str, int] = {}
+        self._candado = threading.Lock()
+
+    def started(self, event):
+        with self._candado:
+            self.comandos[event.command_name] = self.comandos.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def instantanea(self) -> dict[str, int]:
+        with self._candado:
+            return dict(self.comandos)
+
+def rss_pico_mb() -> float | None:
+    """
+    Memoria residente máxima del proceso hasta el momento, en MB (None si el sistema no la expone).
+    """
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux la expresa en KB y macOS en bytes
+    return round(maximo / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def percentil(ordenados: list[float], p: float) -> float:
+    """
+    Percentil `p` (0-100) de una lista ordenada, por el método del rango más cercano.
+    """
+    if not ordenados:
+        return 0.0
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+async def medir(
+    app,
+    escenario: Escenario,
+    datos: dict,
+    peticiones: int,
+    concurrencia: int,
+    calentamiento: int = 0,
+    contador: ContadorComandos | None = None,
+) -> dict:
+    """
+    Envía las peticiones de un escenario con `concurrencia` peticiones en vuelo y mide cada una.
+
+    Las primeras `calentamiento` peticiones no se miden: llenan cachés y abren conexiones.
+
+    Parámetros:
+    - app: Aplicación ASGI.
+    - escenario (Escenario): Escenario a ejecutar.
+    - datos (dict): Datos de la ejecución (muestras del catálogo, semilla, etc.).
+    - peticiones (int): Peticiones medidas.
+    - concurrencia (int): Peticiones simultáneas.
+    - calentamiento (int): Peticiones previas sin medir.
+    - contador (ContadorComandos | None): Contador de comandos de MongoDB, si el backend es MongoDB.
+
+    Retorna:
+    - dict: Peticiones, errores, estados inesperados, rendimiento, latencias (ms), comandos de
+      MongoDB y memoria residente máxima.
+    """
+    total = calentamiento + peticiones
+    if escenario.preparar is not None:
+        await escenario.preparar(app, datos, total)
+    aleatorio = random.Random(f'{datos["semilla"]}:{escenario.nombre}')
+    argumentos = [escenario.construir(i, aleatorio, datos) for i in range(total)]
+    latencias: list[float] = []
+    inesperados: dict[int, int] = {}
+
+    async def enviar(lista: list[dict], medir_latencia: bool):
+        pendientes = iter(lista)
+
+        async def trabajador():
+            for argumentos_peticion in pendientes:
+                inicio = time.perf_counter()
+                respuesta = await peticion(app, escenario.metodo, **argumentos_peticion)
+                if medir_latencia:
+                    latencias.append(time.perf_counter() - inicio)
+                    if respuesta.estado not in escenario.esperados:
+                        inesperados[respuesta.estado] = inesperados.get(respuesta.estado, 0) + 1
+
+        await asyncio.gather(*(trabajador() for _ in range(min(concurrencia, len(lista)) or 1)))
+
+    await enviar(argumentos[:calentamiento], False)
+    comandos_previos = contador.instantanea() if contador is not None else None
+    inicio = time.perf_counter()
+    await enviar(argumentos[calentamiento:], True)
+    segundos = time.perf_counter() - inicio
+
+    ordenadas = sorted(latencias)
+    resultado = {
+        'metodo': escenario.metodo,
+        'ruta': escenario.ruta,
+        'peticiones': len(latencias),
+        'errores': sum(inesperados.values()),
+        'estados_inesperados': {str(estado): cantidad for estado, cantidad in sorted(inesperados.items())},
+        'segundos': round(segundos, 4),
+        'rps': round(len(latencias) / segundos, 2) if segundos > 0 else None,
+        'latencia_ms': {
+            'p50': round(percentil(ordenadas, 50) * 1000, 3),
+            'p95': round(percentil(ordenadas, 95) * 1000, 3),
+            'p99': round(percentil(ordenadas, 99) * 1000, 3),
+            'media': round(sum(ordenadas) / len(ordenadas) * 1000, 3) if ordenadas else 0.0,
+            'max': round(ordenadas[-1] * 1000, 3) if ordenadas else 0.0,
+        },
+        'comandos_mongo': None,
+        'rss_pico_mb': rss_pico_mb(),
+    }
+    if contador is not None:
+        actuales = contador.instantanea()
+        por_comando = {
+            nombre: actuales[nombre] - comandos_previos.get(nombre, 0)
+            for nombre in sorted(actuales) if actuales[nombre] != comandos_previos.get(nombre, 0)
+        }
+        total_comandos = sum(por_comando.values())
+        resultado['comandos_mongo'] = {
+            'total': total_comandos,
+            'por_peticion': round(total_comandos / len(latencias), 3) if latencias else None,
+            'por_comando': por_comando,
+        }
+    return resultado
+
+def comparar(actual: dict, referencia: dict, tolerancia: float) -> list[dict]:
+    """
+    Compara los escenarios comunes de dos ejecuciones.
+
+    Un escenario empeora si su rendimiento baja, o su p95 sube, más que `tolerancia` (fracción,
+    por ejemplo 0.15 para un 15 %), o si tiene más comandos de MongoDB por petición.
+
+    Parámetros:
+    - actual (dict): Resultado de esta ejecución.
+    - referencia (dict): Resultado de la ejecución de referencia (el mismo formato).
+    - tolerancia (float): Variación relativa que se considera ruido.
+
+    Retorna:
+    - list[dict]: Para cada escenario común, los valores de ambas ejecuciones, su variación y si empeoró.
+    """
+    filas = []
+    for nombre, medido in actual['escenarios'].items():
+        base = referencia.get('escenarios', {}).get(nombre)
+        if base is None:
+            continue
+        rps, rps_base = medido.get('rps') or 0, base.get('rps') or 0
+        p95, p95_base = medido['latencia_ms']['p95'], base['latencia_ms']['p95']
+        comandos = (medido.get('comandos_mongo') or {}).get('por_peticion')
+        comandos_base = (base.get('comandos_mongo') or {}).get('por_peticion')
+        variacion_rps = (rps - rps_base) / rps_base if rps_base else 0.0
+        variacion_p95 = (p95 - p95_base) / p95_base if p95_base else 0.0
+        motivos = []
+        if variacion_rps < -tolerancia:
+            motivos.append('rps')
+        if variacion_p95 > tolerancia:
+            motivos.append('p95')
+        if comandos is not None and comandos_base is not None and comandos > comandos_base:
+            motivos.append('comandos')
+        filas.append({
+            'escenario': nombre,
+            'rps': rps,
+            'rps_referencia': rps_base,
+            'variacion_rps': round(variacion_rps, 4),
+            'p95_ms': p95,
+            'p95_referencia_ms': p95_base,
+            'variacion_p95': round(variacion_p95, 4),
+            'comandos_por_peticion': comandos,
+            'comandos_por_peticion_referencia': comandos_base,
+            'empeora': motivos,
+        })
+    return filas
+
+def imprimir_comparacion(filas: list[dict], salida=sys.stderr):
+    """
+    Escribe la comparación como tabla de texto.
+    """
+    print(f'{"escenario":<32} {"rps":>10} {"ref":>10} {"Δ rps":>8} {"p95 ms":>10} {"ref":>10} {"Δ p95":>8}', file=salida)
+    for fila in filas:
+        marca = '  ✗ ' + ','.join(fila['empeora']) if fila['empeora'] else ''
+        print(
+            f'{fila["escenario"]:<32} {fila["rps"]:>10.1f} {fila["rps_referencia"]:>10.1f} {fila["variacion_rps"]:>+8.1%} '
+            f'{fila["p95_ms"]:>10.2f} {fila["p95_referencia_ms"]:>10.2f} {fila["variacion_p95"]:>+8.1%}{marca}',
+            file=salida,
+        )
@@ -0,0 +1,160 @@
+"""
+Coste por elemento de la serialización de los listados, con el camino anterior y el actual.
+
+No usa la base de datos: genera en memoria los documentos que devolvería MongoDB y mide solo el
+trabajo de CPU de convertirlos en el cuerpo de la respuesta.
+
+- `anterior`: el documento (con su elemento unido por `$lookup`) se convierte en un modelo de
+  ODMantic, luego en el esquema de salida con `from_model`, y FastAPI vuelve a validar la página
+  contra el `response_model` antes de codificarla con `json.dumps`. En NDJSON, cada línea se
+  obtenía con `from_model(...).model_dump_json()`.
+- `actual`: la agregación ya devuelve el documento con la forma del esquema de salida, y
+  `respuesta_pagina` / `respuesta_ndjson` lo validan una vez y lo escriben como bytes JSON con
+  el serializador compilado.
+
+Uso:
+
+    python -m bench.serializacion --elementos 10000
+"""
+from bench.catalogo import generar
+from crud.agregacion import documento_salida
+from crud.dvd import construir_dvd
+from crud.libro import construir_libro
+from crud.revista import construir_revista
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from models.elemento import ElementoBiblioteca
+from routers import dvd as router_dvd, elemento as router_elemento, libro as router_libro, revista as router_revista
+from routers.ndjson import respuesta_ndjson
+from routers.proyeccion import respuesta_pagina
+from schemas.dvd import DVDOut
+from schemas.elemento import ElementoOut
+from schemas.libro import LibroOut
+from schemas.paginacion import Pagina
+from schemas.revista import RevistaOut
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+# tipo: (esquema de salida, router del listado, función que construye el subtipo)
+TIPOS = {
+    'Libro': (LibroOut, router_libro, construir_libro),
+    'DVD': (DVDOut, router_dvd, construir_dvd),
+    'Revista': (RevistaOut, router_revista, construir_revista),
+    'Elemento': (ElementoOut, router_elemento, None),
+}
+GENERADOS = {'Libro': 'libro', 'DVD': 'dvd', 'Revista': 'revista', 'Elemento': 'libro'}
+
+def documentos(tipo: str, cantidad: int, aleatorio: random.Random) -> tuple[type, list[dict], list[dict]]:
+    """
+    Documentos de prueba de un tipo, en las dos formas que devuelve la base de datos.
+
+    Retorna:
+    - tuple: Modelo de ODMantic, documentos crudos del subtipo con su elemento unido (o del
+      elemento, para `Elemento`) y los mismos documentos con la forma del esquema de salida.
+    """
+    crudos, salida = [], []
+    for numero in range(cantidad):
+        datos = generar(GENERADOS[tipo], numero, aleatorio)
+        if tipo == 'Elemento':
+            elemento = construir_libro(datos).elemento.model_dump_doc()
+            crudos.append(elemento)
+            salida.append({'id': str(elemento['_id']), **{campo: elemento[campo] for campo in ElementoOut.model_fields if campo != 'id'}})
+            continue
+        subtipo = TIPOS[tipo][2](datos)
+        elemento = subtipo.elemento.model_dump_doc()
+        crudo = {**subtipo.model_dump_doc(), 'elemento': elemento}
+        crudos.append(crudo)
+        salida.append(documento_salida(tipo, crudo, elemento))
+    modelo = ElementoBiblioteca if tipo == 'Elemento' else type(subtipo)
+    return modelo, crudos, salida
+
+def campo_respuesta(router):
+    """
+    Campo de respuesta (`response_model`) del listado `GET /` de un router.
+    """
+    for ruta in router.router.routes:
+        if ruta.path.endswith('/') and 'GET' in ruta.methods:
+            return ruta.response_field
+    raise LookupError(f'{router.__name__} no tiene listado')
+
+def cronometrar(funcion, repeticiones: int) -> float:
+    """
+    Mejor tiempo, en segundos, de varias ejecuciones de una función.
+    """
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+async def _consumir(respuesta) -> bytes:
+    return b''.join([fragmento async for fragmento in respuesta.body_iterator])
+
+async def _iterar(lista: list):
+    for documento in lista:
+        yield documento
+
+def medir(tipo: str, cantidad: int, repeticiones: int, aleatorio: random.Random) -> dict:
+    """
+    Microsegundos por elemento de cada camino, para una página y para NDJSON.
+    """
+    esquema, router, _ = TIPOS[tipo]
+    modelo, crudos, salida = documentos(tipo, cantidad, aleatorio)
+    campo = campo_respuesta(router)
+
+    def pagina_anterior():
+        contenido = Pagina(items=[esquema.from_model(modelo.model_validate_doc(crudo)) for crudo in crudos], next_cursor=None)
+        valor = asyncio.run(serialize_response(field=campo, response_content=contenido))
+        return JSONResponse(valor).body
+
+    def pagina_actual():
+        return respuesta_pagina(esquema, None, salida, None).body
+
+    def ndjson_anterior():
+        return ''.join(esquema.from_model(modelo.model_validate_doc(crudo)).model_dump_json() + '\n' for crudo in crudos).encode()
+
+    def ndjson_actual():
+        return asyncio.run(_consumir(respuesta_ndjson(_iterar(salida), esquema)))
+
+    # Ambos caminos deben producir el mismo contenido
+    assert json.loads(pagina_anterior()) == json.loads(pagina_actual())
+    assert [json.loads(linea) for linea in ndjson_anterior().splitlines()] == [json.loads(linea) for linea in ndjson_actual().splitlines()]
+
+    resultado = {}
+    for nombre, anterior, actual in (('pagina', pagina_anterior, pagina_actual), ('ndjson', ndjson_anterior, ndjson_actual)):
+        us_anterior = cronometrar(anterior, repeticiones) / cantidad * 1e6
+        us_actual = cronometrar(actual, repeticiones) / cantidad * 1e6
+        resultado[nombre] = {
+            'anterior_us': round(us_anterior, 2),
+            'actual_us': round(us_actual, 2),
+            'aceleracion': round(us_anterior / us_actual, 1),
+        }
+    return resultado
+
+def main(argumentos: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Mide el coste por elemento de la serialización de los listados.')
+    parser.add_argument('--elementos', type=int, default=10000, help='documentos por medición (por defecto 10000)')
+    parser.add_argument('--repeticiones', type=int, default=5, help='ejecuciones de cada camino; se toma la mejor (por defecto 5)')
+    parser.add_argument('--semilla', type=int, default=1, help='semilla de los documentos (por defecto 1)')
+    opciones = parser.parse_args(argumentos)
+
+    aleatorio = random.Random(opciones.semilla)
+    resultado = {'elementos': opciones.elementos, 'tipos': {}}
+    for tipo in TIPOS:
+        medido = resultado['tipos'][tipo] = medir(tipo, opciones.elementos, opciones.repeticiones, aleatorio)
+        for nombre, valores in medido.items():
+            print(
+                f'{tipo:<9} {nombre:<7} anterior {valores["anterior_us"]:>7.2f} µs  '
+                f'actual {valores["actual_us"]:>6.2f} µs  x{valores["aceleracion"]}',
+                file=sys.stderr,
+            )
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
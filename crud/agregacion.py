@@ -0,0 +1,172 @@
+from models.libro import Libro
+from models.dvd import DVD
+from models.revista import Revista
+
+CAMPOS_ELEMENTO = ('titulo', 'autor', 'ano_publicacion')
+
+# Campos del elemento que el modo de almacenamiento embebido copia en cada subtipo
+CAMPOS_EMBEBIDOS = CAMPOS_ELEMENTO + ('tipo',)
+
+SUBTIPOS = {
+    'Libro': (Libro, ('isbn', 'numero_paginas', 'genero', 'editorial')),
+    'DVD': (DVD, ('duracion', 'genero')),
+    'Revista': (Revista, ('numero_edicion', 'categoria')),
+}
+
+def campos_salida(tipo: str | None = None) -> tuple[str, ...]:
+    """
+    Campos del esquema de salida de un tipo, en el orden en que los declara.
+
+    Parámetros:
+    - tipo (str | None): Tipo de elemento ('Libro', 'DVD' o 'Revista'), o None para `ElementoOut`.
+
+    Retorna:
+    - tuple[str, ...]: Nombres de los campos.
+    """
+    if tipo is None:
+        return ('id',) + CAMPOS_EMBEBIDOS
+    return ('id',) + CAMPOS_ELEMENTO + SUBTIPOS[tipo][1]
+
+def etapas_detalle(
+    tipo: str,
+    campos: tuple[str, ...] | None = None,
+    extra: dict | None = None,
+    conservar_huerfanos: bool = False,
+) -> list[dict]:
+    """
+    Etapas de agregación que, partiendo de documentos de `ElementoBiblioteca`, unen el documento
+    del subtipo correspondiente y proyectan el resultado con la forma de su esquema de salida
+    (`LibroOut`, `DVDOut` o `RevistaOut`).
+
+    La unión usa el índice `elemento` del subtipo y solo trae de él los campos pedidos.
+
+    Parámetros:
+    - tipo (str): Tipo de elemento ('Libro', 'DVD' o 'Revista').
+    - campos (tuple[str, ...] | None): Campos del esquema de salida a devolver; todos si es None.
+    - extra (dict | None): Expresiones adicionales que se añaden a la proyección final.
+    - conservar_huerfanos (bool): Si es False, se descartan los elementos sin subtipo asociado.
+
+    Retorna:
+    - list[dict]: Etapas `$lookup`, `$unwind` y `$project`.
+    """
+    modelo, campos_subtipo = SUBTIPOS[tipo]
+    campos = campos_salida(tipo) if campos is None else campos
+    pedidos_subtipo = [campo for campo in campos_subtipo if campo in campos]
+    proyeccion = {'_id': 0}
+    if 'id' in campos:
+        proyeccion['id'] = {'$toString': '$detalle._id'}
+    proyeccion.update({campo: f'${campo}' for campo in CAMPOS_ELEMENTO if campo in campos})
+    proyeccion.update({campo: f'$detalle.{campo}' for campo in pedidos_subtipo})
+    proyeccion.update(extra or {})
+    return [
+        {'$lookup': {
+            'from': modelo.__collection__,
+            'localField': '_id',
+            'foreignField': 'elemento',
+            'pipeline': [{'$project': {'_id': 1, **{campo: 1 for campo in pedidos_subtipo}}}],
+            'as': 'detalle',
+        }},
+        {'$unwind': {'path': '$detalle', 'preserveNullAndEmptyArrays': conservar_huerfanos}},
+        {'$project': proyeccion},
+    ]
+
+def etapas_detalle_tipos(extra: dict | None = None) -> list[dict]:
+    """
+    Etapas de agregación que, partiendo de documentos de `ElementoBiblioteca` de cualquier tipo,
+    unen a cada uno el documento de su subtipo y lo proyectan con la forma de su esquema de salida
+    (`LibroOut`, `DVDOut` o `RevistaOut`) más el campo `tipo`.
+
+    Se hace un `$lookup` por subtipo, cada uno por el índice `elemento` de su colección, y se
+    conserva el que corresponde al `tipo` del elemento. Los elementos sin subtipo se conservan sin
+    `id` ni campos propios, para que quien pagina pueda descartarlos después de calcular el cursor.
+
+    Parámetros:
+    - extra (dict | None): Expresiones adicionales que se añaden a la proyección final.
+
+    Retorna:
+    - list[dict]: Etapas `$lookup`, `$addFields`, `$unwind` y `$project`.
+    """
+    etapas = []
+    ramas = []
+    for tipo, (modelo, campos_subtipo) in SUBTIPOS.items():
+        etapas.append({'$lookup': {
+            'from': modelo.__collection__,
+            'localField': '_id',
+            'foreignField': 'elemento',
+            'pipeline': [{'$project': {'_id': 1, **{campo: 1 for campo in campos_subtipo}}}],
+            'as': f'_{tipo}',
+        }})
+        ramas.append({'case': {'$eq': ['$tipo', tipo]}, 'then': f'$_{tipo}'})
+    proyeccion = {'_id': 0, 'id': {'$toString': '$detalle._id'}, 'tipo': '$tipo'}
+    proyeccion.update({campo: f'${campo}' for campo in CAMPOS_ELEMENTO})
+    for _, campos_subtipo in SUBTIPOS.values():
+        # Los campos que el subtipo no tiene (por ejemplo `isbn` en un DVD) no aparecen en el resultado
+        proyeccion.update({campo: f'$detalle.{campo}' for campo in campos_subtipo})
+    proyeccion.update(extra or {})
+    return etapas + [
+        {'$addFields': {'detalle': {'$switch': {'branches': ramas, 'default': []}}}},
+        {'$unwind': {'path': '$detalle', 'preserveNullAndEmptyArrays': True}},
+        {'$project': proyeccion},
+    ]
+
+def etapas_embebido(tipo: str, campos: tuple[str, ...] | None = None) -> list[dict]:
+    """
+    Etapa de agregación que proyecta documentos de un subtipo guardados en modo embebido con la
+    forma de su esquema de salida, sin unirlos con su elemento. Los documentos que aún no tienen
+    los campos compartidos llevan además `_sin_migrar` con el ID de su elemento.
+
+    Parámetros:
+    - tipo (str): Tipo de elemento ('Libro', 'DVD' o 'Revista').
+    - campos (tuple[str, ...] | None): Campos del esquema de salida a devolver; todos si es None.
+
+    Retorna:
+    - list[dict]: Etapa `$project`.
+    """
+    _, campos_subtipo = SUBTIPOS[tipo]
+    campos = campos_salida(tipo) if campos is None else campos
+    proyeccion = {'_id': 0}
+    if 'id' in campos:
+        proyeccion['id'] = {'$toString': '$_id'}
+    proyeccion.update({campo: f'${campo}' for campo in CAMPOS_ELEMENTO + campos_subtipo if campo in campos})
+    if any(campo in campos for campo in CAMPOS_ELEMENTO):
+        # En los documentos aún sin convertir (sin `tipo`), el ID de su elemento para leer de él
+        # los campos compartidos
+        proyeccion['_sin_migrar'] = {'$cond': [{'$ifNull': ['$tipo', False]}, '$$REMOVE', '$elemento']}
+    return [{'$project': proyeccion}]
+
+def etapas_elemento(campos: tuple[str, ...] | None = None, extra: dict | None = None) -> list[dict]:
+    """
+    Etapa de agregación que proyecta documentos de `ElementoBiblioteca` con la forma de `ElementoOut`.
+
+    Parámetros:
+    - campos (tuple[str, ...] | None): Campos de `ElementoOut` a devolver; todos si es None.
+    - extra (dict | None): Expresiones adicionales que se añaden a la proyección.
+
+    Retorna:
+    - list[dict]: Etapa `$project`.
+    """
+    campos = campos_salida() if campos is None else campos
+    proyeccion = {'_id': 0}
+    if 'id' in campos:
+        proyeccion['id'] = {'$toString': '$_id'}
+    proyeccion.update({campo: f'${campo}' for campo in CAMPOS_EMBEBIDOS if campo in campos})
+    proyeccion.update(extra or {})
+    return [{'$project': proyeccion}]
+
+def documento_salida(tipo: str, subtipo: dict, elemento: dict) -> dict:
+    """
+    Combina los documentos crudos de un subtipo y de su elemento en la forma de su esquema de salida.
+
+    Parámetros:
+    - tipo (str): Tipo de elemento ('Libro', 'DVD' o 'Revista').
+    - subtipo (dict): Documento de la colección del subtipo.
+    - elemento (dict): Documento de `ElementoBiblioteca` asociado.
+
+    Retorna:
+    - dict: Documento con la forma de `LibroOut`, `DVDOut` o `RevistaOut`.
+    """
+    _, campos_subtipo = SUBTIPOS[tipo]
+    documento = {'id': str(subtipo['_id'])}
+    documento.update({campo: elemento[campo] for campo in CAMPOS_ELEMENTO})
+    documento.update({campo: subtipo[campo] for campo in campos_subtipo})
+    return documento
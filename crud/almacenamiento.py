@@ -0,0 +1,128 @@
+"""
+Lectura y escritura de los subtipos (Libro, DVD y Revista) según el modo de almacenamiento.
+
+En el modo 'referencia' el documento del subtipo solo contiene el ID de su `ElementoBiblioteca`
+y las lecturas lo resuelven con ODMantic (`$lookup`). En el modo 'embebido' el subtipo guarda
+además una copia de los campos compartidos, por lo que se lee con una sola consulta a su propia
+colección, igual que los listados de un tipo ordenados por id. La colección de elementos se
+mantiene en ambos modos: sobre ella se resuelven los listados ordenados por título o año, la
+búsqueda por título y las rutas de `/elementos`. Por eso el modo embebido
+solo ahorra lecturas: cada alta y cada modificación de los campos compartidos sigue escribiendo
+el `ElementoBiblioteca`, y además su copia en el subtipo.
+
+Los documentos que aún no se han convertido con `migrar_almacenamiento` (sin los campos
+compartidos) se leen en modo embebido tomando esos campos de su elemento, como en el modo
+'referencia', en lugar de fallar.
+
+El modo se configura con `ALMACENAMIENTO` en `database.py`.
+"""
+from odmantic import AIOEngine, Model
+from database import ALMACENAMIENTO
+from models.elemento import ElementoBiblioteca
+from crud.agregacion import CAMPOS_EMBEBIDOS
+
+EMBEBIDO = ALMACENAMIENTO == 'embebido'
+
+def documento_subtipo(subtipo: Model) -> dict:
+    """
+    Convierte un subtipo en el documento que se guarda en su colección.
+
+    Parámetros:
+    - subtipo (Model): Libro, DVD o Revista con su `elemento` asignado.
+
+    Retorna:
+    - dict: Documento de MongoDB; en modo embebido incluye los campos compartidos del elemento.
+    """
+    documento = subtipo.model_dump_doc()
+    if EMBEBIDO:
+        documento.update({campo: getattr(subtipo.elemento, campo) for campo in CAMPOS_EMBEBIDOS})
+    return documento
+
+def embebido(documento: dict) -> bool:
+    """
+    Indica si un documento de un subtipo ya tiene copiados todos los campos compartidos.
+    """
+    return all(campo in documento for campo in CAMPOS_EMBEBIDOS)
+
+async def completar_embebidos(documentos: list[dict], engine: AIOEngine, sesion=None) -> list[dict]:
+    """
+    Copia los campos compartidos de su elemento en los documentos de subtipo que aún no los
+    tienen, con una sola consulta; si todos los tienen, no consulta nada.
+
+    Parámetros:
+    - documentos (list[dict]): Documentos crudos del subtipo (se modifican).
+    - engine (AIOEngine): Motor de base de datos.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - list[dict]: Los documentos completos; los que no tienen elemento se descartan, como en el
+      modo 'referencia'.
+    """
+    pendientes = [documento['elemento'] for documento in documentos if not embebido(documento)]
+    if not pendientes:
+        return documentos
+    proyeccion = {campo: 1 for campo in CAMPOS_EMBEBIDOS}
+    cursor = engine.get_collection(ElementoBiblioteca).find({'_id': {'$in': pendientes}}, proyeccion, session=sesion)
+    elementos = {elemento['_id']: elemento async for elemento in cursor}
+    completos = []
+    for documento in documentos:
+        if not embebido(documento):
+            elemento = elementos.get(documento['elemento'])
+            if elemento is None:
+                continue
+            documento.update({campo: elemento[campo] for campo in CAMPOS_EMBEBIDOS})
+        completos.append(documento)
+    return completos
+
+def modelo_desde_documento(modelo: type[Model], documento: dict) -> Model:
+    """
+    Construye un subtipo a partir de un documento embebido, sin consultar su elemento.
+
+    Parámetros:
+    - modelo (type[Model]): Modelo del subtipo.
+    - documento (dict): Documento crudo con los campos compartidos incluidos (ver
+      `completar_embebidos`).
+
+    Retorna:
+    - Model: Instancia del modelo con su `elemento` reconstruido.
+    """
+    elemento = {'_id': documento['elemento']}
+    elemento.update({campo: documento.pop(campo) for campo in CAMPOS_EMBEBIDOS})
+    return modelo.model_validate_doc({**documento, 'elemento': elemento})
+
+async def buscar_subtipo(modelo: type[Model], filtro: dict, engine: AIOEngine):
+    """
+    Busca un único documento de un subtipo con su elemento resuelto.
+
+    Parámetros:
+    - modelo (type[Model]): Modelo del subtipo.
+    - filtro (dict): Filtro de MongoDB sobre la colección del subtipo.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - Model | None: Documento encontrado o None.
+    """
+    if not EMBEBIDO:
+        return await engine.find_one(modelo, filtro)
+    documento = await engine.get_collection(modelo).find_one(filtro)
+    if documento is None:
+        return None
+    documentos = await completar_embebidos([documento], engine)
+    return modelo_desde_documento(modelo, documentos[0]) if documentos else None
+
+async def buscar_subtipos(modelo: type[Model], filtro: dict, engine: AIOEngine) -> list:
+    """
+    Busca todos los documentos de un subtipo que cumplen un filtro, con su elemento resuelto.
+
+    Parámetros:
+    - modelo (type[Model]): Modelo del subtipo.
+    - filtro (dict): Filtro de MongoDB sobre la colección del subtipo.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - list[Model]: Documentos encontrados.
+    """
+    if not EMBEBIDO:
+        return await engine.find(modelo, filtro)
+    documentos = await engine.get_collection(modelo).find(filtro).to_list(length=None)
+    return [modelo_desde_documento(modelo, documento) for documento in await completar_embebidos(documentos, engine)]
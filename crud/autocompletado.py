@@ -0,0 +1,392 @@
+"""
+Índice de prefijos en memoria para autocompletar títulos y autores.
+
+Cada elemento se indexa por el comienzo de cada palabra de su título y de su autor, normalizados
+con `normalizar` (sin acentos ni mayúsculas): "El Túnel" genera las claves "el tunel" y "tunel".
+Las claves se guardan ordenadas como pares `(clave, id)`, de modo que las que empiezan por un
+prefijo son consecutivas: se localiza la primera con búsqueda binaria (`bisect`) y se recorren
+solo hasta reunir los resultados pedidos. Para que insertar y borrar no desplacen la lista
+entera, esta se reparte en tramos ordenados de unos miles de claves (`ListaOrdenada`).
+
+El índice se construye al arrancar la API (`construir`) y las rutas de escritura de
+`crud/escritura.py` y `crud/lotes.py` lo actualizan al crear, modificar o eliminar elementos.
+Las escrituras de otros procesos llegan por el change stream de `services/invalidacion.py`, que
+entrega los campos indexados de cada elemento insertado, modificado o eliminado, y se aplican de
+una en una (`aplicar_cambio`). Sin change streams (servidor standalone, `BACKEND=memoria` o
+`INVALIDACION_CAMBIOS=0`), cada `AUTOCOMPLETADO_RECARGA` segundos como mucho se compara el
+contador de cambios de los elementos del primario (`crud/versiones.py`) con las escrituras propias
+y, si hubo otras, el índice se reconstruye en segundo plano.
+
+La construcción no bloquea el bucle de eventos: cada lote de documentos leído se ordena por
+separado y los lotes se fusionan tramo a tramo, cediendo el control entre tramos. Los cambios
+que llegan mientras tanto se aplican al índice anterior y, al terminar, también al nuevo.
+"""
+from odmantic import AIOEngine
+from models.elemento import ElementoBiblioteca
+from crud.busqueda import normalizar
+from crud.versiones import leer_cambios
+from schemas.paginacion import LIMITE_AUTOCOMPLETADO
+import asyncio
+import bisect
+import heapq
+import itertools
+import logging
+import os
+import time
+
+AUTOCOMPLETADO_RECARGA = float(os.getenv('AUTOCOMPLETADO_RECARGA', '30'))  # segundos; 0 no revisa
+
+CAMPOS_INDICE = ('titulo', 'autor', 'ano_publicacion', 'tipo')
+TAMANO_TRAMO = 1000
+TAMANO_LOTE_CONSTRUCCION = 5000
+
+registro = logging.getLogger('biblioteca.autocompletado')
+
+def claves_elemento(elemento: dict) -> set[str]:
+    """
+    Claves del índice de un elemento: cada sufijo de su título y de su autor que empieza en una palabra.
+
+    Parámetros:
+    - elemento (dict): Elemento con `titulo` y `autor`.
+
+    Retorna:
+    - set[str]: Claves normalizadas, sin repetir.
+    """
+    claves = set()
+    for campo in ('titulo', 'autor'):
+        palabras = normalizar(elemento[campo]).split(' ')
+        claves.update(' '.join(palabras[i:]) for i in range(len(palabras)) if palabras[i])
+    return claves
+
+class ListaOrdenada:
+    """
+    Lista ordenada repartida en tramos ordenados de entre 1 y `2 * TAMANO_TRAMO` valores.
+
+    Insertar o borrar solo desplaza los valores de un tramo, y el tramo que corresponde a un
+    valor se encuentra con búsqueda binaria sobre el último valor de cada uno.
+
+    Parámetros:
+    - valores (Iterable): Valores iniciales, en cualquier orden.
+    """
+
+    def __init__(self, valores=()):
+        valores = sorted(valores)
+        self._tramos = [valores[i:i + TAMANO_TRAMO] for i in range(0, len(valores), TAMANO_TRAMO)]
+        self._maximos = [tramo[-1] for tramo in self._tramos]
+        self._total = len(valores)
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __iter__(self):
+        for tramo in self._tramos:
+            yield from tramo
+
+    def agregar(self, valor):
+        """
+        Inserta un valor en su posición.
+        """
+        self._total += 1
+        if not self._tramos:
+            self._tramos, self._maximos = [[valor]], [valor]
+            return
+        indice = min(bisect.bisect_left(self._maximos, valor), len(self._tramos) - 1)
+        tramo = self._tramos[indice]
+        bisect.insort(tramo, valor)
+        self._maximos[indice] = tramo[-1]
+        if len(tramo) > 2 * TAMANO_TRAMO:
+            self._tramos[indice:indice + 1] = [tramo[:TAMANO_TRAMO], tramo[TAMANO_TRAMO:]]
+            self._maximos[indice:indice + 1] = [tramo[TAMANO_TRAMO - 1], tramo[-1]]
+
+    def quitar(self, valor) -> bool:
+        """
+        Elimina un valor, si está.
+
+        Retorna:
+        - bool: True si el valor estaba en la lista.
+        """
+        indice = bisect.bisect_left(self._maximos, valor)
+        if indice == len(self._tramos):
+            return False
+        tramo = self._tramos[indice]
+        posicion = bisect.bisect_left(tramo, valor)
+        if tramo[posicion] != valor:
+            return False
+        del tramo[posicion]
+        self._total -= 1
+        if tramo:
+            self._maximos[indice] = tramo[-1]
+        else:
+            del self._tramos[indice], self._maximos[indice]
+        return True
+
+    def anexar(self, valores: list):
+        """
+        Añade al final un tramo de valores ordenados, todos mayores que los que ya hay.
+        """
+        if valores:
+            self._tramos.append(valores)
+            self._maximos.append(valores[-1])
+            self._total += len(valores)
+
+    def desde(self, valor):
+        """
+        Recorre en orden los valores mayores o iguales que `valor`.
+        """
+        indice = bisect.bisect_left(self._maximos, valor)
+        if indice == len(self._tramos):
+            return
+        tramo = self._tramos[indice]
+        for posicion in range(bisect.bisect_left(tramo, valor), len(tramo)):
+            yield tramo[posicion]
+        for siguiente in range(indice + 1, len(self._tramos)):
+            yield from self._tramos[siguiente]
+
+class IndicePrefijos:
+    """
+    Índice en memoria de los elementos por prefijos de su título y su autor.
+
+    Parámetros:
+    - recarga (float): Segundos mínimos entre dos revisiones del contador de cambios, cuando no
+      hay change stream.
+    """
+
+    def __init__(self, recarga: float = AUTOCOMPLETADO_RECARGA):
+        self.recarga = recarga
+        self.construcciones = 0
+        self.cambios_aplicados = 0
+        self.errores = 0
+        self._claves = ListaOrdenada()
+        self._elementos: dict[str, dict] = {}
+        self._cambios = 0
+        self._escrituras = 0
+        self._revisado = time.monotonic()
+        self._tarea: asyncio.Task | None = None
+        self._engine: AIOEngine | None = None
+        # Cambios recibidos durante una construcción, para aplicarlos también al índice nuevo
+        self._aplazados: list | None = None
+        # El change stream entrega los cambios de los demás procesos
+        self._en_vivo = False
+        # Qué hacer al abrirse el change stream: 'revisar' el contador o 'construir' de nuevo
+        self._al_conectar = 'revisar'
+
+    async def construir(self, engine: AIOEngine):
+        """
+        Construye el índice con todos los elementos de la base de datos y sustituye el actual.
+
+        Parámetros:
+        - engine (AIOEngine): Motor del primario.
+        """
+        self._engine = engine
+        self._aplazados = []
+        escrituras = self._escrituras
+        try:
+            # El contador se lee antes que los datos: una escritura concurrente provoca otra reconstrucción
+            cambios = await leer_cambios(engine, ElementoBiblioteca)
+            proyeccion = {campo: 1 for campo in CAMPOS_INDICE}
+            cursor = engine.get_collection(ElementoBiblioteca).find({}, proyeccion, batch_size=TAMANO_LOTE_CONSTRUCCION)
+            elementos, lotes, lote, leidos = {}, [], [], 0
+            async for documento in cursor:
+                elemento = self._elemento(documento)
+                elementos[elemento['id']] = elemento
+                lote.extend((clave, elemento['id']) for clave in claves_elemento(elemento))
+                leidos += 1
+                if leidos % TAMANO_LOTE_CONSTRUCCION == 0:
+                    lote.sort()
+                    lotes.append(lote)
+                    lote = []
+                    await asyncio.sleep(0)
+            lote.sort()
+            lotes.append(lote)
+            claves = ListaOrdenada()
+            fusion = heapq.merge(*lotes)
+            while tramo := list(itertools.islice(fusion, TAMANO_TRAMO)):
+                claves.anexar(tramo)
+                await asyncio.sleep(0)
+            aplazados = self._aplazados
+            self._claves, self._elementos = claves, elementos
+            # Las escrituras propias hechas durante la construcción no están en `cambios`
+            self._cambios, self._escrituras = cambios, self._escrituras - escrituras
+            for operacion, argumentos in aplazados:
+                operacion(*argumentos)
+        finally:
+            self._aplazados = None
+        self._revisado = time.monotonic()
+        self.construcciones += 1
+
+    def _operar(self, operacion, *argumentos):
+        operacion(*argumentos)
+        if self._aplazados is not None:
+            self._aplazados.append((operacion, argumentos))
+
+    def agregar(self, elementos: list[dict]):
+        """
+        Añade elementos recién insertados. Se llama una vez por escritura, aunque la lista esté vacía.
+
+        Parámetros:
+        - elementos (list[dict]): Documentos de `ElementoBiblioteca` (con `_id`).
+        """
+        self._escrituras += 1
+        self._operar(self._agregar, elementos)
+
+    def _agregar(self, elementos: list[dict]):
+        for documento in elementos:
+            elemento = self._elemento(documento)
+            anterior = self._elementos.get(elemento['id'])
+            if anterior is not None:
+                self._quitar(anterior)
+            self._elementos[elemento['id']] = elemento
+            for clave in claves_elemento(elemento):
+                self._claves.agregar((clave, elemento['id']))
+
+    def actualizar(self, elemento_id, campos: dict):
+        """
+        Aplica a un elemento los campos modificados; los que no se indexan se ignoran.
+
+        Parámetros:
+        - elemento_id (ObjectId | str): ID del `ElementoBiblioteca`.
+        - campos (dict): Campos escritos en el elemento.
+        """
+        self._escrituras += 1
+        self._operar(self._actualizar, elemento_id, campos)
+
+    def _actualizar(self, elemento_id, campos: dict):
+        anterior = self._elementos.get(str(elemento_id))
+        indexados = {campo: valor for campo, valor in campos.items() if campo in CAMPOS_INDICE}
+        if anterior is None or not indexados:
+            return
+        self._agregar([{**anterior, '_id': anterior['id'], **indexados}])
+
+    def quitar(self, elemento_id):
+        """
+        Elimina un elemento del índice.
+
+        Parámetros:
+        - elemento_id (ObjectId | str): ID del `ElementoBiblioteca`.
+        """
+        self._escrituras += 1
+        self._operar(self._quitar_id, elemento_id)
+
+    def _quitar_id(self, elemento_id):
+        elemento = self._elementos.get(str(elemento_id))
+        if elemento is not None:
+            self._quitar(elemento)
+
+    def _quitar(self, elemento: dict):
+        del self._elementos[elemento['id']]
+        for clave in claves_elemento(elemento):
+            self._claves.quitar((clave, elemento['id']))
+
+    def aplicar_cambio(self, cambio: dict):
+        """
+        Aplica un cambio del change stream de `elemento_biblioteca` (ver `services/invalidacion.py`).
+
+        Los cambios de este mismo proceso también llegan y vuelven a aplicarse, sin efecto.
+
+        Parámetros:
+        - cambio (dict): Evento con `operationType`, `documentKey` y, según el caso, los campos
+          indexados en `fullDocument` o en `updateDescription.updatedFields`.
+        """
+        tipo = cambio['operationType']
+        elemento_id = cambio['documentKey']['_id']
+        if tipo in ('insert', 'replace'):
+            self._operar(self._agregar, [{**cambio['fullDocument'], '_id': elemento_id}])
+        elif tipo == 'update':
+            self._operar(self._actualizar, elemento_id, cambio.get('updateDescription', {}).get('updatedFields', {}))
+        elif tipo == 'delete':
+            self._operar(self._quitar_id, elemento_id)
+        self.cambios_aplicados += 1
+
+    def seguir_cambios(self, activo: bool):
+        """
+        Indica si el change stream está abierto. Al abrirse se comprueba si hubo escrituras ajenas
+        antes de que empezara a entregarlas (o se reconstruye, tras `reiniciar`).
+
+        Parámetros:
+        - activo (bool): True al abrir el stream, False al perderlo.
+        """
+        if activo and self._al_conectar is not None and self._engine is not None:
+            self._lanzar(self._revisar(self._engine) if self._al_conectar == 'revisar' else self.construir(self._engine))
+            self._al_conectar = None
+        self._en_vivo = activo
+
+    def reiniciar(self):
+        """
+        El change stream perdió cambios (historial agotado, colección o base de datos borrada):
+        el índice se reconstruye en cuanto vuelva a abrirse.
+        """
+        self._al_conectar = 'construir'
+
+    def sugerir(self, texto: str, limite: int = LIMITE_AUTOCOMPLETADO) -> list[dict]:
+        """
+        Elementos cuyo título o autor tiene alguna palabra que empieza por el texto.
+
+        Los resultados siguen el orden alfabético de la clave que coincide: primero el título o
+        autor que es exactamente el texto y después los demás.
+
+        Parámetros:
+        - texto (str): Texto escrito por el usuario.
+        - limite (int): Número máximo de resultados.
+
+        Retorna:
+        - list[dict]: Elementos con la forma de `ElementoOut`.
+        """
+        prefijo = normalizar(texto)
+        if not prefijo:
+            return []
+        resultado = {}
+        for clave, elemento_id in self._claves.desde((prefijo,)):
+            if not clave.startswith(prefijo):
+                break
+            if elemento_id not in resultado:
+                resultado[elemento_id] = self._elementos[elemento_id]
+                if len(resultado) >= limite:
+                    break
+        return list(resultado.values())
+
+    def revisar(self, engine: AIOEngine):
+        """
+        Sin change stream, si pasaron `recarga` segundos desde la última revisión, comprueba en
+        segundo plano si otro proceso escribió en los elementos y, en ese caso, reconstruye el índice.
+
+        Parámetros:
+        - engine (AIOEngine): Motor del primario: en un secundario con retraso las escrituras
+          propias aún no contadas parecerían ajenas.
+        """
+        if self._en_vivo or self.recarga <= 0 or time.monotonic() - self._revisado < self.recarga:
+            return
+        self._revisado = time.monotonic()
+        self._lanzar(self._revisar(engine))
+
+    def _lanzar(self, corrutina):
+        if self._tarea is not None and not self._tarea.done():
+            corrutina.close()
+            return
+        self._tarea = asyncio.create_task(corrutina)
+        self._tarea.add_done_callback(self._terminar)
+
+    async def _revisar(self, engine: AIOEngine):
+        # Un contador menor que el esperado solo indica escrituras propias aún sin registrar
+        if await leer_cambios(engine, ElementoBiblioteca) > self._cambios + self._escrituras:
+            await self.construir(engine)
+
+    def _terminar(self, tarea: asyncio.Task):
+        if not tarea.cancelled() and tarea.exception() is not None:
+            self.errores += 1
+            registro.warning('No se pudo reconstruir el índice de autocompletado', exc_info=tarea.exception())
+
+    @staticmethod
+    def _elemento(documento: dict) -> dict:
+        return {'id': str(documento['_id']), **{campo: documento[campo] for campo in CAMPOS_INDICE}}
+
+    def estadisticas(self) -> dict:
+        return {
+            'elementos': len(self._elementos),
+            'claves': len(self._claves),
+            'construcciones': self.construcciones,
+            'cambios_aplicados': self.cambios_aplicados,
+            'en_vivo': self._en_vivo,
+            'errores': self.errores,
+        }
+
+indice_autocompletado = IndicePrefijos()
@@ -0,0 +1,299 @@
+from odmantic import AIOEngine
+from pymongo import UpdateOne
+from models.elemento import ElementoBiblioteca
+from schemas.paginacion import OrdenBusqueda, LIMITE_BUSQUEDA
+from crud.agregacion import CAMPOS_EMBEBIDOS, etapas_detalle_tipos, etapas_elemento
+from crud.paginacion import CursorInvalido, codificar_posicion, decodificar_cursor, filtro_desde_cursor
+import re
+import unicodedata
+
+TAMANO_LOTE_REINDEXADO = 1000
+
+# Letras de los títulos de más a menos frecuentes, para estimar qué trigramas son raros
+FRECUENCIA_LETRAS = 'eaosrnidlctumpbgvyhqfzjxkw'
+
+ORDENES_BUSQUEDA = {
+    'relevancia': {'_relevancia': 1, '_longitud': 1, '_id': 1},
+    'titulo': {'titulo': 1, '_id': 1},
+    'ano_publicacion': {'ano_publicacion': 1, '_id': 1},
+}
+
+def normalizar(texto: str) -> str:
+    """
+    Normaliza un texto para la búsqueda: elimina acentos, ignora mayúsculas y colapsa espacios.
+
+    Parámetros:
+    - texto (str): Texto original.
+
+    Retorna:
+    - str: Texto normalizado (por ejemplo, "  El Túnel " -> "el tunel").
+    """
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+def trigramas(texto_normalizado: str) -> list[str]:
+    """
+    Calcula los trigramas distintos de un texto ya normalizado.
+
+    Parámetros:
+    - texto_normalizado (str): Texto devuelto por `normalizar`.
+
+    Retorna:
+    - list[str]: Trigramas ordenados y sin repetir.
+    """
+    return sorted({texto_normalizado[i:i + 3] for i in range(len(texto_normalizado) - 2)})
+
+def rareza(trigrama: str) -> tuple[int, int]:
+    """
+    Clave para ordenar trigramas del más raro al más común: primero los que no tienen espacios
+    y, entre ellos, los de letras menos frecuentes. Las letras fuera de `FRECUENCIA_LETRAS`
+    (dígitos, ñ, otros alfabetos) cuentan como raras.
+    """
+    comunes = len(FRECUENCIA_LETRAS)
+    frecuencia = sum(comunes - FRECUENCIA_LETRAS.find(c) if c in FRECUENCIA_LETRAS else 0 for c in trigrama)
+    return (' ' in trigrama, frecuencia)
+
+def campos_busqueda(titulo: str) -> dict:
+    """
+    Genera los campos del índice de búsqueda que se guardan junto a cada `ElementoBiblioteca`.
+
+    Debe usarse en todas las rutas de escritura que asignen o modifiquen el título.
+
+    Parámetros:
+    - titulo (str): Título del elemento.
+
+    Retorna:
+    - dict: Valores de `titulo_normalizado` y `titulo_trigramas`.
+    """
+    titulo_normalizado = normalizar(titulo)
+    return {
+        'titulo_normalizado': titulo_normalizado,
+        'titulo_trigramas': trigramas(titulo_normalizado),
+    }
+
+def filtro_titulo(termino: str, tipo: str | None = None) -> dict:
+    """
+    Construye el filtro que preselecciona candidatos con un índice.
+
+    Los términos de tres o más caracteres exigen todos sus trigramas en `titulo_trigramas`, el
+    más raro primero: MongoDB recorre el índice multiclave con el primer valor de `$all` y filtra
+    los demás, así que un trigrama común (o con espacios) al principio leería casi toda la
+    colección. Los términos de uno o dos caracteres no tienen trigramas: se buscan como subcadena
+    con una expresión regular sin anclar sobre `titulo_normalizado`, que MongoDB resuelve
+    recorriendo las claves del índice `(titulo_normalizado, tipo)` en lugar de los documentos.
+
+    Parámetros:
+    - termino (str): Término de búsqueda ya normalizado.
+    - tipo (str | None): Tipo de elemento al que restringir la búsqueda.
+
+    Retorna:
+    - dict: Filtro de MongoDB.
+    """
+    if len(termino) >= 3:
+        filtro = {'titulo_trigramas': {'$all': sorted(trigramas(termino), key=rareza)}}
+    else:
+        filtro = {'titulo_normalizado': {'$regex': re.escape(termino)}}
+    if tipo is not None:
+        filtro['tipo'] = tipo
+    return filtro
+
+def etapas_coincidencia(termino: str, tipo: str | None = None) -> list[dict]:
+    """
+    Etapas de agregación que seleccionan los elementos cuyo título contiene el término y calculan
+    su relevancia (`_relevancia`) y la longitud de su título (`_longitud`).
+
+    La relevancia es, de mayor a menor (de 0 a 3): título idéntico, título que empieza por el
+    término, alguna palabra que empieza por el término y cualquier otra coincidencia parcial.
+
+    Parámetros:
+    - termino (str): Término de búsqueda ya normalizado.
+    - tipo (str | None): Tipo de elemento al que restringir la búsqueda.
+
+    Retorna:
+    - list[dict]: Etapas a ejecutar sobre la colección de `ElementoBiblioteca`.
+    """
+    posicion = {'$indexOfCP': ['$titulo_normalizado', termino]}
+    return [
+        {'$match': filtro_titulo(termino, tipo)},
+        {'$match': {'$expr': {'$gte': [posicion, 0]}}},
+        {'$addFields': {
+            '_relevancia': {'$switch': {
+                'branches': [
+                    {'case': {'$eq': ['$titulo_normalizado', termino]}, 'then': 0},
+                    {'case': {'$eq': [posicion, 0]}, 'then': 1},
+                    {'case': {'$gte': [{'$indexOfCP': ['$titulo_normalizado', f' {termino}']}, 0]}, 'then': 2},
+                ],
+                'default': 3,
+            }},
+            '_longitud': {'$strLenCP': '$titulo_normalizado'},
+        }},
+    ]
+
+def etapas_busqueda(
+    titulo: str,
+    tipo: str | None = None,
+    limite: int = LIMITE_BUSQUEDA,
+    union: list[dict] | None = None,
+) -> list[dict]:
+    """
+    Etapas de agregación que buscan elementos por título y los ordenan por relevancia.
+
+    La relevancia se calcula con `etapas_coincidencia`; a igual relevancia se prefieren los
+    títulos más cortos.
+
+    Las etapas de `union` (que unen cada elemento con su subtipo y descartan los que no lo
+    tienen) se ejecutan antes del `$limit`, para que esos elementos no dejen el resultado por
+    debajo del límite. Como MongoDB ya no puede combinar la ordenación con el límite, antes de
+    ordenar se descartan los campos que no se usan (como `titulo_trigramas`); la unión solo se
+    ejecuta para los documentos que llegan al límite.
+
+    Parámetros:
+    - titulo (str): Texto buscado tal como lo envía el cliente.
+    - tipo (str | None): Tipo de elemento al que restringir la búsqueda.
+    - limite (int): Número máximo de resultados.
+    - union (list[dict] | None): Etapas de unión y proyección (`etapas_detalle`), o None.
+
+    Retorna:
+    - list[dict]: Etapas a ejecutar sobre la colección de `ElementoBiblioteca`.
+    """
+    etapas = etapas_coincidencia(normalizar(titulo), tipo) + [
+        {'$project': {campo: 1 for campo in ('_relevancia', '_longitud') + CAMPOS_EMBEBIDOS}},
+        {'$sort': ORDENES_BUSQUEDA['relevancia']},
+    ]
+    if union is not None:
+        return etapas + union + [{'$limit': limite}]
+    return etapas + [
+        {'$limit': limite},
+        {'$project': {'_relevancia': 0, '_longitud': 0}},
+    ]
+
+async def buscar_elementos_por_titulo(
+    titulo: str,
+    engine: AIOEngine,
+    tipo: str | None = None,
+    limite: int = LIMITE_BUSQUEDA,
+    campos: tuple[str, ...] | None = None,
+):
+    """
+    Busca elementos cuyo título contenga el texto dado, ignorando mayúsculas y acentos.
+
+    Parámetros:
+    - titulo (str): Texto a buscar.
+    - engine (AIOEngine): Motor de base de datos.
+    - tipo (str | None): Tipo de elemento al que restringir la búsqueda.
+    - limite (int): Número máximo de resultados.
+    - campos (tuple[str, ...] | None): Campos de `ElementoOut` a devolver; todos si es None.
+
+    Retorna:
+    - List[dict]: Elementos encontrados con la forma de `ElementoOut`, ordenados por relevancia.
+    """
+    if not normalizar(titulo):
+        return []
+    pipeline = etapas_busqueda(titulo, tipo, limite) + etapas_elemento(campos)
+    return await engine.get_collection(ElementoBiblioteca).aggregate(pipeline).to_list(length=None)
+
+def filtro_busqueda_desde_cursor(orden: OrdenBusqueda, cursor: str | None) -> dict:
+    """
+    Construye el filtro keyset que selecciona los resultados de la búsqueda posteriores al cursor.
+
+    Con el orden por relevancia el cursor guarda la relevancia y la longitud del título del último
+    resultado; con los demás órdenes, el mismo valor que los listados.
+
+    Parámetros:
+    - orden (OrdenBusqueda): Orden de los resultados.
+    - cursor (str | None): Cursor de la página anterior, o None para la primera página.
+
+    Retorna:
+    - dict: Filtro de MongoDB (vacío si no hay cursor).
+
+    Errores:
+    - CursorInvalido: Si el cursor está mal formado o fue generado con otro orden.
+    """
+    if orden != 'relevancia' or cursor is None:
+        return filtro_desde_cursor(orden, cursor)
+    valor, ultimo_id = decodificar_cursor(cursor, orden)
+    try:
+        relevancia, longitud = valor
+    except (TypeError, ValueError):
+        raise CursorInvalido('Cursor de paginación inválido')
+    return {'$or': [
+        {'_relevancia': {'$gt': relevancia}},
+        {'_relevancia': relevancia, '_longitud': {'$gt': longitud}},
+        {'_relevancia': relevancia, '_longitud': longitud, '_id': {'$gt': ultimo_id}},
+    ]}
+
+async def buscar_elementos_detallados(
+    titulo: str,
+    engine: AIOEngine,
+    limite: int = LIMITE_BUSQUEDA,
+    cursor: str | None = None,
+    orden: OrdenBusqueda = 'relevancia',
+):
+    """
+    Busca elementos de cualquier tipo por título y devuelve una página con todos sus datos, en una única agregación.
+
+    La coincidencia se resuelve sobre la colección de `ElementoBiblioteca` con el índice de
+    trigramas, se pagina con keyset según el orden pedido y solo los resultados de la página se
+    unen con su libro, DVD o revista (`etapas_detalle_tipos`).
+
+    Parámetros:
+    - titulo (str): Texto a buscar.
+    - engine (AIOEngine): Motor de base de datos.
+    - limite (int): Número máximo de resultados de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenBusqueda): 'relevancia' (por defecto), 'titulo' o 'ano_publicacion'.
+
+    Retorna:
+    - tuple[list[dict], str | None]: Resultados con la forma de `LibroOut`, `DVDOut` o `RevistaOut`
+      más su `tipo`, y cursor de la página siguiente.
+
+    Errores:
+    - CursorInvalido: Si el cursor no es válido.
+    """
+    termino = normalizar(titulo)
+    if not termino:
+        return [], None
+    marca = {'id': '$_id', 'huerfano': {'$not': ['$detalle']}}
+    marca['v'] = ['$_relevancia', '$_longitud'] if orden == 'relevancia' else f'${orden}'
+    pipeline = etapas_coincidencia(termino) + [
+        {'$match': filtro_busqueda_desde_cursor(orden, cursor)},
+        {'$sort': ORDENES_BUSQUEDA[orden]},
+        {'$limit': limite + 1},
+    ] + etapas_detalle_tipos(extra={'_cursor': marca})
+    documentos = await engine.get_collection(ElementoBiblioteca).aggregate(pipeline).to_list(length=None)
+    siguiente_cursor = None
+    if len(documentos) > limite:
+        documentos = documentos[:limite]
+        ultimo = documentos[-1]['_cursor']
+        siguiente_cursor = codificar_posicion(orden, ultimo['v'], ultimo['id'])
+    marcas = [documento.pop('_cursor') for documento in documentos]
+    return [documento for documento, marca in zip(documentos, marcas) if not marca['huerfano']], siguiente_cursor
+
+async def reindexar_titulos(engine: AIOEngine, tamano_lote: int = TAMANO_LOTE_REINDEXADO) -> int:
+    """
+    Rellena los campos de búsqueda de los elementos creados antes de existir el índice.
+
+    Es idempotente: solo procesa los documentos que aún no tienen `titulo_normalizado`.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - tamano_lote (int): Número de documentos actualizados por operación `bulk_write`.
+
+    Retorna:
+    - int: Número de elementos reindexados.
+    """
+    coleccion = engine.get_collection(ElementoBiblioteca)
+    cursor = coleccion.find({'titulo_normalizado': {'$exists': False}}, {'titulo': 1}, batch_size=tamano_lote)
+    total = 0
+    lote = []
+    async for documento in cursor:
+        lote.append(UpdateOne({'_id': documento['_id']}, {'$set': campos_busqueda(documento['titulo'])}))
+        if len(lote) >= tamano_lote:
+            await coleccion.bulk_write(lote, ordered=False)
+            total += len(lote)
+            lote = []
+    if lote:
+        await coleccion.bulk_write(lote, ordered=False)
+        total += len(lote)
+    return total
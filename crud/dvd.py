@@ -1,71 +1,173 @@
 from odmantic import AIOEngine
 from models.elemento import ElementoBiblioteca
 from models.dvd import DVD
-from schemas.dvd import DVDCreate
+from schemas.dvd import DVDCreate, DVDUpdate
+from schemas.paginacion import OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_BUSQUEDA
+from crud.iteracion import TAMANO_LOTE, iterar_con_elemento, iterar_con_campos
+from crud.busqueda import campos_busqueda, etapas_busqueda, normalizar
+from crud.agregacion import etapas_detalle
+from crud.lotes import insertar_lote
+from crud.escritura import insertar_con_elemento, actualizar_con_elemento, actualizar_campos, eliminar_con_elemento
+from crud.almacenamiento import buscar_subtipo, buscar_subtipos
+from crud.paginacion import paginar_elementos, paginar_con_campos, ordenar_como_elementos
+from crud.versiones import leer_cambios
 from bson import ObjectId
 import re
 
-async def crear_dvd(dvd_data: DVDCreate, engine: AIOEngine):
+def construir_dvd(dvd_data: DVDCreate) -> DVD:
     """
-    Crea un nuevo DVD en el sistema.
-
-    Registra un nuevo elemento de tipo "DVD" en la base de datos junto con sus características específicas.
+    Construye, sin guardarlo, un DVD junto con su elemento de biblioteca.
 
     Parámetros:
-    - dvd_data (DVDCreate): Datos del DVD a crear.
-    - engine (AIOEngine): Motor de base de datos.
+    - dvd_data (DVDCreate): Datos del DVD.
 
     Retorna:
-    - DVD: Objeto DVD creado.
+    - DVD: DVD con su `elemento` asignado.
     """
     elemento = ElementoBiblioteca(
         titulo= dvd_data.titulo,
         autor= dvd_data.autor,
         ano_publicacion= dvd_data.ano_publicacion,
-        tipo= "DVD"
+        tipo= "DVD",
+        **campos_busqueda(dvd_data.titulo)
     ) # type: ignore
-    await engine.save(elemento)
-    
+
     dvd = DVD(
         elemento= elemento,
         duracion= dvd_data.duracion,
         genero= dvd_data.genero
     ) # type: ignore
-    await engine.save(dvd)
     return dvd
 
-async def listar_dvds(engine: AIOEngine):
+async def crear_dvd(dvd_data: DVDCreate, engine: AIOEngine):
+    """
+    Crea un nuevo DVD en el sistema.
+
+    Registra un nuevo elemento de tipo "DVD" en la base de datos junto con sus características específicas.
+
+    Parámetros:
+    - dvd_data (DVDCreate): Datos del DVD a crear.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - DVD: Objeto DVD creado.
+    """
+    dvd = construir_dvd(dvd_data)
+    await insertar_con_elemento(dvd, engine)
+    return dvd
+
+async def crear_dvds(dvds_data: list[DVDCreate], engine: AIOEngine, ids: list[tuple[ObjectId, ObjectId]] | None = None):
+    """
+    Crea DVDs en bloque con dos escrituras `insert_many` sin orden.
+
+    Parámetros:
+    - dvds_data (list[DVDCreate]): Datos de los DVDs a crear.
+    - engine (AIOEngine): Motor de base de datos.
+    - ids (list[tuple[ObjectId, ObjectId]] | None): IDs de cada subtipo y su elemento; con ellos reenviar el lote no duplica nada.
+
+    Retorna:
+    - list[dict]: Resultado por posición con el `id` creado o el `error` correspondiente.
+    """
+    return await insertar_lote([construir_dvd(dvd_data) for dvd_data in dvds_data], engine, ids)
+
+async def listar_dvds(
+    engine: AIOEngine,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+):
+    """
+    Lista una página de DVDs registrados en el sistema usando paginación por cursor.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - limite (int): Número máximo de resultados de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenPaginacion): Campo de ordenación ('id', 'titulo' o 'ano_publicacion').
+
+    Retorna:
+    - tuple[List[DVD], str | None]: DVDs de la página y cursor de la página siguiente.
+    """
+    elementos, siguiente_cursor = await paginar_elementos(engine, limite, cursor, orden, tipo="DVD")
+    if not elementos:
+        return [], siguiente_cursor
+    dvds = await buscar_subtipos(DVD, DVD.elemento.in_([elemento.id for elemento in elementos]), engine)
+    return ordenar_como_elementos(dvds, elementos), siguiente_cursor
+
+def iterar_dvds(engine: AIOEngine, tamano_lote: int = TAMANO_LOTE):
+    """
+    Recorre todos los DVDs del sistema sin cargarlos a la vez en memoria.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - tamano_lote (int): Documentos por lote leído del cursor.
+
+    Retorna:
+    - AsyncIterator[DVD]: DVDs en orden de inserción.
+    """
+    return iterar_con_elemento(DVD, engine, tamano_lote)
+
+async def listar_dvds_con_campos(
+    engine: AIOEngine,
+    campos: tuple[str, ...] | None,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    sesion=None,
+):
     """
-    Lista todos los DVDs registrados en el sistema.
+    Lista una página de DVDs como diccionarios con la forma de `DVDOut` (o solo los campos pedidos).
 
     Parámetros:
     - engine (AIOEngine): Motor de base de datos.
+    - campos (tuple[str, ...] | None): Campos de `DVDOut` a devolver; todos si es None.
+    - limite (int): Número máximo de resultados de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenPaginacion): Campo de ordenación ('id', 'titulo' o 'ano_publicacion').
+    - sesion: Sesión de MongoDB en la que se lee, o None.
 
     Retorna:
-    - List[DVD]: Lista de DVDs registrados.
+    - tuple[List[dict], str | None]: DVDs de la página y cursor de la página siguiente.
     """
-    return await engine.find(DVD)
+    return await paginar_con_campos(engine, campos, limite, cursor, orden, tipo="DVD", sesion=sesion)
 
-async def buscar_por_titulo(titulo: str, engine: AIOEngine):
+def iterar_dvds_con_campos(engine: AIOEngine, campos: tuple[str, ...] | None, tamano_lote: int = TAMANO_LOTE, sesion=None):
+    """
+    Recorre por lotes los DVDs del sistema como diccionarios con la forma de `DVDOut` (o solo los campos pedidos).
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - campos (tuple[str, ...] | None): Campos de `DVDOut` a devolver; todos si es None.
+    - tamano_lote (int): Documentos por lote leído del cursor.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - AsyncIterator[dict]: DVDs en orden de inserción.
+    """
+    return iterar_con_campos(engine, campos, "DVD", tamano_lote, sesion)
+
+async def buscar_por_titulo(
+    titulo: str,
+    engine: AIOEngine,
+    limite: int = LIMITE_BUSQUEDA,
+    campos: tuple[str, ...] | None = None,
+):
     """
     Busca DVDs cuyo título coincida total o parcialmente con el valor proporcionado.
 
     Parámetros:
     - titulo (str): Título a buscar.
     - engine (AIOEngine): Motor de base de datos.
+    - limite (int): Número máximo de DVDs a devolver.
+    - campos (tuple[str, ...] | None): Campos de `DVDOut` a devolver; todos si es None.
 
     Retorna:
-    - List[DVD]: Lista de DVDs encontrados.
+    - List[dict]: DVDs encontrados con la forma de `DVDOut`, ordenados por relevancia.
     """
-    regex = re.compile(f".*{re.escape(titulo)}.*", re.IGNORECASE)
-    elementos = await engine.find(ElementoBiblioteca, {'titulo': {"$regex": regex}})
-    if not elementos:
+    if not normalizar(titulo):
         return []
-    #Extrayendo los ids de los elementos encontrados
-    elemento_ids = [ObjectId(elemento.id) for elemento in elementos]
-    # Buscando DVDs de los elementos encontrados
-    dvds = await engine.find(DVD, DVD.elemento.in_(elemento_ids))
-    return dvds
+    pipeline = etapas_busqueda(titulo, "DVD", limite, union=etapas_detalle("DVD", campos))
+    return await engine.get_collection(ElementoBiblioteca).aggregate(pipeline).to_list(length=None)
 
 async def buscar_por_genero(categoria: str, engine: AIOEngine):
     """
@@ -79,7 +181,7 @@ async def buscar_por_genero(categoria: str, engine: AIOEngine):
     - List[DVD]: DVDs relacionados a la categoría.
     """
     regex = re.compile(f".*{re.escape(categoria)}.*", re.IGNORECASE)
-    elementos = await engine.find(DVD, {'genero': {'$regex': regex}})
+    elementos = await buscar_subtipos(DVD, {'genero': {'$regex': regex}}, engine)
     if not elementos:
         return []
     return elementos
@@ -95,7 +197,7 @@ async def buscar_por_id(dvd_id: str, engine: AIOEngine):
     Retorna:
     - DVD | None: DVD encontrado o None.
     """
-    return await engine.find_one(DVD, DVD.id == ObjectId(dvd_id))
+    return await buscar_subtipo(DVD, DVD.id == ObjectId(dvd_id), engine)
 
 async def actualizar_por_id(dvd_id, dvd_data: DVDCreate, engine: AIOEngine):
     """
@@ -107,22 +209,37 @@ async def actualizar_por_id(dvd_id, dvd_data: DVDCreate, engine: AIOEngine):
     - engine (AIOEngine): Motor de base de datos.
 
     Retorna:
-    - DVD | None: DVD actualizado o None si no existe.
-    """
-    dvd = await buscar_por_id(dvd_id, engine)
-    if not dvd:
-        return None
-    
-    dvd.elemento.titulo = dvd_data.titulo
-    dvd.elemento.autor = dvd_data.autor
-    dvd.elemento.ano_publicacion = dvd_data.ano_publicacion
-    await engine.save(dvd.elemento)
-    
-    dvd.duracion = dvd_data.duracion
-    dvd.genero = dvd_data.genero
-    await engine.save(dvd)
-    
-    return dvd
+    - dict | None: DVD actualizado con la forma de `DVDOut`, o None si no existe.
+    """
+    return await actualizar_con_elemento(
+        "DVD",
+        dvd_id,
+        {'duracion': dvd_data.duracion, 'genero': dvd_data.genero},
+        {
+            'titulo': dvd_data.titulo,
+            'autor': dvd_data.autor,
+            'ano_publicacion': dvd_data.ano_publicacion,
+            **campos_busqueda(dvd_data.titulo),
+        },
+        engine,
+    )
+
+async def actualizar_parcial_por_id(dvd_id: str, cambios: DVDUpdate, engine: AIOEngine):
+    """
+    Actualiza solo los campos enviados de un DVD existente.
+
+    Los campos compartidos (título, autor y año) se escriben en el elemento únicamente si se envía
+    alguno de ellos; en caso contrario solo se modifica el documento del DVD.
+
+    Parámetros:
+    - dvd_id (str): ID del DVD a actualizar.
+    - cambios (DVDUpdate): Campos a modificar.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - dict | None: DVD actualizado con la forma de `DVDOut`, o None si no fue encontrado.
+    """
+    return await actualizar_campos("DVD", dvd_id, cambios.cambios(), engine)
 
 async def eliminar_por_id(dvd_id: str, engine:AIOEngine):
     """
@@ -137,9 +254,17 @@ async def eliminar_por_id(dvd_id: str, engine:AIOEngine):
     Retorna:
     - bool: True si se eliminó correctamente, False si no fue encontrado.
     """
-    dvd = await buscar_por_id(dvd_id, engine)
-    if not dvd:
-        return False
-    await engine.delete(dvd.elemento)
-    await engine.delete(dvd)
-    return True
\ No newline at end of file
+    return await eliminar_con_elemento("DVD", dvd_id, engine)
+
+async def contar_cambios(engine: AIOEngine, sesion=None) -> int:
+    """
+    Contador de cambios de la colección de DVDs, para el ETag de sus listados.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - int: Número de escrituras registradas en los DVDs.
+    """
+    return await leer_cambios(engine, DVD, sesion)
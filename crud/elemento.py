@@ -1,10 +1,80 @@
 from odmantic import AIOEngine
+from schemas.paginacion import OrdenBusqueda, OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_BUSQUEDA, LIMITE_AUTOCOMPLETADO
+from crud.autocompletado import indice_autocompletado
+from crud.busqueda import buscar_elementos_por_titulo, buscar_elementos_detallados
+from crud.paginacion import paginar_elementos, paginar_con_campos
+from crud.iteracion import TAMANO_LOTE, iterar_elementos, iterar_con_campos
+from crud.versiones import leer_cambios
 from models.elemento import ElementoBiblioteca
-import re
 
-async def buscar_elemento_por_titulo(titulo: str, engine: AIOEngine):
-    regex = re.compile(f".*{re.escape(titulo)}.*", re.IGNORECASE)
-    return await engine.find(ElementoBiblioteca, {'titulo': {"$regex": regex}})
+async def buscar_elemento_por_titulo(
+    titulo: str,
+    engine: AIOEngine,
+    limite: int = LIMITE_BUSQUEDA,
+    campos: tuple[str, ...] | None = None,
+):
+    return await buscar_elementos_por_titulo(titulo, engine, limite=limite, campos=campos)
 
-async def listar_todos_los_elementos(engine: AIOEngine):
-    return await engine.find(ElementoBiblioteca)
+async def buscar_elementos_con_detalle(
+    titulo: str,
+    engine: AIOEngine,
+    limite: int = LIMITE_BUSQUEDA,
+    cursor: str | None = None,
+    orden: OrdenBusqueda = 'relevancia',
+):
+    return await buscar_elementos_detallados(titulo, engine, limite, cursor, orden)
+
+def autocompletar(texto: str, engine: AIOEngine, limite: int = LIMITE_AUTOCOMPLETADO) -> list[dict]:
+    """
+    Sugerencias para un texto a medio escribir, servidas desde el índice de prefijos en memoria.
+
+    No espera a la base de datos: las escrituras de otros procesos llegan por el change stream
+    y, sin él, su comprobación se lanza en segundo plano y la sugerencia se sirve con el índice actual.
+
+    Parámetros:
+    - texto (str): Comienzo de una palabra del título o del autor.
+    - engine (AIOEngine): Motor del primario, con el que se comprueba si otro proceso escribió.
+    - limite (int): Número máximo de sugerencias.
+
+    Retorna:
+    - list[dict]: Elementos con la forma de `ElementoOut`.
+    """
+    indice_autocompletado.revisar(engine)
+    return indice_autocompletado.sugerir(texto, limite)
+
+async def listar_todos_los_elementos(
+    engine: AIOEngine,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+):
+    return await paginar_elementos(engine, limite, cursor, orden)
+
+async def listar_elementos_con_campos(
+    engine: AIOEngine,
+    campos: tuple[str, ...] | None,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    sesion=None,
+):
+    return await paginar_con_campos(engine, campos, limite, cursor, orden, sesion=sesion)
+
+def iterar_todos_los_elementos(engine: AIOEngine, tamano_lote: int = TAMANO_LOTE):
+    return iterar_elementos(engine, tamano_lote)
+
+def iterar_elementos_con_campos(engine: AIOEngine, campos: tuple[str, ...] | None, tamano_lote: int = TAMANO_LOTE, sesion=None):
+    return iterar_con_campos(engine, campos, tamano_lote=tamano_lote, sesion=sesion)
+
+async def contar_cambios(engine: AIOEngine, sesion=None) -> int:
+    """
+    Contador de cambios de la colección de elementos, para el ETag de sus listados.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - int: Número de escrituras registradas en los elementos.
+    """
+    return await leer_cambios(engine, ElementoBiblioteca, sesion)
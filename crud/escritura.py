@@ -0,0 +1,182 @@
+from odmantic import AIOEngine, Model
+from pymongo import ReturnDocument
+from models.elemento import ElementoBiblioteca
+from crud.agregacion import SUBTIPOS, CAMPOS_ELEMENTO, documento_salida
+from crud.almacenamiento import EMBEBIDO, documento_subtipo, embebido
+from crud.autocompletado import indice_autocompletado
+from crud.busqueda import campos_busqueda
+from crud.versiones import registrar_cambios
+from bson import ObjectId
+
+async def insertar_con_elemento(subtipo: Model, engine: AIOEngine):
+    """
+    Inserta un subtipo (Libro, DVD o Revista) y su elemento con dos `insert_one`.
+
+    Si el subtipo no se puede insertar, por el motivo que sea (también si la petición se cancela
+    mientras tanto), el elemento recién creado se elimina para no dejarlo huérfano.
+    Después se añade el elemento al índice de autocompletado y se incrementan los contadores de
+    cambios del subtipo y de los elementos.
+
+    Parámetros:
+    - subtipo (Model): Instancia del subtipo con su `elemento` asignado.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Errores:
+    - pymongo.errors.DuplicateKeyError: Si el subtipo incumple un índice único. Cualquier otro
+      error de la inserción del subtipo también se relanza.
+    """
+    elementos = engine.get_collection(ElementoBiblioteca)
+    documento_elemento = subtipo.elemento.model_dump_doc()
+    await elementos.insert_one(documento_elemento)
+    try:
+        await engine.get_collection(type(subtipo)).insert_one(documento_subtipo(subtipo))
+    except BaseException:
+        await elementos.delete_one({'_id': subtipo.elemento.id})
+        raise
+    indice_autocompletado.agregar([documento_elemento])
+    await registrar_cambios(engine, type(subtipo), ElementoBiblioteca)
+
+async def actualizar_con_elemento(
+    tipo: str,
+    subtipo_id: str,
+    campos_subtipo: dict,
+    campos_elemento: dict,
+    engine: AIOEngine,
+):
+    """
+    Actualiza un subtipo (Libro, DVD o Revista) y su elemento con, como mucho, dos operaciones.
+
+    Cada documento se modifica con `find_one_and_update`, que aplica el `$set` de forma atómica y
+    devuelve la versión ya actualizada. El subtipo siempre se escribe, porque su `version` se
+    incrementa aunque solo cambien campos del elemento; si no hay campos que cambiar en el
+    elemento, este solo se lee. El índice de autocompletado se actualiza una vez escrito el
+    elemento, para que un fallo de la escritura no lo deje con datos que no están en la base de
+    datos, y al terminar se incrementan los contadores de cambios.
+
+    En modo embebido los campos compartidos también se copian en el subtipo, del que se obtiene
+    la respuesta; el elemento solo se escribe si cambia alguno de sus campos y solo se lee si el
+    subtipo aún no se ha convertido a ese modo.
+
+    Parámetros:
+    - tipo (str): Tipo de elemento ('Libro', 'DVD' o 'Revista').
+    - subtipo_id (str): ID del documento del subtipo.
+    - campos_subtipo (dict): Campos a modificar en el subtipo.
+    - campos_elemento (dict): Campos a modificar en el `ElementoBiblioteca` asociado.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - dict | None: Documento actualizado con la forma del esquema de salida, o None si no existe.
+    """
+    modelo, _ = SUBTIPOS[tipo]
+    subtipos = engine.get_collection(modelo)
+    elementos = engine.get_collection(ElementoBiblioteca)
+    filtro = {'_id': ObjectId(subtipo_id)}
+    if EMBEBIDO:
+        campos_subtipo = {
+            **campos_subtipo,
+            **{campo: valor for campo, valor in campos_elemento.items() if campo in CAMPOS_ELEMENTO},
+        }
+    actualizacion = {'$inc': {'version': 1}}
+    if campos_subtipo:
+        actualizacion['$set'] = campos_subtipo
+    subtipo = await subtipos.find_one_and_update(filtro, actualizacion, return_document=ReturnDocument.AFTER)
+    if subtipo is None:
+        return None
+    filtro_elemento = {'_id': subtipo['elemento']}
+    # Los listados de /elementos solo cambian si cambia algún campo del elemento
+    modificados = (modelo, ElementoBiblioteca) if campos_elemento else (modelo,)
+    if EMBEBIDO:
+        if campos_elemento:
+            await elementos.update_one(filtro_elemento, {'$set': campos_elemento})
+            indice_autocompletado.actualizar(subtipo['elemento'], campos_elemento)
+        await registrar_cambios(engine, *modificados)
+        if embebido(subtipo):
+            return documento_salida(tipo, subtipo, subtipo)
+        # Documento aún sin convertir: los campos compartidos se leen del elemento
+        elemento = await elementos.find_one(filtro_elemento)
+        return None if elemento is None else documento_salida(tipo, subtipo, elemento)
+    if campos_elemento:
+        elemento = await elementos.find_one_and_update(
+            filtro_elemento, {'$set': campos_elemento}, return_document=ReturnDocument.AFTER
+        )
+        if elemento is not None:
+            indice_autocompletado.actualizar(subtipo['elemento'], campos_elemento)
+    else:
+        elemento = await elementos.find_one(filtro_elemento)
+    await registrar_cambios(engine, *modificados)
+    if elemento is None:
+        return None
+    return documento_salida(tipo, subtipo, elemento)
+
+async def leer_con_elemento(tipo: str, subtipo_id: str, engine: AIOEngine):
+    """
+    Lee un subtipo (Libro, DVD o Revista) y su elemento con la forma del esquema de salida.
+
+    Parámetros:
+    - tipo (str): Tipo de elemento ('Libro', 'DVD' o 'Revista').
+    - subtipo_id (str): ID del documento del subtipo.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - dict | None: Documento con la forma del esquema de salida, o None si no existe.
+    """
+    modelo, _ = SUBTIPOS[tipo]
+    subtipo = await engine.get_collection(modelo).find_one({'_id': ObjectId(subtipo_id)})
+    if subtipo is None:
+        return None
+    if EMBEBIDO and embebido(subtipo):
+        return documento_salida(tipo, subtipo, subtipo)
+    elemento = await engine.get_collection(ElementoBiblioteca).find_one({'_id': subtipo['elemento']})
+    return None if elemento is None else documento_salida(tipo, subtipo, elemento)
+
+async def eliminar_con_elemento(tipo: str, subtipo_id: str, engine: AIOEngine) -> bool:
+    """
+    Elimina un subtipo y su elemento asociado con dos operaciones, lo quita del índice de
+    autocompletado e incrementa los contadores de cambios.
+
+    Parámetros:
+    - tipo (str): Tipo de elemento ('Libro', 'DVD' o 'Revista').
+    - subtipo_id (str): ID del documento del subtipo.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - bool: True si se eliminó, False si no existía.
+    """
+    modelo, _ = SUBTIPOS[tipo]
+    subtipo = await engine.get_collection(modelo).find_one_and_delete(
+        {'_id': ObjectId(subtipo_id)}, projection={'elemento': 1}
+    )
+    if subtipo is None:
+        return False
+    await engine.get_collection(ElementoBiblioteca).delete_one({'_id': subtipo['elemento']})
+    indice_autocompletado.quitar(subtipo['elemento'])
+    await registrar_cambios(engine, modelo, ElementoBiblioteca)
+    return True
+
+async def actualizar_campos(tipo: str, subtipo_id: str, cambios: dict, engine: AIOEngine):
+    """
+    Aplica una actualización parcial repartiendo los campos entre el subtipo y su elemento.
+
+    Solo se escriben los campos recibidos; si ninguno pertenece al elemento, el `ElementoBiblioteca`
+    no se modifica. Un cambio de título regenera también los campos del índice de búsqueda. Sin
+    campos no se escribe nada (ni cambian la versión ni los contadores): se devuelve el documento actual.
+
+    Parámetros:
+    - tipo (str): Tipo de elemento ('Libro', 'DVD' o 'Revista').
+    - subtipo_id (str): ID del documento del subtipo.
+    - cambios (dict): Campos enviados por el cliente con sus nuevos valores.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - dict | None: Documento actualizado con la forma del esquema de salida, o None si no existe
+      (o el ID no es válido).
+    """
+    if not ObjectId.is_valid(subtipo_id):
+        return None
+    if not cambios:
+        return await leer_con_elemento(tipo, subtipo_id, engine)
+    campos_elemento = {campo: valor for campo, valor in cambios.items() if campo in CAMPOS_ELEMENTO}
+    campos_subtipo = {campo: valor for campo, valor in cambios.items() if campo not in CAMPOS_ELEMENTO}
+    if 'titulo' in campos_elemento:
+        campos_elemento.update(campos_busqueda(campos_elemento['titulo']))
+    return await actualizar_con_elemento(tipo, subtipo_id, campos_subtipo, campos_elemento, engine)
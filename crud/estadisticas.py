@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from odmantic import AIOEngine
+from models.elemento import ElementoBiblioteca
+from models.libro import Libro
+from models.dvd import DVD
+from models.revista import Revista
+
+def _conteo(campo: str, origenes: list[str]) -> list[dict]:
+    return [
+        {'$match': {'_origen': {'$in': origenes}, campo: {'$ne': None}}},
+        {'$group': {'_id': f'${campo}', 'total': {'$sum': 1}}},
+        {'$sort': {'_id': 1}},
+    ]
+
+def etapas_estadisticas() -> list[dict]:
+    """
+    Agregación que calcula todos los conteos del catálogo en una sola consulta.
+
+    Parte de `ElementoBiblioteca` y añade con `$unionWith` solo los campos necesarios de `Libro`,
+    `DVD` y `Revista`; cada documento lleva en `_origen` la colección de la que procede. Un único
+    `$facet` agrupa después el total y los conteos por tipo, año, género, editorial y categoría.
+
+    Retorna:
+    - list[dict]: Etapas de la agregación.
+    """
+    return [
+        {'$project': {'_id': 0, 'tipo': 1, 'ano_publicacion': 1, '_origen': 'Elemento'}},
+        {'$unionWith': {'coll': Libro.__collection__, 'pipeline': [
+            {'$project': {'_id': 0, 'genero': 1, 'editorial': 1, '_origen': 'Libro'}},
+        ]}},
+        {'$unionWith': {'coll': DVD.__collection__, 'pipeline': [
+            {'$project': {'_id': 0, 'genero': 1, '_origen': 'DVD'}},
+        ]}},
+        {'$unionWith': {'coll': Revista.__collection__, 'pipeline': [
+            {'$project': {'_id': 0, 'categoria': 1, '_origen': 'Revista'}},
+        ]}},
+        {'$facet': {
+            'total': [{'$match': {'_origen': 'Elemento'}}, {'$count': 'total'}],
+            'por_tipo': _conteo('tipo', ['Elemento']),
+            'por_ano_publicacion': _conteo('ano_publicacion', ['Elemento']),
+            'por_genero': _conteo('genero', ['Libro', 'DVD']),
+            'por_editorial': _conteo('editorial', ['Libro']),
+            'por_categoria': _conteo('categoria', ['Revista']),
+        }},
+    ]
+
+async def calcular_estadisticas(engine: AIOEngine) -> dict:
+    """
+    Calcula los conteos del catálogo con una única agregación en el servidor.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - dict: Documento con la forma de `EstadisticasOut`.
+    """
+    cursor = engine.get_collection(ElementoBiblioteca).aggregate(etapas_estadisticas())
+    (facetas,) = await cursor.to_list(length=None)
+    estadisticas = {
+        nombre: {str(grupo['_id']): grupo['total'] for grupo in grupos}
+        for nombre, grupos in facetas.items()
+        if nombre != 'total'
+    }
+    estadisticas['total'] = facetas['total'][0]['total'] if facetas['total'] else 0
+    estadisticas['generado'] = datetime.now(timezone.utc)
+    return estadisticas
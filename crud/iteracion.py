@@ -0,0 +1,104 @@
+from odmantic import AIOEngine, Model
+from models.elemento import ElementoBiblioteca
+from crud.almacenamiento import EMBEBIDO, completar_embebidos, modelo_desde_documento
+from crud.agregacion import SUBTIPOS, etapas_detalle, etapas_elemento, etapas_embebido
+
+TAMANO_LOTE = 500
+
+async def iterar_con_elemento(modelo: type[Model], engine: AIOEngine, tamano_lote: int = TAMANO_LOTE):
+    """
+    Recorre toda la colección de un subtipo (Libro, DVD o Revista) resolviendo su elemento asociado.
+
+    A diferencia de `engine.find`, que acumula todos los resultados en memoria, esta función
+    consume el cursor de Motor por lotes y entrega cada documento en cuanto se convierte. En modo
+    embebido el elemento se reconstruye desde el propio documento, sin `$lookup`.
+
+    Parámetros:
+    - modelo (type[Model]): Modelo del subtipo a recorrer.
+    - engine (AIOEngine): Motor de base de datos.
+    - tamano_lote (int): Número de documentos que se piden al servidor en cada lote.
+
+    Retorna:
+    - AsyncIterator[Model]: Instancias del modelo en orden de `_id`.
+    """
+    if EMBEBIDO:
+        cursor = engine.get_collection(modelo).find({}, sort=[('_id', 1)], batch_size=tamano_lote)
+        async for documento in cursor:
+            for completo in await completar_embebidos([documento], engine):
+                yield modelo_desde_documento(modelo, completo)
+        return
+    pipeline = [
+        {'$sort': {'_id': 1}},
+        {'$lookup': {
+            'from': ElementoBiblioteca.__collection__,
+            'localField': 'elemento',
+            'foreignField': '_id',
+            'as': 'elemento',
+        }},
+        {'$unwind': '$elemento'},
+    ]
+    cursor = engine.get_collection(modelo).aggregate(pipeline, batchSize=tamano_lote)
+    async for documento in cursor:
+        yield modelo.model_validate_doc(documento)
+
+async def iterar_elementos(engine: AIOEngine, tamano_lote: int = TAMANO_LOTE):
+    """
+    Recorre toda la colección de elementos de biblioteca por lotes.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - tamano_lote (int): Número de documentos que se piden al servidor en cada lote.
+
+    Retorna:
+    - AsyncIterator[ElementoBiblioteca]: Elementos en orden de `_id`.
+    """
+    cursor = engine.get_collection(ElementoBiblioteca).find({}, sort=[('_id', 1)], batch_size=tamano_lote)
+    async for documento in cursor:
+        yield ElementoBiblioteca.model_validate_doc(documento)
+
+async def iterar_con_campos(
+    engine: AIOEngine,
+    campos: tuple[str, ...] | None,
+    tipo: str | None = None,
+    tamano_lote: int = TAMANO_LOTE,
+    sesion=None,
+):
+    """
+    Recorre por lotes todos los elementos (o los de un tipo) como diccionarios con la forma de su
+    esquema de salida, sin construir modelos de ODMantic.
+
+    En modo embebido los subtipos se leen de su propia colección, sin `$lookup`; los documentos
+    aún sin convertir toman los campos compartidos de su elemento con una consulta más.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - campos (tuple[str, ...] | None): Campos del esquema de salida a devolver; todos si es None.
+    - tipo (str | None): Tipo de elemento ('Libro', 'DVD' o 'Revista'), o None para `ElementoOut`.
+    - tamano_lote (int): Número de documentos que se piden al servidor en cada lote.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - AsyncIterator[dict]: Documentos con la forma (completa o recortada) del esquema de salida, en orden de `_id`.
+    """
+    if EMBEBIDO and tipo is not None:
+        etapas = etapas_embebido(tipo, campos)
+        orden = [campo for campo in etapas[0]['$project'] if campo not in ('_id', '_sin_migrar')]
+        pipeline = [{'$sort': {'_id': 1}}] + etapas
+        cursor = engine.get_collection(SUBTIPOS[tipo][0]).aggregate(pipeline, batchSize=tamano_lote, session=sesion)
+        elementos = engine.get_collection(ElementoBiblioteca)
+        async for documento in cursor:
+            elemento_id = documento.pop('_sin_migrar', None)
+            if elemento_id is not None:
+                # Documento aún sin convertir: los campos compartidos se leen de su elemento
+                elemento = await elementos.find_one({'_id': elemento_id}, session=sesion)
+                if elemento is None:
+                    continue
+                documento = {campo: documento.get(campo, elemento.get(campo)) for campo in orden}
+            yield documento
+        return
+    pipeline = [] if tipo is None else [{'$match': {'tipo': tipo}}]
+    pipeline.append({'$sort': {'_id': 1}})
+    pipeline += etapas_elemento(campos) if tipo is None else etapas_detalle(tipo, campos)
+    cursor = engine.get_collection(ElementoBiblioteca).aggregate(pipeline, batchSize=tamano_lote, session=sesion)
+    async for documento in cursor:
+        yield documento
@@ -1,31 +1,38 @@
 from odmantic import AIOEngine
 from models.elemento import ElementoBiblioteca
 from models.libro import Libro
-from schemas.libro import LibroCreate
+from schemas.libro import LibroCreate, LibroUpdate
+from schemas.paginacion import OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_BUSQUEDA
+from crud.iteracion import TAMANO_LOTE, iterar_con_elemento, iterar_con_campos
+from crud.busqueda import campos_busqueda, etapas_busqueda, normalizar
+from crud.agregacion import etapas_detalle
+from crud.lotes import insertar_lote
+from crud.escritura import insertar_con_elemento, actualizar_con_elemento, actualizar_campos, eliminar_con_elemento
+from crud.almacenamiento import buscar_subtipo, buscar_subtipos
+from crud.paginacion import paginar_elementos, paginar_con_campos, ordenar_como_elementos
+from crud.versiones import leer_cambios
 from bson import ObjectId
-import re
 
-async def crear_libro(libro_data: LibroCreate, engine: AIOEngine):
+def construir_libro(libro_data: LibroCreate) -> Libro:
     """
-    Crea un nuevo libro en el sistema.
+    Construye, sin guardarlo, un libro junto con su elemento de biblioteca.
 
-    Registra un nuevo elemento de tipo "Libro" en la base de datos, incluyendo su información
-    general y los detalles específicos del libro.
+    Los identificadores de ambos documentos quedan generados, por lo que el resultado puede
+    insertarse tanto de uno en uno como en bloque.
 
     Parámetros:
-    - libro_data (LibroCreate): Datos del libro a crear.
-    - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
+    - libro_data (LibroCreate): Datos del libro.
 
     Retorna:
-    - Libro: Objeto del libro creado.
+    - Libro: Libro con su `elemento` asignado.
     """
     elemento = ElementoBiblioteca(
         titulo=libro_data.titulo,
         autor=libro_data.autor,
         ano_publicacion=libro_data.ano_publicacion,
-        tipo="Libro"
+        tipo="Libro",
+        **campos_busqueda(libro_data.titulo)
     ) # type: ignore
-    await engine.save(elemento)
 
     libro = Libro(
         elemento=elemento,
@@ -34,44 +41,146 @@ async def crear_libro(libro_data: LibroCreate, engine: AIOEngine):
         genero=libro_data.genero,
         editorial=libro_data.editorial
     ) # type: ignore
-    await engine.save(libro)
     return libro
 
-async def listar_libros(engine: AIOEngine):
+async def crear_libro(libro_data: LibroCreate, engine: AIOEngine):
     """
-    Lista todos los libros registrados en el sistema.
+    Crea un nuevo libro en el sistema.
+
+    Registra un nuevo elemento de tipo "Libro" en la base de datos, incluyendo su información
+    general y los detalles específicos del libro.
 
     Parámetros:
+    - libro_data (LibroCreate): Datos del libro a crear.
     - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
 
     Retorna:
-    - List[Libro]: Lista de libros encontrados.
+    - Libro: Objeto del libro creado.
+
+    Errores:
+    - pymongo.errors.DuplicateKeyError: Si ya existe un libro con el mismo ISBN.
     """
-    return await engine.find(Libro)
+    libro = construir_libro(libro_data)
+    # Si el ISBN ya existe, el elemento recién creado se elimina para no dejarlo huérfano
+    await insertar_con_elemento(libro, engine)
+    return libro
 
-async def buscar_por_titulo(titulo: str, engine: AIOEngine):
+async def crear_libros(libros_data: list[LibroCreate], engine: AIOEngine, ids: list[tuple[ObjectId, ObjectId]] | None = None):
     """
-    Busca libros por título utilizando coincidencias parciales y sin distinguir mayúsculas.
+    Crea libros en bloque con dos escrituras `insert_many` sin orden.
 
     Parámetros:
-    - titulo (str): Título o fragmento del título del libro.
+    - libros_data (list[LibroCreate]): Datos de los libros a crear.
     - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
+    - ids (list[tuple[ObjectId, ObjectId]] | None): IDs de cada subtipo y su elemento; con ellos reenviar el lote no duplica nada.
 
     Retorna:
-    - List[Libro]: Libros coincidentes.
+    - list[dict]: Resultado por posición con el `id` creado o el `error` correspondiente.
+    """
+    return await insertar_lote([construir_libro(libro_data) for libro_data in libros_data], engine, ids)
+
+async def listar_libros(
+    engine: AIOEngine,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+):
     """
-    regex = re.compile(f".*{re.escape(titulo)}.*", re.IGNORECASE)
-    elementos = await engine.find(ElementoBiblioteca, {'titulo': {"$regex": regex}})
+    Lista una página de libros registrados en el sistema usando paginación por cursor.
 
+    La página se calcula sobre los elementos de tipo "Libro" y luego se resuelven los libros
+    que los referencian, de modo que nunca se carga la colección completa en memoria.
+
+    Parámetros:
+    - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
+    - limite (int): Número máximo de resultados de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenPaginacion): Campo de ordenación ('id', 'titulo' o 'ano_publicacion').
+
+    Retorna:
+    - tuple[List[Libro], str | None]: Libros de la página y cursor de la página siguiente.
+    """
+    elementos, siguiente_cursor = await paginar_elementos(engine, limite, cursor, orden, tipo="Libro")
     if not elementos:
-        return []
+        return [], siguiente_cursor
+    libros = await buscar_subtipos(Libro, Libro.elemento.in_([elemento.id for elemento in elementos]), engine)
+    return ordenar_como_elementos(libros, elementos), siguiente_cursor
 
-    # Extraer IDs de los elementos encontrados
-    elemento_ids = [elemento.id for elemento in elementos]
+def iterar_libros(engine: AIOEngine, tamano_lote: int = TAMANO_LOTE):
+    """
+    Recorre todos los libros del sistema sin cargarlos a la vez en memoria.
 
-    # Buscar libros que referencian esos elementos
-    libros = await engine.find(Libro, Libro.elemento.in_(elemento_ids))
-    return libros
+    Parámetros:
+    - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
+    - tamano_lote (int): Documentos por lote leído del cursor.
+
+    Retorna:
+    - AsyncIterator[Libro]: Libros en orden de inserción.
+    """
+    return iterar_con_elemento(Libro, engine, tamano_lote)
+
+async def listar_libros_con_campos(
+    engine: AIOEngine,
+    campos: tuple[str, ...] | None,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    sesion=None,
+):
+    """
+    Lista una página de libros como diccionarios con la forma de `LibroOut` (o solo los campos pedidos).
+
+    Parámetros:
+    - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
+    - campos (tuple[str, ...] | None): Campos de `LibroOut` a devolver; todos si es None.
+    - limite (int): Número máximo de resultados de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenPaginacion): Campo de ordenación ('id', 'titulo' o 'ano_publicacion').
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - tuple[List[dict], str | None]: Libros de la página y cursor de la página siguiente.
+    """
+    return await paginar_con_campos(engine, campos, limite, cursor, orden, tipo="Libro", sesion=sesion)
+
+def iterar_libros_con_campos(engine: AIOEngine, campos: tuple[str, ...] | None, tamano_lote: int = TAMANO_LOTE, sesion=None):
+    """
+    Recorre por lotes los libros del sistema como diccionarios con la forma de `LibroOut` (o solo los campos pedidos).
+
+    Parámetros:
+    - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
+    - campos (tuple[str, ...] | None): Campos de `LibroOut` a devolver; todos si es None.
+    - tamano_lote (int): Documentos por lote leído del cursor.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - AsyncIterator[dict]: Libros en orden de inserción.
+    """
+    return iterar_con_campos(engine, campos, "Libro", tamano_lote, sesion)
+
+async def buscar_por_titulo(
+    titulo: str,
+    engine: AIOEngine,
+    limite: int = LIMITE_BUSQUEDA,
+    campos: tuple[str, ...] | None = None,
+):
+    """
+    Busca libros por título utilizando coincidencias parciales, sin distinguir mayúsculas ni acentos.
+
+    Parámetros:
+    - titulo (str): Título o fragmento del título del libro.
+    - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
+    - limite (int): Número máximo de libros a devolver.
+    - campos (tuple[str, ...] | None): Campos de `LibroOut` a devolver; todos si es None.
+
+    Retorna:
+    - List[dict]: Libros coincidentes con la forma de `LibroOut`, ordenados por relevancia.
+    """
+    if not normalizar(titulo):
+        return []
+    # Una sola agregación: búsqueda por trigramas, unión con el libro y proyección a LibroOut
+    pipeline = etapas_busqueda(titulo, "Libro", limite, union=etapas_detalle("Libro", campos))
+    return await engine.get_collection(ElementoBiblioteca).aggregate(pipeline).to_list(length=None)
 
 async def buscar_por_isbn(isbn: str, engine: AIOEngine):
     """
@@ -84,7 +193,7 @@ async def buscar_por_isbn(isbn: str, engine: AIOEngine):
     Retorna:
     - Libro | None: Libro encontrado o None si no existe.
     """
-    return await engine.find_one(Libro, Libro.isbn == isbn)
+    return await buscar_subtipo(Libro, Libro.isbn == isbn, engine)
 
 async def buscar_por_id(libro_id: str, engine: AIOEngine):
     """
@@ -97,7 +206,7 @@ async def buscar_por_id(libro_id: str, engine: AIOEngine):
     Retorna:
     - Libro | None: Libro encontrado o None si no existe.
     """
-    return await engine.find_one(Libro, Libro.id == ObjectId(libro_id))
+    return await buscar_subtipo(Libro, Libro.id == ObjectId(libro_id), engine)
 
 async def actualizar_libro_por_id(libro_id: str, libro_data: LibroCreate, engine: AIOEngine):
     """
@@ -109,24 +218,49 @@ async def actualizar_libro_por_id(libro_id: str, libro_data: LibroCreate, engine
     - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
 
     Retorna:
-    - Libro | None: Libro actualizado o None si no se encontró.
+    - dict | None: Libro actualizado con la forma de `LibroOut`, o None si no se encontró.
+
+    Errores:
+    - pymongo.errors.DuplicateKeyError: Si el nuevo ISBN ya pertenece a otro libro.
     """
-    libro = await buscar_por_id(libro_id, engine)
-    if not libro:
-        return None
+    # Se actualiza primero el libro para que un ISBN duplicado falle antes de tocar el elemento
+    return await actualizar_con_elemento(
+        "Libro",
+        libro_id,
+        {
+            'isbn': libro_data.isbn,
+            'numero_paginas': libro_data.numero_paginas,
+            'genero': libro_data.genero,
+            'editorial': libro_data.editorial,
+        },
+        {
+            'titulo': libro_data.titulo,
+            'autor': libro_data.autor,
+            'ano_publicacion': libro_data.ano_publicacion,
+            **campos_busqueda(libro_data.titulo),
+        },
+        engine,
+    )
 
-    libro.elemento.titulo = libro_data.titulo
-    libro.elemento.autor = libro_data.autor
-    libro.elemento.ano_publicacion = libro_data.ano_publicacion
-    await engine.save(libro.elemento)
+async def actualizar_parcial_libro_por_id(libro_id: str, cambios: LibroUpdate, engine: AIOEngine):
+    """
+    Actualiza solo los campos enviados de un libro existente.
 
-    libro.isbn = libro_data.isbn
-    libro.numero_paginas = libro_data.numero_paginas
-    libro.genero = libro_data.genero
-    libro.editorial = libro_data.editorial
-    await engine.save(libro)
+    Los campos compartidos (título, autor y año) se escriben en el elemento únicamente si se envía
+    alguno de ellos; en caso contrario solo se modifica el documento del libro.
 
-    return libro
+    Parámetros:
+    - libro_id (str): ID del libro a actualizar.
+    - cambios (LibroUpdate): Campos a modificar.
+    - engine (AIOEngine): Instancia del motor de base de datos ODMantic.
+
+    Retorna:
+    - dict | None: Libro actualizado con la forma de `LibroOut`, o None si no fue encontrado.
+
+    Errores:
+    - pymongo.errors.DuplicateKeyError: Si el nuevo ISBN ya pertenece a otro libro.
+    """
+    return await actualizar_campos("Libro", libro_id, cambios.cambios(), engine)
 
 async def eliminar_libro_por_id(libro_id: str, engine: AIOEngine):
     """
@@ -139,9 +273,17 @@ async def eliminar_libro_por_id(libro_id: str, engine: AIOEngine):
     Retorna:
     - bool: True si fue eliminado exitosamente, False si no se encontró.
     """
-    libro = await buscar_por_id(libro_id, engine)
-    if not libro:
-        return False
-    await engine.delete(libro)
-    await engine.delete(libro.elemento)
-    return True
+    return await eliminar_con_elemento("Libro", libro_id, engine)
+
+async def contar_cambios(engine: AIOEngine, sesion=None) -> int:
+    """
+    Contador de cambios de la colección de libros, para el ETag de sus listados.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - int: Número de escrituras registradas en los libros.
+    """
+    return await leer_cambios(engine, Libro, sesion)
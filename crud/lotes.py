@@ -0,0 +1,105 @@
+from odmantic import AIOEngine, Model
+from pymongo.errors import BulkWriteError
+from models.elemento import ElementoBiblioteca
+from crud.almacenamiento import documento_subtipo
+from crud.autocompletado import indice_autocompletado
+from crud.versiones import registrar_cambios
+from bson import ObjectId
+
+def _describir_error(error: dict) -> str:
+    if error.get('code') == 11000:
+        claves = ', '.join(f'{campo}={valor}' for campo, valor in error.get('keyValue', {}).items())
+        return f'Clave duplicada: {claves}' if claves else 'Clave duplicada'
+    return error.get('errmsg', 'Error de escritura')
+
+async def _insertar_sin_orden(coleccion, documentos: list[dict]) -> dict[int, str]:
+    """
+    Inserta documentos con `insert_many(ordered=False)` y devuelve los errores por posición.
+    """
+    if not documentos:
+        return {}
+    try:
+        await coleccion.insert_many(documentos, ordered=False)
+    except BulkWriteError as e:
+        return {error['index']: _describir_error(error) for error in e.details.get('writeErrors', [])}
+    return {}
+
+async def _eliminar_huerfanos(coleccion, elementos, ids_elemento: list):
+    """
+    Elimina los elementos de la lista que no tienen ningún documento en la colección del subtipo.
+    """
+    cursor = coleccion.find({'elemento': {'$in': ids_elemento}}, {'elemento': 1})
+    con_subtipo = {documento['elemento'] async for documento in cursor}
+    huerfanos = [id_elemento for id_elemento in ids_elemento if id_elemento not in con_subtipo]
+    if huerfanos:
+        await elementos.delete_many({'_id': {'$in': huerfanos}})
+
+async def insertar_lote(
+    subtipos: list[Model],
+    engine: AIOEngine,
+    ids: list[tuple[ObjectId, ObjectId]] | None = None,
+) -> list[dict]:
+    """
+    Inserta en bloque documentos de un subtipo (Libro, DVD o Revista) junto con sus elementos.
+
+    Los identificadores ya vienen generados en los modelos, por lo que todo el lote se escribe con
+    dos `insert_many` sin orden: uno para los elementos y otro para los subtipos cuyo elemento se
+    insertó correctamente. Los elementos cuyo subtipo falla se eliminan para no dejar huérfanos.
+    Si una de las escrituras falla por otro motivo (también si la petición se cancela), no se
+    sabe qué documentos llegaron a escribirse: se eliminan los elementos del lote que no tienen
+    subtipo y se relanza el error.
+    Al terminar se añaden los elementos insertados al índice de autocompletado y se incrementan una
+    vez los contadores de cambios del subtipo y de los elementos.
+
+    Con `ids` la escritura es idempotente, para poder reenviar un lote que quizá ya se escribió
+    (como hace `importar.py` al reanudar): los documentos cuyo subtipo ya existe se dan por
+    creados sin volver a escribirlos, y los elementos que una ejecución interrumpida dejó sin
+    subtipo se eliminan antes de insertarlos de nuevo. Cuesta dos operaciones más por lote.
+
+    Parámetros:
+    - subtipos (list[Model]): Instancias del subtipo con su `elemento` asignado.
+    - engine (AIOEngine): Motor de base de datos.
+    - ids (list[tuple[ObjectId, ObjectId]] | None): IDs del subtipo y del elemento de cada
+      documento, en lugar de los generados en los modelos.
+
+    Retorna:
+    - list[dict]: Un resultado por documento con `indice` y, según el caso, `id` o `error`.
+
+    Errores:
+    - pymongo.errors.PyMongoError: Cualquier error de las escrituras distinto de los errores por
+      documento de `insert_many` se relanza, después de eliminar los elementos huérfanos.
+    """
+    if not subtipos:
+        return []
+    modelo = type(subtipos[0])
+    coleccion = engine.get_collection(modelo)
+    elementos = engine.get_collection(ElementoBiblioteca)
+    documentos = [documento_subtipo(subtipo) for subtipo in subtipos]
+    documentos_elemento = [subtipo.elemento.model_dump_doc() for subtipo in subtipos]
+    nuevos = list(range(len(subtipos)))
+    if ids is not None:
+        for documento, documento_elemento, (id_subtipo, id_elemento) in zip(documentos, documentos_elemento, ids):
+            documento['_id'], documento['elemento'] = id_subtipo, id_elemento
+            documento_elemento['_id'] = id_elemento
+        cursor = coleccion.find({'_id': {'$in': [documento['_id'] for documento in documentos]}}, {'_id': 1})
+        existentes = {documento['_id'] async for documento in cursor}
+        nuevos = [i for i in nuevos if documentos[i]['_id'] not in existentes]
+        await elementos.delete_many({'_id': {'$in': [documentos_elemento[i]['_id'] for i in nuevos]}})
+    try:
+        errores_elemento = await _insertar_sin_orden(elementos, [documentos_elemento[i] for i in nuevos])
+        errores = {nuevos[j]: mensaje for j, mensaje in errores_elemento.items()}
+        pendientes = [i for i in nuevos if i not in errores]
+        errores_subtipo = await _insertar_sin_orden(coleccion, [documentos[i] for i in pendientes])
+        if errores_subtipo:
+            huerfanos = [documentos_elemento[pendientes[j]]['_id'] for j in errores_subtipo]
+            await elementos.delete_many({'_id': {'$in': huerfanos}})
+            errores.update({pendientes[j]: mensaje for j, mensaje in errores_subtipo.items()})
+    except BaseException:
+        await _eliminar_huerfanos(coleccion, elementos, [documentos_elemento[i]['_id'] for i in nuevos])
+        raise
+    indice_autocompletado.agregar([documentos_elemento[i] for i in pendientes if i not in errores])
+    await registrar_cambios(engine, modelo, ElementoBiblioteca)
+    return [
+        {'indice': i, 'error': errores[i]} if i in errores else {'indice': i, 'id': str(documento['_id'])}
+        for i, documento in enumerate(documentos)
+    ]
@@ -0,0 +1,236 @@
+from odmantic import AIOEngine
+from models.elemento import ElementoBiblioteca
+from schemas.paginacion import OrdenPaginacion, LIMITE_POR_DEFECTO
+from crud.agregacion import CAMPOS_EMBEBIDOS, SUBTIPOS, etapas_detalle, etapas_elemento, etapas_embebido
+from crud.almacenamiento import EMBEBIDO
+from bson import json_util
+import base64
+import binascii
+
+ORDENES = {
+    'id': (ElementoBiblioteca.id,),
+    'titulo': (ElementoBiblioteca.titulo, ElementoBiblioteca.id),
+    'ano_publicacion': (ElementoBiblioteca.ano_publicacion, ElementoBiblioteca.id),
+}
+
+class CursorInvalido(ValueError):
+    """
+Error lanzado cuando el cursor recibido no se puede decodificar o no corresponde al orden pedido.
+    """
+
+def codificar_cursor(orden: OrdenPaginacion, elemento: ElementoBiblioteca) -> str:
+    """
+    Genera el cursor opaco que apunta justo después del elemento dado.
+
+    Parámetros:
+    - orden (OrdenPaginacion): Campo por el que se ordena el listado.
+    - elemento (ElementoBiblioteca): Último elemento de la página actual.
+
+    Retorna:
+    - str: Cursor codificado en base64 apto para URLs.
+    """
+    valor = None if orden == 'id' else getattr(elemento, orden)
+    return codificar_posicion(orden, valor, elemento.id)
+
+def codificar_posicion(orden: str, valor, ultimo_id) -> str:
+    """
+    Genera el cursor opaco a partir del valor de ordenación y del ID del último documento.
+    """
+    datos = json_util.dumps({'o': orden, 'v': valor, 'id': ultimo_id})
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor: str, orden: OrdenPaginacion):
+    """
+    Decodifica un cursor generado por `codificar_cursor`.
+
+    Parámetros:
+    - cursor (str): Cursor opaco recibido del cliente.
+    - orden (OrdenPaginacion): Orden solicitado en la petición actual.
+
+    Retorna:
+    - tuple: Valor del campo de orden y ObjectId del último elemento.
+
+    Errores:
+    - CursorInvalido: Si el cursor está mal formado o fue generado con otro orden.
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json_util.loads(base64.urlsafe_b64decode(cursor + relleno).decode())
+        orden_cursor, valor, ultimo_id = datos['o'], datos['v'], datos['id']
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise CursorInvalido('Cursor de paginación inválido')
+    if orden_cursor != orden:
+        raise CursorInvalido('El cursor no corresponde al orden solicitado')
+    return valor, ultimo_id
+
+def filtro_desde_cursor(orden: OrdenPaginacion, cursor: str | None) -> dict:
+    """
+    Construye el filtro keyset que selecciona los elementos posteriores al cursor.
+
+    Parámetros:
+    - orden (OrdenPaginacion): Campo por el que se ordena el listado.
+    - cursor (str | None): Cursor de la página anterior, o None para la primera página.
+
+    Retorna:
+    - dict: Filtro de MongoDB (vacío si no hay cursor).
+    """
+    if cursor is None:
+        return {}
+    valor, ultimo_id = decodificar_cursor(cursor, orden)
+    if orden == 'id':
+        return {'_id': {'$gt': ultimo_id}}
+    return {'$or': [
+        {orden: {'$gt': valor}},
+        {orden: valor, '_id': {'$gt': ultimo_id}},
+    ]}
+
+def _consulta(orden: OrdenPaginacion, cursor: str | None, tipo: str | None) -> dict:
+    filtros = [filtro_desde_cursor(orden, cursor)]
+    if tipo is not None:
+        filtros.append({'tipo': tipo})
+    return {'$and': filtros} if len(filtros) > 1 else filtros[0]
+
+async def paginar_elementos(
+    engine: AIOEngine,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    tipo: str | None = None,
+):
+    """
+    Obtiene una página de elementos de biblioteca usando paginación keyset.
+
+    La consulta se resuelve con los índices `(tipo, <orden>, _id)` / `(<orden>, _id)` declarados
+    en `ElementoBiblioteca`, por lo que su coste no depende de la posición de la página.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - limite (int): Número máximo de elementos de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenPaginacion): Campo de ordenación ('id', 'titulo' o 'ano_publicacion').
+    - tipo (str | None): Si se indica, limita el listado a un tipo de elemento.
+
+    Retorna:
+    - tuple[list[ElementoBiblioteca], str | None]: Elementos de la página y cursor de la siguiente.
+    """
+    elementos = await engine.find(
+        ElementoBiblioteca, _consulta(orden, cursor, tipo), sort=ORDENES[orden], limit=limite + 1
+    )
+    if len(elementos) <= limite:
+        return elementos, None
+    elementos = elementos[:limite]
+    return elementos, codificar_cursor(orden, elementos[-1])
+
+def ordenar_como_elementos(documentos: list, elementos: list[ElementoBiblioteca]) -> list:
+    """
+    Reordena documentos de un subtipo (Libro, DVD, Revista) según el orden de sus elementos.
+
+    Parámetros:
+    - documentos (list): Documentos del subtipo con el atributo `elemento` ya resuelto.
+    - elementos (list[ElementoBiblioteca]): Elementos en el orden de la página.
+
+    Retorna:
+    - list: Documentos ordenados igual que `elementos`.
+    """
+    posiciones = {elemento.id: i for i, elemento in enumerate(elementos)}
+    return sorted(documentos, key=lambda documento: posiciones[documento.elemento.id])
+
+async def paginar_con_campos(
+    engine: AIOEngine,
+    campos: tuple[str, ...] | None,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    tipo: str | None = None,
+    sesion=None,
+):
+    """
+    Obtiene una página con la forma del esquema de salida (o solo los campos pedidos), en una única agregación.
+
+    Sigue la misma paginación keyset que `paginar_elementos`; si se indica un tipo, la página se une
+    con su subtipo mediante un `$lookup` que solo trae los campos pedidos. En modo embebido, el
+    listado de un tipo ordenado por id se lee directamente de la colección del subtipo (ver
+    `_paginar_embebido`); los demás órdenes necesitan los índices de `ElementoBiblioteca`.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - campos (tuple[str, ...] | None): Campos del esquema de salida a devolver; todos si es None.
+    - limite (int): Número máximo de documentos de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenPaginacion): Campo de ordenación ('id', 'titulo' o 'ano_publicacion').
+    - tipo (str | None): Tipo de elemento ('Libro', 'DVD' o 'Revista'), o None para `ElementoOut`.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - tuple[list[dict], str | None]: Documentos de la página y cursor de la siguiente.
+    """
+    if EMBEBIDO and tipo is not None and orden == 'id':
+        return await _paginar_embebido(engine, campos, limite, cursor, tipo, sesion)
+    marca = {'id': '$_id'}
+    if orden != 'id':
+        marca['v'] = f'${orden}'
+    if tipo is None:
+        proyeccion = etapas_elemento(campos, extra={'_cursor': marca})
+    else:
+        # Los elementos sin subtipo se conservan para que no alteren el cálculo del cursor
+        marca['huerfano'] = {'$not': ['$detalle']}
+        proyeccion = etapas_detalle(tipo, campos, extra={'_cursor': marca}, conservar_huerfanos=True)
+    pipeline = [
+        {'$match': _consulta(orden, cursor, tipo)},
+        {'$sort': {'_id': 1} if orden == 'id' else {orden: 1, '_id': 1}},
+        {'$limit': limite + 1},
+    ] + proyeccion
+    documentos = await engine.get_collection(ElementoBiblioteca).aggregate(pipeline, session=sesion).to_list(length=None)
+    siguiente_cursor = None
+    if len(documentos) > limite:
+        documentos = documentos[:limite]
+        ultimo = documentos[-1]['_cursor']
+        siguiente_cursor = codificar_posicion(orden, ultimo.get('v'), ultimo['id'])
+    marcas = [documento.pop('_cursor') for documento in documentos]
+    return [documento for documento, marca in zip(documentos, marcas) if not marca.get('huerfano')], siguiente_cursor
+
+async def _paginar_embebido(
+    engine: AIOEngine,
+    campos: tuple[str, ...] | None,
+    limite: int,
+    cursor: str | None,
+    tipo: str,
+    sesion=None,
+):
+    """
+    Obtiene una página de un tipo ordenada por id desde la colección de su subtipo, sin `$lookup`.
+
+    El cursor apunta al `_id` del subtipo, que se recorre con su índice. Los documentos aún sin
+    convertir toman los campos compartidos de sus elementos, con una sola consulta por página, y
+    los que no tienen elemento se descartan como en el modo 'referencia'.
+    """
+    etapas = etapas_embebido(tipo, campos)
+    orden_campos = [campo for campo in etapas[0]['$project'] if campo not in ('_id', '_sin_migrar')]
+    etapas[0]['$project']['_cursor'] = '$_id'
+    pipeline = [
+        {'$match': filtro_desde_cursor('id', cursor)},
+        {'$sort': {'_id': 1}},
+        {'$limit': limite + 1},
+    ] + etapas
+    documentos = await engine.get_collection(SUBTIPOS[tipo][0]).aggregate(pipeline, session=sesion).to_list(length=None)
+    siguiente_cursor = None
+    if len(documentos) > limite:
+        documentos = documentos[:limite]
+        siguiente_cursor = codificar_posicion('id', None, documentos[-1]['_cursor'])
+    pendientes = [documento['_sin_migrar'] for documento in documentos if '_sin_migrar' in documento]
+    elementos = {}
+    if pendientes:
+        proyeccion = {campo: 1 for campo in CAMPOS_EMBEBIDOS}
+        consulta = engine.get_collection(ElementoBiblioteca).find({'_id': {'$in': pendientes}}, proyeccion, session=sesion)
+        elementos = {elemento['_id']: elemento async for elemento in consulta}
+    pagina = []
+    for documento in documentos:
+        del documento['_cursor']
+        elemento_id = documento.pop('_sin_migrar', None)
+        if elemento_id is not None:
+            elemento = elementos.get(elemento_id)
+            if elemento is None:
+                continue
+            documento = {campo: documento.get(campo, elemento.get(campo)) for campo in orden_campos}
+        pagina.append(documento)
+    return pagina, siguiente_cursor
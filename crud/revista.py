@@ -1,69 +1,176 @@
 from odmantic import AIOEngine
 from models.elemento import ElementoBiblioteca
 from models.revista import Revista
-from schemas.revista import RevistaCreate
+from schemas.revista import RevistaCreate, RevistaUpdate
+from schemas.paginacion import OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_BUSQUEDA
+from crud.iteracion import TAMANO_LOTE, iterar_con_elemento, iterar_con_campos
+from crud.busqueda import campos_busqueda, etapas_busqueda, normalizar
+from crud.agregacion import etapas_detalle
+from crud.lotes import insertar_lote
+from crud.escritura import insertar_con_elemento, actualizar_con_elemento, actualizar_campos, eliminar_con_elemento
+from crud.almacenamiento import buscar_subtipo, buscar_subtipos
+from crud.paginacion import paginar_elementos, paginar_con_campos, ordenar_como_elementos
+from crud.versiones import leer_cambios
 from bson import ObjectId
 import re
 
-async def crear_revista(revista_data: RevistaCreate, engine: AIOEngine):
+def construir_revista(revista_data: RevistaCreate) -> Revista:
     """
-    Crea una nueva revista en el sistema.
-
-    Registra un nuevo elemento de tipo "Revista" junto con sus datos específicos.
+    Construye, sin guardarlo, una revista junto con su elemento de biblioteca.
 
     Parámetros:
     - revista_data (RevistaCreate): Datos de la revista.
-    - engine (AIOEngine): Motor de base de datos.
 
     Retorna:
-    - Revista: Revista creada exitosamente.
+    - Revista: Revista con su `elemento` asignado.
     """
     elemento = ElementoBiblioteca(
         titulo = revista_data.titulo,
         autor = revista_data.autor,
         ano_publicacion= revista_data.ano_publicacion,
-        tipo="Revista"
+        tipo="Revista",
+        **campos_busqueda(revista_data.titulo)
     ) # type: ignore
-    await engine.save(elemento)
-    
+
     revista = Revista(
         elemento=elemento,
         numero_edicion= revista_data.numero_edicion,
         categoria= revista_data.categoria
     ) # type: ignore
-    await engine.save(revista)
     return revista
 
-async def listar_revistas(engine: AIOEngine):
+async def crear_revista(revista_data: RevistaCreate, engine: AIOEngine):
+    """
+    Crea una nueva revista en el sistema.
+
+    Registra un nuevo elemento de tipo "Revista" junto con sus datos específicos.
+
+    Parámetros:
+    - revista_data (RevistaCreate): Datos de la revista.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - Revista: Revista creada exitosamente.
+    """
+    revista = construir_revista(revista_data)
+    await insertar_con_elemento(revista, engine)
+    return revista
+
+async def crear_revistas(revistas_data: list[RevistaCreate], engine: AIOEngine, ids: list[tuple[ObjectId, ObjectId]] | None = None):
+    """
+    Crea revistas en bloque con dos escrituras `insert_many` sin orden.
+
+    Parámetros:
+    - revistas_data (list[RevistaCreate]): Datos de las revistas a crear.
+    - engine (AIOEngine): Motor de base de datos.
+    - ids (list[tuple[ObjectId, ObjectId]] | None): IDs de cada subtipo y su elemento; con ellos reenviar el lote no duplica nada.
+
+    Retorna:
+    - list[dict]: Resultado por posición con el `id` creado o el `error` correspondiente.
+    """
+    return await insertar_lote([construir_revista(revista_data) for revista_data in revistas_data], engine, ids)
+
+async def listar_revistas(
+    engine: AIOEngine,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+):
     """
-    Lista todas las revistas registradas en el sistema.
+    Lista una página de revistas registradas en el sistema.
+
+    Pagina por cursor sobre los elementos de tipo "Revista" y después recupera solo las revistas
+    asociadas a esos elementos.
 
     Parámetros:
     - engine (AIOEngine): Motor de base de datos.
+    - limite (int): Número máximo de resultados de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenPaginacion): Campo de ordenación ('id', 'titulo' o 'ano_publicacion').
 
     Retorna:
-    - List[Revista]: Lista de revistas.
+    - tuple[List[Revista], str | None]: Revistas de la página y cursor de la página siguiente.
+    """
+    elementos, siguiente_cursor = await paginar_elementos(engine, limite, cursor, orden, tipo="Revista")
+    if not elementos:
+        return [], siguiente_cursor
+    revistas = await buscar_subtipos(Revista, Revista.elemento.in_([elemento.id for elemento in elementos]), engine)
+    return ordenar_como_elementos(revistas, elementos), siguiente_cursor
+
+def iterar_revistas(engine: AIOEngine, tamano_lote: int = TAMANO_LOTE):
     """
-    return await engine.find(Revista)
+    Recorre todos los revistas del sistema sin cargarlos a la vez en memoria.
 
-async def buscar_por_titulo(titulo: str, engine: AIOEngine):
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - tamano_lote (int): Documentos por lote leído del cursor.
+
+    Retorna:
+    - AsyncIterator[Revista]: Revistas en orden de inserción.
+    """
+    return iterar_con_elemento(Revista, engine, tamano_lote)
+
+async def listar_revistas_con_campos(
+    engine: AIOEngine,
+    campos: tuple[str, ...] | None,
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    sesion=None,
+):
+    """
+    Lista una página de revistas como diccionarios con la forma de `RevistaOut` (o solo los campos pedidos).
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - campos (tuple[str, ...] | None): Campos de `RevistaOut` a devolver; todos si es None.
+    - limite (int): Número máximo de resultados de la página.
+    - cursor (str | None): Cursor devuelto por la página anterior.
+    - orden (OrdenPaginacion): Campo de ordenación ('id', 'titulo' o 'ano_publicacion').
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - tuple[List[dict], str | None]: Revistas de la página y cursor de la página siguiente.
+    """
+    return await paginar_con_campos(engine, campos, limite, cursor, orden, tipo="Revista", sesion=sesion)
+
+def iterar_revistas_con_campos(engine: AIOEngine, campos: tuple[str, ...] | None, tamano_lote: int = TAMANO_LOTE, sesion=None):
+    """
+    Recorre por lotes las revistas del sistema como diccionarios con la forma de `RevistaOut` (o solo los campos pedidos).
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - campos (tuple[str, ...] | None): Campos de `RevistaOut` a devolver; todos si es None.
+    - tamano_lote (int): Documentos por lote leído del cursor.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - AsyncIterator[dict]: Revistas en orden de inserción.
+    """
+    return iterar_con_campos(engine, campos, "Revista", tamano_lote, sesion)
+
+async def buscar_por_titulo(
+    titulo: str,
+    engine: AIOEngine,
+    limite: int = LIMITE_BUSQUEDA,
+    campos: tuple[str, ...] | None = None,
+):
     """
     Busca revistas cuyo título coincida total o parcialmente.
 
     Parámetros:
     - titulo (str): Título o fragmento del título.
     - engine (AIOEngine): Motor de base de datos.
+    - limite (int): Número máximo de revistas a devolver.
+    - campos (tuple[str, ...] | None): Campos de `RevistaOut` a devolver; todos si es None.
 
     Retorna:
-    - List[Revista]: Revistas encontradas.
+    - List[dict]: Revistas encontradas con la forma de `RevistaOut`, de la más a la menos relevante.
     """
-    regex = re.compile(f".*{re.escape(titulo)}.*", re.IGNORECASE)
-    elementos = await engine.find(ElementoBiblioteca, {'titulo': {"$regex": regex}})
-    if not elementos:
+    if not normalizar(titulo):
         return []
-    elementos_ids = [elemento.id for elemento in elementos]
-    revistas = await engine.find(Revista, Revista.elemento.in_(elementos_ids))
-    return revistas
+    pipeline = etapas_busqueda(titulo, "Revista", limite, union=etapas_detalle("Revista", campos))
+    return await engine.get_collection(ElementoBiblioteca).aggregate(pipeline).to_list(length=None)
 
 async def buscar_por_categoria(categoria: str, engine: AIOEngine):
     """
@@ -77,7 +184,7 @@ async def buscar_por_categoria(categoria: str, engine: AIOEngine):
     - List[Revista]: Lista de revistas que coinciden.
     """
     regex = re.compile(f".*{re.escape(categoria)}.*", re.IGNORECASE)
-    revistas = await engine.find(Revista, {'categoria': {"$regex": regex}})
+    revistas = await buscar_subtipos(Revista, {'categoria': {"$regex": regex}}, engine)
     if not revistas:
         return []
     
@@ -94,7 +201,7 @@ async def buscar_por_id(revista_id: str, engine: AIOEngine):
     Retorna:
     - Revista | None: Revista encontrada o None.
     """
-    return await engine.find_one(Revista, Revista.id == ObjectId(revista_id))
+    return await buscar_subtipo(Revista, Revista.id == ObjectId(revista_id), engine)
 
 async def actualizar_por_id(revista_id: str, revista_data: RevistaCreate, engine: AIOEngine):
     """
@@ -106,21 +213,37 @@ async def actualizar_por_id(revista_id: str, revista_data: RevistaCreate, engine
     - engine (AIOEngine): Motor de base de datos.
 
     Retorna:
-    - Revista | None: Revista actualizada o None si no fue encontrada.
+    - dict | None: Revista actualizada con la forma de `RevistaOut`, o None si no fue encontrada.
     """
-    revista = await buscar_por_id(revista_id, engine)
-    if not revista:
-        return None
-    
-    revista.elemento.titulo = revista_data.titulo
-    revista.elemento.autor = revista_data.autor
-    revista.elemento.ano_publicacion = revista_data.ano_publicacion
-    await engine.save(revista.elemento)
-    
-    revista.categoria = revista_data.categoria
-    revista.numero_edicion = revista_data.numero_edicion
-    await engine.save(revista)
-    return revista
+    return await actualizar_con_elemento(
+        "Revista",
+        revista_id,
+        {'categoria': revista_data.categoria, 'numero_edicion': revista_data.numero_edicion},
+        {
+            'titulo': revista_data.titulo,
+            'autor': revista_data.autor,
+            'ano_publicacion': revista_data.ano_publicacion,
+            **campos_busqueda(revista_data.titulo),
+        },
+        engine,
+    )
+
+async def actualizar_parcial_por_id(revista_id: str, cambios: RevistaUpdate, engine: AIOEngine):
+    """
+    Actualiza solo los campos enviados de una revista existente.
+
+    Los campos compartidos (título, autor y año) se escriben en el elemento únicamente si se envía
+    alguno de ellos; en caso contrario solo se modifica el documento de la revista.
+
+    Parámetros:
+    - revista_id (str): ID de la revista a actualizar.
+    - cambios (RevistaUpdate): Campos a modificar.
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - dict | None: Revista actualizada con la forma de `RevistaOut`, o None si no fue encontrada.
+    """
+    return await actualizar_campos("Revista", revista_id, cambios.cambios(), engine)
 
 async def eliminar_revista_por_id(revista_id: str, engine: AIOEngine):
     """
@@ -133,9 +256,17 @@ async def eliminar_revista_por_id(revista_id: str, engine: AIOEngine):
     Retorna:
     - bool: True si fue eliminada correctamente, False si no existe.
     """
-    revista = await buscar_por_id(revista_id, engine)
-    if not revista:
-        return False
-    await engine.delete(revista)
-    await engine.delete(revista.elemento)
-    return True
\ No newline at end of file
+    return await eliminar_con_elemento("Revista", revista_id, engine)
+
+async def contar_cambios(engine: AIOEngine, sesion=None) -> int:
+    """
+    Contador de cambios de la colección de revistas, para el ETag de sus listados.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - int: Número de escrituras registradas en las revistas.
+    """
+    return await leer_cambios(engine, Revista, sesion)
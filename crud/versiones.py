@@ -0,0 +1,62 @@
+"""
+Versiones de documentos y contadores de cambios por colección, para los ETag de la API.
+
+- Cada Libro, DVD o Revista guarda en `version` el número de veces que se ha modificado; las
+  escrituras de `crud/escritura.py` lo incrementan con `$inc` en la misma operación que cambia
+  el documento (también cuando solo cambia su `ElementoBiblioteca`). Las consultas por ID o ISBN
+  la leen del mismo documento que devuelven, y la caché la guarda junto a él.
+- La colección `cambios` guarda un contador por colección (`{_id: <colección>, cambios: n}`) que
+  las rutas de escritura incrementan después de cada inserción, modificación o eliminación.
+
+Los contadores se incrementan después de escribir y las lecturas leen el contador antes que los
+datos, de modo que nunca se etiquetan datos antiguos con un contador que ya cuenta una escritura
+posterior: en el peor caso la etiqueta se queda atrás y el cliente vuelve a descargar una
+respuesta que no había cambiado. Cuando los listados se leen de los secundarios, el contador y
+los datos pueden venir de nodos distintos; por eso ambos se leen en sesiones con consistencia
+causal (`database.sesion_causal`), que obligan a la lectura de los datos a ver al menos el
+estado en que se leyó el contador.
+
+El contador no se incrementa en la misma transacción que la escritura (la API también funciona
+con un servidor standalone, sin transacciones), así que cada escritura hace una operación más
+contra la base de datos y entre ambas hay una ventana en la que el listado ya ha cambiado pero
+el contador no: un `If-None-Match` con la etiqueta anterior recibe un `304` durante ese tiempo.
+Si el proceso cae entre la escritura y el incremento, el contador se queda atrás hasta la
+siguiente escritura en la colección.
+"""
+from odmantic import AIOEngine, Model
+from pymongo import UpdateOne
+
+COLECCION_CAMBIOS = 'cambios'
+
+async def registrar_cambios(engine: AIOEngine, *modelos: type[Model]):
+    """
+    Incrementa el contador de cambios de las colecciones de los modelos, con una sola operación.
+
+    Debe llamarse después de la escritura, nunca antes; es una operación adicional a la escritura
+    y no forma parte de ella (ver la ventana descrita en el módulo).
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - modelos (type[Model]): Modelos cuyas colecciones han cambiado.
+    """
+    operaciones = [
+        UpdateOne({'_id': modelo.__collection__}, {'$inc': {'cambios': 1}}, upsert=True)
+        for modelo in dict.fromkeys(modelos)
+    ]
+    if operaciones:
+        await engine.database[COLECCION_CAMBIOS].bulk_write(operaciones, ordered=False)
+
+async def leer_cambios(engine: AIOEngine, modelo: type[Model], sesion=None) -> int:
+    """
+    Contador de cambios de la colección de un modelo.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - modelo (type[Model]): Modelo de la colección.
+    - sesion: Sesión de MongoDB en la que se lee, o None.
+
+    Retorna:
+    - int: Número de escrituras registradas (0 si la colección nunca se ha modificado).
+    """
+    documento = await engine.database[COLECCION_CAMBIOS].find_one({'_id': modelo.__collection__}, session=sesion)
+    return 0 if documento is None else documento['cambios']
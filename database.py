@@ -1,22 +1,232 @@
-
+from contextlib import asynccontextmanager
 from odmantic import AIOEngine
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 from dotenv import load_dotenv
+from services.metricas import METRICAS, monitor_comandos
+from services.consultas_lentas import CONSULTAS_LENTAS_MS, monitor_consultas_lentas
+import asyncio
 import os
 
 load_dotenv()
 
 URI = os.getenv('URI')
-if URI is None:
-    raise ValueError('La variable de entorno URI no está definida')
-# Create a new client and connect to the server
-client = AsyncIOMotorClient(URI)
-engine = AIOEngine(client=client, database='biblioteca')
-"""
-# Send a ping to confirm a successful connection
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
-"""
\ No newline at end of file
+BASE_DE_DATOS = os.getenv('BASE_DE_DATOS', 'biblioteca')
+
+# Almacenamiento de los datos:
+# - 'mongodb' (por defecto): el servidor indicado en URI.
+# - 'memoria': colecciones en memoria del propio proceso (ver `database_memoria.py`), sin
+#   servidor; los datos se pierden al cerrar. Pensado para pruebas, benchmarks y réplicas de solo lectura.
+BACKEND = os.getenv('BACKEND', 'mongodb')
+if BACKEND not in ('mongodb', 'memoria'):
+    raise ValueError(f'Backend de almacenamiento desconocido: {BACKEND}')
+
+# Disposición de los documentos de Libro, DVD y Revista:
+# - 'referencia': el subtipo solo guarda el ID de su ElementoBiblioteca.
+# - 'embebido': el subtipo guarda además una copia de titulo, autor, ano_publicacion y tipo,
+#   de modo que sus lecturas no necesitan resolver la referencia.
+# Antes de cambiar de modo hay que convertir los datos con `python -m migrar_almacenamiento`.
+ALMACENAMIENTO = os.getenv('ALMACENAMIENTO', 'referencia')
+if ALMACENAMIENTO not in ('referencia', 'embebido'):
+    raise ValueError(f'Modo de almacenamiento desconocido: {ALMACENAMIENTO}')
+
+# Pool de conexiones y compresión del protocolo
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '0'))  # 0: sin límite
+MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')  # p. ej. 'zstd,zlib'; zstd requiere el paquete `zstandard`
+
+# Lecturas que pueden ir a los secundarios del replica set. Las clases de endpoint son:
+# - 'listado': listados paginados y exportaciones NDJSON.
+# - 'busqueda': búsquedas por título, género o categoría.
+# - 'consulta': búsquedas por ID o ISBN. Por defecto van al primario porque se usan justo
+#   después de escribir y su resultado se guarda en caché durante CACHE_TTL segundos.
+# - 'estadisticas': conteos de /elementos/estadisticas.
+# Las escrituras, y las respuestas que devuelven, siempre usan el primario.
+CLASES_LECTURA = ('listado', 'busqueda', 'consulta', 'estadisticas')
+MONGO_PREFERENCIA_LECTURA = os.getenv('MONGO_PREFERENCIA_LECTURA', 'secondaryPreferred')
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', '90'))  # mínimo 90; -1: sin límite
+MONGO_LECTURA_SECUNDARIA = {
+    clase.strip() for clase in os.getenv('MONGO_LECTURA_SECUNDARIA', 'listado,busqueda,estadisticas').split(',') if clase.strip()
+}
+if not MONGO_LECTURA_SECUNDARIA <= set(CLASES_LECTURA):
+    raise ValueError(f'MONGO_LECTURA_SECUNDARIA solo admite: {", ".join(CLASES_LECTURA)}')
+
+PREFERENCIAS = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+client: AsyncIOMotorClient | None = None
+engine: AIOEngine | None = None
+engine_lectura: AIOEngine | None = None
+
+def opciones_cliente() -> dict:
+    """
+    Opciones del cliente de MongoDB tomadas de las variables de entorno.
+
+    Retorna:
+    - dict: Argumentos para `AsyncIOMotorClient`.
+    """
+    opciones = {'maxPoolSize': MONGO_MAX_POOL_SIZE, 'minPoolSize': MONGO_MIN_POOL_SIZE}
+    if MONGO_MAX_IDLE_TIME_MS:
+        opciones['maxIdleTimeMS'] = MONGO_MAX_IDLE_TIME_MS
+    if MONGO_COMPRESSORS:
+        opciones['compressors'] = MONGO_COMPRESSORS
+    listeners = []
+    if METRICAS:
+        listeners.append(monitor_comandos)
+    if CONSULTAS_LENTAS_MS > 0:
+        listeners.append(monitor_consultas_lentas)
+    if listeners:
+        opciones['event_listeners'] = listeners
+    return opciones
+
+def preferencia_lectura():
+    """
+    Preferencia de lectura del motor de lecturas, según `MONGO_PREFERENCIA_LECTURA`.
+
+    Errores:
+    - ValueError: Si el modo no es uno de los de MongoDB.
+    """
+    if MONGO_PREFERENCIA_LECTURA not in PREFERENCIAS:
+        raise ValueError(f'Preferencia de lectura desconocida: {MONGO_PREFERENCIA_LECTURA}')
+    if MONGO_PREFERENCIA_LECTURA == 'primary':
+        return Primary()
+    return PREFERENCIAS[MONGO_PREFERENCIA_LECTURA](max_staleness=MONGO_MAX_STALENESS_SECONDS)
+
+async def calentar(cliente: AsyncIOMotorClient, conexiones: int = max(MONGO_MIN_POOL_SIZE, 1)):
+    """
+    Abre conexiones del pool enviando pings simultáneos, para que las primeras peticiones
+    no paguen el establecimiento de la conexión.
+
+    Parámetros:
+    - cliente (AsyncIOMotorClient): Cliente recién creado.
+    - conexiones (int): Número de pings en paralelo (por defecto, `MONGO_MIN_POOL_SIZE`).
+
+    Errores:
+    - pymongo.errors.PyMongoError: Si el servidor no responde.
+    """
+    await asyncio.gather(*(cliente.admin.command('ping') for _ in range(conexiones)))
+
+async def conectar() -> AIOEngine:
+    """
+    Crea el cliente de MongoDB, calienta su pool y publica los motores de ODMantic.
+
+    Ambos motores comparten el cliente (y su pool): el de escritura usa el primario y el de
+    lectura la preferencia configurada. Con `BACKEND=memoria` el cliente es un `ClienteMemoria` y
+    los dos motores son el mismo.
+
+    Retorna:
+    - AIOEngine: Motor de escritura listo para usarse.
+
+    Errores:
+    - ValueError: Si la variable de entorno URI no está definida (con el backend de MongoDB).
+    """
+    global client, engine, engine_lectura
+    if engine is not None:
+        return engine
+    if BACKEND == 'memoria':
+        from database_memoria import ClienteMemoria
+        client = ClienteMemoria()
+        engine = engine_lectura = AIOEngine(client=client, database=BASE_DE_DATOS)
+        return engine
+    if URI is None:
+        raise ValueError('La variable de entorno URI no está definida')
+    lectura = preferencia_lectura()
+    nuevo_cliente = AsyncIOMotorClient(URI, **opciones_cliente())
+    try:
+        await calentar(nuevo_cliente)
+    except Exception:
+        nuevo_cliente.close()
+        raise
+    client = nuevo_cliente
+    engine = AIOEngine(client=client, database=BASE_DE_DATOS)
+    engine_lectura = AIOEngine(client=client, database=BASE_DE_DATOS)
+    engine_lectura.database = client.get_database(BASE_DE_DATOS, read_preference=lectura)
+    return engine
+
+def desconectar():
+    """
+    Cierra el cliente de MongoDB y sus conexiones.
+    """
+    global client, engine, engine_lectura
+    if client is not None:
+        client.close()
+    client = engine = engine_lectura = None
+
+def obtener_engine(clase: str | None = None) -> AIOEngine:
+    """
+    Devuelve el motor de ODMantic que corresponde a una operación.
+
+    Parámetros:
+    - clase (str | None): Clase de lectura (ver `CLASES_LECTURA`), o None para escrituras y
+      lecturas que deben ver las escrituras previas.
+
+    Retorna:
+    - AIOEngine: Motor de lectura si la clase está en `MONGO_LECTURA_SECUNDARIA`; si no, el del primario.
+
+    Errores:
+    - RuntimeError: Si todavía no se llamó a `conectar()`.
+    - ValueError: Si la clase no existe.
+    """
+    if engine is None:
+        raise RuntimeError('La conexión con MongoDB no está abierta')
+    if clase is None:
+        return engine
+    if clase not in CLASES_LECTURA:
+        raise ValueError(f'Clase de lectura desconocida: {clase}')
+    return engine_lectura if clase in MONGO_LECTURA_SECUNDARIA else engine
+
+@asynccontextmanager
+async def sesion_causal(despues_de: tuple | None = None):
+    """
+    Abre una sesión de MongoDB con consistencia causal durante el bloque `async with`.
+
+    Las lecturas de la sesión ven al menos el estado que vieron las anteriores, aunque cada una
+    vaya a un secundario distinto (el servidor espera a haber replicado hasta ese punto). Con
+    `despues_de` la sesión continúa la de otra lectura ya terminada.
+
+    Parámetros:
+    - despues_de (tuple | None): Marca de otra sesión, obtenida con `marca_causal`.
+
+    Retorna:
+    - La sesión, para pasarla como `session` a las operaciones.
+    """
+    if client is None:
+        raise RuntimeError('La conexión con MongoDB no está abierta')
+    sesion = await client.start_session(causal_consistency=True)
+    try:
+        if despues_de is not None:
+            tiempo_cluster, tiempo_operacion = despues_de
+            # Un servidor sin replica set no devuelve estos tiempos
+            if tiempo_cluster is not None:
+                sesion.advance_cluster_time(tiempo_cluster)
+            if tiempo_operacion is not None:
+                sesion.advance_operation_time(tiempo_operacion)
+        yield sesion
+    finally:
+        await sesion.end_session()
+
+def marca_causal(sesion) -> tuple:
+    """
+    Punto de la historia de la base de datos que alcanzaron las lecturas de una sesión.
+
+    Retorna:
+    - tuple: Tiempos de clúster y de operación, para `sesion_causal(despues_de=...)`.
+    """
+    return sesion.cluster_time, sesion.operation_time
+
+@asynccontextmanager
+async def conexion():
+    """
+    Abre la conexión con MongoDB durante el bloque `async with` y la cierra al salir.
+    """
+    motor = await conectar()
+    try:
+        yield motor
+    finally:
+        desconectar()
@@ -0,0 +1,1317 @@
+"""
+Backend de almacenamiento en memoria con la misma interfaz que Motor.
+
+Todo el acceso a datos de la capa crud pasa por un `AIOEngine` de ODMantic, que a su vez solo usa
+`client[base_de_datos][coleccion]`. Este módulo implementa ese cliente, sus bases de datos y sus
+colecciones sobre diccionarios de Python, de modo que `AIOEngine(client=ClienteMemoria())` sirve
+a los mismos módulos crud sin cambiarlos. Se selecciona con `BACKEND=memoria` en `database.py`.
+
+Cubre solo las operaciones que emiten la aplicación y ODMantic; cualquier otra lanza
+`OperationFailure` en lugar de imitar a MongoDB a medias. El contrato son las llamadas de la capa
+crud que ejecuta `python -m bench.equivalencia`, que compara sus resultados con los de un servidor
+de MongoDB con los mismos datos; una consulta nueva de la capa crud se añade allí y se comprueba
+con los dos backends. Las operaciones admitidas son:
+- Escrituras: `insert_one`, `insert_many`, `update_one`, `find_one_and_update`,
+  `find_one_and_delete`, `delete_one`, `delete_many` y `bulk_write` (solo con `UpdateOne`), con
+  los operadores `$set`, `$unset` e `$inc`.
+- Lecturas: `find`, `find_one`, `count_documents`, `estimated_document_count` y `aggregate`, con
+  los filtros de comparación, `$ne`, `$in`, `$regex`, `$exists`, `$all`, `$and`, `$or` y `$expr`,
+  y las etapas `$match`, `$sort`, `$skip`, `$limit`, `$project`, `$addFields`, `$unset`,
+  `$lookup` (que es como ODMantic resuelve las referencias), `$unwind`, `$group`, `$count`,
+  `$facet` y `$unionWith`.
+- Índices: cada índice declarado crea un índice hash sobre todos sus campos, además del de
+  `_id`. Un filtro que fija por igualdad, `$in` o `$all` los primeros campos de un índice (en un
+  `find`, un `$match` inicial o un `$lookup`) obtiene sus candidatos del índice que más campos
+  fija, de modo que `{tipo, titulo_trigramas}` no recorre todos los elementos de un tipo. Los
+  índices únicos se respetan y lanzan `DuplicateKeyError` como MongoDB.
+
+Los datos viven en el proceso y se pierden al cerrarlo; no hay transacciones ni change streams.
+"""
+from datetime import datetime
+from bson import ObjectId, Regex, Timestamp
+from bson.int64 import Int64
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import IndexModel, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+import asyncio
+import bisect
+import heapq
+import itertools
+import math
+import re
+
+TAMANO_LOTE = 1000
+
+class _Falta:
+    """
+    Marca de campo inexistente, distinta de un campo con valor None.
+    """
+
+    def __repr__(self):
+        return 'FALTA'
+
+FALTA = _Falta()
+
+# Rango de los tipos exactos más comunes, para no recorrer la cadena de isinstance
+RANGOS = {type(None): 1, int: 2, float: 2, str: 3, dict: 4, list: 5, bytes: 6, ObjectId: 7, bool: 8, datetime: 9, Timestamp: 10}
+
+def _rango(valor) -> int:
+    # Orden de tipos de MongoDB: null, números, cadenas, objetos, arrays, binarios, ObjectId,
+    # booleanos, fechas, timestamps y expresiones regulares
+    rango = RANGOS.get(type(valor))
+    if rango is not None:
+        return rango
+    if valor is FALTA:
+        return 0
+    if valor is None:
+        return 1
+    if isinstance(valor, bool):
+        return 8
+    if isinstance(valor, (int, float, Int64)):
+        return 2
+    if isinstance(valor, str):
+        return 3
+    if isinstance(valor, dict):
+        return 4
+    if isinstance(valor, (list, tuple)):
+        return 5
+    if isinstance(valor, bytes):
+        return 6
+    if isinstance(valor, ObjectId):
+        return 7
+    if isinstance(valor, datetime):
+        return 9
+    if isinstance(valor, Timestamp):
+        return 10
+    return 11
+
+def comparar(a, b) -> int:
+    """
+    Compara dos valores con el orden de BSON: primero por tipo y después por valor.
+    """
+    rango_a, rango_b = _rango(a), _rango(b)
+    if rango_a != rango_b:
+        return -1 if rango_a < rango_b else 1
+    if rango_a in (0, 1):
+        return 0
+    if rango_a == 4:
+        return comparar(list(a.items()), list(b.items()))
+    if rango_a == 5:
+        for x, y in zip(a, b):
+            resultado = comparar(x, y)
+            if resultado:
+                return resultado
+        return (len(a) > len(b)) - (len(a) < len(b))
+    if rango_a == 11:
+        a, b = str(a), str(b)
+    return (a > b) - (a < b)
+
+def _iguales(a, b) -> bool:
+    return _rango(a) == _rango(b) and comparar(a, b) == 0
+
+def clave(valor):
+    """
+    Clave hashable de un valor para los índices y `$group`; respeta que 1 y True son distintos.
+    """
+    if isinstance(valor, dict):
+        return (4, tuple((k, clave(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple)):
+        return (5, tuple(clave(v) for v in valor))
+    if isinstance(valor, re.Pattern):
+        return (11, valor.pattern)
+    if isinstance(valor, Regex):
+        return (11, valor.pattern)
+    return (_rango(valor), valor)
+
+def copiar(valor):
+    """
+    Copia profunda de un documento; los valores escalares de BSON son inmutables.
+    """
+    if isinstance(valor, dict):
+        return {k: copiar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [copiar(v) for v in valor]
+    return valor
+
+def _verdadero(valor) -> bool:
+    # Veracidad de las expresiones de agregación: solo null, false, 0 y el campo ausente son falsos
+    if valor is FALTA or valor is None or valor is False:
+        return False
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return valor != 0
+    return True
+
+def obtener(documento, ruta: str):
+    """
+    Valor de una ruta con puntos (`detalle._id`); si atraviesa un array devuelve la lista de valores.
+    """
+    valor = documento
+    for parte in ruta.split('.'):
+        if isinstance(valor, dict):
+            valor = valor.get(parte, FALTA)
+        elif isinstance(valor, list):
+            if parte.isdigit():
+                indice = int(parte)
+                valor = valor[indice] if indice < len(valor) else FALTA
+            else:
+                valor = [v for v in (obtener(elemento, parte) for elemento in valor if isinstance(elemento, dict)) if v is not FALTA]
+        else:
+            return FALTA
+        if valor is FALTA:
+            return FALTA
+    return valor
+
+def lector(ruta: str):
+    """
+    Función que lee una ruta de los documentos; evita partir la ruta en cada lectura si no tiene puntos.
+    """
+    if '.' in ruta:
+        return lambda documento: obtener(documento, ruta)
+    return lambda documento: documento.get(ruta, FALTA) if isinstance(documento, dict) else FALTA
+
+def _valores_consulta(documento, ruta: str) -> list:
+    # Valores contra los que se compara una condición de consulta: si el campo es un array,
+    # cada uno de sus elementos y también el array completo
+    valor = obtener(documento, ruta)
+    if isinstance(valor, list):
+        return valor + [valor]
+    return [valor]
+
+def asignar(documento: dict, ruta: str, valor):
+    """
+    Asigna un valor en una ruta con puntos, creando los subdocumentos que falten.
+    """
+    partes = ruta.split('.')
+    for parte in partes[:-1]:
+        siguiente = documento.get(parte)
+        if not isinstance(siguiente, dict):
+            siguiente = documento[parte] = {}
+        documento = siguiente
+    documento[partes[-1]] = valor
+
+def quitar(documento: dict, ruta: str):
+    """
+    Elimina el campo de una ruta con puntos si existe.
+    """
+    partes = ruta.split('.')
+    for parte in partes[:-1]:
+        documento = documento.get(parte)
+        if not isinstance(documento, dict):
+            return
+    documento.pop(partes[-1], None)
+
+def _patron(patron, opciones: str = '') -> re.Pattern:
+    if isinstance(patron, re.Pattern):
+        return patron
+    if isinstance(patron, Regex):
+        return patron.try_compile()
+    banderas = 0
+    for letra, bandera in (('i', re.IGNORECASE), ('m', re.MULTILINE), ('s', re.DOTALL), ('x', re.VERBOSE)):
+        if letra in opciones:
+            banderas |= bandera
+    return re.compile(patron, banderas)
+
+def _es_patron(valor) -> bool:
+    return isinstance(valor, (re.Pattern, Regex))
+
+def _igual_consulta(valor, esperado) -> bool:
+    if type(valor) is type(esperado) and not isinstance(esperado, (dict, list)):
+        return valor == esperado
+    if _es_patron(esperado):
+        return isinstance(valor, str) and _patron(esperado).search(valor) is not None
+    if esperado is None:
+        return valor is None or valor is FALTA
+    return _iguales(valor, esperado)
+
+def _comparacion(operador: str, valor, esperado) -> bool:
+    if valor is FALTA or _rango(valor) != _rango(esperado):
+        return False
+    resultado = comparar(valor, esperado)
+    return {'$gt': resultado > 0, '$gte': resultado >= 0, '$lt': resultado < 0, '$lte': resultado <= 0}[operador]
+
+def _condicion(documento, ruta: str, condicion, variables: dict | None = None) -> bool:
+    if not (isinstance(condicion, dict) and condicion and all(k.startswith('$') for k in condicion)):
+        return any(_igual_consulta(v, condicion) for v in _valores_consulta(documento, ruta))
+    for operador, esperado in condicion.items():
+        if operador == '$options':
+            continue
+        if operador == '$regex':
+            patron = _patron(esperado, condicion.get('$options', ''))
+            cumple = any(isinstance(v, str) and patron.search(v) for v in _valores_consulta(documento, ruta))
+        elif operador == '$eq':
+            cumple = any(_igual_consulta(v, esperado) for v in _valores_consulta(documento, ruta))
+        elif operador == '$ne':
+            cumple = not any(_igual_consulta(v, esperado) for v in _valores_consulta(documento, ruta))
+        elif operador in ('$gt', '$gte', '$lt', '$lte'):
+            cumple = any(_comparacion(operador, v, esperado) for v in _valores_consulta(documento, ruta))
+        elif operador == '$in':
+            cumple = any(_igual_consulta(v, e) for v in _valores_consulta(documento, ruta) for e in esperado)
+        elif operador == '$exists':
+            cumple = (obtener(documento, ruta) is not FALTA) == bool(esperado)
+        elif operador == '$all':
+            valor = obtener(documento, ruta)
+            elementos = valor if isinstance(valor, list) else [valor]
+            cumple = all(any(_igual_consulta(v, e) for v in elementos) for e in esperado)
+        else:
+            raise OperationFailure(f'Operador de consulta no soportado en memoria: {operador}')
+        if not cumple:
+            return False
+    return True
+
+def _predicado_condicion(campo: str, condicion, variables: dict | None):
+    if campo in ('$and', '$or'):
+        predicados = [compilar_filtro(subfiltro, variables) for subfiltro in condicion]
+        if campo == '$and':
+            return lambda documento: all(p(documento) for p in predicados)
+        return lambda documento: any(p(documento) for p in predicados)
+    if campo == '$expr':
+        return lambda documento: _verdadero(evaluar(condicion, documento, variables))
+    if campo.startswith('$'):
+        raise OperationFailure(f'Operador de consulta no soportado en memoria: {campo}')
+    if '.' not in campo and isinstance(condicion, (str, int, float, ObjectId, datetime)):
+        # Igualdad con un escalar: comparación directa si el campo tiene el mismo tipo
+        tipo = type(condicion)
+
+        def igualdad(documento):
+            valor = documento.get(campo, FALTA)
+            if type(valor) is tipo:
+                return valor == condicion
+            return _condicion(documento, campo, condicion, variables)
+        return igualdad
+    return lambda documento: _condicion(documento, campo, condicion, variables)
+
+def compilar_filtro(filtro: dict | None, variables: dict | None = None):
+    """
+    Convierte un filtro de consulta de MongoDB en una función `documento -> bool`, de modo que
+    el filtro se interpreta una sola vez aunque se aplique a muchos documentos.
+
+    `variables` son las de un `$lookup` con `let`, disponibles para `$expr` como `$$nombre`.
+    """
+    if not filtro:
+        return lambda documento: True
+    predicados = [_predicado_condicion(campo, condicion, variables) for campo, condicion in filtro.items()]
+    if len(predicados) == 1:
+        return predicados[0]
+    return lambda documento: all(p(documento) for p in predicados)
+
+def coincide(documento, filtro: dict | None, variables: dict | None = None) -> bool:
+    """
+    Indica si un documento cumple un filtro de consulta de MongoDB.
+    """
+    return compilar_filtro(filtro, variables)(documento)
+
+def _a_texto(valor):
+    if valor is FALTA or valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor.isoformat(timespec='milliseconds').replace('+00:00', '') + 'Z'
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    return str(valor)
+
+def _indice_cp(cadena, subcadena, inicio=0, fin=None):
+    if cadena is FALTA or cadena is None:
+        return None
+    return cadena.find(subcadena, inicio, len(cadena) if fin is None else fin)
+
+def _switch(argumentos: dict, documento, variables: dict):
+    for rama in argumentos['branches']:
+        if _verdadero(evaluar(rama['case'], documento, variables)):
+            return evaluar(rama['then'], documento, variables)
+    if 'default' not in argumentos:
+        raise OperationFailure('$switch sin rama coincidente ni valor por defecto')
+    return evaluar(argumentos['default'], documento, variables)
+
+def _cond(argumentos, documento, variables: dict):
+    if isinstance(argumentos, dict):
+        argumentos = [argumentos['if'], argumentos['then'], argumentos['else']]
+    condicion, entonces, si_no = argumentos
+    return evaluar(entonces if _verdadero(evaluar(condicion, documento, variables)) else si_no, documento, variables)
+
+def _if_null(argumentos, documento, variables: dict):
+    for argumento in argumentos[:-1]:
+        valor = evaluar(argumento, documento, variables)
+        if valor is not None and valor is not FALTA:
+            return valor
+    return evaluar(argumentos[-1], documento, variables)
+
+def _numeros(valores) -> list:
+    return [v for v in valores if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+# Operadores que reciben sus argumentos ya evaluados
+OPERADORES = {
+    '$eq': lambda a, b: comparar(a, b) == 0,
+    '$ne': lambda a, b: comparar(a, b) != 0,
+    '$gt': lambda a, b: comparar(a, b) > 0,
+    '$gte': lambda a, b: comparar(a, b) >= 0,
+    '$lt': lambda a, b: comparar(a, b) < 0,
+    '$lte': lambda a, b: comparar(a, b) <= 0,
+    '$cmp': comparar,
+    '$and': lambda *valores: all(_verdadero(v) for v in valores),
+    '$or': lambda *valores: any(_verdadero(v) for v in valores),
+    '$not': lambda valor: not _verdadero(valor),
+    '$in': lambda valor, lista: any(_iguales(valor, v) for v in lista),
+    '$toString': _a_texto,
+    '$indexOfCP': _indice_cp,
+    '$strLenCP': len,
+    '$toLower': lambda valor: '' if valor in (None, FALTA) else str(valor).lower(),
+    '$toUpper': lambda valor: '' if valor in (None, FALTA) else str(valor).upper(),
+    '$concat': lambda *valores: None if any(v in (None, FALTA) for v in valores) else ''.join(valores),
+    '$size': len,
+    '$add': lambda *valores: sum(_numeros(valores)),
+    '$subtract': lambda a, b: a - b,
+    '$multiply': lambda *valores: math.prod(_numeros(valores)),
+    '$max': lambda *valores: max((v for v in valores if v not in (None, FALTA)), key=clave_orden, default=None),
+    '$min': lambda *valores: min((v for v in valores if v not in (None, FALTA)), key=clave_orden, default=None),
+}
+# Operadores que evalúan sus argumentos por su cuenta
+OPERADORES_PEREZOSOS = {
+    '$switch': _switch,
+    '$cond': _cond,
+    '$ifNull': _if_null,
+    '$literal': lambda argumento, documento, variables: argumento,
+}
+
+def evaluar(expresion, documento, variables: dict | None = None):
+    """
+    Evalúa una expresión de agregación (`'$campo'`, `'$$variable'`, `{'$operador': ...}`,
+    objetos, listas o literales) sobre un documento.
+    """
+    if isinstance(expresion, str):
+        if expresion.startswith('$$'):
+            nombre, _, ruta = expresion[2:].partition('.')
+            if nombre in ('ROOT', 'CURRENT'):
+                base = documento
+            else:
+                base = (variables or {}).get(nombre, FALTA)
+            return obtener(base, ruta) if ruta else base
+        if expresion.startswith('$'):
+            return obtener(documento, expresion[1:])
+        return expresion
+    if isinstance(expresion, dict):
+        if len(expresion) == 1:
+            (operador, argumentos), = expresion.items()
+            if operador.startswith('$'):
+                if operador in OPERADORES_PEREZOSOS:
+                    return OPERADORES_PEREZOSOS[operador](argumentos, documento, variables)
+                if operador not in OPERADORES:
+                    raise OperationFailure(f'Operador de expresión no soportado en memoria: {operador}')
+                if not isinstance(argumentos, list):
+                    argumentos = [argumentos]
+                return OPERADORES[operador](*(evaluar(a, documento, variables) for a in argumentos))
+        resultado = {}
+        for campo, valor in expresion.items():
+            valor = evaluar(valor, documento, variables)
+            if valor is not FALTA:
+                resultado[campo] = valor
+        return resultado
+    if isinstance(expresion, list):
+        return [evaluar(valor, documento, variables) for valor in expresion]
+    return expresion
+
+def _es_bandera(valor) -> bool:
+    return isinstance(valor, (bool, int, float)) and not isinstance(valor, Int64)
+
+def _incluir(documento, rutas: dict):
+    # rutas: árbol {campo: True | subárbol} con los campos a conservar
+    if isinstance(documento, list):
+        return [_incluir(v, rutas) for v in documento if isinstance(v, dict)]
+    resultado = {}
+    for campo, subrutas in rutas.items():
+        if campo not in documento:
+            continue
+        if subrutas is True:
+            resultado[campo] = documento[campo]
+        elif isinstance(documento[campo], (dict, list)):
+            resultado[campo] = _incluir(documento[campo], subrutas)
+    return resultado
+
+def proyectar(documento: dict, proyeccion, variables: dict | None = None) -> dict:
+    """
+    Aplica una proyección de `find` o una etapa `$project`, en modo inclusión o exclusión.
+    """
+    if proyeccion is None:
+        return documento
+    if isinstance(proyeccion, (list, tuple)):
+        proyeccion = {campo: 1 for campo in proyeccion}
+    excluir_id = '_id' in proyeccion and _es_bandera(proyeccion['_id']) and not proyeccion['_id']
+    resto = {campo: valor for campo, valor in proyeccion.items() if campo != '_id' or not _es_bandera(valor)}
+    if all(_es_bandera(valor) and not valor for valor in resto.values()):
+        resultado = copiar(documento)
+        for campo in resto:
+            quitar(resultado, campo)
+        if excluir_id:
+            resultado.pop('_id', None)
+        return resultado
+    rutas: dict = {}
+    if not excluir_id:
+        rutas['_id'] = True
+    calculados = {}
+    for campo, valor in resto.items():
+        if _es_bandera(valor):
+            if valor:
+                nodo = rutas
+                partes = campo.split('.')
+                for parte in partes[:-1]:
+                    nodo = nodo.setdefault(parte, {}) if nodo.get(parte) is not True else {}
+                nodo[partes[-1]] = True
+        else:
+            calculados[campo] = valor
+    resultado = _incluir(documento, rutas)
+    if any('.' in campo for campo in calculados):
+        resultado = copiar(resultado)
+    for campo, expresion in calculados.items():
+        valor = evaluar(expresion, documento, variables)
+        if valor is not FALTA:
+            asignar(resultado, campo, valor)
+    return resultado
+
+def actualizar(documento: dict, cambios: dict) -> dict:
+    """
+    Devuelve una copia del documento con una actualización de MongoDB aplicada.
+    """
+    nuevo = copiar(documento)
+    for operador, campos in cambios.items():
+        if operador not in ('$set', '$unset', '$inc'):
+            raise OperationFailure(f'Operador de actualización no soportado en memoria: {operador}')
+        for campo, valor in campos.items():
+            if operador == '$set':
+                asignar(nuevo, campo, copiar(valor))
+            elif operador == '$unset':
+                quitar(nuevo, campo)
+            else:
+                actual = obtener(nuevo, campo)
+                asignar(nuevo, campo, (0 if actual is FALTA else actual) + valor)
+    return nuevo
+
+def _documento_upsert(filtro: dict) -> dict:
+    # Campos de igualdad del filtro que se copian en el documento creado por un upsert
+    documento = {}
+    for campo, condicion in (filtro or {}).items():
+        if campo.startswith('$'):
+            continue
+        if isinstance(condicion, dict) and any(k.startswith('$') for k in condicion):
+            if '$eq' in condicion:
+                asignar(documento, campo, condicion['$eq'])
+        else:
+            asignar(documento, campo, condicion)
+    return documento
+
+def _normalizar_orden(orden) -> list[tuple[str, int]]:
+    if orden is None:
+        return []
+    if isinstance(orden, dict):
+        return list(orden.items())
+    if isinstance(orden, str):
+        return [(orden, 1)]
+    return [tuple(par) for par in orden]
+
+def _orden_por_id(orden) -> int:
+    # 1 o -1 si el orden es solo por `_id`; 0 en cualquier otro caso
+    pares = _normalizar_orden(orden)
+    return pares[0][1] if len(pares) == 1 and pares[0][0] == '_id' else 0
+
+def clave_orden(valor):
+    """
+    Clave de ordenación con el orden de BSON, para usar con `sorted` en lugar de `comparar`.
+    """
+    rango = _rango(valor)
+    if rango in (0, 1):
+        return (1, 0)
+    if rango == 4:
+        return (4, tuple((k, clave_orden(v)) for k, v in valor.items()))
+    if rango == 5:
+        return (5, tuple(clave_orden(v) for v in valor))
+    if rango == 7:
+        return (7, valor.binary)
+    if rango == 11:
+        return (11, str(valor))
+    return (rango, valor)
+
+def ordenar(documentos: list, orden) -> list:
+    """
+    Ordena documentos según una especificación de MongoDB (`{campo: 1 | -1}` o lista de pares).
+
+    Se hace una ordenación estable por cada campo, del menos al más significativo, para admitir
+    direcciones distintas en cada uno.
+    """
+    claves = _normalizar_orden(orden)
+    if not claves:
+        return documentos
+    documentos = list(documentos)
+    for campo, direccion in reversed(claves):
+        leer = lector(campo)
+        documentos.sort(key=lambda documento: clave_orden(leer(documento)), reverse=direccion < 0)
+    return documentos
+
+def primeros(documentos: list, orden, limite: int) -> list:
+    """
+    Los `limite` primeros documentos según un orden, sin ordenar la lista entera cuando todos los
+    campos van en la misma dirección (el caso de `$sort` seguido de `$limit` en la paginación).
+    """
+    claves = _normalizar_orden(orden)
+    direcciones = {direccion >= 0 for _, direccion in claves}
+    if len(direcciones) != 1:
+        return ordenar(documentos, orden)[:limite]
+
+    lectores = [lector(campo) for campo, _ in claves]
+
+    def clave_documento(documento):
+        return tuple(clave_orden(leer(documento)) for leer in lectores)
+
+    seleccion = heapq.nsmallest if direcciones.pop() else heapq.nlargest
+    return seleccion(limite, documentos, key=clave_documento)
+
+class CursorMemoria:
+    """
+    Cursor asíncrono compatible con los de Motor (`async for`, `to_list`, `sort`, `skip`, `limit`).
+
+    Los resultados se calculan al empezar a leerlos y se entregan ya copiados, de modo que quien
+    los reciba puede modificarlos sin afectar a la colección.
+    """
+
+    def __init__(self, calcular, orden=None, saltar: int = 0, limite: int = 0):
+        # calcular(orden, saltar, limite) -> list[dict]
+        self._calcular = calcular
+        self._orden = orden
+        self._saltar = saltar
+        self._limite = limite
+        self._resultados: list | None = None
+        self._posicion = 0
+
+    def sort(self, orden, direccion: int | None = None):
+        self._orden = [(orden, direccion or 1)] if isinstance(orden, str) else orden
+        return self
+
+    def skip(self, saltar: int):
+        self._saltar = saltar
+        return self
+
+    def limit(self, limite: int):
+        self._limite = limite
+        return self
+
+    def batch_size(self, tamano: int):
+        return self
+
+    def _preparar(self) -> list:
+        if self._resultados is None:
+            self._resultados = self._calcular(self._orden, self._saltar, abs(self._limite))
+        return self._resultados
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        resultados = self._preparar()
+        if self._posicion >= len(resultados):
+            raise StopAsyncIteration
+        documento = resultados[self._posicion]
+        self._posicion += 1
+        if self._posicion % TAMANO_LOTE == 0:
+            # Cede el bucle de eventos entre lotes, como haría un getMore
+            await asyncio.sleep(0)
+        return copiar(documento)
+
+    async def to_list(self, length: int | None = None) -> list:
+        resultados = self._preparar()
+        fin = len(resultados) if length is None else min(len(resultados), self._posicion + length)
+        lote = [copiar(documento) for documento in resultados[self._posicion:fin]]
+        self._posicion = fin
+        return lote
+
+    async def close(self):
+        self._posicion = len(self._preparar())
+
+class IndiceHash:
+    """
+    Índice hash sobre todos los campos de un índice de MongoDB. Para cada prefijo de sus claves
+    (el primer campo, los dos primeros...) guarda de cada combinación de valores a los `_id` de
+    los documentos que la contienen, de modo que un filtro que fija los primeros campos de un
+    índice compuesto los usa todos, como los límites de un IXSCAN. Si un campo es un array, cada
+    uno de sus elementos es un valor (índice multiclave).
+    """
+
+    def __init__(self, nombre: str, claves: list[tuple[str, int]], unico: bool = False):
+        self.nombre = nombre
+        self.claves = claves
+        self.campos = [campo for campo, _ in claves]
+        self.unico = unico
+        # entradas[n - 1]: de los valores de los n primeros campos a los `_id`
+        self.entradas: list[dict] = [{} for _ in self.campos]
+
+    def _combinaciones(self, documento) -> set:
+        valores = []
+        for campo in self.campos:
+            valor = obtener(documento, campo)
+            if valor is FALTA:
+                valor = None
+            elementos = (valor or [None]) if isinstance(valor, list) else [valor]
+            valores.append([clave(elemento) for elemento in elementos])
+        return set(itertools.product(*valores))
+
+    def agregar(self, documento: dict):
+        for combinacion in self._combinaciones(documento):
+            for n, entradas in enumerate(self.entradas, 1):
+                entradas.setdefault(combinacion[:n], set()).add(documento['_id'])
+
+    def quitar(self, documento: dict):
+        for combinacion in self._combinaciones(documento):
+            for n, entradas in enumerate(self.entradas, 1):
+                ids = entradas.get(combinacion[:n])
+                if ids is not None:
+                    ids.discard(documento['_id'])
+                    if not ids:
+                        del entradas[combinacion[:n]]
+
+    def buscar(self, valores: list[list]) -> set:
+        """
+        `_id` de los documentos con alguno de los valores dados en cada uno de los primeros campos.
+
+        Parámetros:
+        - valores (list[list]): Valores admitidos para el primer campo, el segundo...
+        """
+        entradas = self.entradas[len(valores) - 1]
+        ids = set()
+        for combinacion in itertools.product(*([clave(v) for v in campo] for campo in valores)):
+            ids |= entradas.get(combinacion, set())
+        return ids
+
+    def duplicados(self, documento: dict) -> set:
+        """
+        `_id` de los documentos que comparten alguna clave completa con el documento.
+        """
+        ids = set()
+        for combinacion in self._combinaciones(documento):
+            ids |= self.entradas[-1].get(combinacion, set())
+        return ids
+
+    def informacion(self) -> dict:
+        datos = {'v': 2, 'key': self.claves}
+        if self.unico:
+            datos['unique'] = True
+        return datos
+
+def _valores_igualdad(condicion) -> tuple[str, list] | None:
+    # ('in', valores) para igualdad o `$in`, ('all', valores) para `$all`; None si no fija el campo
+    if isinstance(condicion, dict) and condicion and all(k.startswith('$') for k in condicion):
+        if '$eq' in condicion:
+            modo, valores = 'in', [condicion['$eq']]
+        elif '$in' in condicion:
+            modo, valores = 'in', list(condicion['$in'])
+        elif condicion.get('$all'):
+            modo, valores = 'all', list(condicion['$all'])
+        else:
+            return None
+    else:
+        modo, valores = 'in', [condicion]
+    if any(isinstance(v, (list, dict)) or _es_patron(v) for v in valores):
+        return None
+    return modo, valores
+
+class ColeccionMemoria:
+    """
+    Colección en memoria con la interfaz de `AsyncIOMotorCollection` que usa la aplicación.
+    """
+
+    def __init__(self, base_de_datos: 'BaseDatosMemoria', nombre: str):
+        self.database = base_de_datos
+        self.name = nombre
+        self.documentos: dict = {}
+        self.indices: dict[str, IndiceHash] = {}
+        self.ids: list = []  # `_id` en orden ascendente, el equivalente al índice `_id_`
+
+    def _por_id(self, ids) -> list[dict]:
+        return [self.documentos[id_] for id_ in ids if id_ in self.documentos]
+
+    def _candidatos(self, filtro: dict | None) -> list[dict]:
+        """
+        Documentos que pueden cumplir el filtro, usando el índice hash que más campos fija; si
+        ninguno sirve, todos los de la colección.
+        """
+        condiciones = {}
+        for campo, condicion in (filtro or {}).items():
+            if campo == '$and':
+                for subfiltro in condicion:
+                    for subcampo, subcondicion in subfiltro.items():
+                        condiciones.setdefault(subcampo, subcondicion)
+            else:
+                condiciones[campo] = condicion
+        candidatos = self._candidatos_indice(condiciones)
+        return list(self.documentos.values()) if candidatos is None else candidatos
+
+    def _candidatos_indice(self, filtro: dict) -> list[dict] | None:
+        """
+        Candidatos de las condiciones de igualdad, `$in` o `$all` del filtro, según el índice cuyo
+        prefijo de campos fijados es más largo; None si no hay ninguno.
+
+        Con `$all` sobre un campo multiclave se intersecan los candidatos de cada valor.
+        """
+        fijados = {}
+        for campo, condicion in filtro.items():
+            if not campo.startswith('$'):
+                valores = _valores_igualdad(condicion)
+                if valores is not None:
+                    fijados[campo] = valores
+        if '_id' in fijados and fijados['_id'][0] == 'in':
+            return self._por_id(dict.fromkeys(fijados['_id'][1]))
+        mejor, prefijo = None, 0
+        for indice in self.indices.values():
+            n = 0
+            while n < len(indice.campos) and indice.campos[n] in fijados:
+                n += 1
+            if n > prefijo:
+                mejor, prefijo = indice, n
+        if mejor is None:
+            return None
+        valores = [fijados[campo] for campo in mejor.campos[:prefijo]]
+        todos = next((i for i, (modo, _) in enumerate(valores) if modo == 'all'), None)
+        if todos is None:
+            return self._por_id(mejor.buscar([v for _, v in valores]))
+        # Un documento tiene que estar en las entradas de cada valor de `$all`
+        ids = None
+        for valor in valores[todos][1]:
+            fijo = [[valor] if i == todos else v for i, (_, v) in enumerate(valores)]
+            encontrados = mejor.buscar(fijo)
+            ids = encontrados if ids is None else ids & encontrados
+        return self._por_id(ids)
+
+    def _filtrar(self, filtro: dict | None) -> list[dict]:
+        candidatos = self._candidatos(filtro)
+        if not filtro:
+            return candidatos
+        predicado = compilar_filtro(filtro)
+        return [documento for documento in candidatos if predicado(documento)]
+
+    def _inicio_por_id(self, filtro: dict, direccion: int) -> int:
+        # Posición de `ids` desde la que empezar, según las cotas de `_id` del filtro
+        condiciones = [filtro.get('_id')] + [subfiltro.get('_id') for subfiltro in filtro.get('$and', ())]
+        inicio = 0 if direccion > 0 else len(self.ids) - 1
+        for condicion in condiciones:
+            if not isinstance(condicion, dict):
+                continue
+            for operador, valor in condicion.items():
+                if direccion > 0 and operador in ('$gt', '$gte'):
+                    buscar = bisect.bisect_right if operador == '$gt' else bisect.bisect_left
+                    inicio = max(inicio, buscar(self.ids, clave_orden(valor), key=clave_orden))
+                elif direccion < 0 and operador in ('$lt', '$lte'):
+                    buscar = bisect.bisect_left if operador == '$lt' else bisect.bisect_right
+                    inicio = min(inicio, buscar(self.ids, clave_orden(valor), key=clave_orden) - 1)
+        return inicio
+
+    def primeros_por_id(self, filtro: dict | None, direccion: int, limite: int) -> list[dict] | None:
+        """
+        Los `limite` primeros documentos que cumplen el filtro en orden de `_id`, recorriendo `ids`
+        desde la cota del filtro y parando al completarlos, como un IXSCAN sobre `_id_`.
+
+        Retorna None si el filtro fija por igualdad un campo indexado con pocos candidatos; en ese
+        caso es más rápido filtrarlos y ordenarlos.
+        """
+        filtro = filtro or {}
+        candidatos = self._candidatos(filtro) if filtro else None
+        if candidatos is not None and len(candidatos) <= limite * 8:
+            return None
+        predicado = compilar_filtro(filtro)
+        inicio = self._inicio_por_id(filtro, direccion)
+        posiciones = range(inicio, len(self.ids)) if direccion > 0 else range(inicio, -1, -1)
+        resultado = []
+        for posicion in posiciones:
+            documento = self.documentos[self.ids[posicion]]
+            if predicado(documento):
+                resultado.append(documento)
+                if len(resultado) == limite:
+                    break
+        return resultado
+
+    def _comprobar_unicos(self, documento: dict, anterior: dict | None = None):
+        if documento['_id'] in self.documentos and (anterior is None or anterior['_id'] != documento['_id']):
+            raise DuplicateKeyError(
+                f'E11000 duplicate key error collection: {self.name} index: _id_',
+                11000, {'code': 11000, 'keyValue': {'_id': documento['_id']}},
+            )
+        for indice in self.indices.values():
+            if not indice.unico:
+                continue
+            otros = indice.duplicados(documento) - ({anterior['_id']} if anterior is not None else set())
+            if otros:
+                valores = {campo: obtener(documento, campo) for campo in indice.campos}
+                clave_duplicada = {campo: None if v is FALTA else v for campo, v in valores.items()}
+                raise DuplicateKeyError(
+                    f'E11000 duplicate key error collection: {self.name} index: {indice.nombre}',
+                    11000, {'code': 11000, 'keyValue': clave_duplicada},
+                )
+
+    def _guardar(self, documento: dict, anterior: dict | None = None):
+        self._comprobar_unicos(documento, anterior)
+        if anterior is not None:
+            for indice in self.indices.values():
+                indice.quitar(anterior)
+        else:
+            bisect.insort(self.ids, documento['_id'], key=clave_orden)
+        self.documentos[documento['_id']] = documento
+        for indice in self.indices.values():
+            indice.agregar(documento)
+
+    def _borrar(self, documento: dict):
+        for indice in self.indices.values():
+            indice.quitar(documento)
+        posicion = bisect.bisect_left(self.ids, clave_orden(documento['_id']), key=clave_orden)
+        del self.ids[posicion]
+        del self.documentos[documento['_id']]
+
+    async def create_indexes(self, indices: list[IndexModel], session=None, **kwargs) -> list[str]:
+        nombres = []
+        for modelo in indices:
+            datos = modelo.document
+            claves = list(datos['key'].items())
+            nombre = datos.get('name') or '_'.join(f'{c}_{d}' for c, d in claves)
+            existente = self.indices.get(nombre)
+            if existente is not None:
+                if existente.claves != claves or existente.unico != bool(datos.get('unique')):
+                    raise OperationFailure(f'Índice {nombre} ya existe con otra definición', 85)
+            else:
+                indice = IndiceHash(nombre, claves, bool(datos.get('unique')))
+                for documento in self.documentos.values():
+                    indice.agregar(documento)
+                self.indices[nombre] = indice
+            nombres.append(nombre)
+        return nombres
+
+    async def create_index(self, claves, unique: bool = False, name: str | None = None, session=None, **kwargs) -> str:
+        opciones = {'unique': unique}
+        if name:
+            opciones['name'] = name
+        (nombre,) = await self.create_indexes([IndexModel(claves, **opciones)])
+        return nombre
+
+    async def drop_index(self, nombre: str, session=None, **kwargs):
+        if self.indices.pop(nombre, None) is None:
+            raise OperationFailure(f'index not found with name [{nombre}]', 27)
+
+    async def index_information(self, session=None) -> dict:
+        informacion = {'_id_': {'v': 2, 'key': [('_id', 1)]}}
+        informacion.update({nombre: indice.informacion() for nombre, indice in self.indices.items()})
+        return informacion
+
+    def _insertar(self, documento: dict):
+        if '_id' not in documento:
+            documento['_id'] = ObjectId()
+        self._guardar(copiar(documento))
+        return documento['_id']
+
+    async def insert_one(self, documento: dict, session=None, **kwargs) -> InsertOneResult:
+        return InsertOneResult(self._insertar(documento), True)
+
+    async def insert_many(self, documentos, ordered: bool = True, session=None, **kwargs) -> InsertManyResult:
+        ids, errores = [], []
+        for indice, documento in enumerate(documentos):
+            try:
+                ids.append(self._insertar(documento))
+            except DuplicateKeyError as e:
+                errores.append({'index': indice, 'code': 11000, 'errmsg': str(e), 'keyValue': e.details.get('keyValue', {}), 'op': documento})
+                if ordered:
+                    break
+        if errores:
+            raise BulkWriteError({
+                'writeErrors': errores, 'writeConcernErrors': [], 'nInserted': len(ids),
+                'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': [],
+            })
+        return InsertManyResult(ids, True)
+
+    def _actualizar(self, filtro: dict, cambios: dict, upsert: bool, orden=None) -> tuple[int, int, object, dict | None, dict | None]:
+        # Devuelve coincidencias, modificados, ID insertado y el documento antes y después
+        documentos = self._filtrar(filtro)
+        if orden is not None:
+            documentos = ordenar(documentos, orden)
+        if not documentos:
+            if not upsert:
+                return 0, 0, None, None, None
+            base = _documento_upsert(filtro)
+            base.setdefault('_id', ObjectId())
+            nuevo = actualizar(base, cambios)
+            self._guardar(nuevo)
+            return 0, 0, nuevo['_id'], None, nuevo
+        documento = documentos[0]
+        nuevo = actualizar(documento, cambios)
+        if nuevo == documento:
+            return 1, 0, None, documento, nuevo
+        self._guardar(nuevo, documento)
+        return 1, 1, None, documento, nuevo
+
+    @staticmethod
+    def _resultado_actualizacion(coincidencias: int, modificados: int, insertado) -> UpdateResult:
+        resultado = {'n': coincidencias or (1 if insertado is not None else 0), 'nModified': modificados, 'ok': 1.0}
+        if insertado is not None:
+            resultado['upserted'] = insertado
+        return UpdateResult(resultado, True)
+
+    async def update_one(self, filtro: dict, cambios: dict, upsert: bool = False, session=None, **kwargs) -> UpdateResult:
+        coincidencias, modificados, insertado, _, _ = self._actualizar(filtro, cambios, upsert, kwargs.get('sort'))
+        return self._resultado_actualizacion(coincidencias, modificados, insertado)
+
+    async def find_one_and_update(
+        self,
+        filtro: dict,
+        cambios: dict,
+        projection=None,
+        sort=None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+        session=None,
+        **kwargs,
+    ):
+        _, _, _, antes, despues = self._actualizar(filtro, cambios, upsert, sort)
+        documento = despues if return_document == ReturnDocument.AFTER else antes
+        return None if documento is None else copiar(proyectar(documento, projection))
+
+    async def find_one_and_delete(self, filtro: dict, projection=None, sort=None, session=None, **kwargs):
+        documentos = ordenar(self._filtrar(filtro), sort)
+        if not documentos:
+            return None
+        self._borrar(documentos[0])
+        return copiar(proyectar(documentos[0], projection))
+
+    async def delete_one(self, filtro: dict, session=None, **kwargs) -> DeleteResult:
+        documentos = self._filtrar(filtro)[:1]
+        for documento in documentos:
+            self._borrar(documento)
+        return DeleteResult({'n': len(documentos), 'ok': 1.0}, True)
+
+    async def delete_many(self, filtro: dict, session=None, **kwargs) -> DeleteResult:
+        documentos = self._filtrar(filtro)
+        for documento in documentos:
+            self._borrar(documento)
+        return DeleteResult({'n': len(documentos), 'ok': 1.0}, True)
+
+    async def bulk_write(self, operaciones: list, ordered: bool = True, session=None, **kwargs) -> BulkWriteResult:
+        resultado = {
+            'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0,
+            'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': [],
+        }
+        for indice, operacion in enumerate(operaciones):
+            try:
+                if isinstance(operacion, UpdateOne):
+                    coincidencias, modificados, insertado, _, _ = self._actualizar(
+                        operacion._filter, operacion._doc, bool(operacion._upsert),
+                    )
+                    resultado['nMatched'] += coincidencias
+                    resultado['nModified'] += modificados
+                    if insertado is not None:
+                        resultado['nUpserted'] += 1
+                        resultado['upserted'].append({'index': indice, '_id': insertado})
+                else:
+                    raise OperationFailure(f'Operación no soportada en memoria: {type(operacion).__name__}')
+            except DuplicateKeyError as e:
+                resultado['writeErrors'].append({'index': indice, 'code': 11000, 'errmsg': str(e), 'keyValue': e.details.get('keyValue', {})})
+                if ordered:
+                    break
+        if resultado['writeErrors']:
+            raise BulkWriteError(resultado)
+        return BulkWriteResult(resultado, True)
+
+    def find(self, filter: dict | None = None, projection=None, sort=None, skip: int = 0, limit: int = 0, session=None, **kwargs) -> CursorMemoria:
+        def calcular(orden, saltar: int, limite: int) -> list[dict]:
+            # Se ordena y recorta antes de proyectar, por si el orden usa campos que no se devuelven
+            direccion = _orden_por_id(orden)
+            documentos = None
+            if limite and direccion:
+                documentos = self.primeros_por_id(filter, direccion, saltar + limite)
+            if documentos is not None:
+                documentos = documentos[saltar:]
+            elif limite and orden:
+                documentos = self._filtrar(filter)
+                documentos = primeros(documentos, orden, saltar + limite)[saltar:]
+                documentos = primeros(documentos, orden, saltar + limite)[saltar:]
+            else:
+                documentos = ordenar(self._filtrar(filter), orden)[saltar:]
+                if limite:
+                    documentos = documentos[:limite]
+            return documentos if projection is None else [proyectar(documento, projection) for documento in documentos]
+        return CursorMemoria(calcular, sort, skip, limit)
+
+    async def find_one(self, filter: dict | None = None, projection=None, sort=None, session=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        documentos = await self.find(filter, projection, sort=sort, limit=1).to_list(length=1)
+        return documentos[0] if documentos else None
+
+    async def count_documents(self, filter: dict, session=None, **kwargs) -> int:
+        total = len(self._filtrar(filter))
+        total = max(total - kwargs.get('skip', 0), 0)
+        return min(total, kwargs['limit']) if kwargs.get('limit') else total
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self.documentos)
+
+    def aggregate(self, pipeline: list[dict], session=None, **kwargs) -> CursorMemoria:
+        return CursorMemoria(lambda orden, saltar, limite: self.database.ejecutar(self, pipeline))
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure('El backend en memoria no admite change streams', 40573)
+
+def _acumular(operador: str, expresion, documentos: list, variables: dict | None):
+    valores = [evaluar(expresion, documento, variables) for documento in documentos]
+    if operador == '$sum':
+        return sum(_numeros(valores))
+    if operador == '$avg':
+        numeros = _numeros(valores)
+        return sum(numeros) / len(numeros) if numeros else None
+    if operador == '$first':
+        return valores[0] if valores else None
+    if operador == '$last':
+        return valores[-1] if valores else None
+    if operador == '$push':
+        return [v for v in valores if v is not FALTA]
+    if operador == '$addToSet':
+        return list({clave(v): v for v in valores if v is not FALTA}.values())
+    if operador in ('$min', '$max'):
+        presentes = [v for v in valores if v not in (None, FALTA)]
+        if not presentes:
+            return None
+        return (min if operador == '$min' else max)(presentes, key=clave_orden)
+    if operador == '$count':
+        return len(documentos)
+    raise OperationFailure(f'Acumulador no soportado en memoria: {operador}')
+
+class BaseDatosMemoria:
+    """
+    Base de datos en memoria: crea sus colecciones al primer acceso, como MongoDB.
+    """
+
+    def __init__(self, cliente: 'ClienteMemoria', nombre: str):
+        self.client = cliente
+        self.name = nombre
+        self.colecciones: dict[str, ColeccionMemoria] = {}
+
+    def __getitem__(self, nombre: str) -> ColeccionMemoria:
+        coleccion = self.colecciones.get(nombre)
+        if coleccion is None:
+            coleccion = self.colecciones[nombre] = ColeccionMemoria(self, nombre)
+        return coleccion
+
+    def get_collection(self, nombre: str, **kwargs) -> ColeccionMemoria:
+        return self[nombre]
+
+    async def create_collection(self, nombre: str, **kwargs) -> ColeccionMemoria:
+        return self[nombre]
+
+    async def list_collection_names(self, **kwargs) -> list[str]:
+        return list(self.colecciones)
+
+    async def drop_collection(self, nombre: str, **kwargs):
+        self.colecciones.pop(nombre, None)
+
+    async def command(self, comando, *args, **kwargs) -> dict:
+        nombre = comando if isinstance(comando, str) else next(iter(comando))
+        if nombre == 'ping':
+            return {'ok': 1.0}
+        raise OperationFailure(f'Comando no soportado en memoria: {nombre}')
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure('El backend en memoria no admite change streams', 40573)
+
+    def ejecutar(self, coleccion: ColeccionMemoria, pipeline: list[dict]) -> list[dict]:
+        """
+        Ejecuta un pipeline de agregación sobre una colección y devuelve los documentos resultantes.
+
+        Si la primera etapa es un `$match`, sus candidatos se obtienen con los índices de la colección;
+        si además le siguen `$sort` por `_id` y `$limit`, se recorre la colección en orden de `_id`.
+        """
+        if len(pipeline) >= 3 and '$match' in pipeline[0] and '$limit' in pipeline[2]:
+            direccion = _orden_por_id(pipeline[1].get('$sort'))
+            if direccion:
+                documentos = coleccion.primeros_por_id(pipeline[0]['$match'], direccion, pipeline[2]['$limit'])
+                if documentos is not None:
+                    return self.aplicar(documentos, pipeline[3:])
+        if pipeline and '$match' in pipeline[0]:
+            return self.aplicar(coleccion._filtrar(pipeline[0]['$match']), pipeline[1:])
+        return self.aplicar(list(coleccion.documentos.values()), pipeline)
+
+    def aplicar(self, documentos: list[dict], pipeline: list[dict], variables: dict | None = None) -> list[dict]:
+        """
+        Aplica etapas de agregación a una lista de documentos, sin modificar los originales.
+        """
+        posicion = 0
+        while posicion < len(pipeline):
+            (nombre, argumentos), = pipeline[posicion].items()
+            siguiente = pipeline[posicion + 1] if posicion + 1 < len(pipeline) else {}
+            if nombre == '$sort' and '$limit' in siguiente:
+                documentos = primeros(documentos, argumentos, siguiente['$limit'])
+                posicion += 2
+                continue
+            documentos = self._etapa(nombre, argumentos, documentos, variables)
+            posicion += 1
+        return documentos
+
+    def _etapa(self, nombre: str, argumentos, documentos: list[dict], variables: dict | None) -> list[dict]:
+        if nombre == '$match':
+            predicado = compilar_filtro(argumentos, variables)
+            return [d for d in documentos if predicado(d)]
+        if nombre == '$sort':
+            return ordenar(documentos, argumentos)
+        if nombre == '$limit':
+            return documentos[:argumentos]
+        if nombre == '$skip':
+            return documentos[argumentos:]
+        if nombre == '$project':
+            return [proyectar(d, argumentos, variables) for d in documentos]
+        if nombre in ('$addFields', '$set'):
+            resultado = []
+            for documento in documentos:
+                nuevo = dict(documento)
+                for campo, expresion in argumentos.items():
+                    valor = evaluar(expresion, documento, variables)
+                    if valor is not FALTA:
+                        if '.' in campo:
+                            nuevo = copiar(nuevo)
+                        asignar(nuevo, campo, valor)
+                resultado.append(nuevo)
+            return resultado
+        if nombre == '$unset':
+            campos = [argumentos] if isinstance(argumentos, str) else argumentos
+            return [proyectar(d, {campo: 0 for campo in campos}) for d in documentos]
+        if nombre == '$unwind':
+            return self._unwind(argumentos, documentos)
+        if nombre == '$lookup':
+            return self._lookup(argumentos, documentos, variables)
+        if nombre == '$unionWith':
+            if isinstance(argumentos, str):
+                argumentos = {'coll': argumentos}
+            return documentos + self.ejecutar(self[argumentos['coll']], argumentos.get('pipeline', []))
+        if nombre == '$facet':
+            return [{campo: self.aplicar(documentos, subpipeline, variables) for campo, subpipeline in argumentos.items()}]
+        if nombre == '$count':
+            return [{argumentos: len(documentos)}] if documentos else []
+        if nombre == '$group':
+            return self._group(argumentos, documentos, variables)
+        raise OperationFailure(f'Etapa de agregación no soportada en memoria: {nombre}')
+
+    @staticmethod
+    def _unwind(argumentos, documentos: list[dict]) -> list[dict]:
+        if isinstance(argumentos, str):
+            argumentos = {'path': argumentos}
+        campo = argumentos['path'][1:]
+        conservar = argumentos.get('preserveNullAndEmptyArrays', False)
+        resultado = []
+        for documento in documentos:
+            valor = obtener(documento, campo)
+            if isinstance(valor, list) and valor:
+                for elemento in valor:
+                    nuevo = copiar(documento) if '.' in campo else dict(documento)
+                    asignar(nuevo, campo, elemento)
+                    resultado.append(nuevo)
+            elif isinstance(valor, list) or valor is FALTA or valor is None:
+                if conservar:
+                    nuevo = copiar(documento) if '.' in campo else dict(documento)
+                    if isinstance(valor, list):
+                        quitar(nuevo, campo)
+                    resultado.append(nuevo)
+            else:
+                resultado.append(documento)
+        return resultado
+
+    def _lookup(self, argumentos: dict, documentos: list[dict], variables: dict | None) -> list[dict]:
+        externa = self[argumentos['from']]
+        local, foraneo = argumentos.get('localField'), argumentos.get('foreignField')
+        subpipeline = argumentos.get('pipeline', [])
+        let = argumentos.get('let', {})
+        resultado = []
+        for documento in documentos:
+            variables_locales = {**(variables or {}), **{n: evaluar(e, documento, variables) for n, e in let.items()}}
+            if local is not None:
+                valor = obtener(documento, local)
+                valores = valor if isinstance(valor, list) else [None if valor is FALTA else valor]
+                candidatos = externa._filtrar({foraneo: {'$in': valores}})
+            else:
+                candidatos = self._candidatos_lookup(externa, subpipeline, variables_locales)
+            nuevo = dict(documento)
+            nuevo[argumentos['as']] = self.aplicar(candidatos, subpipeline, variables_locales) if subpipeline else list(candidatos)
+            resultado.append(nuevo)
+        return resultado
+
+    @staticmethod
+    def _candidatos_lookup(externa: ColeccionMemoria, subpipeline: list[dict], variables: dict) -> list[dict]:
+        # Las referencias de ODMantic se resuelven con `$match: {$expr: {$eq: ['$campo', '$$variable']}}`;
+        # si el campo está indexado, los candidatos salen del índice
+        if subpipeline and '$match' in subpipeline[0]:
+            expresion = subpipeline[0]['$match'].get('$expr', {})
+            argumentos = expresion.get('$eq') if isinstance(expresion, dict) and len(expresion) == 1 else None
+            if isinstance(argumentos, list) and len(argumentos) == 2:
+                campo, variable = argumentos
+                if isinstance(campo, str) and campo.startswith('$') and not campo.startswith('$$') \
+                        and isinstance(variable, str) and variable.startswith('$$'):
+                    valor = evaluar(variable, {}, variables)
+                    if valor is not FALTA and not isinstance(valor, (list, dict)):
+                        candidatos = externa._candidatos_indice({campo[1:]: valor})
+                        if candidatos is not None:
+                            return candidatos
+        return list(externa.documentos.values())
+
+    @staticmethod
+    def _group(argumentos: dict, documentos: list[dict], variables: dict | None) -> list[dict]:
+        grupos: dict = {}
+        for documento in documentos:
+            valor = evaluar(argumentos['_id'], documento, variables)
+            valor = None if valor is FALTA else valor
+            grupos.setdefault(clave(valor), (valor, []))[1].append(documento)
+        resultado = []
+        for valor, miembros in grupos.values():
+            grupo = {'_id': valor}
+            for campo, acumulador in argumentos.items():
+                if campo != '_id':
+                    (operador, expresion), = acumulador.items()
+                    grupo[campo] = _acumular(operador, expresion, miembros, variables)
+            resultado.append(grupo)
+        return resultado
+
+class SesionMemoria:
+    """
+    Sesión sin efecto, para las operaciones de ODMantic que abren una (como `engine.save`) y
+    para `database.sesion_causal`: con un solo proceso todas las lecturas ven el último estado.
+    """
+
+    cluster_time = None
+    operation_time = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def end_session(self):
+        pass
+
+    def advance_cluster_time(self, tiempo):
+        pass
+
+    def advance_operation_time(self, tiempo):
+        pass
+
+class ClienteMemoria:
+    """
+    Cliente en memoria con la interfaz de `AsyncIOMotorClient` que usan ODMantic y `database.py`.
+    """
+
+    def __init__(self):
+        self.bases_de_datos: dict[str, BaseDatosMemoria] = {}
+
+    def __getitem__(self, nombre: str) -> BaseDatosMemoria:
+        base = self.bases_de_datos.get(nombre)
+        if base is None:
+            base = self.bases_de_datos[nombre] = BaseDatosMemoria(self, nombre)
+        return base
+
+    def get_database(self, nombre: str, **kwargs) -> BaseDatosMemoria:
+        return self[nombre]
+
+    @property
+    def admin(self) -> BaseDatosMemoria:
+        return self['admin']
+
+    async def start_session(self, **kwargs) -> SesionMemoria:
+        return SesionMemoria()
+
+    def close(self):
+        self.bases_de_datos.clear()
@@ -0,0 +1,318 @@
+"""
+Importación masiva de catálogos desde archivos CSV o NDJSON.
+
+Lee el archivo en streaming, valida cada fila con el esquema de creación del tipo indicado
+(`LibroCreate`, `DVDCreate` o `RevistaCreate`) y escribe por lotes usando la creación masiva.
+El número de lotes en vuelo está acotado, por lo que la memoria usada no depende del tamaño
+del archivo.
+
+El progreso se guarda en un archivo de control (`<archivo>.checkpoint.json` por defecto) con
+la última fila y posición en bytes cuyos lotes terminaron; si la importación se interrumpe,
+al volver a ejecutarla continúa desde ese punto. Como los lotes terminan en cualquier orden, al
+reanudar se vuelven a enviar lotes que quizá ya se escribieron: para que no se dupliquen, el
+ID de cada documento (y el de su elemento) se deriva del número de fila y de una base guardada
+en el archivo de control, y los lotes se escriben de forma idempotente (ver `insertar_lote`).
+
+Uso:
+
+    python -m importar libros.csv --tipo libro
+    python -m importar dvds.ndjson --tipo dvd --lote 2000 --concurrencia 8 --errores rechazos.ndjson
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from bson import ObjectId
+from pydantic import ValidationError
+from schemas.libro import LibroCreate
+from schemas.dvd import DVDCreate
+from schemas.revista import RevistaCreate
+from services import libro as libro_service, dvd as dvd_service, revista as revista_service
+from database import conexion
+
+TAMANO_LOTE = 1000
+CONCURRENCIA = 4
+
+ESQUEMAS = {
+    'libro': LibroCreate,
+    'dvd': DVDCreate,
+    'revista': RevistaCreate,
+}
+
+CREADORES = {
+    'libro': libro_service.crear_libros_service,
+    'dvd': dvd_service.crear_dvds_service,
+    'revista': revista_service.crear_revistas_service,
+}
+
+def _lineas(archivo, posicion: list[int]):
+    """
+    Entrega las líneas decodificadas de un archivo binario y acumula en `posicion[0]` los bytes consumidos.
+    """
+    for linea in archivo:
+        posicion[0] += len(linea)
+        yield linea.decode('utf-8-sig' if posicion[0] == len(linea) else 'utf-8')
+
+def leer_filas(ruta: str, formato: str, desde: int = 0):
+    """
+    Recorre las filas de un archivo CSV o NDJSON sin cargarlo completo en memoria.
+
+    Parámetros:
+    - ruta (str): Ruta del archivo.
+    - formato (str): 'csv' o 'ndjson'.
+    - desde (int): Posición en bytes desde la que continuar (0 para empezar desde el principio).
+
+    Retorna:
+    - Iterator[tuple[dict | None, int, str | None]]: Para cada fila, sus datos (o None si no se pudo
+      leer), la posición en bytes al terminarla y el error de lectura, si lo hubo.
+    """
+    with open(ruta, 'rb') as archivo:
+        posicion = [0]
+        if formato == 'csv':
+            encabezado = next(csv.reader(_lineas(archivo, posicion)))
+            if desde:
+                archivo.seek(desde)
+                posicion[0] = desde
+            for valores in csv.reader(_lineas(archivo, posicion)):
+                if not valores:
+                    continue
+                if len(valores) != len(encabezado):
+                    yield None, posicion[0], 'Número de columnas incorrecto'
+                    continue
+                yield dict(zip(encabezado, valores)), posicion[0], None
+        else:
+            if desde:
+                archivo.seek(desde)
+                posicion[0] = desde
+            for linea in _lineas(archivo, posicion):
+                if not linea.strip():
+                    continue
+                try:
+                    yield json.loads(linea), posicion[0], None
+                except json.JSONDecodeError as e:
+                    yield None, posicion[0], f'JSON inválido: {e.msg}'
+
+def _nueva_base() -> ObjectId:
+    """
+    Base para los IDs de una importación: la hora actual y 5 bytes aleatorios propios.
+    """
+    return ObjectId(int(time.time()).to_bytes(4, 'big') + os.urandom(5) + bytes(3))
+
+def _id_fila(base: ObjectId, fila: int) -> ObjectId:
+    """
+    ID de una fila: el de la base con el contador sustituido por el número de fila (y los
+    segundos adelantados cada 2^24 filas), de modo que los IDs siguen el orden del archivo.
+    """
+    binario = base.binary
+    segundos = int.from_bytes(binario[:4], 'big') + (fila >> 24)
+    return ObjectId(segundos.to_bytes(4, 'big') + binario[4:9] + (fila & 0xFFFFFF).to_bytes(3, 'big'))
+
+class PuntoControl:
+    """
+    Archivo de control que registra hasta dónde se completó la importación.
+
+    Como los lotes terminan en cualquier orden, solo se avanza cuando todos los lotes
+    anteriores también han terminado. También guarda las bases de los IDs de los subtipos y de
+    sus elementos, para que cada fila reciba los mismos IDs al reanudar.
+    """
+
+    def __init__(self, ruta: str, archivo: str, tipo: str):
+        self.ruta = ruta
+        self.archivo = archivo
+        self.tipo = tipo
+        self.filas = 0
+        self.posicion = 0
+        self.bases: tuple[ObjectId, ObjectId] | None = None
+        self._pendientes: dict[int, tuple[int, int]] = {}
+        self._siguiente = 0
+
+    def cargar(self):
+        if os.path.exists(self.ruta):
+            with open(self.ruta) as f:
+                datos = json.load(f)
+            if datos.get('archivo') != os.path.abspath(self.archivo) or datos.get('tipo') != self.tipo:
+                raise SystemExit(f'El archivo de control {self.ruta} pertenece a otra importación')
+            self.filas = datos['filas']
+            self.posicion = datos['posicion']
+            if 'bases' in datos:
+                self.bases = tuple(ObjectId(base) for base in datos['bases'])
+        if self.bases is None:
+            # Las bases se guardan antes de escribir el primer lote
+            self.bases = (_nueva_base(), _nueva_base())
+            self._guardar()
+
+    def ids(self, fila: int) -> tuple[ObjectId, ObjectId]:
+        """
+        IDs del subtipo y de su elemento para una fila del archivo.
+        """
+        return _id_fila(self.bases[0], fila), _id_fila(self.bases[1], fila)
+
+    def completar(self, numero_lote: int, filas: int, posicion: int):
+        self._pendientes[numero_lote] = (filas, posicion)
+        avanzado = False
+        while self._siguiente in self._pendientes:
+            self.filas, self.posicion = self._pendientes.pop(self._siguiente)
+            self._siguiente += 1
+            avanzado = True
+        if avanzado:
+            self._guardar()
+
+    def _guardar(self):
+        temporal = f'{self.ruta}.tmp'
+        with open(temporal, 'w') as f:
+            json.dump({
+                'archivo': os.path.abspath(self.archivo),
+                'tipo': self.tipo,
+                'filas': self.filas,
+                'posicion': self.posicion,
+                'bases': [str(base) for base in self.bases],
+            }, f)
+        os.replace(temporal, self.ruta)
+
+class Progreso:
+    """
+    Contadores de la importación y su impresión periódica por la salida de error.
+    """
+
+    def __init__(self, filas_previas: int):
+        self.inicio = time.monotonic()
+        self.leidas = 0
+        self.filas_previas = filas_previas
+        self.creadas = 0
+        self.errores = 0
+
+    def informar(self, final: bool = False):
+        transcurrido = max(time.monotonic() - self.inicio, 1e-9)
+        print(
+            f'{"Terminado" if final else "Progreso"}: filas={self.filas_previas + self.leidas} '
+            f'creadas={self.creadas} errores={self.errores} ({self.leidas / transcurrido:.0f} filas/s)',
+            file=sys.stderr,
+        )
+
+async def importar(
+    ruta: str,
+    tipo: str,
+    formato: str,
+    tamano_lote: int = TAMANO_LOTE,
+    concurrencia: int = CONCURRENCIA,
+    ruta_control: str | None = None,
+    ruta_errores: str | None = None,
+) -> Progreso:
+    """
+    Importa un archivo completo respetando el punto de control existente.
+
+    Parámetros:
+    - ruta (str): Archivo CSV o NDJSON a importar.
+    - tipo (str): 'libro', 'dvd' o 'revista'.
+    - formato (str): 'csv' o 'ndjson'.
+    - tamano_lote (int): Filas válidas por inserción masiva.
+    - concurrencia (int): Máximo de lotes escribiéndose a la vez.
+    - ruta_control (str | None): Archivo de control; por defecto `<ruta>.checkpoint.json`.
+    - ruta_errores (str | None): Si se indica, archivo NDJSON donde se registran las filas rechazadas.
+
+    Retorna:
+    - Progreso: Contadores finales de la importación.
+    """
+    esquema = ESQUEMAS[tipo]
+    crear = CREADORES[tipo]
+    control = PuntoControl(ruta_control or f'{ruta}.checkpoint.json', ruta, tipo)
+    control.cargar()
+    progreso = Progreso(control.filas)
+    semaforo = asyncio.Semaphore(concurrencia)
+    errores = open(ruta_errores, 'a', encoding='utf-8') if ruta_errores else None
+    tareas: set[asyncio.Task] = set()
+    fallos: list[BaseException] = []
+    numero_lote = 0
+
+    def rechazar(fila: int, motivo: str):
+        progreso.errores += 1
+        if errores:
+            errores.write(json.dumps({'fila': fila, 'error': motivo}, ensure_ascii=False) + '\n')
+
+    async def escribir(numero_lote: int, lote: list, filas_lote: list[int], filas: int, posicion: int):
+        try:
+            for resultado in await crear(lote, [control.ids(fila) for fila in filas_lote]):
+                if resultado.get('error'):
+                    rechazar(filas_lote[resultado['indice']], resultado['error'])
+                else:
+                    progreso.creadas += 1
+            control.completar(numero_lote, filas, posicion)
+            progreso.informar()
+        finally:
+            semaforo.release()
+
+    def terminar(tarea: asyncio.Task):
+        tareas.discard(tarea)
+        if not tarea.cancelled() and tarea.exception() is not None:
+            fallos.append(tarea.exception())
+
+    async def enviar(lote: list, filas_lote: list[int], filas: int, posicion: int):
+        nonlocal numero_lote
+        await semaforo.acquire()
+        if fallos:
+            # Un lote anterior falló: se detiene la lectura para reanudar desde el punto de control
+            semaforo.release()
+            raise fallos[0]
+        tarea = asyncio.create_task(escribir(numero_lote, lote, filas_lote, filas, posicion))
+        numero_lote += 1
+        tareas.add(tarea)
+        tarea.add_done_callback(terminar)
+
+    lote, filas_lote = [], []
+    fila, posicion = control.filas, control.posicion
+    try:
+        for datos, posicion, error in leer_filas(ruta, formato, control.posicion):
+            fila += 1
+            progreso.leidas += 1
+            if error is not None:
+                rechazar(fila, error)
+                continue
+            try:
+                lote.append(esquema.model_validate(datos))
+                filas_lote.append(fila)
+            except ValidationError as e:
+                rechazar(fila, '; '.join(f"{'.'.join(map(str, d['loc']))}: {d['msg']}" for d in e.errors()))
+            if len(lote) >= tamano_lote:
+                await enviar(lote, filas_lote, fila, posicion)
+                lote, filas_lote = [], []
+        await enviar(lote, filas_lote, fila, posicion)
+    finally:
+        await asyncio.gather(*tareas, return_exceptions=True)
+        if errores:
+            errores.close()
+    if fallos:
+        raise fallos[0]
+    progreso.informar(final=True)
+    return progreso
+
+def main(argumentos: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Importa un catálogo CSV o NDJSON en la biblioteca.')
+    parser.add_argument('archivo', help='archivo CSV o NDJSON a importar')
+    parser.add_argument('--tipo', required=True, choices=sorted(ESQUEMAS), help='tipo de elemento de cada fila')
+    parser.add_argument('--formato', choices=['csv', 'ndjson'], help='formato del archivo (por defecto, según la extensión)')
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help=f'filas por lote (por defecto {TAMANO_LOTE})')
+    parser.add_argument('--concurrencia', type=int, default=CONCURRENCIA, help=f'lotes en vuelo (por defecto {CONCURRENCIA})')
+    parser.add_argument('--checkpoint', help='archivo de control para reanudar (por defecto <archivo>.checkpoint.json)')
+    parser.add_argument('--errores', help='archivo NDJSON donde registrar las filas rechazadas')
+    opciones = parser.parse_args(argumentos)
+
+    formato = opciones.formato or ('csv' if opciones.archivo.lower().endswith('.csv') else 'ndjson')
+
+    async def ejecutar() -> Progreso:
+        async with conexion():
+            return await importar(
+                opciones.archivo, opciones.tipo, formato,
+                tamano_lote=opciones.lote,
+                concurrencia=opciones.concurrencia,
+                ruta_control=opciones.checkpoint,
+                ruta_errores=opciones.errores,
+            )
+
+    progreso = asyncio.run(ejecutar())
+    return 1 if progreso.errores else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -30,16 +30,59 @@ Este sistema permite la administración completa de los siguientes recursos:
 - ReDoc: `/redoc`
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routers import libro, elemento, dvd, revista
+from routers import libro, elemento, dvd, revista, cache, metricas
+from database import conexion, BASE_DE_DATOS
+from services.metricas import METRICAS, MiddlewareMetricas
+from services.compresion import COMPRESION, MiddlewareCompresion
+from services.consultas_lentas import consultas_lentas
+from services.invalidacion import invalidacion_cambios
+from services.elemento import estadisticas
+from models.indices import crear_indices
+from crud.busqueda import reindexar_titulos
+from crud.autocompletado import indice_autocompletado
 from typing import Union
 
-app = FastAPI(title="API Biblioteca - MongoDB")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Abre el cliente de MongoDB y calienta su pool antes de aceptar peticiones; se cierra al apagar
+    async with conexion() as engine:
+        # Crea (si no existen) los índices declarados en los modelos
+        await crear_indices(engine)
+        # Completa el índice de búsqueda de los elementos creados antes de que existiera
+        await reindexar_titulos(engine)
+        # Carga en memoria los títulos y autores para /elementos/autocompletar
+        await indice_autocompletado.construir(engine)
+        # Registra las consultas que superan CONSULTAS_LENTAS_MS junto con su explain()
+        await consultas_lentas.iniciar(engine.client, BASE_DE_DATOS)
+        # Invalida la caché con las escrituras de otros procesos, siguiendo los change streams
+        await invalidacion_cambios.iniciar(engine.database)
+        # Recalcula las estadísticas del catálogo cada ESTADISTICAS_TTL segundos en segundo plano
+        await estadisticas.iniciar()
+        try:
+            yield
+        finally:
+            await estadisticas.detener()
+            await invalidacion_cambios.detener()
+            await consultas_lentas.detener()
+
+app = FastAPI(title="API Biblioteca - MongoDB", lifespan=lifespan)
 
 app.include_router(libro.router)
 app.include_router(elemento.router)
 app.include_router(dvd.router)
 app.include_router(revista.router)
+app.include_router(cache.router)
+
+if COMPRESION:
+    # gzip/brotli/zstd según Accept-Encoding; se añade antes que las métricas para que midan los bytes enviados
+    app.add_middleware(MiddlewareCompresion)
+
+if METRICAS:
+    # Duración, tamaño y estado de cada petición; se exponen en /metrics
+    app.add_middleware(MiddlewareMetricas)
+    app.include_router(metricas.router)
 
 @app.get('/')
 def read_root():
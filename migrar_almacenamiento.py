@@ -0,0 +1,164 @@
+"""
+Conversión de los documentos de Libro, DVD y Revista entre los modos de almacenamiento.
+
+- `--a embebido`: copia en cada subtipo los campos compartidos de su `ElementoBiblioteca`
+  (titulo, autor, ano_publicacion y tipo).
+- `--a referencia`: elimina esas copias y deja solo la referencia al elemento.
+
+Cada colección se recorre por lotes en orden de `_id` y cada lote se escribe con un único
+`bulk_write`. Tras cada lote se guarda el último `_id` convertido en un archivo de control, de modo
+que si la conversión se interrumpe, al volver a ejecutarla continúa desde ese punto. Al terminar,
+el archivo de control se elimina.
+
+Los documentos creados o modificados con la aplicación en el modo anterior mientras la conversión
+está en marcha pueden quedar sin convertir; para evitarlo, detén las escrituras durante la
+conversión o vuelve a ejecutarla completa justo después de cambiar `ALMACENAMIENTO`.
+
+Uso:
+
+    python -m migrar_almacenamiento --a embebido
+    python -m migrar_almacenamiento --a referencia --lote 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+from bson import json_util
+from odmantic import AIOEngine, Model
+from pymongo import UpdateOne
+from database import conexion
+from models.elemento import ElementoBiblioteca
+from crud.agregacion import SUBTIPOS, CAMPOS_EMBEBIDOS
+
+TAMANO_LOTE = 1000
+ARCHIVO_CONTROL = 'migracion_almacenamiento.json'
+
+class PuntoControl:
+    """
+    Archivo de control con el último `_id` convertido de cada colección.
+    """
+
+    def __init__(self, ruta: str, destino: str):
+        self.ruta = ruta
+        self.destino = destino
+        self.colecciones: dict[str, object] = {}
+
+    def cargar(self):
+        if not os.path.exists(self.ruta):
+            return
+        with open(self.ruta) as f:
+            datos = json_util.loads(f.read())
+        if datos.get('destino') != self.destino:
+            print(f'El archivo de control {self.ruta} es de una conversión a "{datos.get("destino")}"; se empieza de nuevo', file=sys.stderr)
+            return
+        self.colecciones = datos['colecciones']
+
+    def avanzar(self, coleccion: str, ultimo_id):
+        self.colecciones[coleccion] = ultimo_id
+        temporal = f'{self.ruta}.tmp'
+        with open(temporal, 'w') as f:
+            f.write(json_util.dumps({'destino': self.destino, 'colecciones': self.colecciones}))
+        os.replace(temporal, self.ruta)
+
+    def eliminar(self):
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+async def _lote_embebido(coleccion, filtro: dict, tamano_lote: int) -> tuple[list[dict], list[UpdateOne], int]:
+    documentos = await coleccion.aggregate([
+        {'$match': filtro},
+        {'$sort': {'_id': 1}},
+        {'$limit': tamano_lote},
+        {'$lookup': {
+            'from': ElementoBiblioteca.__collection__,
+            'localField': 'elemento',
+            'foreignField': '_id',
+            'as': '_elemento',
+        }},
+        {'$project': {f'_elemento.{campo}': 1 for campo in CAMPOS_EMBEBIDOS}},
+    ]).to_list(length=None)
+    operaciones = [
+        UpdateOne({'_id': documento['_id']}, {'$set': {campo: documento['_elemento'][0][campo] for campo in CAMPOS_EMBEBIDOS}})
+        for documento in documentos
+        if documento['_elemento']
+    ]
+    return documentos, operaciones, len(documentos) - len(operaciones)
+
+async def _lote_referencia(coleccion, filtro: dict, tamano_lote: int) -> tuple[list[dict], list[UpdateOne], int]:
+    documentos = await coleccion.find(filtro, {'_id': 1}, sort=[('_id', 1)], limit=tamano_lote).to_list(length=None)
+    operaciones = [
+        UpdateOne({'_id': documento['_id']}, {'$unset': {campo: '' for campo in CAMPOS_EMBEBIDOS}})
+        for documento in documentos
+    ]
+    return documentos, operaciones, 0
+
+async def convertir_coleccion(
+    engine: AIOEngine,
+    modelo: type[Model],
+    destino: str,
+    control: PuntoControl,
+    tamano_lote: int = TAMANO_LOTE,
+) -> tuple[int, int]:
+    """
+    Convierte todos los documentos de un subtipo al modo de almacenamiento indicado.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - modelo (type[Model]): Modelo del subtipo (Libro, DVD o Revista).
+    - destino (str): 'embebido' o 'referencia'.
+    - control (PuntoControl): Archivo de control desde el que continuar.
+    - tamano_lote (int): Documentos convertidos por cada `bulk_write`.
+
+    Retorna:
+    - tuple[int, int]: Documentos convertidos y documentos omitidos por no tener elemento.
+    """
+    coleccion = engine.get_collection(modelo)
+    nombre = modelo.__collection__
+    leer_lote = _lote_embebido if destino == 'embebido' else _lote_referencia
+    convertidos = omitidos = 0
+    while True:
+        ultimo_id = control.colecciones.get(nombre)
+        filtro = {} if ultimo_id is None else {'_id': {'$gt': ultimo_id}}
+        documentos, operaciones, huerfanos = await leer_lote(coleccion, filtro, tamano_lote)
+        if not documentos:
+            return convertidos, omitidos
+        if operaciones:
+            await coleccion.bulk_write(operaciones, ordered=False)
+        convertidos += len(operaciones)
+        omitidos += huerfanos
+        control.avanzar(nombre, documentos[-1]['_id'])
+        print(f'{nombre}: convertidos={convertidos} omitidos={omitidos}', file=sys.stderr)
+
+async def migrar(engine: AIOEngine, destino: str, tamano_lote: int = TAMANO_LOTE, ruta_control: str = ARCHIVO_CONTROL):
+    """
+    Convierte las colecciones de Libro, DVD y Revista al modo de almacenamiento indicado.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+    - destino (str): 'embebido' o 'referencia'.
+    - tamano_lote (int): Documentos convertidos por cada `bulk_write`.
+    - ruta_control (str): Archivo de control para reanudar la conversión.
+    """
+    control = PuntoControl(ruta_control, destino)
+    control.cargar()
+    for modelo, _ in SUBTIPOS.values():
+        await convertir_coleccion(engine, modelo, destino, control, tamano_lote)
+    control.eliminar()
+
+def main(argumentos: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Convierte libros, DVDs y revistas entre los modos de almacenamiento.')
+    parser.add_argument('--a', dest='destino', required=True, choices=['embebido', 'referencia'], help='modo de almacenamiento de destino')
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help=f'documentos por lote (por defecto {TAMANO_LOTE})')
+    parser.add_argument('--checkpoint', default=ARCHIVO_CONTROL, help=f'archivo de control para reanudar (por defecto {ARCHIVO_CONTROL})')
+    opciones = parser.parse_args(argumentos)
+
+    async def ejecutar():
+        async with conexion() as engine:
+            await migrar(engine, opciones.destino, opciones.lote, opciones.checkpoint)
+
+    asyncio.run(ejecutar())
+    print(f'Conversión a "{opciones.destino}" terminada; configura ALMACENAMIENTO={opciones.destino}', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from odmantic import Model, Reference
+from odmantic import Model, Reference, Index
 from models.elemento import ElementoBiblioteca
 
 class DVD(Model):
@@ -11,7 +11,15 @@ Atributos:
 - elemento (ElementoBiblioteca): Referencia al elemento de biblioteca asociado.
 - duracion (int): Duración del DVD en minutos.
 - genero (str): Género del contenido del DVD (por ejemplo, 'Documental', 'Drama').
+- version (int): Número de modificaciones del DVD; identifica su versión en los ETag.
     """
     elemento: ElementoBiblioteca = Reference()
     duracion: int
-    genero: str
\ No newline at end of file
+    genero: str
+    version: int = 0
+
+    model_config = {
+        'indexes': lambda: [
+            Index(DVD.elemento),
+        ]
+    }
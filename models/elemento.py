@@ -1,4 +1,4 @@
-from odmantic import Model
+from odmantic import Model, Index
 
 class ElementoBiblioteca(Model):
     """
@@ -12,8 +12,30 @@ Atributos:
 - autor (str): Nombre del autor o creador del material.
 - ano_publicacion (int): Año en que fue publicado o producido.
 - tipo (str): Tipo de elemento. Puede ser 'Libro', 'DVD' o 'Revista'.
+- titulo_normalizado (str): Título sin acentos ni mayúsculas, usado por la búsqueda.
+- titulo_trigramas (list[str]): Trigramas de `titulo_normalizado`, indexados para la búsqueda por título.
+
+Índices:
+- Los índices compuestos `(tipo, <orden>, _id)` y `(<orden>, _id)` respaldan la paginación
+  por cursor de los listados ordenados por id, título o año de publicación.
+- El índice multiclave `(titulo_trigramas, tipo)` resuelve las búsquedas por título y
+  `(titulo_normalizado, tipo)` las de términos de uno o dos caracteres (recorriendo sus claves).
     """
     titulo: str
     autor: str
     ano_publicacion: int
     tipo: str  # Puede ser 'Libro', 'DVD', 'Revista'
+    titulo_normalizado: str = ''
+    titulo_trigramas: list[str] = []
+
+    model_config = {
+        'indexes': lambda: [
+            Index(ElementoBiblioteca.tipo, ElementoBiblioteca.id),
+            Index(ElementoBiblioteca.tipo, ElementoBiblioteca.titulo, ElementoBiblioteca.id),
+            Index(ElementoBiblioteca.tipo, ElementoBiblioteca.ano_publicacion, ElementoBiblioteca.id),
+            Index(ElementoBiblioteca.titulo, ElementoBiblioteca.id),
+            Index(ElementoBiblioteca.ano_publicacion, ElementoBiblioteca.id),
+            Index(ElementoBiblioteca.titulo_trigramas, ElementoBiblioteca.tipo),
+            Index(ElementoBiblioteca.titulo_normalizado, ElementoBiblioteca.tipo),
+        ]
+    }
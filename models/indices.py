@@ -0,0 +1,137 @@
+"""
+Registro de los índices declarados en los modelos.
+
+Cada modelo declara sus índices en `model_config['indexes']`; este módulo los reúne para
+crearlos al arrancar la aplicación y para compararlos con los que existen en la base de datos.
+
+Uso desde la línea de comandos:
+
+    python -m models.indices           # informe de diferencias (código de salida 1 si falta alguno)
+    python -m models.indices --crear   # crea los índices que falten
+"""
+from odmantic import AIOEngine
+from models.elemento import ElementoBiblioteca
+from models.libro import Libro
+from models.dvd import DVD
+from models.revista import Revista
+
+MODELOS = [ElementoBiblioteca, Libro, DVD, Revista]
+
+def _especificacion(clave, unico: bool) -> tuple:
+    return (tuple((campo, int(direccion)) for campo, direccion in clave), bool(unico))
+
+def indices_declarados() -> dict[str, dict[tuple, str]]:
+    """
+    Obtiene los índices declarados en los modelos agrupados por colección.
+
+    Retorna:
+    - dict[str, dict[tuple, str]]: Para cada colección, la especificación `(claves, unico)` de cada índice y su nombre.
+    """
+    declarados = {}
+    for modelo in MODELOS:
+        indices = {}
+        for indice in modelo.__indexes__():
+            documento = indice.get_pymongo_index().document
+            especificacion = _especificacion(documento['key'].items(), documento.get('unique', False))
+            indices[especificacion] = documento['name']
+        declarados[modelo.__collection__] = indices
+    return declarados
+
+async def isbn_duplicados(engine: AIOEngine) -> list[str]:
+    """
+    Obtiene los ISBN repetidos en la colección de libros, que impiden crear su índice único.
+
+    Si el índice único ya existe no puede haber repetidos y no se consulta la colección.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - list[str]: ISBN que aparecen en más de un libro, ordenados.
+    """
+    coleccion = engine.get_collection(Libro)
+    unico = _especificacion([('isbn', 1)], True)
+    informacion = await coleccion.index_information()
+    if any(_especificacion(datos['key'], datos.get('unique', False)) == unico for datos in informacion.values()):
+        return []
+    pipeline = [
+        {'$group': {'_id': '$isbn', 'total': {'$sum': 1}}},
+        {'$match': {'total': {'$gt': 1}}},
+        {'$sort': {'_id': 1}},
+    ]
+    return [grupo['_id'] async for grupo in coleccion.aggregate(pipeline)]
+
+async def crear_indices(engine: AIOEngine):
+    """
+    Crea en la base de datos los índices declarados en los modelos.
+
+    La operación es idempotente: MongoDB ignora los índices que ya existen con la misma definición.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+
+    Errores:
+    - ValueError: Si hay libros con el mismo ISBN; hay que corregirlos antes de crear el índice único.
+    """
+    duplicados = await isbn_duplicados(engine)
+    if duplicados:
+        raise ValueError(
+            f"No se puede crear el índice único de ISBN: {len(duplicados)} ISBN repetidos "
+            f"({', '.join(duplicados[:20])}{', ...' if len(duplicados) > 20 else ''})"
+        )
+    await engine.configure_database(MODELOS)
+
+async def comparar_indices(engine: AIOEngine) -> dict[str, dict[str, list[str]]]:
+    """
+    Compara los índices declarados con los existentes en cada colección.
+
+    Parámetros:
+    - engine (AIOEngine): Motor de base de datos.
+
+    Retorna:
+    - dict[str, dict[str, list[str]]]: Para cada colección, los nombres de los índices `faltantes`
+      (declarados pero no creados) y `sobrantes` (creados pero no declarados).
+    """
+    informe = {}
+    for coleccion, declarados in indices_declarados().items():
+        informacion = await engine.database[coleccion].index_information()
+        existentes = {
+            _especificacion(datos['key'], datos.get('unique', False)): nombre
+            for nombre, datos in informacion.items()
+            if nombre != '_id_'
+        }
+        informe[coleccion] = {
+            'faltantes': sorted(nombre for especificacion, nombre in declarados.items() if especificacion not in existentes),
+            'sobrantes': sorted(nombre for especificacion, nombre in existentes.items() if especificacion not in declarados),
+        }
+    return informe
+
+async def _main(crear: bool) -> int:
+    from database import conexion
+    async with conexion() as engine:
+        duplicados = await isbn_duplicados(engine)
+        if crear and not duplicados:
+            await crear_indices(engine)
+        informe = await comparar_indices(engine)
+    faltan = False
+    for isbn in duplicados:
+        print(f'{Libro.__collection__}: ISBN repetido: {isbn}')
+    for coleccion, diferencias in informe.items():
+        estado = 'OK' if not diferencias['faltantes'] else 'INCOMPLETA'
+        print(f'{coleccion}: {estado}')
+        for nombre in diferencias['faltantes']:
+            print(f'  - falta: {nombre}')
+            faltan = True
+        for nombre in diferencias['sobrantes']:
+            print(f'  + no declarado: {nombre}')
+    return 1 if faltan else 0
+
+if __name__ == '__main__':
+    import argparse
+    import asyncio
+    import sys
+
+    parser = argparse.ArgumentParser(description='Compara los índices declarados en los modelos con los de la base de datos.')
+    parser.add_argument('--crear', action='store_true', help='crea los índices que falten antes de generar el informe')
+    argumentos = parser.parse_args()
+    sys.exit(asyncio.run(_main(argumentos.crear)))
@@ -1,4 +1,4 @@
-from odmantic import Model, Reference
+from odmantic import Model, Reference, Index
 from models.elemento import ElementoBiblioteca
 
 class Libro(Model):
@@ -13,9 +13,18 @@ Atributos:
 - numero_paginas (int): Número total de páginas del libro.
 - genero (str): Género literario del libro (por ejemplo, 'Fantasía', 'Tecnología').
 - editorial (str): Nombre de la editorial que publicó el libro.
+- version (int): Número de modificaciones del libro; identifica su versión en los ETag.
     """
     elemento: ElementoBiblioteca = Reference()
     isbn: str
     numero_paginas: int
     genero: str
     editorial: str
+    version: int = 0
+
+    model_config = {
+        'indexes': lambda: [
+            Index(Libro.elemento),
+            Index(Libro.isbn, unique=True),
+        ]
+    }
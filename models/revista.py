@@ -1,4 +1,4 @@
-from odmantic import Model, Reference
+from odmantic import Model, Reference, Index
 from models.elemento import ElementoBiblioteca
 
 class Revista(Model):
@@ -11,7 +11,15 @@ Atributos:
 - elemento (ElementoBiblioteca): Referencia al elemento base de biblioteca.
 - numero_edicion (int): Número de edición o volumen de la revista.
 - categoria (str): Nombre de la categoría a la que pertenece la revista (ej. Ciencia, Moda, Tecnología).
+- version (int): Número de modificaciones de la revista; identifica su versión en los ETag.
     """
     elemento: ElementoBiblioteca = Reference()
     numero_edicion: int
-    categoria: str
\ No newline at end of file
+    categoria: str
+    version: int = 0
+
+    model_config = {
+        'indexes': lambda: [
+            Index(Revista.elemento),
+        ]
+    }
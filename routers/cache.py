@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from services.cache import cache
+from services.invalidacion import invalidacion_cambios
+
+router = APIRouter(prefix="/cache", tags=["Caché"])
+
+@router.get("/estadisticas")
+async def estadisticas_cache():
+    """
+📊 **Estadísticas de la caché**
+
+Devuelve los contadores de la caché de búsquedas puntuales (por ID o ISBN).
+
+📦 **Retorna**:
+- `backend`: Backend en uso (`CacheMemoria`, `CacheRedis` o `CacheNula`).
+- `aciertos`, `fallos`, `invalidaciones`: Contadores acumulados desde el arranque del proceso.
+- `descartes`: Valores leídos de la base de datos que no se guardaron porque una escritura
+  invalidó sus etiquetas mientras se leían.
+- `tasa_aciertos`: Proporción de consultas resueltas desde la caché.
+- `invalidacion`: Estado de la invalidación por change streams (`activa`) y sus contadores de
+  eventos recibidos, vaciados completos, reanudaciones desde un resume token y errores.
+"""
+    return {**cache.estadisticas(), 'invalidacion': invalidacion_cambios.estadisticas()}
@@ -1,5 +1,11 @@
-from fastapi import APIRouter, HTTPException, status
-from schemas.dvd import DVDCreate, DVDOut
+from typing import Annotated
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response, status
+from routers.etag import RESPUESTA_NO_MODIFICADO, etag_listado, coincide, no_modificado, con_etag
+from routers.ndjson import RESPUESTA_NDJSON, acepta_ndjson, respuesta_ndjson
+from routers.proyeccion import DESCRIPCION_FIELDS, leer_campos, esquema_salida, respuesta_pagina, respuesta_lista
+from schemas.dvd import DVDCreate, DVDOut, DVDUpdate
+from schemas.lote import ResultadoLote, TAMANO_MAXIMO_LOTE
+from schemas.paginacion import Pagina, OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_MAXIMO, LIMITE_BUSQUEDA, LIMITE_BUSQUEDA_MAXIMO
 from services import dvd as dvd_service
 
 router = APIRouter(prefix='/dvds', tags=["DVDs"])
@@ -27,30 +33,70 @@ async def crear_dvd(dvd: DVDCreate):
         genero= dvd_creado.genero
     )
     
-@router.get('/', response_model=list[DVDOut])
-async def listar_dvds():
+@router.post('/bulk', response_model=list[ResultadoLote])
+async def crear_dvds(dvds: Annotated[list[DVDCreate], Body(max_length=TAMANO_MAXIMO_LOTE)]):
+    """
+    📀 **Crear DVDs en bloque**
+
+    Registra varios DVDs en una sola petición. Todo el lote se escribe con dos inserciones
+    masivas, por lo que el coste no crece con la latencia de cada ida y vuelta a la base de datos.
+
+    **Parámetros:**
+    - `dvds` (list[DVDCreate]): Arreglo con los datos de cada DVD.
+
+    **Retorna:**
+    - `list[ResultadoLote]`: Para cada posición del arreglo, el `id` creado o el `error` producido.
+    """
+    return await dvd_service.crear_dvds_service(dvds)
+
+@router.get('/', response_model=Pagina[DVDOut], responses={**RESPUESTA_NDJSON, **RESPUESTA_NO_MODIFICADO})
+async def listar_dvds(
+    request: Request,
+    response: Response,
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: str | None = None,
+    sort: OrdenPaginacion = 'id',
+    fields: str | None = Query(None, description=DESCRIPCION_FIELDS),
+):
     """
     📂 **Listar DVDs**
 
-    Muestra todos los DVDs registrados en el sistema.
+    Muestra una página de los DVDs registrados en el sistema.
+
+    **Parámetros:**
+    - `limit` (int): Número máximo de DVDs por página.
+    - `cursor` (str): Valor de `next_cursor` devuelto por la página anterior.
+    - `sort` (str): Orden del listado: `id`, `titulo` o `ano_publicacion`.
+    - `fields` (str): Campos a devolver separados por comas (por ejemplo `id,titulo`); por defecto, todos.
+
+    Con la cabecera `Accept: application/x-ndjson` se ignora la paginación y se emite el
+    catálogo completo de DVDs, un objeto JSON por línea.
+
+    La respuesta lleva un `ETag` que cambia con cada escritura en los DVDs; si se envía en
+    `If-None-Match` y sigue vigente, se responde `304 Not Modified` sin consultar los DVDs.
 
     **Retorna:**
-    - `list[DVDOut]`: Colección de DVDs.
+    - `Pagina[DVDOut]`: DVDs de la página y cursor de la siguiente.
     """
-    dvds = await dvd_service.listar_dvds_service()
-    return [
-        DVDOut(
-        id=str(dvd.id),
-        titulo=dvd.elemento.titulo,
-        autor = dvd.elemento.autor,
-        ano_publicacion=dvd.elemento.ano_publicacion,
-        duracion= dvd.duracion,
-        genero= dvd.genero
-        ) for dvd in dvds
-    ]
+    campos = leer_campos(fields, DVDOut)
+    cambios, marca = await dvd_service.cambios_dvds_service()
+    etag = etag_listado(request, cambios)
+    if coincide(request, etag):
+        return no_modificado(etag)
+    if acepta_ndjson(request):
+        return con_etag(respuesta_ndjson(dvd_service.iterar_dvds_service(campos, marca), esquema_salida(DVDOut, campos)), response, etag)
+    try:
+        dvds, next_cursor = await dvd_service.listar_dvds_service(limit, cursor, sort, campos, marca)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return con_etag(respuesta_pagina(DVDOut, campos, dvds, next_cursor), response, etag)
     
 @router.get('/buscar/titulo/{titulo}', response_model=list[DVDOut])
-async def buscar_por_titulo(titulo: str):
+async def buscar_por_titulo(
+    titulo: str,
+    limit: int = Query(LIMITE_BUSQUEDA, ge=1, le=LIMITE_BUSQUEDA_MAXIMO),
+    fields: str | None = Query(None, description=DESCRIPCION_FIELDS),
+):
     """
     🔍 **Buscar DVD por título**
 
@@ -58,23 +104,17 @@ async def buscar_por_titulo(titulo: str):
 
     **Parámetros:**
     - `titulo` (str): Título del DVD.
+    - `limit` (int): Número máximo de resultados.
+    - `fields` (str): Campos a devolver separados por comas; por defecto, todos.
 
     **Retorna:**
     - `list[DVDOut]`: Lista de DVDs encontrados.
     """
-    dvds = await dvd_service.buscar_dvd_por_titulo_service(titulo)
+    campos = leer_campos(fields, DVDOut)
+    dvds = await dvd_service.buscar_dvd_por_titulo_service(titulo, limit, campos)
     if not dvds:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No se encontraron DVDs con ese título")
-    return [
-        DVDOut(
-        id=str(dvd.id),
-        titulo=dvd.elemento.titulo,
-        autor = dvd.elemento.autor,
-        ano_publicacion=dvd.elemento.ano_publicacion,
-        duracion= dvd.duracion,
-        genero= dvd.genero
-        ) for dvd in dvds
-    ]
+    return respuesta_lista(DVDOut, campos, dvds)
     
 @router.get('/buscar/genero/{genero}', response_model=list[DVDOut])
 async def buscar_por_genero(genero: str):
@@ -120,7 +160,29 @@ async def actualizar_por_id(id:str, dvd: DVDCreate):
     actualizado = await dvd_service.actualizar_dvd_por_id_service(id, dvd)
     if not actualizado:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='DVD No encontrado')
-    return DVDOut.from_model(actualizado)
+    return actualizado
+
+@router.patch('/actualizar/{id}', response_model=DVDOut)
+async def actualizar_parcial_por_id(id: str, cambios: DVDUpdate):
+    """
+    🩹 **Actualizar parcialmente un DVD**
+
+    Modifica solo los campos enviados en el cuerpo; el resto del DVD se conserva.
+
+    **Parámetros:**
+    - `id` (str): ID del DVD a actualizar.
+    - `cambios` (DVDUpdate): Campos a modificar.
+
+    **Retorna:**
+    - `DVDOut`: DVD actualizado.
+
+    **Errores:**
+    - `404 Not Found`: Si no existe un DVD con ese ID.
+    """
+    try:
+        return await dvd_service.actualizar_parcial_dvd_por_id_service(id, cambios)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='DVD No encontrado')
 
 @router.delete('/eliminar/id/{id}')
 async def eliminar_por_id(id: str):
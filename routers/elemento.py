@@ -1,44 +1,159 @@
-from fastapi import APIRouter, HTTPException
-from models.elemento import ElementoBiblioteca
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from routers.etag import RESPUESTA_NO_MODIFICADO, etag_listado, coincide, no_modificado, con_etag
+from routers.ndjson import RESPUESTA_NDJSON, acepta_ndjson, respuesta_ndjson
+from routers.proyeccion import DESCRIPCION_FIELDS, leer_campos, esquema_salida, respuesta_pagina, respuesta_lista
+from schemas.busqueda import ElementoBusquedaOut, PaginaBusquedaOut
+from schemas.elemento import ElementoOut
+from schemas.estadisticas import EstadisticasOut
+from schemas.paginacion import Pagina, OrdenBusqueda, OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_MAXIMO, LIMITE_BUSQUEDA, LIMITE_BUSQUEDA_MAXIMO, LIMITE_AUTOCOMPLETADO, LIMITE_AUTOCOMPLETADO_MAXIMO
 from services import elemento as elemento_service
 
 router = APIRouter(prefix="/elementos", tags=["Elementos de Biblioteca"])
 
-@router.get("/", response_model=list[ElementoBiblioteca])
-async def listar_elementos():
+@router.get("/", response_model=Pagina[ElementoOut], responses={**RESPUESTA_NDJSON, **RESPUESTA_NO_MODIFICADO})
+async def listar_elementos(
+    request: Request,
+    response: Response,
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: str | None = None,
+    sort: OrdenPaginacion = "id",
+    fields: str | None = Query(None, description=DESCRIPCION_FIELDS),
+):
     """
-🔍 **Listar todos los elementos de la biblioteca**
+🔍 **Listar los elementos de la biblioteca**
 
-Este endpoint devuelve una lista con todos los elementos disponibles en la biblioteca, incluyendo libros, revistas y DVDs.
+Este endpoint devuelve una página de los elementos disponibles en la biblioteca, incluyendo libros, revistas y DVDs.
+
+📥 **Parámetros**:
+- `limit` (*int*): Número máximo de elementos por página.
+- `cursor` (*str*): Valor de `next_cursor` devuelto por la página anterior.
+- `sort` (*str*): Orden del listado: `id`, `titulo` o `ano_publicacion`.
+- `fields` (*str*): Campos a devolver separados por comas (por ejemplo `id,titulo`); por defecto, todos.
+
+Con la cabecera `Accept: application/x-ndjson` se emite el catálogo completo, un elemento por línea.
+
+La respuesta lleva un `ETag` que cambia con cada escritura en los elementos; si se envía en
+`If-None-Match` y sigue vigente, se responde `304 Not Modified` sin consultar los elementos.
 
 📦 **Retorna**:
-- Una lista de objetos `ElementoBiblioteca`.
+- Una página con objetos `ElementoOut` y el cursor de la página siguiente.
 
 ❌ **Errores**:
+- `400 Bad Request`: Si el cursor no es válido.
 - `404 Not Found`: Si no existen elementos registrados en la biblioteca.
 """
-    elementos = await elemento_service.listar_elementos_service()
+    campos = leer_campos(fields, ElementoOut)
+    cambios, marca = await elemento_service.cambios_elementos_service()
+    etag = etag_listado(request, cambios)
+    if coincide(request, etag):
+        return no_modificado(etag)
+    if acepta_ndjson(request):
+        return con_etag(respuesta_ndjson(elemento_service.iterar_elementos_service(campos, marca), esquema_salida(ElementoOut, campos)), response, etag)
+    try:
+        elementos, next_cursor = await elemento_service.listar_elementos_service(limit, cursor, sort, campos, marca)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not elementos:
         raise HTTPException(status_code=404, detail="No hay elementos en la biblioteca")
-    return elementos
+    return con_etag(respuesta_pagina(ElementoOut, campos, elementos, next_cursor), response, etag)
+
+@router.get("/estadisticas", response_model=EstadisticasOut)
+async def obtener_estadisticas():
+    """
+📊 **Estadísticas del catálogo**
+
+Devuelve el total de elementos y sus conteos por tipo, año de publicación, género, editorial y categoría.
+
+Los conteos se calculan en el servidor con una sola agregación y se sirven desde memoria; cuando
+caducan se recalculan en segundo plano, por lo que pueden tener unos segundos de retraso (ver `generado`).
+
+📦 **Retorna**:
+- Un objeto `EstadisticasOut`.
+"""
+    return await elemento_service.obtener_estadisticas_service()
+
+@router.get("/autocompletar", response_model=list[ElementoOut])
+async def autocompletar(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(LIMITE_AUTOCOMPLETADO, ge=1, le=LIMITE_AUTOCOMPLETADO_MAXIMO),
+):
+    """
+⌨️ **Autocompletar títulos y autores**
+
+Sugiere elementos mientras el usuario escribe: devuelve los que tienen en el título o en el autor
+alguna palabra que empieza por `q`, sin distinguir mayúsculas ni acentos.
+
+Se sirve desde un índice en memoria, sin consultar la base de datos, por lo que puede llamarse en
+cada pulsación de tecla.
+
+📥 **Parámetros**:
+- `q` (*str*): Texto escrito hasta el momento.
+- `limit` (*int*): Número máximo de sugerencias.
+
+📦 **Retorna**:
+- Una lista de objetos `ElementoOut`, vacía si no hay coincidencias.
+"""
+    return respuesta_lista(ElementoOut, None, elemento_service.autocompletar_service(q, limit))
+
+@router.get("/buscar", response_model=PaginaBusquedaOut)
+async def buscar_con_detalle(
+    titulo: str = Query(..., min_length=1),
+    limit: int = Query(LIMITE_BUSQUEDA, ge=1, le=LIMITE_BUSQUEDA_MAXIMO),
+    cursor: str | None = None,
+    sort: OrdenBusqueda = "relevancia",
+):
+    """
+🔍 **Buscar libros, DVDs y revistas por título**
+
+Busca en todos los tipos de elemento a la vez y devuelve cada resultado con todos sus datos
+(ISBN, duración, categoría, etc.), en una sola consulta y sin distinguir mayúsculas ni acentos.
+
+📥 **Parámetros**:
+- `titulo` (*str*): Texto a buscar en el título.
+- `limit` (*int*): Número máximo de resultados por página.
+- `cursor` (*str*): Valor de `next_cursor` devuelto por la página anterior.
+- `sort` (*str*): Orden de los resultados: `relevancia` (por defecto), `titulo` o `ano_publicacion`.
+
+📦 **Retorna**:
+- Una página de resultados y el cursor de la página siguiente. Cada resultado tiene los campos
+  de `LibroOut`, `DVDOut` o `RevistaOut` según su campo `tipo`.
+
+❌ **Errores**:
+- `400 Bad Request`: Si el cursor no es válido.
+- `404 Not Found`: Si ningún elemento coincide con el título.
+"""
+    try:
+        elementos, next_cursor = await elemento_service.buscar_elementos_detallados_service(titulo, limit, cursor, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not elementos:
+        raise HTTPException(status_code=404, detail="Elemento no encontrado")
+    return respuesta_pagina(ElementoBusquedaOut, None, elementos, next_cursor)
 
-@router.get("/buscar/{titulo}", response_model=list[ElementoBiblioteca])
-async def buscar_por_titulo(titulo: str):
+@router.get("/buscar/{titulo}", response_model=list[ElementoOut])
+async def buscar_por_titulo(
+    titulo: str,
+    limit: int = Query(LIMITE_BUSQUEDA, ge=1, le=LIMITE_BUSQUEDA_MAXIMO),
+    fields: str | None = Query(None, description=DESCRIPCION_FIELDS),
+):
     """
 🔍 **Buscar elementos por título**
 
-Permite buscar todos los elementos de la biblioteca que coincidan con un título específico.
+Permite buscar los elementos de la biblioteca cuyo título contenga el texto indicado, sin distinguir mayúsculas ni acentos.
 
 📥 **Parámetros**:
 - `titulo` (*str*): El título del elemento a buscar.
+- `limit` (*int*): Número máximo de resultados.
+- `fields` (*str*): Campos a devolver separados por comas; por defecto, todos.
 
 📦 **Retorna**:
-- Una lista de objetos `ElementoBiblioteca` que coincidan con el título.
+- Una lista de objetos `ElementoOut`, de la coincidencia más relevante a la menos relevante.
 
 ❌ **Errores**:
 - `404 Not Found`: Si no se encuentra ningún elemento con el título proporcionado.
 """
-    elementos = await elemento_service.buscar_elemento_por_titulo_service(titulo)
+    campos = leer_campos(fields, ElementoOut)
+    elementos = await elemento_service.buscar_elemento_por_titulo_service(titulo, limit, campos)
     if not elementos:
         raise HTTPException(status_code=404, detail="Elemento no encontrado")
-    return elementos
+    return respuesta_lista(ElementoOut, campos, elementos)
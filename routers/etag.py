@@ -0,0 +1,70 @@
+"""
+ETag e `If-None-Match` para los listados y las consultas por ID o ISBN.
+
+En los listados el ETag se calcula sin leer los datos, a partir del contador de cambios de la
+colección (más una huella de la ruta, la query string y el formato pedido): si el cliente envía
+un ETag que sigue vigente se responde `304 Not Modified` sin ejecutar la consulta ni serializar
+la respuesta. En las consultas se usa la `version` del documento que se devolvería (ver
+`crud/versiones.py`), que suele salir de la caché: el `304` ahorra la serialización y el envío.
+"""
+from fastapi import Request, Response, status
+from routers.ndjson import acepta_ndjson
+import hashlib
+
+# Documenta en OpenAPI la respuesta a `If-None-Match`
+RESPUESTA_NO_MODIFICADO = {
+    304: {'description': 'El recurso no cambió desde el ETag enviado en `If-None-Match`.'},
+}
+
+def etag_listado(request: Request, cambios: int) -> str:
+    """
+    ETag de un listado: el contador de cambios de su colección y una huella de la petición.
+
+    La huella distingue páginas, órdenes, campos y formatos (JSON o NDJSON) del mismo listado.
+    """
+    parametros = '&'.join(sorted(f'{clave}={valor}' for clave, valor in request.query_params.multi_items()))
+    peticion = f'{request.url.path}?{parametros}|{"ndjson" if acepta_ndjson(request) else "json"}'
+    huella = hashlib.sha1(peticion.encode()).hexdigest()[:16]
+    return f'"{cambios}-{huella}"'
+
+def etag_documento(id: str, version: int) -> str:
+    """
+    ETag de un documento: su ID y su versión.
+    """
+    return f'"{id}-{version}"'
+
+def coincide(request: Request, etag: str) -> bool:
+    """
+    Indica si la cabecera `If-None-Match` incluye el ETag (o es `*`).
+
+    Como indica HTTP para `If-None-Match`, la comparación es débil: `W/"x"` coincide con `"x"`.
+    """
+    cabecera = request.headers.get('if-none-match')
+    if not cabecera:
+        return False
+    etiquetas = {etiqueta.strip().removeprefix('W/') for etiqueta in cabecera.split(',')}
+    return '*' in etiquetas or etag in etiquetas
+
+def no_modificado(etag: str) -> Response:
+    """
+    Respuesta `304 Not Modified`, sin cuerpo, con el ETag vigente.
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+def con_etag(resultado, response: Response, etag: str):
+    """
+    Añade la cabecera `ETag` a la respuesta de un endpoint.
+
+    Parámetros:
+    - resultado: Valor devuelto por el endpoint; si ya es una `Response` la cabecera se le añade directamente.
+    - response (Response): Respuesta temporal que FastAPI inyecta en el endpoint, usada en los demás casos.
+    - etag (str): ETag a enviar.
+
+    Retorna:
+    - El mismo `resultado`.
+    """
+    if isinstance(resultado, Response):
+        resultado.headers['ETag'] = etag
+    else:
+        response.headers['ETag'] = etag
+    return resultado
@@ -1,5 +1,11 @@
-from fastapi import APIRouter, HTTPException, status
-from schemas.libro import LibroCreate, LibroOut
+from typing import Annotated
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response, status
+from routers.etag import RESPUESTA_NO_MODIFICADO, etag_listado, etag_documento, coincide, no_modificado, con_etag
+from routers.ndjson import RESPUESTA_NDJSON, acepta_ndjson, respuesta_ndjson
+from routers.proyeccion import DESCRIPCION_FIELDS, leer_campos, esquema_salida, respuesta_pagina, respuesta_lista
+from schemas.libro import LibroCreate, LibroOut, LibroUpdate
+from schemas.lote import ResultadoLote, TAMANO_MAXIMO_LOTE
+from schemas.paginacion import Pagina, OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_MAXIMO, LIMITE_BUSQUEDA, LIMITE_BUSQUEDA_MAXIMO
 from services import libro as libro_service
 
 router = APIRouter(prefix="/libros", tags=["Libros"])
@@ -16,25 +22,80 @@ async def crear_libro(libro: LibroCreate):
 
     **Retorna:**
     - `LibroOut`: Detalles del libro creado.
+
+    **Errores:**
+    - `409 Conflict`: Si ya existe un libro con el mismo ISBN.
     """
-    libro_creado = await libro_service.crear_libro_service(libro)
+    try:
+        libro_creado = await libro_service.crear_libro_service(libro)
+    except libro_service.ISBNDuplicado as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     return LibroOut.from_model(libro_creado)
 
-@router.get("/", response_model=list[LibroOut])
-async def listar_libros():
+@router.post("/bulk", response_model=list[ResultadoLote])
+async def crear_libros(libros: Annotated[list[LibroCreate], Body(max_length=TAMANO_MAXIMO_LOTE)]):
+    """
+    📚 **Crear libros en bloque**
+
+    Registra varios libros en una sola petición. Todo el lote se escribe con dos inserciones
+    masivas, por lo que el coste no crece con la latencia de cada ida y vuelta a la base de datos.
+
+    **Parámetros:**
+    - `libros` (list[LibroCreate]): Arreglo con los datos de cada libro.
+
+    **Retorna:**
+    - `list[ResultadoLote]`: Para cada posición del arreglo, el `id` creado o el `error` producido.
     """
-    📚 **Listar todos los libros**
+    return await libro_service.crear_libros_service(libros)
+
+@router.get("/", response_model=Pagina[LibroOut], responses={**RESPUESTA_NDJSON, **RESPUESTA_NO_MODIFICADO})
+async def listar_libros(
+    request: Request,
+    response: Response,
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: str | None = None,
+    sort: OrdenPaginacion = "id",
+    fields: str | None = Query(None, description=DESCRIPCION_FIELDS),
+):
+    """
+    📚 **Listar libros**
+
+    Recupera una página de libros registrados usando paginación por cursor.
+
+    **Parámetros:**
+    - `limit` (int): Número máximo de libros por página.
+    - `cursor` (str): Valor de `next_cursor` devuelto por la página anterior.
+    - `sort` (str): Orden del listado: `id`, `titulo` o `ano_publicacion`.
+    - `fields` (str): Campos a devolver separados por comas (por ejemplo `id,titulo`); por defecto, todos.
 
-    Recupera la lista completa de libros registrados.
+    Con la cabecera `Accept: application/x-ndjson` se ignora la paginación y se emite el
+    catálogo completo de libros, un objeto JSON por línea.
+
+    La respuesta lleva un `ETag` que cambia con cada escritura en los libros; si se envía en
+    `If-None-Match` y sigue vigente, se responde `304 Not Modified` sin consultar los libros.
 
     **Retorna:**
-    - `list[LibroOut]`: Lista de todos los libros disponibles.
+    - `Pagina[LibroOut]`: Libros de la página y cursor de la siguiente.
     """
-    libros = await libro_service.listar_libros_service()
-    return [LibroOut.from_model(libro) for libro in libros]
+    campos = leer_campos(fields, LibroOut)
+    cambios, marca = await libro_service.cambios_libros_service()
+    etag = etag_listado(request, cambios)
+    if coincide(request, etag):
+        return no_modificado(etag)
+    if acepta_ndjson(request):
+        return con_etag(respuesta_ndjson(libro_service.iterar_libros_service(campos, marca), esquema_salida(LibroOut, campos)), response, etag)
+    try:
+        libros, next_cursor = await libro_service.listar_libros_service(limit, cursor, sort, campos, marca)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return con_etag(respuesta_pagina(LibroOut, campos, libros, next_cursor), response, etag)
 
 @router.get("/buscar/titulo/{titulo}", response_model=list[LibroOut])
-async def buscar_por_titulo(titulo: str):
+async def buscar_por_titulo(
+    titulo: str,
+    limit: int = Query(LIMITE_BUSQUEDA, ge=1, le=LIMITE_BUSQUEDA_MAXIMO),
+    fields: str | None = Query(None, description=DESCRIPCION_FIELDS),
+):
     """
     🔍 **Buscar libros por título**
 
@@ -42,32 +103,45 @@ async def buscar_por_titulo(titulo: str):
 
     **Parámetros:**
     - `titulo` (str): Título del libro a buscar.
+    - `limit` (int): Número máximo de resultados.
+    - `fields` (str): Campos a devolver separados por comas; por defecto, todos.
 
     **Retorna:**
     - `list[LibroOut]`: Lista de libros que coinciden con el título.
     """
-    libros = await libro_service.buscar_libro_por_titulo_service(titulo)
+    campos = leer_campos(fields, LibroOut)
+    libros = await libro_service.buscar_libro_por_titulo_service(titulo, limit, campos)
     if not libros:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No se encontraron libros con ese título")
-    return [LibroOut.from_model(libro) for libro in libros]
+    return respuesta_lista(LibroOut, campos, libros)
 
-@router.get("/buscar/isbn/{isbn}", response_model=LibroOut)
-async def buscar_por_isbn(isbn: str):
+@router.get("/buscar/isbn/{isbn}", response_model=LibroOut, responses=RESPUESTA_NO_MODIFICADO)
+async def buscar_por_isbn(isbn: str, request: Request, response: Response):
     """
     🔎 **Buscar libro por ISBN**
 
     Recupera un libro específico mediante su código ISBN.
 
+    La respuesta lleva un `ETag` con la versión del libro; si se envía en `If-None-Match` y el
+    libro no ha cambiado, se responde `304 Not Modified`.
+
     **Parámetros:**
     - `isbn` (str): ISBN del libro a buscar.
 
     **Retorna:**
     - `LibroOut`: Detalles del libro encontrado.
+
+    **Errores:**
+    - `404 Not Found`: Si no existe un libro con ese ISBN.
     """
-    libro = await libro_service.buscar_libro_por_isbn_service(isbn)
-    if not libro:
+    try:
+        libro, version = await libro_service.buscar_libro_por_isbn_service(isbn)
+    except ValueError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Libro no encontrado")
-    return LibroOut.from_model(libro)
+    etag = etag_documento(libro["id"], version)
+    if coincide(request, etag):
+        return no_modificado(etag)
+    return con_etag(libro, response, etag)
 
 @router.put("/actualizar/{id}", response_model=LibroOut)
 async def actualizar_por_id(id: str, libro: LibroCreate):
@@ -82,11 +156,42 @@ async def actualizar_por_id(id: str, libro: LibroCreate):
 
     **Retorna:**
     - `LibroOut`: Libro actualizado.
+
+    **Errores:**
+    - `409 Conflict`: Si el nuevo ISBN ya pertenece a otro libro.
     """
-    actualizado = await libro_service.actualizar_libro_por_id_service(id, libro)
+    try:
+        actualizado = await libro_service.actualizar_libro_por_id_service(id, libro)
+    except libro_service.ISBNDuplicado as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     if not actualizado:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Libro no encontrado")
-    return LibroOut.from_model(actualizado)
+    return actualizado
+
+@router.patch("/actualizar/{id}", response_model=LibroOut)
+async def actualizar_parcial_por_id(id: str, cambios: LibroUpdate):
+    """
+    🩹 **Actualizar parcialmente un libro por ID**
+
+    Modifica solo los campos enviados en el cuerpo; el resto del libro se conserva.
+
+    **Parámetros:**
+    - `id` (str): ID del libro a actualizar.
+    - `cambios` (LibroUpdate): Campos a modificar.
+
+    **Retorna:**
+    - `LibroOut`: Libro actualizado.
+
+    **Errores:**
+    - `404 Not Found`: Si no existe un libro con ese ID.
+    - `409 Conflict`: Si el nuevo ISBN ya pertenece a otro libro.
+    """
+    try:
+        return await libro_service.actualizar_parcial_libro_por_id_service(id, cambios)
+    except libro_service.ISBNDuplicado as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Libro no encontrado")
 
 @router.delete("/eliminar/id/{id}")
 async def eliminar_por_id(id: str):
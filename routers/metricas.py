@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from services.metricas import exponer, TIPO_CONTENIDO
+
+router = APIRouter(tags=["Métricas"])
+
+@router.get("/metrics", response_class=Response, include_in_schema=False)
+async def metricas():
+    """
+📈 **Métricas en formato Prometheus**
+
+Devuelve las métricas del proceso en el formato de texto de Prometheus:
+- `http_request_duration_seconds`: Duración de las peticiones por método, ruta y estado.
+- `http_response_size_bytes`: Tamaño de las respuestas por método y ruta.
+- `http_requests_in_flight`: Peticiones en curso por método.
+- `mongodb_command_duration_seconds`: Duración de los comandos de MongoDB por comando y colección.
+- `mongodb_command_failures_total`: Comandos de MongoDB fallidos.
+- `mongodb_command_documents_total`: Documentos devueltos o escritos por comando y colección.
+"""
+    return Response(content=exponer(), media_type=TIPO_CONTENIDO)
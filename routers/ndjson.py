@@ -0,0 +1,54 @@
+from typing import AsyncIterator
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from routers.proyeccion import adaptador
+
+MEDIA_TYPE_NDJSON = 'application/x-ndjson'
+# Documentos que se serializan y envían juntos en cada fragmento de la respuesta
+TAMANO_FRAGMENTO = 100
+
+# Documenta en OpenAPI el tipo de contenido alternativo de los listados
+RESPUESTA_NDJSON = {
+    200: {
+        'content': {MEDIA_TYPE_NDJSON: {}},
+        'description': f'Página JSON, o el catálogo completo si se pide `Accept: {MEDIA_TYPE_NDJSON}`.',
+    }
+}
+
+def acepta_ndjson(request: Request) -> bool:
+    """
+    Indica si el cliente pidió la respuesta en formato NDJSON mediante la cabecera `Accept`.
+    """
+    return MEDIA_TYPE_NDJSON in request.headers.get('accept', '')
+
+def respuesta_ndjson(documentos: AsyncIterator[dict], esquema: type[BaseModel]) -> StreamingResponse:
+    """
+    Construye una respuesta que emite un objeto JSON por línea a medida que se leen los documentos.
+
+    Los documentos se agrupan en fragmentos de `TAMANO_FRAGMENTO`: cada fragmento se valida de una
+    vez y cada línea se escribe con el serializador compilado del esquema, sin pasar por objetos
+    intermedios ni por `json.dumps`.
+
+    Parámetros:
+    - documentos (AsyncIterator[dict]): Documentos con la forma del esquema, leídos de la base de datos por lotes.
+    - esquema (type[BaseModel]): Esquema de salida (completo o recortado) de cada línea.
+
+    Retorna:
+    - StreamingResponse: Respuesta con `media_type` `application/x-ndjson`.
+    """
+    lista, item = adaptador(list[esquema]), adaptador(esquema)
+
+    def serializar(fragmento: list[dict]) -> bytes:
+        return b''.join(item.dump_json(modelo) + b'\n' for modelo in lista.validate_python(fragmento))
+
+    async def generar():
+        fragmento = []
+        async for documento in documentos:
+            fragmento.append(documento)
+            if len(fragmento) >= TAMANO_FRAGMENTO:
+                yield serializar(fragmento)
+                fragmento = []
+        if fragmento:
+            yield serializar(fragmento)
+    return StreamingResponse(generar(), media_type=MEDIA_TYPE_NDJSON)
@@ -0,0 +1,52 @@
+from functools import lru_cache
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+from schemas.paginacion import Pagina
+from schemas.proyeccion import campos_solicitados, esquema_recortado
+
+DESCRIPCION_FIELDS = 'Campos a devolver separados por comas (por ejemplo `id,titulo`). Por defecto se devuelven todos.'
+
+def leer_campos(fields: str | None, esquema: type[BaseModel]) -> tuple[str, ...] | None:
+    """
+    Valida el parámetro `fields` contra el esquema de salida del endpoint.
+
+    Errores:
+    - HTTPException 400: Si se pide algún campo que el esquema no tiene.
+    """
+    try:
+        return campos_solicitados(fields, esquema)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def esquema_salida(esquema: type[BaseModel], campos: tuple[str, ...] | None) -> type[BaseModel]:
+    """
+    Esquema con el que se serializa la respuesta: el completo, o el recortado a los campos pedidos.
+    """
+    return esquema if campos is None else esquema_recortado(esquema, campos)
+
+@lru_cache(maxsize=None)
+def adaptador(tipo) -> TypeAdapter:
+    """
+    `TypeAdapter` de un tipo de respuesta, construido (y compilado por pydantic-core) una sola vez.
+    """
+    return TypeAdapter(tipo)
+
+def respuesta_pagina(esquema: type[BaseModel], campos: tuple[str, ...] | None, items: list[dict], next_cursor: str | None) -> Response:
+    """
+    Serializa una página de documentos que la agregación ya devuelve con la forma del esquema.
+
+    Los diccionarios se validan una sola vez y se convierten directamente a bytes JSON con el
+    serializador compilado de `Pagina[esquema]`. El `response_model` del endpoint sigue
+    describiendo la respuesta en OpenAPI, pero como aquí se devuelve una `Response`, FastAPI no
+    vuelve a validarla ni a codificarla.
+    """
+    pagina = adaptador(Pagina[esquema_salida(esquema, campos)])
+    return Response(content=pagina.dump_json(pagina.validate_python({'items': items, 'next_cursor': next_cursor})), media_type='application/json')
+
+def respuesta_lista(esquema: type[BaseModel], campos: tuple[str, ...] | None, items: list[dict]) -> Response:
+    """
+    Serializa una lista de resultados con la forma del esquema, del mismo modo que `respuesta_pagina`.
+    """
+    lista = adaptador(list[esquema_salida(esquema, campos)])
+    return Response(content=lista.dump_json(lista.validate_python(items)), media_type='application/json')
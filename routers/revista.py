@@ -1,5 +1,11 @@
-from fastapi import APIRouter, HTTPException, status
-from schemas.revista import RevistaCreate, RevistaOut
+from typing import Annotated
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response, status
+from routers.etag import RESPUESTA_NO_MODIFICADO, etag_listado, etag_documento, coincide, no_modificado, con_etag
+from routers.ndjson import RESPUESTA_NDJSON, acepta_ndjson, respuesta_ndjson
+from routers.proyeccion import DESCRIPCION_FIELDS, leer_campos, esquema_salida, respuesta_pagina, respuesta_lista
+from schemas.revista import RevistaCreate, RevistaOut, RevistaUpdate
+from schemas.lote import ResultadoLote, TAMANO_MAXIMO_LOTE
+from schemas.paginacion import Pagina, OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_MAXIMO, LIMITE_BUSQUEDA, LIMITE_BUSQUEDA_MAXIMO
 from services import revista as revista_service
 
 router = APIRouter(prefix='/revistas', tags=['Revistas'])
@@ -20,39 +26,98 @@ async def crear_revista(revista: RevistaCreate):
     revista_creada = await revista_service.crear_revista_service(revista)
     return RevistaOut.from_model(revista_creada)
 
-@router.get('/', response_model=list[RevistaOut])
-async def listar_revistas():
+@router.post('/bulk', response_model=list[ResultadoLote])
+async def crear_revistas(revistas: Annotated[list[RevistaCreate], Body(max_length=TAMANO_MAXIMO_LOTE)]):
     """
-    📚 **Listar todas las revistas**
+    📘 **Crear revistas en bloque**
 
-    Muestra todas las revistas registradas.
+    Registra varios revistas en una sola petición. Todo el lote se escribe con dos inserciones
+    masivas, por lo que el coste no crece con la latencia de cada ida y vuelta a la base de datos.
+
+    **Parámetros:**
+    - `revistas` (list[RevistaCreate]): Arreglo con los datos de cada revista.
 
     **Retorna:**
-    - `list[RevistaOut]`: Lista de revistas.
+    - `list[ResultadoLote]`: Para cada posición del arreglo, el `id` creado o el `error` producido.
     """
-    revistas = await revista_service.listar_revistas_service()
-    return [RevistaOut.from_model(revista) for revista in revistas]
+    return await revista_service.crear_revistas_service(revistas)
+
+@router.get('/', response_model=Pagina[RevistaOut], responses={**RESPUESTA_NDJSON, **RESPUESTA_NO_MODIFICADO})
+async def listar_revistas(
+    request: Request,
+    response: Response,
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: str | None = None,
+    sort: OrdenPaginacion = 'id',
+    fields: str | None = Query(None, description=DESCRIPCION_FIELDS),
+):
+    """
+    📚 **Listar revistas**
+
+    Muestra una página de las revistas registradas.
+
+    **Parámetros:**
+    - `limit` (int): Número máximo de revistas por página.
+    - `cursor` (str): Valor de `next_cursor` devuelto por la página anterior.
+    - `sort` (str): Orden del listado: `id`, `titulo` o `ano_publicacion`.
+    - `fields` (str): Campos a devolver separados por comas (por ejemplo `id,titulo`); por defecto, todos.
+
+    Con la cabecera `Accept: application/x-ndjson` se ignora la paginación y se emite el
+    catálogo completo de revistas, un objeto JSON por línea.
 
-@router.get('/buscar/id/{id}', response_model=RevistaOut)
-async def buscar_revista_por_id(id: str):
+    La respuesta lleva un `ETag` que cambia con cada escritura en las revistas; si se envía en
+    `If-None-Match` y sigue vigente, se responde `304 Not Modified` sin consultar las revistas.
+
+    **Retorna:**
+    - `Pagina[RevistaOut]`: Revistas de la página y cursor de la siguiente.
+    """
+    campos = leer_campos(fields, RevistaOut)
+    cambios, marca = await revista_service.cambios_revistas_service()
+    etag = etag_listado(request, cambios)
+    if coincide(request, etag):
+        return no_modificado(etag)
+    if acepta_ndjson(request):
+        return con_etag(respuesta_ndjson(revista_service.iterar_revistas_service(campos, marca), esquema_salida(RevistaOut, campos)), response, etag)
+    try:
+        revistas, next_cursor = await revista_service.listar_revistas_service(limit, cursor, sort, campos, marca)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return con_etag(respuesta_pagina(RevistaOut, campos, revistas, next_cursor), response, etag)
+
+@router.get('/buscar/id/{id}', response_model=RevistaOut, responses=RESPUESTA_NO_MODIFICADO)
+async def buscar_revista_por_id(id: str, request: Request, response: Response):
     """
     🔎 **Buscar revista por ID**
 
     Recupera los datos de una revista específica usando su ID.
 
+    La respuesta lleva un `ETag` con la versión de la revista; si se envía en `If-None-Match` y
+    la revista no ha cambiado, se responde `304 Not Modified`.
+
     **Parámetros:**
     - `id` (str): ID de la revista.
 
     **Retorna:**
     - `RevistaOut`: Revista encontrada.
+
+    **Errores:**
+    - `404 Not Found`: Si no existe una revista con ese ID.
     """
-    revista = await revista_service.buscar_revista_por_id_service(id)
-    if not revista:
+    try:
+        revista, version = await revista_service.buscar_revista_por_id_service(id)
+    except ValueError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Revista no encontrada')
-    return RevistaOut.from_model(revista)
+    etag = etag_documento(revista['id'], version)
+    if coincide(request, etag):
+        return no_modificado(etag)
+    return con_etag(revista, response, etag)
 
 @router.get('/buscar/titulo/{titulo}', response_model=list[RevistaOut])
-async def buscar_revista_por_titulo(titulo: str):
+async def buscar_revista_por_titulo(
+    titulo: str,
+    limit: int = Query(LIMITE_BUSQUEDA, ge=1, le=LIMITE_BUSQUEDA_MAXIMO),
+    fields: str | None = Query(None, description=DESCRIPCION_FIELDS),
+):
     """
     🔍 **Buscar revistas por título**
 
@@ -60,14 +125,17 @@ async def buscar_revista_por_titulo(titulo: str):
 
     **Parámetros:**
     - `titulo` (str): Título a buscar.
+    - `limit` (int): Número máximo de resultados.
+    - `fields` (str): Campos a devolver separados por comas; por defecto, todos.
 
     **Retorna:**
     - `list[RevistaOut]`: Resultados encontrados.
     """
-    revistas = await revista_service.buscar_revista_por_titulo_service(titulo)
+    campos = leer_campos(fields, RevistaOut)
+    revistas = await revista_service.buscar_revista_por_titulo_service(titulo, limit, campos)
     if not revistas:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No se encontraron revistas con ese título')
-    return [ RevistaOut.from_model(revista) for revista in revistas ]
+    return respuesta_lista(RevistaOut, campos, revistas)
 
 @router.get('buscar/categoria/{categoria}', response_model=list[RevistaOut])
 async def buscar_revista_por_categoria(categoria: str):
@@ -104,7 +172,29 @@ async def actualizar_revista_por_id(id: str, revista: RevistaCreate):
     actualizado = await revista_service.actualizar_revista_por_id_service(id, revista)
     if not actualizado:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Revista no encontrada')
-    return RevistaOut.from_model(actualizado)
+    return actualizado
+
+@router.patch('/actualizar/{id}', response_model=RevistaOut)
+async def actualizar_parcial_revista_por_id(id: str, cambios: RevistaUpdate):
+    """
+    🩹 **Actualizar parcialmente una revista por ID**
+
+    Modifica solo los campos enviados en el cuerpo; el resto de la revista se conserva.
+
+    **Parámetros:**
+    - `id` (str): ID de la revista.
+    - `cambios` (RevistaUpdate): Campos a modificar.
+
+    **Retorna:**
+    - `RevistaOut`: Revista actualizada.
+
+    **Errores:**
+    - `404 Not Found`: Si no existe una revista con ese ID.
+    """
+    try:
+        return await revista_service.actualizar_parcial_revista_por_id_service(id, cambios)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Revista no encontrada')
 
 @router.delete('eliminar/id/{id}')
 async def eliminar_por_id(id: str):
@@ -0,0 +1,41 @@
+from typing import Annotated, Literal, Union
+from pydantic import Field
+from schemas.dvd import DVDOut
+from schemas.libro import LibroOut
+from schemas.paginacion import Pagina
+from schemas.revista import RevistaOut
+
+class LibroBusquedaOut(LibroOut):
+    """
+Libro devuelto por la búsqueda unificada: todos los campos de `LibroOut` más su `tipo`.
+
+Atributos:
+- tipo (str): Siempre 'Libro'.
+    """
+    tipo: Literal['Libro']
+
+class DVDBusquedaOut(DVDOut):
+    """
+DVD devuelto por la búsqueda unificada: todos los campos de `DVDOut` más su `tipo`.
+
+Atributos:
+- tipo (str): Siempre 'DVD'.
+    """
+    tipo: Literal['DVD']
+
+class RevistaBusquedaOut(RevistaOut):
+    """
+Revista devuelta por la búsqueda unificada: todos los campos de `RevistaOut` más su `tipo`.
+
+Atributos:
+- tipo (str): Siempre 'Revista'.
+    """
+    tipo: Literal['Revista']
+
+# Resultado de la búsqueda unificada: el campo `tipo` indica cuál de los tres esquemas es
+ElementoBusquedaOut = Annotated[Union[LibroBusquedaOut, DVDBusquedaOut, RevistaBusquedaOut], Field(discriminator='tipo')]
+
+class PaginaBusquedaOut(Pagina[ElementoBusquedaOut]):
+    """
+Página de resultados de la búsqueda unificada (con nombre propio en el esquema de OpenAPI).
+    """
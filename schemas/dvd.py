@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class DVDCreate(BaseModel):
@@ -19,6 +20,31 @@ Atributos:
     duracion: int
     genero: str
     
+class DVDUpdate(BaseModel):
+    """
+Esquema de entrada para la actualización parcial del DVD.
+
+Todos los campos son opcionales: solo se modifican los que se envían en la petición.
+
+Atributos:
+- titulo (str | None): Nuevo valor de `titulo`.
+- autor (str | None): Nuevo valor de `autor`.
+- ano_publicacion (int | None): Nuevo valor de `ano_publicacion`.
+- duracion (int | None): Nuevo valor de `duracion`.
+- genero (str | None): Nuevo valor de `genero`.
+    """
+    titulo: Optional[str] = None
+    autor: Optional[str] = None
+    ano_publicacion: Optional[int] = None
+    duracion: Optional[int] = None
+    genero: Optional[str] = None
+
+    def cambios(self) -> dict:
+        """
+    Devuelve solo los campos enviados con un valor distinto de None.
+    """
+        return self.model_dump(exclude_unset=True, exclude_none=True)
+
 class DVDOut(BaseModel):
     """
 Esquema de salida que representa un DVD registrado en el sistema.
@@ -0,0 +1,43 @@
+from pydantic import BaseModel
+
+class ElementoOut(BaseModel):
+    """
+Esquema de salida que representa un elemento general de la biblioteca.
+
+Expone solo los datos comunes del elemento; los campos internos del índice de búsqueda
+no se devuelven en la API.
+
+Atributos:
+- id (str): Identificador único del elemento.
+- titulo (str): Título del material.
+- autor (str): Autor o creador del material.
+- ano_publicacion (int): Año de publicación o producción.
+- tipo (str): Tipo de elemento ('Libro', 'DVD' o 'Revista').
+    """
+    id: str
+    titulo: str
+    autor: str
+    ano_publicacion: int
+    tipo: str
+
+    class Config:
+        from_attributes = True
+
+    @classmethod
+    def from_model(cls, elemento):
+        """
+    Crea una instancia de `ElementoOut` a partir de un `ElementoBiblioteca`.
+
+    Parámetros:
+    - elemento (ElementoBiblioteca): Elemento leído de la base de datos.
+
+    Retorna:
+    - ElementoOut: Esquema listo para ser devuelto en la API.
+    """
+        return cls(
+            id=str(elemento.id),
+            titulo=elemento.titulo,
+            autor=elemento.autor,
+            ano_publicacion=elemento.ano_publicacion,
+            tipo=elemento.tipo
+        )
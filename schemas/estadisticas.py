@@ -0,0 +1,23 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+class EstadisticasOut(BaseModel):
+    """
+Esquema de salida con los conteos del catálogo de la biblioteca.
+
+Atributos:
+- total (int): Número total de elementos.
+- por_tipo (dict[str, int]): Elementos por tipo ('Libro', 'DVD' o 'Revista').
+- por_ano_publicacion (dict[str, int]): Elementos por año de publicación.
+- por_genero (dict[str, int]): Libros y DVDs por género.
+- por_editorial (dict[str, int]): Libros por editorial.
+- por_categoria (dict[str, int]): Revistas por categoría.
+- generado (datetime): Momento (UTC) en que se calcularon los conteos.
+    """
+    total: int
+    por_tipo: dict[str, int]
+    por_ano_publicacion: dict[str, int]
+    por_genero: dict[str, int]
+    por_editorial: dict[str, int]
+    por_categoria: dict[str, int]
+    generado: datetime
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class LibroCreate(BaseModel):
@@ -23,6 +24,35 @@ Atributos:
     genero: str
     editorial: str
 
+class LibroUpdate(BaseModel):
+    """
+Esquema de entrada para la actualización parcial del libro.
+
+Todos los campos son opcionales: solo se modifican los que se envían en la petición.
+
+Atributos:
+- titulo (str | None): Nuevo valor de `titulo`.
+- autor (str | None): Nuevo valor de `autor`.
+- ano_publicacion (int | None): Nuevo valor de `ano_publicacion`.
+- isbn (str | None): Nuevo valor de `isbn`.
+- numero_paginas (int | None): Nuevo valor de `numero_paginas`.
+- genero (str | None): Nuevo valor de `genero`.
+- editorial (str | None): Nuevo valor de `editorial`.
+    """
+    titulo: Optional[str] = None
+    autor: Optional[str] = None
+    ano_publicacion: Optional[int] = None
+    isbn: Optional[str] = None
+    numero_paginas: Optional[int] = None
+    genero: Optional[str] = None
+    editorial: Optional[str] = None
+
+    def cambios(self) -> dict:
+        """
+    Devuelve solo los campos enviados con un valor distinto de None.
+    """
+        return self.model_dump(exclude_unset=True, exclude_none=True)
+
 class LibroOut(BaseModel):
     """
 Esquema de salida que representa la información de un libro registrada en el sistema.
@@ -0,0 +1,17 @@
+from typing import Optional
+from pydantic import BaseModel
+
+TAMANO_MAXIMO_LOTE = 5000
+
+class ResultadoLote(BaseModel):
+    """
+Esquema de salida con el resultado de cada elemento de una creación masiva.
+
+Atributos:
+- indice (int): Posición del elemento en el arreglo recibido.
+- id (str | None): Identificador del documento creado, si la inserción tuvo éxito.
+- error (str | None): Motivo del fallo, si la inserción no se pudo completar.
+    """
+    indice: int
+    id: Optional[str] = None
+    error: Optional[str] = None
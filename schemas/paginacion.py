@@ -0,0 +1,25 @@
+from typing import Generic, Literal, Optional, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar('T')
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 500
+LIMITE_BUSQUEDA = 50
+LIMITE_BUSQUEDA_MAXIMO = 200
+LIMITE_AUTOCOMPLETADO = 10
+LIMITE_AUTOCOMPLETADO_MAXIMO = 50
+
+OrdenPaginacion = Literal['id', 'titulo', 'ano_publicacion']
+OrdenBusqueda = Literal['relevancia', 'titulo', 'ano_publicacion']
+
+class Pagina(BaseModel, Generic[T]):
+    """
+Esquema de salida genérico para los listados paginados por cursor.
+
+Atributos:
+- items (list[T]): Elementos de la página actual.
+- next_cursor (str | None): Cursor opaco para pedir la página siguiente. Es None cuando no hay más resultados.
+    """
+    items: list[T]
+    next_cursor: Optional[str] = None
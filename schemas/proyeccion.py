@@ -0,0 +1,43 @@
+from functools import lru_cache
+from pydantic import BaseModel, create_model
+
+def campos_solicitados(fields: str | None, esquema: type[BaseModel]) -> tuple[str, ...] | None:
+    """
+    Interpreta el parámetro `fields` (nombres separados por comas) contra un esquema de salida.
+
+    Parámetros:
+    - fields (str | None): Valor recibido en la petición.
+    - esquema (type[BaseModel]): Esquema de salida completo (p. ej. `LibroOut`).
+
+    Retorna:
+    - tuple[str, ...] | None: Campos pedidos en el orden del esquema, o None si no se pidió ninguno.
+
+    Errores:
+    - ValueError: Si la lista está vacía o contiene campos que el esquema no tiene.
+    """
+    if fields is None:
+        return None
+    pedidos = {campo.strip() for campo in fields.split(',') if campo.strip()}
+    desconocidos = pedidos - esquema.model_fields.keys()
+    if desconocidos:
+        raise ValueError(f'Campos desconocidos: {", ".join(sorted(desconocidos))}')
+    if not pedidos:
+        raise ValueError('El parámetro fields no contiene ningún campo')
+    return tuple(campo for campo in esquema.model_fields if campo in pedidos)
+
+@lru_cache(maxsize=None)
+def esquema_recortado(esquema: type[BaseModel], campos: tuple[str, ...]) -> type[BaseModel]:
+    """
+    Crea (una sola vez por combinación) un esquema con solo algunos campos de otro.
+
+    Parámetros:
+    - esquema (type[BaseModel]): Esquema de salida completo.
+    - campos (tuple[str, ...]): Campos a conservar, tal como los devuelve `campos_solicitados`.
+
+    Retorna:
+    - type[BaseModel]: Esquema con los campos indicados y sus mismos tipos.
+    """
+    return create_model(
+        f'{esquema.__name__}Parcial',
+        **{campo: (esquema.model_fields[campo].annotation, ...) for campo in campos},
+    )
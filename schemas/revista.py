@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class RevistaCreate(BaseModel):
@@ -19,6 +20,31 @@ Atributos:
     numero_edicion: int
     categoria: str
     
+class RevistaUpdate(BaseModel):
+    """
+Esquema de entrada para la actualización parcial de la revista.
+
+Todos los campos son opcionales: solo se modifican los que se envían en la petición.
+
+Atributos:
+- titulo (str | None): Nuevo valor de `titulo`.
+- autor (str | None): Nuevo valor de `autor`.
+- ano_publicacion (int | None): Nuevo valor de `ano_publicacion`.
+- numero_edicion (int | None): Nuevo valor de `numero_edicion`.
+- categoria (str | None): Nuevo valor de `categoria`.
+    """
+    titulo: Optional[str] = None
+    autor: Optional[str] = None
+    ano_publicacion: Optional[int] = None
+    numero_edicion: Optional[int] = None
+    categoria: Optional[str] = None
+
+    def cambios(self) -> dict:
+        """
+    Devuelve solo los campos enviados con un valor distinto de None.
+    """
+        return self.model_dump(exclude_unset=True, exclude_none=True)
+
 class RevistaOut(BaseModel):
     """
 Esquema de salida que representa una revista registrada en el sistema.
@@ -0,0 +1,417 @@
+"""
+Caché de lectura para las búsquedas puntuales (por ID o ISBN).
+
+Los valores se guardan ya convertidos al esquema de salida (diccionarios serializables) y se
+asocian a etiquetas como `libro:<id>`, de modo que las rutas de actualización y eliminación
+puedan invalidar de una vez todas las entradas de un documento (por ID, por ISBN, etc.).
+
+Backends disponibles (variable de entorno `CACHE_BACKEND`):
+- `memoria` (por defecto): LRU con caducidad dentro del propio proceso.
+- `redis`: caché compartida entre procesos; requiere el paquete `redis` y `CACHE_REDIS_URL`.
+- `ninguno`: desactiva la caché.
+
+Una lectura que falla en la caché consulta la base de datos y después guarda el resultado; si
+mientras tanto una escritura invalida sus etiquetas, el resultado ya es antiguo. Para no
+guardarlo, cada invalidación incrementa un número de generación y registra en cada etiqueta la
+generación en que se invalidó: la lectura toma la generación (`generacion()`) antes de consultar
+la base de datos y la pasa a `guardar`, que descarta el valor si alguna de sus etiquetas se ha
+invalidado después.
+
+`CacheRefrescada` cubre otro caso: un único valor costoso de calcular (como las estadísticas del
+catálogo) que se sirve desde memoria y se recalcula en segundo plano periódicamente.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable
+import asyncio
+import json
+import logging
+import os
+import time
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memoria')
+CACHE_TTL = float(os.getenv('CACHE_TTL', '60'))
+CACHE_TAMANO = int(os.getenv('CACHE_TAMANO', '10000'))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+class CacheBase(ABC):
+    """
+    Interfaz común de los backends de caché, con contadores de aciertos y fallos.
+    """
+
+    def __init__(self):
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self.descartes = 0
+
+    async def obtener(self, clave: str):
+        """
+        Devuelve el valor guardado para la clave, o None si no existe o ya caducó.
+        """
+        valor = await self._leer(clave)
+        if valor is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return valor
+
+    async def generacion(self) -> int:
+        """
+        Devuelve la generación actual de las invalidaciones, que se pasa a `guardar`.
+        """
+        return await self._generacion()
+
+    async def guardar(self, clave: str, valor, etiquetas: tuple[str, ...] = (), desde: int | None = None):
+        """
+        Guarda un valor asociándolo a las etiquetas indicadas.
+
+        Si se indica `desde` (la generación tomada antes de leer el valor de la base de datos) y
+        alguna de las etiquetas se ha invalidado después, el valor no se guarda.
+        """
+        if not await self._escribir(clave, valor, etiquetas, desde):
+            self.descartes += 1
+
+    async def invalidar(self, *etiquetas: str):
+        """
+        Elimina todas las entradas asociadas a cualquiera de las etiquetas.
+        """
+        self.invalidaciones += 1
+        await self._borrar_etiquetas(etiquetas)
+
+    async def vaciar(self):
+        """
+        Elimina todas las entradas.
+        """
+        self.invalidaciones += 1
+        await self._vaciar()
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            'backend': type(self).__name__,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'invalidaciones': self.invalidaciones,
+            'descartes': self.descartes,
+            'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+        }
+
+    @abstractmethod
+    async def _leer(self, clave: str):
+        """
+        Devuelve el valor de la clave, o None si no existe o ya caducó.
+        """
+
+    @abstractmethod
+    async def _escribir(self, clave: str, valor, etiquetas: tuple[str, ...], desde: int | None) -> bool:
+        """
+        Guarda el valor si ninguna etiqueta se ha invalidado después de `desde`; indica si lo guardó.
+        """
+
+    @abstractmethod
+    async def _borrar_etiquetas(self, etiquetas: tuple[str, ...]):
+        """
+        Elimina las entradas de las etiquetas y registra la generación en que se invalidaron.
+        """
+
+    @abstractmethod
+    async def _vaciar(self):
+        """
+        Elimina todas las entradas; los valores leídos antes ya no se guardan.
+        """
+
+    @abstractmethod
+    async def _generacion(self) -> int:
+        """
+        Devuelve la generación actual de las invalidaciones.
+        """
+
+class CacheNula(CacheBase):
+    """
+    Backend que no guarda nada; todas las consultas cuentan como fallo.
+    """
+
+    async def _leer(self, clave):
+        return None
+
+    async def _escribir(self, clave, valor, etiquetas, desde):
+        return True
+
+    async def _borrar_etiquetas(self, etiquetas):
+        pass
+
+    async def _vaciar(self):
+        pass
+
+    async def _generacion(self):
+        return 0
+
+class CacheMemoria(CacheBase):
+    """
+    Caché LRU con caducidad (TTL) dentro del proceso.
+
+    Recuerda la generación de las últimas `tamano` etiquetas invalidadas; un valor leído antes
+    de la más antigua que ha olvidado no se guarda.
+
+    Parámetros:
+    - tamano (int): Número máximo de entradas; al superarlo se descarta la menos usada.
+    - ttl (float): Segundos de validez de cada entrada.
+    """
+
+    def __init__(self, tamano: int = CACHE_TAMANO, ttl: float = CACHE_TTL):
+        super().__init__()
+        self.tamano = tamano
+        self.ttl = ttl
+        self.desalojos = 0
+        self._entradas: OrderedDict[str, tuple[float, object, tuple[str, ...]]] = OrderedDict()
+        self._etiquetas: dict[str, set[str]] = {}
+        self._generacion_actual = 0
+        self._invalidadas: OrderedDict[str, int] = OrderedDict()
+        self._olvidadas = 0
+
+    async def _leer(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        expira, valor, _ = entrada
+        if expira < time.monotonic():
+            self._quitar(clave)
+            return None
+        self._entradas.move_to_end(clave)
+        return valor
+
+    async def _escribir(self, clave, valor, etiquetas, desde):
+        if desde is not None and (
+            desde < self._olvidadas or any(self._invalidadas.get(etiqueta, 0) > desde for etiqueta in etiquetas)
+        ):
+            return False
+        if clave in self._entradas:
+            self._quitar(clave)
+        self._entradas[clave] = (time.monotonic() + self.ttl, valor, etiquetas)
+        for etiqueta in etiquetas:
+            self._etiquetas.setdefault(etiqueta, set()).add(clave)
+        while len(self._entradas) > self.tamano:
+            self._quitar(next(iter(self._entradas)))
+            self.desalojos += 1
+        return True
+
+    async def _borrar_etiquetas(self, etiquetas):
+        self._generacion_actual += 1
+        for etiqueta in etiquetas:
+            for clave in self._etiquetas.pop(etiqueta, set()):
+                self._quitar(clave)
+            self._invalidadas[etiqueta] = self._generacion_actual
+            self._invalidadas.move_to_end(etiqueta)
+        while len(self._invalidadas) > self.tamano:
+            _, self._olvidadas = self._invalidadas.popitem(last=False)
+
+    async def _vaciar(self):
+        self._entradas.clear()
+        self._etiquetas.clear()
+        self._generacion_actual += 1
+        self._invalidadas.clear()
+        self._olvidadas = self._generacion_actual
+
+    async def _generacion(self):
+        return self._generacion_actual
+
+    def _quitar(self, clave: str):
+        _, _, etiquetas = self._entradas.pop(clave)
+        for etiqueta in etiquetas:
+            claves = self._etiquetas.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._etiquetas[etiqueta]
+
+    def estadisticas(self) -> dict:
+        return {**super().estadisticas(), 'entradas': len(self._entradas), 'desalojos': self.desalojos}
+
+# Guarda la entrada solo si ni la caché se ha vaciado ni alguna de sus etiquetas se ha invalidado
+# después de la generación `desde` (-1 para no comprobarlo).
+# KEYS: entrada, generacion:vaciado, etiqueta:<e>..., invalidada:<e>...
+# ARGV: valor, segundos de validez, desde, clave
+GUARDAR_REDIS = """
+local desde = tonumber(ARGV[3])
+local n = (#KEYS - 2) / 2
+if desde >= 0 then
+    if tonumber(redis.call('GET', KEYS[2]) or '0') > desde then
+        return 0
+    end
+    for i = 1, n do
+        if tonumber(redis.call('GET', KEYS[2 + n + i]) or '0') > desde then
+            return 0
+        end
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+for i = 1, n do
+    redis.call('SADD', KEYS[2 + i], ARGV[4])
+    redis.call('EXPIRE', KEYS[2 + i], ARGV[2])
+end
+return 1
+"""
+
+class CacheRedis(CacheBase):
+    """
+    Caché compartida en Redis. Cada etiqueta es un conjunto con las claves asociadas.
+
+    La generación es un contador compartido (`generacion`); cada etiqueta invalidada guarda la
+    suya en `invalidada:<etiqueta>` durante al menos `ttl` segundos, y la comprobación y la
+    escritura se hacen en un mismo script de Lua.
+
+    Parámetros:
+    - url (str): URL de conexión a Redis.
+    - ttl (float): Segundos de validez de cada entrada.
+    """
+
+    def __init__(self, url: str = CACHE_REDIS_URL, ttl: float = CACHE_TTL):
+        super().__init__()
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND=redis requiere instalar el paquete "redis"')
+        self.ttl = ttl
+        self._redis = redis.from_url(url)
+        self._guardar = self._redis.register_script(GUARDAR_REDIS)
+
+    async def _leer(self, clave):
+        valor = await self._redis.get(f'cache:{clave}')
+        return None if valor is None else json.loads(valor)
+
+    async def _escribir(self, clave, valor, etiquetas, desde):
+        segundos = max(int(self.ttl), 1)
+        claves = [f'cache:{clave}', 'generacion:vaciado']
+        claves += [f'etiqueta:{etiqueta}' for etiqueta in etiquetas]
+        claves += [f'invalidada:{etiqueta}' for etiqueta in etiquetas]
+        argumentos = [json.dumps(valor), segundos, -1 if desde is None else desde, clave]
+        return bool(await self._guardar(keys=claves, args=argumentos))
+
+    async def _borrar_etiquetas(self, etiquetas):
+        # La generación se registra antes de borrar: una escritura posterior ya la ve, y una
+        # anterior se borra a continuación
+        generacion = await self._redis.incr('generacion')
+        segundos = max(int(self.ttl), 1)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for etiqueta in etiquetas:
+                pipe.set(f'invalidada:{etiqueta}', generacion, ex=segundos)
+            await pipe.execute()
+        for etiqueta in etiquetas:
+            claves = await self._redis.smembers(f'etiqueta:{etiqueta}')
+            nombres = [f'cache:{clave.decode()}' for clave in claves]
+            await self._redis.delete(f'etiqueta:{etiqueta}', *nombres)
+
+    async def _vaciar(self):
+        generacion = await self._redis.incr('generacion')
+        await self._redis.set('generacion:vaciado', generacion)
+        for patron in ('cache:*', 'etiqueta:*'):
+            nombres = [nombre async for nombre in self._redis.scan_iter(match=patron, count=1000)]
+            for inicio in range(0, len(nombres), 1000):
+                await self._redis.delete(*nombres[inicio:inicio + 1000])
+
+    async def _generacion(self):
+        return int(await self._redis.get('generacion') or 0)
+
+def crear_cache(backend: str = CACHE_BACKEND) -> CacheBase:
+    """
+    Construye el backend de caché configurado.
+
+    Parámetros:
+    - backend (str): 'memoria', 'redis' o 'ninguno'.
+
+    Retorna:
+    - CacheBase: Instancia del backend.
+
+    Errores:
+    - ValueError: Si el backend no es conocido.
+    """
+    if backend == 'memoria':
+        return CacheMemoria()
+    if backend == 'redis':
+        return CacheRedis()
+    if backend == 'ninguno':
+        return CacheNula()
+    raise ValueError(f'Backend de caché desconocido: {backend}')
+
+cache = crear_cache()
+
+class CacheRefrescada:
+    """
+    Valor único calculado por una función asíncrona y servido desde memoria.
+
+    Una vez iniciada (`iniciar`), una tarea en segundo plano recalcula el valor cada `ttl`
+    segundos, de modo que las peticiones nunca esperan al cálculo salvo la primera si llega antes
+    de que termine. Sin la tarea (o si un recálculo falla o tarda), una petición que encuentra el
+    valor caducado sigue devolviendo el último y lanza ella misma un único recálculo.
+
+    Parámetros:
+    - calcular (Callable[[], Awaitable]): Función que obtiene el valor.
+    - ttl (float): Segundos durante los que el valor se considera vigente.
+    """
+
+    def __init__(self, calcular: Callable[[], Awaitable], ttl: float):
+        self._calcular = calcular
+        self.ttl = ttl
+        self.recalculos = 0
+        self.errores = 0
+        self._valor = None
+        self._calculado = 0.0
+        self._tarea: asyncio.Task | None = None
+        self._periodica: asyncio.Task | None = None
+
+    async def iniciar(self):
+        """
+        Empieza a recalcular el valor cada `ttl` segundos en segundo plano (nada si `ttl` es 0).
+        """
+        if self.ttl > 0 and self._periodica is None:
+            self._periodica = asyncio.create_task(self._refrescar_periodicamente())
+
+    async def detener(self):
+        """
+        Detiene el recálculo periódico y el que esté en curso.
+        """
+        for tarea in (self._periodica, self._tarea):
+            if tarea is not None and not tarea.done():
+                tarea.cancel()
+                try:
+                    await tarea
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._periodica = None
+
+    async def obtener(self):
+        """
+        Devuelve el valor vigente o, si caducó, el último calculado mientras se recalcula.
+        """
+        if self._valor is None:
+            # `shield` evita que cancelar una petición cancele el cálculo compartido
+            await asyncio.shield(self._lanzar())
+        elif time.monotonic() - self._calculado > self.ttl:
+            self._lanzar()
+        return self._valor
+
+    def _lanzar(self) -> asyncio.Task:
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._refrescar())
+            self._tarea.add_done_callback(self._terminar)
+        return self._tarea
+
+    async def _refrescar_periodicamente(self):
+        while True:
+            try:
+                await self._lanzar()
+            except Exception:
+                # El error ya se registra en `_terminar`; se reintenta en el siguiente periodo
+                pass
+            await asyncio.sleep(self.ttl)
+
+    async def _refrescar(self):
+        valor = await self._calcular()
+        self._valor, self._calculado = valor, time.monotonic()
+        self.recalculos += 1
+
+    def _terminar(self, tarea: asyncio.Task):
+        if not tarea.cancelled() and tarea.exception() is not None:
+            self.errores += 1
+            logging.getLogger(__name__).warning('No se pudo recalcular el valor en caché', exc_info=tarea.exception())
@@ -0,0 +1,254 @@
+"""
+Compresión negociada de las respuestas HTTP (gzip, brotli y zstd).
+
+`MiddlewareCompresion` elige la codificación a partir de la cabecera `Accept-Encoding` del
+cliente (respetando sus valores `q`; a igualdad, gana el orden de `COMPRESION_ALGORITMOS`) y
+comprime las respuestas de tipos de texto (JSON, NDJSON, HTML, etc.):
+- Respuestas completas: solo si el cuerpo ocupa al menos `COMPRESION_MINIMO` bytes.
+- Respuestas en streaming (las exportaciones NDJSON): siempre, fragmento a fragmento. Cada
+  fragmento se vacía del compresor al enviarlo, de modo que el cliente puede descomprimir y
+  procesar las líneas a medida que llegan.
+
+`gzip` no necesita dependencias; `br` requiere el paquete `brotli` y `zstd` el paquete
+`zstandard`. Con la lista por defecto los algoritmos cuyo paquete no está instalado se omiten;
+si se indican expresamente en `COMPRESION_ALGORITMOS` y faltan, la API no arranca.
+
+Al comprimir, un `ETag` fuerte pasa a ser débil (`W/"..."`), como hace nginx: el contenido
+comprimido no es idéntico byte a byte, y `If-None-Match` ya compara de forma débil.
+"""
+from typing import Callable
+import os
+import zlib
+
+COMPRESION = os.getenv('COMPRESION', '1') not in ('0', 'false', 'no')
+COMPRESION_ALGORITMOS = os.getenv('COMPRESION_ALGORITMOS')  # None: 'zstd,br,gzip' con los paquetes disponibles
+COMPRESION_MINIMO = int(os.getenv('COMPRESION_MINIMO', '1024'))  # bytes
+COMPRESION_NIVEL_GZIP = int(os.getenv('COMPRESION_NIVEL_GZIP', '6'))  # 1-9
+COMPRESION_NIVEL_BROTLI = int(os.getenv('COMPRESION_NIVEL_BROTLI', '4'))  # 0-11
+COMPRESION_NIVEL_ZSTD = int(os.getenv('COMPRESION_NIVEL_ZSTD', '3'))  # 1-22
+
+ALGORITMOS_POR_DEFECTO = 'zstd,br,gzip'
+PAQUETES = {'br': 'brotli', 'zstd': 'zstandard'}
+TIPOS_COMPRIMIBLES = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml')
+ESTADOS_SIN_CUERPO = (204, 304)
+
+class CompresorGzip:
+    """
+    Compresor gzip incremental.
+    """
+
+    def __init__(self, nivel: int = COMPRESION_NIVEL_GZIP):
+        self._compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def comprimir(self, datos: bytes) -> bytes:
+        """
+        Comprime un fragmento y vacía el compresor, para que el cliente pueda descomprimirlo ya.
+        """
+        return self._compresor.compress(datos) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self, datos: bytes = b'') -> bytes:
+        """
+        Comprime el último fragmento y cierra el flujo comprimido.
+        """
+        return self._compresor.compress(datos) + self._compresor.flush()
+
+class CompresorBrotli:
+    """
+    Compresor brotli incremental (paquete `brotli`).
+    """
+
+    def __init__(self, nivel: int = COMPRESION_NIVEL_BROTLI):
+        import brotli
+        self._compresor = brotli.Compressor(quality=nivel)
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return self._compresor.process(datos) + self._compresor.flush()
+
+    def terminar(self, datos: bytes = b'') -> bytes:
+        return self._compresor.process(datos) + self._compresor.finish()
+
+class CompresorZstd:
+    """
+    Compresor zstd incremental (paquete `zstandard`).
+    """
+
+    def __init__(self, nivel: int = COMPRESION_NIVEL_ZSTD):
+        import zstandard
+        self._flush_bloque = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compresor = zstandard.ZstdCompressor(level=nivel).compressobj()
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return self._compresor.compress(datos) + self._compresor.flush(self._flush_bloque)
+
+    def terminar(self, datos: bytes = b'') -> bytes:
+        return self._compresor.compress(datos) + self._compresor.flush()
+
+COMPRESORES = {'gzip': CompresorGzip, 'br': CompresorBrotli, 'zstd': CompresorZstd}
+
+def crear_compresores(algoritmos: str | None = COMPRESION_ALGORITMOS) -> dict[str, Callable]:
+    """
+    Compresores disponibles, en orden de preferencia del servidor.
+
+    Parámetros:
+    - algoritmos (str | None): Nombres separados por comas (`gzip`, `br`, `zstd`), o None para
+      usar los de `ALGORITMOS_POR_DEFECTO` cuyo paquete esté instalado.
+
+    Retorna:
+    - dict[str, Callable]: Nombre de la codificación y función que crea un compresor nuevo.
+
+    Errores:
+    - ValueError: Si se indica un algoritmo desconocido.
+    - RuntimeError: Si se indica expresamente un algoritmo cuyo paquete no está instalado.
+    """
+    expresos = algoritmos is not None
+    nombres = [nombre.strip() for nombre in (algoritmos if expresos else ALGORITMOS_POR_DEFECTO).split(',') if nombre.strip()]
+    compresores = {}
+    for nombre in nombres:
+        if nombre not in COMPRESORES:
+            raise ValueError(f'Algoritmo de compresión desconocido: {nombre}')
+        if nombre in PAQUETES:
+            try:
+                __import__(PAQUETES[nombre])
+            except ImportError:
+                if expresos:
+                    raise RuntimeError(f'COMPRESION_ALGORITMOS={nombre} requiere instalar el paquete "{PAQUETES[nombre]}"')
+                continue
+        compresores[nombre] = COMPRESORES[nombre]
+    return compresores
+
+def negociar(accept_encoding: str, disponibles) -> str | None:
+    """
+    Elige la codificación de la respuesta según la cabecera `Accept-Encoding`.
+
+    Parámetros:
+    - accept_encoding (str): Valor de la cabecera (por ejemplo `gzip, br;q=0.8`).
+    - disponibles: Codificaciones que admite el servidor, en su orden de preferencia.
+
+    Retorna:
+    - str | None: La codificación aceptada con mayor `q` (a igualdad, la preferida por el
+      servidor), o None si el cliente no acepta ninguna.
+    """
+    pesos = {}
+    for parte in accept_encoding.split(','):
+        nombre, _, parametros = parte.partition(';')
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        peso = 1.0
+        for parametro in parametros.split(';'):
+            clave, _, valor = parametro.partition('=')
+            if clave.strip().lower() == 'q':
+                try:
+                    peso = float(valor)
+                except ValueError:
+                    peso = 0.0
+        pesos[nombre] = peso
+    elegida, mejor = None, 0.0
+    for nombre in disponibles:
+        peso = pesos.get(nombre, pesos.get('*', 0.0))
+        if peso > mejor:
+            elegida, mejor = nombre, peso
+    return elegida
+
+def _cabecera(cabeceras, nombre: bytes) -> str | None:
+    for clave, valor in cabeceras:
+        if clave.lower() == nombre:
+            return valor.decode('latin-1')
+    return None
+
+def comprimible(inicio: dict) -> bool:
+    """
+    Indica si una respuesta puede comprimirse, a partir de su mensaje `http.response.start`.
+    """
+    if inicio['status'] < 200 or inicio['status'] in ESTADOS_SIN_CUERPO:
+        return False
+    cabeceras = inicio.get('headers', [])
+    if _cabecera(cabeceras, b'content-encoding') is not None:
+        return False
+    if 'no-transform' in (_cabecera(cabeceras, b'cache-control') or ''):
+        return False
+    tipo = (_cabecera(cabeceras, b'content-type') or '').split(';')[0].strip().lower()
+    return tipo.startswith(TIPOS_COMPRIMIBLES) or tipo.endswith('+json')
+
+def cabeceras_comprimidas(cabeceras, codificacion: str) -> list:
+    """
+    Cabeceras de una respuesta comprimida: sin `Content-Length`, con `Content-Encoding`,
+    `Vary: Accept-Encoding` y el `ETag` convertido en débil.
+    """
+    resultado = []
+    vary = None
+    for clave, valor in cabeceras:
+        nombre = clave.lower()
+        if nombre == b'content-length':
+            continue
+        if nombre == b'vary':
+            vary = valor
+            continue
+        if nombre == b'etag' and not valor.startswith(b'W/'):
+            valor = b'W/' + valor
+        resultado.append((clave, valor))
+    if vary is None:
+        vary = b'Accept-Encoding'
+    elif b'accept-encoding' not in vary.lower() and vary.strip() != b'*':
+        vary += b', Accept-Encoding'
+    resultado.append((b'vary', vary))
+    resultado.append((b'content-encoding', codificacion.encode()))
+    return resultado
+
+class MiddlewareCompresion:
+    """
+    Middleware ASGI que comprime las respuestas con la codificación negociada con el cliente.
+
+    Como `MiddlewareMetricas`, es un middleware ASGI puro: retiene el mensaje
+    `http.response.start` hasta ver el primer fragmento del cuerpo y, a partir de ahí, comprime
+    cada fragmento al pasar, sin acumular la respuesta.
+
+    Parámetros:
+    - app: Aplicación ASGI.
+    - compresores (dict | None): Resultado de `crear_compresores`; por defecto, el configurado.
+    - minimo (int): Tamaño mínimo, en bytes, de las respuestas completas que se comprimen.
+    """
+
+    def __init__(self, app, compresores: dict[str, Callable] | None = None, minimo: int = COMPRESION_MINIMO):
+        self.app = app
+        self.compresores = crear_compresores() if compresores is None else compresores
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+        codificacion = negociar(_cabecera(scope['headers'], b'accept-encoding') or '', self.compresores)
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+        inicio = None
+        compresor = None
+        decidido = False
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor, decidido
+            if mensaje['type'] == 'http.response.start':
+                inicio = mensaje
+                return
+            if mensaje['type'] != 'http.response.body':
+                await send(mensaje)
+                return
+            cuerpo = mensaje.get('body', b'')
+            mas = mensaje.get('more_body', False)
+            if not decidido:
+                decidido = True
+                # Se comprime si el tipo lo admite y la respuesta es un stream o supera el mínimo
+                if comprimible(inicio) and (mas or len(cuerpo) >= self.minimo):
+                    compresor = self.compresores[codificacion]()
+                    inicio = {**inicio, 'headers': cabeceras_comprimidas(inicio.get('headers', []), codificacion)}
+                await send(inicio)
+            if compresor is None:
+                await send(mensaje)
+                return
+            if mas and not cuerpo:
+                return
+            datos = compresor.comprimir(cuerpo) if mas else compresor.terminar(cuerpo)
+            await send({'type': 'http.response.body', 'body': datos, 'more_body': mas})
+
+        await self.app(scope, receive, enviar)
@@ -0,0 +1,291 @@
+"""
+Registro de consultas lentas con su `explain("executionStats")`.
+
+`MonitorConsultasLentas` es un `CommandListener` de pymongo que detecta los comandos de lectura y
+modificación (find, aggregate, count, distinct, findAndModify, update y delete) que superan
+`CONSULTAS_LENTAS_MS`. Para cada uno calcula la forma de la consulta: el comando, la colección y
+el filtro o pipeline con los valores sustituidos por `?`, de modo que `buscar_por_genero('drama')`
+y `buscar_por_genero('terror')` comparten forma.
+
+Por cada forma se registra como mucho una entrada cada `CONSULTAS_LENTAS_VENTANA` segundos, y en
+total no más de `CONSULTAS_LENTAS_POR_MINUTO` por minuto. Las entradas aceptadas pasan a una tarea
+en segundo plano que vuelve a ejecutar el comando con `explain` (sin modificar datos) y escribe el
+resultado, con un resumen (etapas del plan, índices usados, documentos examinados), en:
+- `log` (por defecto): el logger `biblioteca.consultas_lentas`, una línea JSON por consulta.
+- `coleccion`: la colección limitada (capped) `CONSULTAS_LENTAS_COLECCION`.
+
+El registro solo funciona mientras la API está en marcha (`iniciar` y `detener` se llaman desde el
+`lifespan`); las herramientas de línea de comandos no lo activan. Está desactivado por defecto
+(`CONSULTAS_LENTAS_MS=0`): activo, el listener se ejecuta en cada comando y cada consulta lenta
+registrada se vuelve a ejecutar en el servidor con `explain`, lo que suma carga justo cuando ya
+va lento. Conviene activarlo para diagnosticar y con un umbral holgado.
+"""
+from collections import deque
+from datetime import datetime, timezone
+from bson import json_util
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+CONSULTAS_LENTAS_MS = float(os.getenv('CONSULTAS_LENTAS_MS', '0'))  # 0: desactivado
+CONSULTAS_LENTAS_DESTINO = os.getenv('CONSULTAS_LENTAS_DESTINO', 'log')
+CONSULTAS_LENTAS_COLECCION = os.getenv('CONSULTAS_LENTAS_COLECCION', 'ConsultasLentas')
+CONSULTAS_LENTAS_TAMANO = int(os.getenv('CONSULTAS_LENTAS_TAMANO', str(16 * 1024 * 1024)))  # bytes de la colección limitada
+CONSULTAS_LENTAS_VENTANA = float(os.getenv('CONSULTAS_LENTAS_VENTANA', '600'))
+CONSULTAS_LENTAS_POR_MINUTO = int(os.getenv('CONSULTAS_LENTAS_POR_MINUTO', '6'))
+if CONSULTAS_LENTAS_DESTINO not in ('log', 'coleccion'):
+    raise ValueError(f'Destino de consultas lentas desconocido: {CONSULTAS_LENTAS_DESTINO}')
+
+registro = logging.getLogger('biblioteca.consultas_lentas')
+
+# Campos de cada comando que determinan su forma
+CAMPOS_FORMA = {
+    'find': ('filter', 'sort', 'projection'),
+    'aggregate': ('pipeline',),
+    'count': ('query',),
+    'distinct': ('key', 'query'),
+    'findAndModify': ('query', 'sort'),
+    'update': ('updates',),
+    'delete': ('deletes',),
+}
+# Campos de sesión, transacción y enrutado que `explain` no admite
+CAMPOS_EXCLUIDOS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern'}
+TAMANO_COLA = 100
+MAX_FORMAS = 10000
+
+def forma(valor):
+    """
+    Sustituye los valores de un filtro o pipeline por `?`, conservando los nombres de campo y
+    operadores. Las listas de valores simples (como las de `$in`) se reducen a un único `?`.
+    """
+    if isinstance(valor, dict):
+        return {clave: forma(v) for clave, v in valor.items()}
+    if isinstance(valor, list) and any(isinstance(v, (dict, list)) for v in valor):
+        return [forma(v) for v in valor]
+    return '?'
+
+def forma_comando(nombre: str, comando) -> dict:
+    """
+    Forma de un comando: nombre, colección y la forma de sus campos de consulta.
+    """
+    resultado = {'comando': nombre, 'coleccion': comando.get(nombre)}
+    for campo in CAMPOS_FORMA[nombre]:
+        if campo == 'key':
+            resultado[campo] = comando.get(campo)
+        elif campo in comando:
+            resultado[campo] = forma(comando[campo])
+    return resultado
+
+def resumir_explain(explain: dict) -> dict:
+    """
+    Resumen de un `explain`: etapas del plan ganador, índices usados y estadísticas de ejecución.
+
+    El formato del `explain` cambia entre comandos y versiones del servidor (por ejemplo, en una
+    agregación las estadísticas están dentro de la etapa `$cursor`), así que se recorre entero
+    buscando las claves `stage`, `indexName` y `executionStats`.
+    """
+    etapas, indices, estadisticas = [], [], {}
+
+    def recorrer(nodo):
+        if isinstance(nodo, dict):
+            if isinstance(nodo.get('stage'), str) and nodo['stage'] not in etapas:
+                etapas.append(nodo['stage'])
+            if isinstance(nodo.get('indexName'), str) and nodo['indexName'] not in indices:
+                indices.append(nodo['indexName'])
+            if 'executionStats' in nodo and not estadisticas:
+                estadisticas.update(nodo['executionStats'])
+            for clave, hijo in nodo.items():
+                if clave != 'rejectedPlans':
+                    recorrer(hijo)
+        elif isinstance(nodo, list):
+            for hijo in nodo:
+                recorrer(hijo)
+
+    recorrer(explain)
+    return {
+        'etapas': etapas,
+        'indices': indices,
+        'colscan': 'COLLSCAN' in etapas,
+        'nReturned': estadisticas.get('nReturned'),
+        'executionTimeMillis': estadisticas.get('executionTimeMillis'),
+        'totalKeysExamined': estadisticas.get('totalKeysExamined'),
+        'totalDocsExamined': estadisticas.get('totalDocsExamined'),
+    }
+
+class RegistroConsultasLentas:
+    """
+    Decide qué consultas lentas se registran y captura su `explain` en segundo plano.
+
+    `notificar` se llama desde los hilos de pymongo; la deduplicación y el límite por minuto se
+    resuelven ahí con un candado, y el resto del trabajo pasa al bucle de eventos de la API.
+    """
+
+    def __init__(self, ventana: float = CONSULTAS_LENTAS_VENTANA, por_minuto: int = CONSULTAS_LENTAS_POR_MINUTO):
+        self.ventana = ventana
+        self.por_minuto = por_minuto
+        self.detectadas = 0
+        self.repetidas = 0
+        self.descartadas = 0
+        self.registradas = 0
+        self._vistas: dict[str, float] = {}
+        self._recientes: deque[float] = deque()
+        self._candado = threading.Lock()
+        self._bucle: asyncio.AbstractEventLoop | None = None
+        self._cola: asyncio.Queue | None = None
+        self._tarea: asyncio.Task | None = None
+        self._cliente = None
+        self._base_de_datos = ''
+
+    async def iniciar(self, cliente, base_de_datos: str):
+        """
+        Empieza a procesar consultas lentas con el cliente de la API.
+
+        Parámetros:
+        - cliente (AsyncIOMotorClient): Cliente con el que se ejecutan los `explain`.
+        - base_de_datos (str): Base de datos de la colección limitada.
+        """
+        self._cliente = cliente
+        self._base_de_datos = base_de_datos
+        if CONSULTAS_LENTAS_DESTINO == 'coleccion':
+            try:
+                await cliente[base_de_datos].create_collection(
+                    CONSULTAS_LENTAS_COLECCION, capped=True, size=CONSULTAS_LENTAS_TAMANO,
+                )
+            except CollectionInvalid:
+                pass  # Ya existe
+        self._cola = asyncio.Queue(maxsize=TAMANO_COLA)
+        self._bucle = asyncio.get_running_loop()
+        self._tarea = asyncio.create_task(self._procesar())
+
+    async def detener(self):
+        """
+        Deja de registrar consultas lentas; las pendientes de `explain` se descartan.
+        """
+        self._bucle = None
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._tarea = self._cola = self._cliente = None
+
+    def notificar(self, base_de_datos: str, nombre: str, comando, duracion_ms: float, error: str | None = None):
+        """
+        Recibe un comando lento y, si no se ha registrado su forma hace poco y no se ha superado
+        el límite por minuto, lo encola para capturar su `explain`.
+        """
+        bucle = self._bucle
+        if bucle is None:
+            return
+        forma_consulta = forma_comando(nombre, comando)
+        clave = json.dumps(forma_consulta, default=str)
+        ahora = time.monotonic()
+        with self._candado:
+            self.detectadas += 1
+            if ahora - self._vistas.get(clave, float('-inf')) < self.ventana:
+                self.repetidas += 1
+                return
+            while self._recientes and ahora - self._recientes[0] >= 60:
+                self._recientes.popleft()
+            if len(self._recientes) >= self.por_minuto:
+                self.descartadas += 1
+                return
+            self._recientes.append(ahora)
+            if len(self._vistas) >= MAX_FORMAS:
+                self._vistas = {c: t for c, t in self._vistas.items() if ahora - t < self.ventana}
+            self._vistas[clave] = ahora
+        entrada = {
+            'fecha': datetime.now(timezone.utc),
+            'base_de_datos': base_de_datos,
+            'forma': forma_consulta,
+            'duracion_ms': round(duracion_ms, 3),
+            'umbral_ms': CONSULTAS_LENTAS_MS,
+        }
+        if error is not None:
+            entrada['error'] = error
+        explicable = {clave: valor for clave, valor in comando.items() if not clave.startswith('$') and clave not in CAMPOS_EXCLUIDOS}
+        try:
+            bucle.call_soon_threadsafe(self._encolar, entrada, explicable)
+        except RuntimeError:
+            pass  # El bucle ya se cerró
+
+    def _encolar(self, entrada: dict, comando: dict):
+        if self._cola is None:
+            return
+        try:
+            self._cola.put_nowait((entrada, comando))
+        except asyncio.QueueFull:
+            self.descartadas += 1
+
+    async def _procesar(self):
+        while True:
+            entrada, comando = await self._cola.get()
+            try:
+                explain = await self._cliente[entrada['base_de_datos']].command({'explain': comando, 'verbosity': 'executionStats'})
+                explain.pop('$clusterTime', None)
+                explain.pop('operationTime', None)
+                entrada['resumen'] = resumir_explain(explain)
+                entrada['explain'] = explain
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                entrada['error_explain'] = str(e)
+            try:
+                await self._escribir(entrada)
+                self.registradas += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                registro.exception('No se pudo guardar la consulta lenta')
+
+    async def _escribir(self, entrada: dict):
+        if CONSULTAS_LENTAS_DESTINO == 'coleccion':
+            await self._cliente[self._base_de_datos][CONSULTAS_LENTAS_COLECCION].insert_one(entrada)
+        else:
+            registro.warning(json_util.dumps(entrada))
+
+    def estadisticas(self) -> dict:
+        return {
+            'detectadas': self.detectadas,
+            'repetidas': self.repetidas,
+            'descartadas': self.descartadas,
+            'registradas': self.registradas,
+        }
+
+class MonitorConsultasLentas(monitoring.CommandListener):
+    """
+    Listener de pymongo que pasa a `RegistroConsultasLentas` los comandos que superan el umbral.
+
+    Solo guarda una referencia a los comandos que pueden registrarse, hasta que llega su evento de
+    éxito o fallo.
+    """
+
+    def __init__(self, registro_consultas: RegistroConsultasLentas, umbral_ms: float = CONSULTAS_LENTAS_MS):
+        self.registro_consultas = registro_consultas
+        self.umbral_us = umbral_ms * 1000
+        self._pendientes: dict[tuple, tuple] = {}
+
+    def started(self, event):
+        if event.command_name in CAMPOS_FORMA:
+            self._pendientes[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._terminar(event)
+
+    def failed(self, event):
+        self._terminar(event, str(event.failure.get('errmsg', '')) or 'error')
+
+    def _terminar(self, event, error: str | None = None):
+        pendiente = self._pendientes.pop((event.connection_id, event.request_id), None)
+        if pendiente is not None and event.duration_micros >= self.umbral_us:
+            base_de_datos, comando = pendiente
+            self.registro_consultas.notificar(base_de_datos, event.command_name, comando, event.duration_micros / 1000, error)
+
+consultas_lentas = RegistroConsultasLentas()
+monitor_consultas_lentas = MonitorConsultasLentas(consultas_lentas)
@@ -1,6 +1,9 @@
-from database import engine
+from bson import ObjectId
+from database import obtener_engine, sesion_causal, marca_causal
 from crud import dvd as crud_dvd
-from schemas.dvd import DVDCreate
+from services.cache import cache
+from schemas.dvd import DVDCreate, DVDOut, DVDUpdate
+from schemas.paginacion import OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_BUSQUEDA
 
 async def crear_dvd_service(dvd_data: DVDCreate):
     """
@@ -12,16 +15,77 @@ Parámetros:
 Retorna:
 - DVD: El DVD creado.
 """
-    return await crud_dvd.crear_dvd(dvd_data, engine)
+    return await crud_dvd.crear_dvd(dvd_data, obtener_engine())
 
-async def listar_dvds_service():
+async def crear_dvds_service(dvds_data: list[DVDCreate], ids: list[tuple[ObjectId, ObjectId]] | None = None):
     """
-Lista todos los DVDs del sistema.
+Crea varios DVDs en una sola operación.
+
+Parámetros:
+- dvds_data (list[DVDCreate]): Datos de los DVDs a crear.
+- ids (list[tuple[ObjectId, ObjectId]] | None): IDs fijos de cada subtipo y su elemento; con ellos la escritura
+  es idempotente y reenviar el mismo lote no crea duplicados.
+
+Retorna:
+- list[dict]: Resultado de cada DVD, con su `id` o el `error` que impidió crearlo.
+"""
+    return await crud_dvd.crear_dvds(dvds_data, obtener_engine(), ids)
+
+async def listar_dvds_service(
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    campos: tuple[str, ...] | None = None,
+    despues_de: tuple | None = None,
+):
+    """
+Lista una página de DVDs del sistema.
+
+Parámetros:
+- limite (int): Número máximo de DVDs a devolver.
+- cursor (str | None): Cursor opaco de la página anterior.
+- orden (OrdenPaginacion): Campo de ordenación.
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `DVDOut`.
+- despues_de (tuple | None): Marca devuelta por `cambios_dvds_service`; la página verá al menos ese estado.
+
+Retorna:
+- tuple[List[dict], str | None]: DVDs de la página, como diccionarios con la forma de `DVDOut`, y cursor de la siguiente.
+
+Errores:
+- ValueError: Si el cursor no es válido.
+"""
+    async with sesion_causal(despues_de) as sesion:
+        return await crud_dvd.listar_dvds_con_campos(obtener_engine('listado'), campos, limite, cursor, orden, sesion)
+
+async def iterar_dvds_service(campos: tuple[str, ...] | None = None, despues_de: tuple | None = None):
+    """
+Recorre todos los DVDs del sistema por lotes.
+
+Parámetros:
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `DVDOut`.
+- despues_de (tuple | None): Marca devuelta por `cambios_dvds_service`; el recorrido verá al menos ese estado.
+
+Retorna:
+- AsyncIterator[dict]: DVDs, con la forma de `DVDOut`, en orden de inserción.
+"""
+    async with sesion_causal(despues_de) as sesion:
+        async for documento in crud_dvd.iterar_dvds_con_campos(obtener_engine('listado'), campos, sesion=sesion):
+            yield documento
+
+async def cambios_dvds_service() -> tuple[int, tuple]:
+    """
+Obtiene el contador de cambios de los DVDs, con el que se calcula el ETag de sus listados.
+
+Se lee con la misma preferencia de lectura que los listados y antes que ellos, en una sesión
+con consistencia causal: pasando su marca a `listar_dvds_service` o `iterar_dvds_service`,
+la respuesta nunca es más antigua que el contador con el que se etiqueta, aunque las dos lecturas
+vayan a secundarios distintos.
 
 Retorna:
-- List[DVD]: Lista de DVDs disponibles.
+- tuple[int, tuple]: Número de escrituras registradas en los DVDs y marca causal de la lectura.
 """
-    return await crud_dvd.listar_dvds(engine)
+    async with sesion_causal() as sesion:
+        return await crud_dvd.contar_cambios(obtener_engine('listado'), sesion), marca_causal(sesion)
 
 async def buscar_dvd_por_id_service(id: str):
     """
@@ -31,33 +95,35 @@ Parámetros:
 - id (str): ID del DVD.
 
 Retorna:
-- DVD: El DVD encontrado.
+- dict: El DVD encontrado, con la forma de `DVDOut`.
 
 Errores:
 - ValueError: Si no se encuentra el DVD.
 """
-    dvd = await crud_dvd.buscar_por_id(id, engine)
-    if not dvd:
-        raise ValueError('No se encontró el DVD')
+    clave = f'dvd:id:{id}'
+    dvd = await cache.obtener(clave)
+    if dvd is None:
+        generacion = await cache.generacion()
+        encontrado = await crud_dvd.buscar_por_id(id, obtener_engine('consulta'))
+        if not encontrado:
+            raise ValueError('No se encontró el DVD')
+        dvd = DVDOut.from_model(encontrado).model_dump()
+        await cache.guardar(clave, dvd, (f'dvd:{dvd["id"]}', f'elemento:{encontrado.elemento.id}'), generacion)
     return dvd
 
-async def buscar_dvd_por_titulo_service(titulo: str):
+async def buscar_dvd_por_titulo_service(titulo: str, limite: int = LIMITE_BUSQUEDA, campos: tuple[str, ...] | None = None):
     """
 Busca DVDs por su título.
 
 Parámetros:
 - titulo (str): Título del DVD.
+- limite (int): Número máximo de resultados.
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `DVDOut`.
 
 Retorna:
-- List[DVD]: Lista de DVDs que coinciden con el título.
-
-Errores:
-- ValueError: Si no se encuentran DVDs con ese título.
+- List[dict]: DVDs que coinciden con el título, con la forma de `DVDOut` (la lista vacía si no hay ninguno).
 """
-    dvds = await crud_dvd.buscar_por_titulo(titulo, engine)
-    if not dvds:
-        raise ValueError('No se encontraron DVDs con ese título')
-    return dvds
+    return await crud_dvd.buscar_por_titulo(titulo, obtener_engine('busqueda'), limite, campos)
 
 async def buscar_dvd_por_genero_service(categoria: str):
     """
@@ -67,15 +133,9 @@ Parámetros:
 - categoria (str): Categoría del DVD.
 
 Retorna:
-- List[DVD]: Lista de DVDs que coinciden con la categoría.
-
-Errores:
-- ValueError: Si no se encuentran DVDs con esa categoría.
+- List[DVD]: Lista de DVDs que coinciden con la categoría (la lista vacía si no hay ninguno).
 """
-    dvds = await crud_dvd.buscar_por_genero(categoria, engine)
-    if not dvds:
-        raise ValueError('No se encontraron DVDs con ese genero')
-    return dvds
+    return await crud_dvd.buscar_por_genero(categoria, obtener_engine('busqueda'))
 
 async def actualizar_dvd_por_id_service(id: str, dvd_data: DVDCreate):
     """
@@ -86,15 +146,37 @@ Parámetros:
 - dvd_data (DVDCreate): Datos nuevos del DVD.
 
 Retorna:
-- DVD: El DVD actualizado.
+- dict: El DVD actualizado, con la forma de `DVDOut`.
+
+Errores:
+- ValueError: Si no se encuentra el DVD.
+"""
+    actualizado = await crud_dvd.actualizar_por_id(id, dvd_data, obtener_engine())
+    if not actualizado:
+        raise ValueError('No se encontró el DVD')
+    await cache.invalidar(f'dvd:{id}')
+    return actualizado
+
+async def actualizar_parcial_dvd_por_id_service(id: str, cambios: DVDUpdate):
+    """
+Actualiza solo los campos enviados de un DVD.
+
+Parámetros:
+- id (str): ID del DVD a actualizar.
+- cambios (DVDUpdate): Campos a modificar.
+
+Retorna:
+- dict: El DVD actualizado, con la forma de `DVDOut`.
 
 Errores:
 - ValueError: Si no se encuentra el DVD.
 """
-    dvd = await crud_dvd.buscar_por_id(id, engine)
-    if not dvd:
+    actualizado = await crud_dvd.actualizar_parcial_por_id(id, cambios, obtener_engine())
+    if not actualizado:
         raise ValueError('No se encontró el DVD')
-    return await crud_dvd.actualizar_por_id(id, dvd_data, engine)
+    if cambios.cambios():
+        await cache.invalidar(f'dvd:{id}')
+    return actualizado
 
 async def eliminar_por_id_service(id: str):
     """
@@ -109,7 +191,8 @@ Retorna:
 Errores:
 - ValueError: Si no se encuentra el DVD.
 """
-    dvd = await crud_dvd.buscar_por_id(id, engine)
-    if not dvd:
+    eliminado = await crud_dvd.eliminar_por_id(id, obtener_engine())
+    if not eliminado:
         raise ValueError('No se encontró el DVD')
-    return await crud_dvd.eliminar_por_id(id, engine)
\ No newline at end of file
+    await cache.invalidar(f'dvd:{id}')
+    return eliminado
\ No newline at end of file
@@ -1,29 +1,129 @@
-from database import engine
-from crud import elemento as crud_elemento
+import os
+from database import obtener_engine, sesion_causal, marca_causal
+from crud import elemento as crud_elemento, estadisticas as crud_estadisticas
+from services.cache import CacheRefrescada
+from schemas.paginacion import OrdenBusqueda, OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_BUSQUEDA, LIMITE_AUTOCOMPLETADO
 
-async def buscar_elemento_por_titulo_service(titulo: str):
+ESTADISTICAS_TTL = float(os.getenv('ESTADISTICAS_TTL', '30'))
+
+estadisticas = CacheRefrescada(lambda: crud_estadisticas.calcular_estadisticas(obtener_engine('estadisticas')), ESTADISTICAS_TTL)
+
+async def buscar_elemento_por_titulo_service(titulo: str, limite: int = LIMITE_BUSQUEDA, campos: tuple[str, ...] | None = None):
     """
 Busca elementos por su título.
 
 Parámetros:
 - titulo (str): Título del elemento.
+- limite (int): Número máximo de resultados.
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `ElementoOut`.
+
+Retorna:
+- List[dict]: Elementos encontrados, con la forma de `ElementoOut` (la lista vacía si no hay ninguno).
+"""
+    return await crud_elemento.buscar_elemento_por_titulo(titulo, obtener_engine('busqueda'), limite, campos)
+
+def autocompletar_service(texto: str, limite: int = LIMITE_AUTOCOMPLETADO):
+    """
+Sugiere elementos cuyo título o autor tiene una palabra que empieza por el texto.
+
+Parámetros:
+- texto (str): Texto escrito por el usuario.
+- limite (int): Número máximo de sugerencias.
+
+Retorna:
+- List[dict]: Elementos con la forma de `ElementoOut` (la lista vacía si no hay ninguno).
+"""
+    # El contador de cambios se lee del primario: en un secundario las escrituras propias aún no
+    # replicadas parecerían de otro proceso
+    return crud_elemento.autocompletar(texto, obtener_engine(), limite)
+
+async def buscar_elementos_detallados_service(
+    titulo: str,
+    limite: int = LIMITE_BUSQUEDA,
+    cursor: str | None = None,
+    orden: OrdenBusqueda = 'relevancia',
+):
+    """
+Busca libros, DVDs y revistas por su título y devuelve una página con todos sus datos.
+
+Parámetros:
+- titulo (str): Texto a buscar en el título.
+- limite (int): Número máximo de resultados de la página.
+- cursor (str | None): Cursor opaco de la página anterior.
+- orden (OrdenBusqueda): 'relevancia', 'titulo' o 'ano_publicacion'.
 
 Retorna:
-- List[Elemento]: Lista de elementos encontrados.
+- tuple[List[dict], str | None]: Resultados, con la forma de `ElementoBusquedaOut`, y cursor de la siguiente página.
 
 Errores:
-- ValueError: Si no se encuentran elementos con ese título.
+- ValueError: Si el cursor no es válido.
 """
-    elementos = await crud_elemento.buscar_elemento_por_titulo(titulo, engine)
-    if not elementos:
-        raise ValueError('No se encontraron elementos con ese título')
-    return elementos
+    return await crud_elemento.buscar_elementos_con_detalle(titulo, obtener_engine('busqueda'), limite, cursor, orden)
 
-async def listar_elementos_service():
+async def listar_elementos_service(
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    campos: tuple[str, ...] | None = None,
+    despues_de: tuple | None = None,
+):
     """
-Lista todos los elementos del sistema.
+Lista una página de elementos del sistema.
+
+Parámetros:
+- limite (int): Número máximo de elementos a devolver.
+- cursor (str | None): Cursor opaco de la página anterior.
+- orden (OrdenPaginacion): Campo de ordenación.
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `ElementoOut`.
+- despues_de (tuple | None): Marca devuelta por `cambios_elementos_service`; la página verá al menos ese estado.
+
+Retorna:
+- tuple[List[dict], str | None]: Elementos de la página, como diccionarios con la forma de `ElementoOut`, y cursor de la siguiente.
+
+Errores:
+- ValueError: Si el cursor no es válido.
+"""
+    async with sesion_causal(despues_de) as sesion:
+        return await crud_elemento.listar_elementos_con_campos(obtener_engine('listado'), campos, limite, cursor, orden, sesion)
+
+async def iterar_elementos_service(campos: tuple[str, ...] | None = None, despues_de: tuple | None = None):
+    """
+Recorre todos los elementos del sistema por lotes.
+
+Parámetros:
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `ElementoOut`.
+- despues_de (tuple | None): Marca devuelta por `cambios_elementos_service`; el recorrido verá al menos ese estado.
+
+Retorna:
+- AsyncIterator[dict]: Elementos, con la forma de `ElementoOut`, en orden de inserción.
+"""
+    async with sesion_causal(despues_de) as sesion:
+        async for documento in crud_elemento.iterar_elementos_con_campos(obtener_engine('listado'), campos, sesion=sesion):
+            yield documento
+
+async def cambios_elementos_service() -> tuple[int, tuple]:
+    """
+Obtiene el contador de cambios de los elementos, con el que se calcula el ETag de sus listados.
+
+Se lee con la misma preferencia de lectura que los listados y antes que ellos, en una sesión
+con consistencia causal: pasando su marca a `listar_elementos_service` o `iterar_elementos_service`,
+la respuesta nunca es más antigua que el contador con el que se etiqueta, aunque las dos lecturas
+vayan a secundarios distintos.
+
+Retorna:
+- tuple[int, tuple]: Número de escrituras registradas en los elementos y marca causal de la lectura.
+"""
+    async with sesion_causal() as sesion:
+        return await crud_elemento.contar_cambios(obtener_engine('listado'), sesion), marca_causal(sesion)
+
+async def obtener_estadisticas_service():
+    """
+Obtiene los conteos del catálogo.
+
+Los conteos se sirven desde memoria y se recalculan en segundo plano cada `ESTADISTICAS_TTL`
+segundos como mucho, por lo que pueden tener ese retraso respecto a los datos.
 
 Retorna:
-- List[Elemento]: Lista de todos los elementos.
+- dict: Estadísticas con la forma de `EstadisticasOut`.
 """
-    return await crud_elemento.listar_todos_los_elementos(engine)
+    return await estadisticas.obtener()
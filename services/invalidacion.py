@@ -0,0 +1,249 @@
+"""
+Invalidación de la caché a partir de los change streams de MongoDB.
+
+Cada proceso de la API invalida su caché al escribir, pero con varios workers (o varias máquinas)
+las escrituras de los demás no le llegan. `InvalidacionCambios` abre en segundo plano un change
+stream sobre las colecciones `libro`, `dvd`, `revista` y `elemento_biblioteca` y, por cada
+modificación o eliminación, invalida la etiqueta del documento (`libro:<id>`, `dvd:<id>`,
+`revista:<id>` o `elemento:<id>`) en la caché del proceso. Las inserciones se filtran en el
+servidor (un documento nuevo no puede estar en caché), salvo las de `elemento_biblioteca`.
+
+El stream también alimenta a los `oyentes`, como el índice de autocompletado
+(`crud/autocompletado.py`): reciben cada inserción, modificación o eliminación de
+`elemento_biblioteca` con sus campos indexados, y se les avisa al abrirse el stream y cuando se
+pierden cambios. Con oyentes el stream se sigue aunque no haya caché.
+
+El resume token del último cambio aplicado se guarda cada `INVALIDACION_GUARDADO` segundos en la
+colección `INVALIDACION_COLECCION`, de modo que al reiniciar la API el stream continúa donde se
+quedó y aplica los cambios hechos mientras estaba parada (lo que importa sobre todo con
+`CACHE_BACKEND=redis`, cuya caché sobrevive al reinicio). Si el token ya no está en el oplog, o la
+base de datos o alguna de las colecciones se borra o renombra, se vacía la caché entera.
+
+Los change streams requieren un replica set o un clúster fragmentado. Con un servidor standalone
+o con `BACKEND=memoria` la invalidación se desactiva (se avisa en el log) y la caché depende solo
+de `CACHE_TTL`. `INVALIDACION_CAMBIOS=0` la desactiva siempre.
+"""
+from datetime import datetime, timezone
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from models.dvd import DVD
+from models.elemento import ElementoBiblioteca
+from models.libro import Libro
+from models.revista import Revista
+from crud.autocompletado import CAMPOS_INDICE, indice_autocompletado
+from services.cache import CacheBase, CacheNula, cache
+import asyncio
+import logging
+import os
+import time
+
+INVALIDACION_CAMBIOS = os.getenv('INVALIDACION_CAMBIOS', '1') not in ('0', 'false', 'no')
+INVALIDACION_COLECCION = os.getenv('INVALIDACION_COLECCION', 'ReanudacionCambios')
+INVALIDACION_GUARDADO = float(os.getenv('INVALIDACION_GUARDADO', '5'))  # segundos entre guardados del resume token
+
+registro = logging.getLogger('biblioteca.invalidacion')
+
+# Prefijo de las etiquetas de caché de cada colección vigilada
+PREFIJOS = {
+    Libro.__collection__: 'libro',
+    DVD.__collection__: 'dvd',
+    Revista.__collection__: 'revista',
+    ElementoBiblioteca.__collection__: 'elemento',
+}
+# Cambios que afectan a un único documento; los demás que deja pasar el filtro vacían la caché
+CAMBIOS_DOCUMENTO = ('update', 'replace', 'delete')
+# Códigos de error del servidor
+SIN_CHANGE_STREAMS = 40573  # standalone (o backend en memoria)
+HISTORIAL_PERDIDO = (280, 286)  # ChangeStreamFatalError, ChangeStreamHistoryLost
+ESPERA_MAXIMA = 30.0
+
+def etiqueta(cambio: dict) -> str:
+    """
+    Etiqueta de caché del documento al que se refiere un cambio, como `libro:<id>`.
+    """
+    return f'{PREFIJOS[cambio["ns"]["coll"]]}:{cambio["documentKey"]["_id"]}'
+
+def pipeline_cambios() -> list[dict]:
+    """
+    Filtro del change stream: cambios de documentos existentes en las colecciones vigiladas,
+    inserciones de elementos y cambios que invalidan colecciones enteras. Solo se piden los campos
+    necesarios (de los documentos, los del índice de autocompletado), para que las modificaciones
+    grandes no viajen completas.
+    """
+    colecciones = list(PREFIJOS)
+    campos = {}
+    for campo in CAMPOS_INDICE:
+        campos[f'fullDocument.{campo}'] = 1
+        campos[f'updateDescription.updatedFields.{campo}'] = 1
+    return [
+        {'$match': {'$or': [
+            {'operationType': {'$in': list(CAMBIOS_DOCUMENTO)}, 'ns.coll': {'$in': colecciones}},
+            {'operationType': 'insert', 'ns.coll': ElementoBiblioteca.__collection__},
+            {'operationType': {'$in': ['drop', 'rename']}, 'ns.coll': {'$in': colecciones}},
+            {'operationType': {'$in': ['dropDatabase', 'invalidate']}},
+        ]}},
+        {'$project': {'operationType': 1, 'ns': 1, 'documentKey': 1, 'clusterTime': 1, **campos}},
+    ]
+
+class InvalidacionCambios:
+    """
+    Tarea en segundo plano que sigue el change stream de la base de datos e invalida la caché.
+
+    Parámetros:
+    - cache (CacheBase): Caché cuyas entradas se invalidan.
+    - id_token (str): `_id` del documento con el resume token en `INVALIDACION_COLECCION`.
+    - oyentes (list | None): Objetos con `aplicar_cambio(cambio)`, `seguir_cambios(activo)` y
+      `reiniciar()` que reciben los cambios de `elemento_biblioteca`.
+    """
+
+    def __init__(self, cache: CacheBase, id_token: str = 'cache', oyentes: list | None = None):
+        self.cache = cache
+        self.id_token = id_token
+        self.oyentes = oyentes or []
+        self.activa = False
+        self.eventos = 0
+        self.vaciados = 0
+        self.reanudaciones = 0
+        self.errores = 0
+        self._database = None
+        self._tarea: asyncio.Task | None = None
+        self._token: dict | None = None
+        self._tiempo = None
+        self._guardado = 0.0
+
+    async def iniciar(self, database):
+        """
+        Empieza a seguir el change stream, continuando desde el resume token guardado.
+
+        Parámetros:
+        - database (AsyncIOMotorDatabase): Base de datos de la API (la del motor de escritura).
+        """
+        if not INVALIDACION_CAMBIOS or (isinstance(self.cache, CacheNula) and not self.oyentes):
+            return
+        self._database = database
+        self._tarea = asyncio.create_task(self._seguir())
+        self._tarea.add_done_callback(self._terminar)
+
+    async def detener(self):
+        """
+        Deja de seguir el change stream y guarda el último resume token.
+        """
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            try:
+                await self._guardar_token()
+            except PyMongoError:
+                registro.warning('No se pudo guardar el resume token', exc_info=True)
+        self._activar(False)
+        self._tarea = self._database = None
+
+    async def _seguir(self):
+        espera = 1.0
+        cargado = False
+        while True:
+            try:
+                if not cargado:
+                    documento = await self._database[INVALIDACION_COLECCION].find_one({'_id': self.id_token})
+                    if documento is not None:
+                        self._token, self._tiempo = documento['token'], documento.get('tiempo')
+                    cargado = True
+                async with self._database.watch(pipeline_cambios(), resume_after=self._token) as stream:
+                    if self._token is not None:
+                        self.reanudaciones += 1
+                    self._activar(True)
+                    espera = 1.0
+                    async for cambio in stream:
+                        await self._aplicar(cambio)
+                        if cambio['operationType'] == 'invalidate':
+                            # Tras `invalidate` el stream se cierra y su token ya no sirve para reanudar
+                            self._token = self._tiempo = None
+                            break
+                        self._token, self._tiempo = stream.resume_token, cambio.get('clusterTime')
+                        if time.monotonic() - self._guardado >= INVALIDACION_GUARDADO:
+                            await self._guardar_token()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self._activar(False)
+                if e.code == SIN_CHANGE_STREAMS:
+                    registro.warning(
+                        'La base de datos no admite change streams; la caché depende solo de CACHE_TTL '
+                        'y el índice de autocompletado de AUTOCOMPLETADO_RECARGA'
+                    )
+                    return
+                if e.code in HISTORIAL_PERDIDO:
+                    # Los cambios desde el token ya no están en el oplog: ninguna entrada es fiable
+                    registro.warning('El resume token ya no está en el oplog; se vacía la caché')
+                    await self._vaciar()
+                    self._reiniciar_oyentes()
+                    self._token = self._tiempo = None
+                    continue
+                self.errores += 1
+                registro.warning('Error en el change stream; se reintenta en %.0f s', espera, exc_info=True)
+            except PyMongoError:
+                self._activar(False)
+                self.errores += 1
+                registro.warning('Error en el change stream; se reintenta en %.0f s', espera, exc_info=True)
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, ESPERA_MAXIMA)
+
+    def _activar(self, activa: bool):
+        self.activa = activa
+        for oyente in self.oyentes:
+            oyente.seguir_cambios(activa)
+
+    def _reiniciar_oyentes(self):
+        for oyente in self.oyentes:
+            oyente.reiniciar()
+
+    def _terminar(self, tarea: asyncio.Task):
+        self._activar(False)
+        if not tarea.cancelled() and tarea.exception() is not None:
+            registro.error('La invalidación por change streams se detuvo', exc_info=tarea.exception())
+
+    async def _aplicar(self, cambio: dict):
+        self.eventos += 1
+        tipo = cambio['operationType']
+        if tipo in CAMBIOS_DOCUMENTO or tipo == 'insert':
+            if cambio['ns']['coll'] == ElementoBiblioteca.__collection__:
+                for oyente in self.oyentes:
+                    oyente.aplicar_cambio(cambio)
+            if tipo != 'insert':
+                await self.cache.invalidar(etiqueta(cambio))
+        else:
+            await self._vaciar()
+            self._reiniciar_oyentes()
+
+    async def _vaciar(self):
+        self.vaciados += 1
+        await self.cache.vaciar()
+
+    async def _guardar_token(self):
+        """
+        Guarda el resume token salvo que otro proceso haya guardado ya uno posterior.
+        """
+        if self._token is None:
+            return
+        self._guardado = time.monotonic()
+        filtro = {'_id': self.id_token}
+        if self._tiempo is not None:
+            filtro['$or'] = [{'tiempo': {'$lte': self._tiempo}}, {'tiempo': None}]
+        actualizacion = {'$set': {'token': self._token, 'tiempo': self._tiempo, 'fecha': datetime.now(timezone.utc)}}
+        try:
+            await self._database[INVALIDACION_COLECCION].update_one(filtro, actualizacion, upsert=True)
+        except DuplicateKeyError:
+            pass  # Otro proceso ya guardó un token posterior
+
+    def estadisticas(self) -> dict:
+        return {
+            'activa': self.activa,
+            'eventos': self.eventos,
+            'vaciados': self.vaciados,
+            'reanudaciones': self.reanudaciones,
+            'errores': self.errores,
+        }
+
+invalidacion_cambios = InvalidacionCambios(cache, oyentes=[indice_autocompletado])
@@ -1,6 +1,15 @@
-from database import engine
+from pymongo import errors as errores_mongo
+from bson import ObjectId
+from database import obtener_engine, sesion_causal, marca_causal
 from crud import libro as crud_libro
-from schemas.libro import LibroCreate
+from services.cache import cache
+from schemas.libro import LibroCreate, LibroOut, LibroUpdate
+from schemas.paginacion import OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_BUSQUEDA
+
+class ISBNDuplicado(ValueError):
+    """
+Error lanzado cuando se intenta registrar un ISBN que ya pertenece a otro libro.
+"""
 
 async def crear_libro_service(libro_data: LibroCreate):
     """
@@ -11,17 +20,84 @@ Parámetros:
 
 Retorna:
 - Libro: El libro creado.
+
+Errores:
+- ISBNDuplicado: Si ya existe un libro con ese ISBN.
+"""
+    try:
+        return await crud_libro.crear_libro(libro_data, obtener_engine())
+    except errores_mongo.DuplicateKeyError:
+        raise ISBNDuplicado('Ya existe un libro con ese ISBN')
+
+async def crear_libros_service(libros_data: list[LibroCreate], ids: list[tuple[ObjectId, ObjectId]] | None = None):
+    """
+Crea varios libros en una sola operación.
+
+Parámetros:
+- libros_data (list[LibroCreate]): Datos de los libros a crear.
+- ids (list[tuple[ObjectId, ObjectId]] | None): IDs fijos de cada subtipo y su elemento; con ellos la escritura
+  es idempotente y reenviar el mismo lote no crea duplicados.
+
+Retorna:
+- list[dict]: Resultado de cada libro, con su `id` o el `error` que impidió crearlo.
+"""
+    return await crud_libro.crear_libros(libros_data, obtener_engine(), ids)
+
+async def listar_libros_service(
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    campos: tuple[str, ...] | None = None,
+    despues_de: tuple | None = None,
+):
+    """
+Lista una página de libros del sistema.
+
+Parámetros:
+- limite (int): Número máximo de libros a devolver.
+- cursor (str | None): Cursor opaco de la página anterior.
+- orden (OrdenPaginacion): Campo de ordenación.
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `LibroOut`.
+- despues_de (tuple | None): Marca devuelta por `cambios_libros_service`; la página verá al menos ese estado.
+
+Retorna:
+- tuple[List[dict], str | None]: Libros de la página, como diccionarios con la forma de `LibroOut`, y cursor de la siguiente.
+
+Errores:
+- ValueError: Si el cursor no es válido.
+"""
+    async with sesion_causal(despues_de) as sesion:
+        return await crud_libro.listar_libros_con_campos(obtener_engine('listado'), campos, limite, cursor, orden, sesion)
+
+async def iterar_libros_service(campos: tuple[str, ...] | None = None, despues_de: tuple | None = None):
+    """
+Recorre todos los libros del sistema por lotes.
+
+Parámetros:
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `LibroOut`.
+- despues_de (tuple | None): Marca devuelta por `cambios_libros_service`; el recorrido verá al menos ese estado.
+
+Retorna:
+- AsyncIterator[dict]: Libros, con la forma de `LibroOut`, en orden de inserción.
 """
-    return await crud_libro.crear_libro(libro_data, engine)
+    async with sesion_causal(despues_de) as sesion:
+        async for documento in crud_libro.iterar_libros_con_campos(obtener_engine('listado'), campos, sesion=sesion):
+            yield documento
 
-async def listar_libros_service():
+async def cambios_libros_service() -> tuple[int, tuple]:
     """
-Lista todos los libros del sistema.
+Obtiene el contador de cambios de los libros, con el que se calcula el ETag de sus listados.
+
+Se lee con la misma preferencia de lectura que los listados y antes que ellos, en una sesión
+con consistencia causal: pasando su marca a `listar_libros_service` o `iterar_libros_service`,
+la respuesta nunca es más antigua que el contador con el que se etiqueta, aunque las dos lecturas
+vayan a secundarios distintos.
 
 Retorna:
-- List[Libro]: Lista de libros disponibles.
+- tuple[int, tuple]: Número de escrituras registradas en los libros y marca causal de la lectura.
 """
-    return await crud_libro.listar_libros(engine)
+    async with sesion_causal() as sesion:
+        return await crud_libro.contar_cambios(obtener_engine('listado'), sesion), marca_causal(sesion)
 
 async def buscar_libro_por_id_service(id: str):
     """
@@ -31,51 +107,62 @@ Parámetros:
 - id (str): ID del libro.
 
 Retorna:
-- Libro: El libro encontrado.
+- dict: El libro encontrado, con la forma de `LibroOut`.
 
 Errores:
 - ValueError: Si no se encuentra el libro.
 """
-    libro = await crud_libro.buscar_por_id(id, engine)
-    if not libro:
-        raise ValueError('No se encontró el libro')
+    clave = f'libro:id:{id}'
+    libro = await cache.obtener(clave)
+    if libro is None:
+        generacion = await cache.generacion()
+        encontrado = await crud_libro.buscar_por_id(id, obtener_engine('consulta'))
+        if not encontrado:
+            raise ValueError('No se encontró el libro')
+        libro = LibroOut.from_model(encontrado).model_dump()
+        await cache.guardar(clave, libro, (f'libro:{libro["id"]}', f'elemento:{encontrado.elemento.id}'), generacion)
     return libro
 
-async def buscar_libro_por_titulo_service(titulo: str):
+async def buscar_libro_por_titulo_service(titulo: str, limite: int = LIMITE_BUSQUEDA, campos: tuple[str, ...] | None = None):
     """
 Busca libros por su título.
 
 Parámetros:
 - titulo (str): Título del libro.
+- limite (int): Número máximo de resultados.
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `LibroOut`.
 
 Retorna:
-- List[Libro]: Lista de libros que coinciden con el título.
-
-Errores:
-- ValueError: Si no se encuentran libros con ese título.
+- List[dict]: Libros que coinciden con el título, con la forma de `LibroOut` (la lista vacía si no hay ninguno).
 """
-    libros = await crud_libro.buscar_por_titulo(titulo, engine)
-    if not libros:
-        raise ValueError('No se encontraron libros con ese título')
-    return libros
+    return await crud_libro.buscar_por_titulo(titulo, obtener_engine('busqueda'), limite, campos)
 
 async def buscar_libro_por_isbn_service(isbn: str):
     """
 Busca un libro por su ISBN.
 
+La versión se guarda en la caché junto al libro, de modo que siempre corresponde al documento
+devuelto, aunque la entrada sea anterior a una escritura de otro proceso.
+
 Parámetros:
 - isbn (str): ISBN del libro.
 
 Retorna:
-- Libro: El libro encontrado.
+- tuple[dict, int]: El libro encontrado, con la forma de `LibroOut`, y su versión (para el ETag).
 
 Errores:
 - ValueError: Si no se encuentra el libro.
 """
-    libro = await crud_libro.buscar_por_isbn(isbn, engine)
-    if not libro:
-        raise ValueError('No se encontró el libro')
-    return libro
+    clave = f'libro:isbn:{isbn}'
+    entrada = await cache.obtener(clave)
+    if entrada is None:
+        generacion = await cache.generacion()
+        encontrado = await crud_libro.buscar_por_isbn(isbn, obtener_engine('consulta'))
+        if not encontrado:
+            raise ValueError('No se encontró el libro')
+        entrada = {'libro': LibroOut.from_model(encontrado).model_dump(), 'version': encontrado.version}
+        await cache.guardar(clave, entrada, (f'libro:{encontrado.id}', f'elemento:{encontrado.elemento.id}'), generacion)
+    return entrada['libro'], entrada['version']
 
 async def actualizar_libro_por_id_service(id: str, libro_data: LibroCreate):
     """
@@ -86,15 +173,45 @@ Parámetros:
 - libro_data (LibroCreate): Datos nuevos del libro.
 
 Retorna:
-- Libro: El libro actualizado.
+- dict: El libro actualizado, con la forma de `LibroOut`.
+
+Errores:
+- ValueError: Si no se encuentra el libro.
+- ISBNDuplicado: Si el nuevo ISBN ya pertenece a otro libro.
+"""
+    try:
+        actualizado = await crud_libro.actualizar_libro_por_id(id, libro_data, obtener_engine())
+    except errores_mongo.DuplicateKeyError:
+        raise ISBNDuplicado('Ya existe un libro con ese ISBN')
+    if not actualizado:
+        raise ValueError('No se encontró el libro')
+    await cache.invalidar(f'libro:{id}')
+    return actualizado
+
+async def actualizar_parcial_libro_por_id_service(id: str, cambios: LibroUpdate):
+    """
+Actualiza solo los campos enviados de un libro.
+
+Parámetros:
+- id (str): ID del libro a actualizar.
+- cambios (LibroUpdate): Campos a modificar.
+
+Retorna:
+- dict: El libro actualizado, con la forma de `LibroOut`.
 
 Errores:
 - ValueError: Si no se encuentra el libro.
+- ISBNDuplicado: Si el nuevo ISBN ya pertenece a otro libro.
 """
-    libro = await crud_libro.buscar_por_id(id, engine)
-    if not libro:
+    try:
+        actualizado = await crud_libro.actualizar_parcial_libro_por_id(id, cambios, obtener_engine())
+    except errores_mongo.DuplicateKeyError:
+        raise ISBNDuplicado('Ya existe un libro con ese ISBN')
+    if not actualizado:
         raise ValueError('No se encontró el libro')
-    return await crud_libro.actualizar_libro_por_id(id, libro_data, engine)
+    if cambios.cambios():
+        await cache.invalidar(f'libro:{id}')
+    return actualizado
 
 async def eliminar_libro_por_id_service(id: str):
     """
@@ -109,7 +226,8 @@ Retorna:
 Errores:
 - ValueError: Si no se encuentra el libro.
 """
-    libro = await crud_libro.buscar_por_id(id, engine)
-    if not libro:
+    eliminado = await crud_libro.eliminar_libro_por_id(id, obtener_engine())
+    if not eliminado:
         raise ValueError('No se encontró el libro')
-    return await crud_libro.eliminar_libro_por_id(id, engine)
+    await cache.invalidar(f'libro:{id}')
+    return eliminado
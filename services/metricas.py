@@ -0,0 +1,230 @@
+"""
+Métricas de la API en el formato de texto de Prometheus, sin dependencias externas.
+
+- `MiddlewareMetricas`: middleware ASGI que mide cada petición por método, ruta (la plantilla,
+  como `/libros/buscar/{id}`, no la URL concreta) y código de estado: duración, tamaño de la
+  respuesta y peticiones en curso.
+- `MonitorComandos`: `CommandListener` de pymongo que mide la latencia de cada comando de MongoDB
+  y cuenta los documentos devueltos o escritos por colección. Se registra en el cliente desde
+  `database.py`.
+
+Las métricas viven en memoria de cada proceso; con varios workers, Prometheus debe consultar cada
+uno por separado. Se desactivan con `METRICAS=0`.
+"""
+from bisect import bisect_left
+from pymongo import monitoring
+import os
+import threading
+import time
+
+METRICAS = os.getenv('METRICAS', '1') not in ('0', 'false', 'no')
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+RUTA_DESCONOCIDA = '<desconocida>'
+
+BUCKETS_HTTP = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_MONGO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _etiquetas(nombres: tuple[str, ...], valores: tuple, extra: str = '') -> str:
+    pares = [f'{nombre}="{_escapar(str(valor))}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Metrica:
+    """
+    Familia de series con el mismo nombre, una por cada combinación de etiquetas.
+
+    Las series se actualizan tanto desde el bucle de eventos como desde los hilos de pymongo,
+    por lo que cada familia protege sus valores con un candado.
+    """
+    tipo = ''
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series: dict[tuple, object] = {}
+        self._candado = threading.Lock()
+
+    def exponer(self) -> list[str]:
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} {self.tipo}']
+        with self._candado:
+            series = sorted(self._series.items(), key=lambda serie: tuple(map(str, serie[0])))
+            for valores, serie in series:
+                lineas.extend(self._lineas(valores, serie))
+        return lineas
+
+    def _lineas(self, valores: tuple, serie) -> list[str]:
+        return [f'{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(serie)}']
+
+class Contador(Metrica):
+    """
+    Valor acumulado que solo crece.
+    """
+    tipo = 'counter'
+
+    def incrementar(self, *valores, cantidad: float = 1):
+        with self._candado:
+            self._series[valores] = self._series.get(valores, 0) + cantidad
+
+class Medidor(Metrica):
+    """
+    Valor que sube y baja, como las peticiones en curso.
+    """
+    tipo = 'gauge'
+
+    def sumar(self, *valores, cantidad: float = 1):
+        with self._candado:
+            self._series[valores] = self._series.get(valores, 0) + cantidad
+
+class Histograma(Metrica):
+    """
+    Distribución de observaciones en buckets acumulados, con su suma y su número total.
+    """
+    tipo = 'histogram'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple[str, ...] = (), buckets: tuple[float, ...] = BUCKETS_HTTP):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = buckets
+
+    def observar(self, valor: float, *valores):
+        posicion = bisect_left(self.buckets, valor)
+        with self._candado:
+            serie = self._series.get(valores)
+            if serie is None:
+                # [conteos por bucket (el último es +Inf), suma]
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+
+    def _lineas(self, valores: tuple, serie) -> list[str]:
+        conteos, suma = serie
+        lineas = []
+        acumulado = 0
+        for limite, conteo in zip(self.buckets + (float('inf'),), conteos):
+            acumulado += conteo
+            le = '+Inf' if limite == float('inf') else _numero(limite)
+            etiquetas = _etiquetas(self.etiquetas, valores, 'le="' + le + '"')
+            lineas.append(f'{self.nombre}_bucket{etiquetas} {acumulado}')
+        lineas.append(f'{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}')
+        lineas.append(f'{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}')
+        return lineas
+
+duracion_http = Histograma(
+    'http_request_duration_seconds', 'Duración de las peticiones HTTP, hasta enviar el último byte.',
+    ('method', 'route', 'status'), BUCKETS_HTTP,
+)
+tamano_http = Histograma(
+    'http_response_size_bytes', 'Tamaño del cuerpo de las respuestas HTTP.',
+    ('method', 'route'), BUCKETS_BYTES,
+)
+en_curso_http = Medidor('http_requests_in_flight', 'Peticiones HTTP en curso.', ('method',))
+duracion_mongo = Histograma(
+    'mongodb_command_duration_seconds', 'Duración de los comandos enviados a MongoDB.',
+    ('command', 'collection'), BUCKETS_MONGO,
+)
+fallos_mongo = Contador('mongodb_command_failures_total', 'Comandos de MongoDB que terminaron en error.', ('command', 'collection'))
+documentos_mongo = Contador(
+    'mongodb_command_documents_total', 'Documentos devueltos o escritos por los comandos de MongoDB.',
+    ('command', 'collection'),
+)
+
+METRICAS_REGISTRADAS: list[Metrica] = [duracion_http, tamano_http, en_curso_http, duracion_mongo, fallos_mongo, documentos_mongo]
+
+def exponer() -> str:
+    """
+    Texto con todas las métricas en el formato de exposición de Prometheus.
+    """
+    lineas = []
+    for metrica in METRICAS_REGISTRADAS:
+        lineas.extend(metrica.exponer())
+    return '\n'.join(lineas) + '\n'
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que registra la duración, el tamaño y el estado de cada petición HTTP.
+
+    Es un middleware ASGI puro (no `BaseHTTPMiddleware`) para no añadir tareas ni copias del
+    cuerpo: solo observa los mensajes `http.response.*` que ya pasan por él. La ruta se lee de
+    `scope['route']`, que FastAPI rellena al resolver el endpoint; las URLs que no corresponden a
+    ninguna ruta se agrupan en `<desconocida>` para no multiplicar las series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        metodo = scope['method']
+        estado = 500
+        tamano = 0
+
+        async def enviar(mensaje):
+            nonlocal estado, tamano
+            if mensaje['type'] == 'http.response.start':
+                estado = mensaje['status']
+            elif mensaje['type'] == 'http.response.body':
+                tamano += len(mensaje.get('body', b''))
+            await send(mensaje)
+
+        en_curso_http.sumar(metodo)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            en_curso_http.sumar(metodo, cantidad=-1)
+            ruta = getattr(scope.get('route'), 'path', RUTA_DESCONOCIDA)
+            duracion_http.observar(duracion, metodo, ruta, estado)
+            tamano_http.observar(tamano, metodo, ruta)
+
+def _coleccion(comando: str, documento) -> str:
+    if comando == 'getMore':
+        return documento.get('collection', '')
+    valor = documento.get(comando)
+    return valor if isinstance(valor, str) else ''
+
+def _documentos(comando: str, respuesta) -> int:
+    cursor = respuesta.get('cursor')
+    if cursor is not None:
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or ())
+    if comando == 'findAndModify':
+        return 0 if respuesta.get('value') is None else 1
+    return respuesta.get('n', 0) if comando in ('insert', 'update', 'delete', 'count') else 0
+
+class MonitorComandos(monitoring.CommandListener):
+    """
+    Listener de pymongo que mide cada comando de MongoDB por nombre y colección.
+
+    La colección solo aparece en el evento de inicio, así que se guarda hasta que llega el de
+    éxito o fallo del mismo comando (identificado por conexión y `request_id`).
+    """
+
+    def __init__(self):
+        self._pendientes: dict[tuple, str] = {}
+
+    def started(self, event):
+        self._pendientes[(event.connection_id, event.request_id)] = _coleccion(event.command_name, event.command)
+
+    def succeeded(self, event):
+        coleccion = self._pendientes.pop((event.connection_id, event.request_id), '')
+        duracion_mongo.observar(event.duration_micros / 1e6, event.command_name, coleccion)
+        documentos = _documentos(event.command_name, event.reply)
+        if documentos:
+            documentos_mongo.incrementar(event.command_name, coleccion, cantidad=documentos)
+
+    def failed(self, event):
+        coleccion = self._pendientes.pop((event.connection_id, event.request_id), '')
+        duracion_mongo.observar(event.duration_micros / 1e6, event.command_name, coleccion)
+        fallos_mongo.incrementar(event.command_name, coleccion)
+
+monitor_comandos = MonitorComandos()
@@ -1,6 +1,9 @@
-from database import engine
+from bson import ObjectId
+from database import obtener_engine, sesion_causal, marca_causal
 from crud import revista as crud_revista
-from schemas.revista import RevistaCreate
+from services.cache import cache
+from schemas.revista import RevistaCreate, RevistaOut, RevistaUpdate
+from schemas.paginacion import OrdenPaginacion, LIMITE_POR_DEFECTO, LIMITE_BUSQUEDA
 
 async def crear_revista_service(revista_data: RevistaCreate):
     """
@@ -12,53 +15,119 @@ Parámetros:
 Retorna:
 - Revista: La revista creada.
 """
-    return await crud_revista.crear_revista(revista_data, engine) # type: ignore
+    return await crud_revista.crear_revista(revista_data, obtener_engine()) # type: ignore
 
-async def listar_revistas_service():
+async def crear_revistas_service(revistas_data: list[RevistaCreate], ids: list[tuple[ObjectId, ObjectId]] | None = None):
     """
-Lista todas las revistas del sistema.
+Crea varios revistas en una sola operación.
+
+Parámetros:
+- revistas_data (list[RevistaCreate]): Datos de las revistas a crear.
+- ids (list[tuple[ObjectId, ObjectId]] | None): IDs fijos de cada subtipo y su elemento; con ellos la escritura
+  es idempotente y reenviar el mismo lote no crea duplicados.
+
+Retorna:
+- list[dict]: Resultado de cada revista, con su `id` o el `error` que impidió crearla.
+"""
+    return await crud_revista.crear_revistas(revistas_data, obtener_engine(), ids)
+
+async def listar_revistas_service(
+    limite: int = LIMITE_POR_DEFECTO,
+    cursor: str | None = None,
+    orden: OrdenPaginacion = 'id',
+    campos: tuple[str, ...] | None = None,
+    despues_de: tuple | None = None,
+):
+    """
+Lista una página de revistas del sistema.
+
+Parámetros:
+- limite (int): Número máximo de revistas a devolver.
+- cursor (str | None): Cursor opaco de la página anterior.
+- orden (OrdenPaginacion): Campo de ordenación.
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `RevistaOut`.
+- despues_de (tuple | None): Marca devuelta por `cambios_revistas_service`; la página verá al menos ese estado.
+
+Retorna:
+- tuple[List[dict], str | None]: Revistas de la página, como diccionarios con la forma de `RevistaOut`, y cursor de la siguiente.
+
+Errores:
+- ValueError: Si el cursor no es válido.
+"""
+    async with sesion_causal(despues_de) as sesion:
+        return await crud_revista.listar_revistas_con_campos(obtener_engine('listado'), campos, limite, cursor, orden, sesion)
+
+async def iterar_revistas_service(campos: tuple[str, ...] | None = None, despues_de: tuple | None = None):
+    """
+Recorre todos los revistas del sistema por lotes.
+
+Parámetros:
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `RevistaOut`.
+- despues_de (tuple | None): Marca devuelta por `cambios_revistas_service`; el recorrido verá al menos ese estado.
+
+Retorna:
+- AsyncIterator[dict]: Revistas, con la forma de `RevistaOut`, en orden de inserción.
+"""
+    async with sesion_causal(despues_de) as sesion:
+        async for documento in crud_revista.iterar_revistas_con_campos(obtener_engine('listado'), campos, sesion=sesion):
+            yield documento
+
+async def cambios_revistas_service() -> tuple[int, tuple]:
+    """
+Obtiene el contador de cambios de las revistas, con el que se calcula el ETag de sus listados.
+
+Se lee con la misma preferencia de lectura que los listados y antes que ellos, en una sesión
+con consistencia causal: pasando su marca a `listar_revistas_service` o `iterar_revistas_service`,
+la respuesta nunca es más antigua que el contador con el que se etiqueta, aunque las dos lecturas
+vayan a secundarios distintos.
 
 Retorna:
-- List[Revista]: Lista de revistas disponibles.
+- tuple[int, tuple]: Número de escrituras registradas en las revistas y marca causal de la lectura.
 """
-    return await crud_revista.listar_revistas(engine)
+    async with sesion_causal() as sesion:
+        return await crud_revista.contar_cambios(obtener_engine('listado'), sesion), marca_causal(sesion)
 
 async def buscar_revista_por_id_service(id: str):
     """
 Busca una revista por su ID.
 
+La versión se guarda en la caché junto a la revista, de modo que siempre corresponde al
+documento devuelto, aunque la entrada sea anterior a una escritura de otro proceso.
+
 Parámetros:
 - id (str): ID de la revista.
 
 Retorna:
-- Revista: La revista encontrada.
+- tuple[dict, int]: La revista encontrada, con la forma de `RevistaOut`, y su versión (para el ETag).
 
 Errores:
 - ValueError: Si no se encuentra la revista.
 """
-    revista = await crud_revista.buscar_por_id(id, engine)
-    if not revista:
-        raise ValueError('No se encontró esta revista')
-    return revista
-
-async def buscar_revista_por_titulo_service(titulo: str):
+    clave = f'revista:id:{id}'
+    entrada = await cache.obtener(clave)
+    if entrada is None:
+        generacion = await cache.generacion()
+        encontrada = await crud_revista.buscar_por_id(id, obtener_engine('consulta'))
+        if not encontrada:
+            raise ValueError('No se encontró esta revista')
+        entrada = {'revista': RevistaOut.from_model(encontrada).model_dump(), 'version': encontrada.version}
+        await cache.guardar(clave, entrada, (f'revista:{encontrada.id}', f'elemento:{encontrada.elemento.id}'), generacion)
+    return entrada['revista'], entrada['version']
+
+async def buscar_revista_por_titulo_service(titulo: str, limite: int = LIMITE_BUSQUEDA, campos: tuple[str, ...] | None = None):
     """
 Busca revistas por su título.
 
 Parámetros:
 - titulo (str): Título de la revista.
+- limite (int): Número máximo de resultados.
+- campos (tuple[str, ...] | None): Si se indica, solo se devuelven esos campos de `RevistaOut`.
 
 Retorna:
-- List[Revista]: Lista de revistas que coinciden con el título.
-
-Errores:
-- ValueError: Si no se encuentran revistas con ese título.
+- List[dict]: Revistas que coinciden con el título, con la forma de `RevistaOut` (la lista vacía si no hay ninguna).
 """
 
-    revistas = await crud_revista.buscar_por_titulo(titulo, engine)
-    if not revistas:
-        raise ValueError('No se encontraron revistas con ese titulo')
-    return revistas
+    return await crud_revista.buscar_por_titulo(titulo, obtener_engine('busqueda'), limite, campos)
 
 async def buscar_revista_por_categoria_service(categoria: str):
     """
@@ -68,16 +137,10 @@ Parámetros:
 - categoria (str): Categoría de la revista.
 
 Retorna:
-- List[Revista]: Lista de revistas que coinciden con la categoría.
-
-Errores:
-- ValueError: Si no se encuentran revistas con esa categoría.
+- List[Revista]: Lista de revistas que coinciden con la categoría (la lista vacía si no hay ninguna).
 """
 
-    revistas = await crud_revista.buscar_por_categoria(categoria, engine)
-    if not revistas:
-        raise ValueError('No se encontraron revistas con esa categoría')
-    return revistas
+    return await crud_revista.buscar_por_categoria(categoria, obtener_engine('busqueda'))
 
 async def actualizar_revista_por_id_service(id: str, revista_data: RevistaCreate):
     """
@@ -88,16 +151,38 @@ Parámetros:
 - revista_data (RevistaCreate): Datos nuevos de la revista.
 
 Retorna:
-- Revista: La revista actualizada.
+- dict: La revista actualizada, con la forma de `RevistaOut`.
 
 Errores:
 - ValueError: Si no se encuentra la revista.
 """
 
-    revista = crud_revista.buscar_por_id(id, engine)
-    if not revista:
+    actualizada = await crud_revista.actualizar_por_id(id, revista_data, obtener_engine())
+    if not actualizada:
+        raise ValueError('No se encontró esta revista')
+    await cache.invalidar(f'revista:{id}')
+    return actualizada
+
+async def actualizar_parcial_revista_por_id_service(id: str, cambios: RevistaUpdate):
+    """
+Actualiza solo los campos enviados de una revista.
+
+Parámetros:
+- id (str): ID de la revista.
+- cambios (RevistaUpdate): Campos a modificar.
+
+Retorna:
+- dict: La revista actualizada, con la forma de `RevistaOut`.
+
+Errores:
+- ValueError: Si no se encuentra la revista.
+"""
+    actualizada = await crud_revista.actualizar_parcial_por_id(id, cambios, obtener_engine())
+    if not actualizada:
         raise ValueError('No se encontró esta revista')
-    return await crud_revista.actualizar_por_id(id, revista_data, engine)
+    if cambios.cambios():
+        await cache.invalidar(f'revista:{id}')
+    return actualizada
 
 async def eliminar_revista_por_id_service(id: str):
     """
@@ -112,7 +197,8 @@ Retorna:
 Errores:
 - ValueError: Si no se encuentra la revista.
     """
-    revista = crud_revista.buscar_por_id(id, engine)
-    if not revista:
+    eliminada = await crud_revista.eliminar_revista_por_id(id, obtener_engine())
+    if not eliminada:
         raise ValueError('No se encontró esta revista')
-    return await crud_revista.eliminar_revista_por_id(id, engine)
\ No newline at end of file
+    await cache.invalidar(f'revista:{id}')
+    return eliminada
\ No newline at end of file